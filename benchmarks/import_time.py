@@ -0,0 +1,105 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the time taken to import the library in a new interpreter.
+
+Each import is timed in a new process, several times, and the median and
+fastest times are reported. The heavy dependencies the library defers until
+they are first used are timed the same way, showing the time an import of the
+library saves by not loading them, and any of them loaded by importing the
+library is reported.
+
+Examples:
+  python benchmarks/import_time.py
+  python benchmarks/import_time.py --runs 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# The number of processes each import is timed in by default.
+_DEFAULT_RUNS = 10
+# The modules of the library timed.
+_LIBRARY_MODULES = ('googleads', 'googleads.adwords', 'googleads.dfp',
+                    'googleads.dfa')
+# The dependencies the library imports only when they are first used.
+_DEFERRED_MODULES = ('yaml', 'httplib2', 'socks', 'oauth2client.client',
+                     'pytz', 'suds.client', 'suds.plugin', 'sqlite3',
+                     'BaseHTTPServer', 'cProfile', 'pstats', 'difflib',
+                     'unicodedata')
+# Times an import in the new process, printing the number of seconds it took
+# and the deferred modules it loaded as JSON.
+_TIMING_SCRIPT = """
+import json, sys, time
+start_time = time.time()
+import %(module)s
+duration = time.time() - start_time
+print json.dumps([duration, [name for name in %(deferred)r
+                             if sys.modules.get(name)]])
+"""
+
+
+def TimeImport(module, runs=_DEFAULT_RUNS):
+  """Times the import of a module in new processes.
+
+  Args:
+    module: A string containing the name of the module.
+    [optional]
+    runs: The number of processes the import is timed in.
+
+  Returns:
+    A tuple of the sorted list of the seconds each import took and the list of
+    the deferred modules loaded by the import.
+  """
+  library_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  environment = dict(os.environ)
+  environment['PYTHONPATH'] = os.pathsep.join(
+      [library_path] + filter(None, [environment.get('PYTHONPATH')]))
+  durations = []
+  loaded = []
+  for _ in xrange(runs):
+    output = subprocess.check_output(
+        [sys.executable, '-c', _TIMING_SCRIPT % {
+            'module': module, 'deferred': _DEFERRED_MODULES}],
+        env=environment)
+    duration, loaded = json.loads(output.strip().splitlines()[-1])
+    durations.append(duration)
+  return sorted(durations), loaded
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--runs', type=int, default=_DEFAULT_RUNS,
+                      help='The number of processes each import is timed in.')
+  args = parser.parse_args(argv)
+
+  print '%-22s %12s %12s  %s' % ('module', 'median_ms', 'fastest_ms',
+                                 'deferred modules loaded')
+  for module in _LIBRARY_MODULES + _DEFERRED_MODULES:
+    if module == _DEFERRED_MODULES[0]:
+      print
+    durations, loaded = TimeImport(module, args.runs)
+    print '%-22s %12.1f %12.1f  %s' % (
+        module, durations[len(durations) // 2] * 1000, durations[0] * 1000,
+        ', '.join(name for name in loaded if name != module) or '-')
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,436 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks the library's hot paths against a local stub of the APIs.
+
+Each benchmark runs at several sizes, by default each in its own process so
+that the peak resident set size reported is that of the benchmark alone. For
+every run the throughput, the latency percentiles of its iterations and the
+peak resident set size are reported, as a table or as JSON lines.
+
+Examples:
+  python benchmarks/run_benchmarks.py
+  python benchmarks/run_benchmarks.py --benchmarks mutate,pql_csv --quick
+  python benchmarks/run_benchmarks.py --benchmarks get --sizes 500,5000 --json
+"""
+
+import argparse
+import atexit
+import collections
+import datetime
+import json
+import os
+import resource
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import suds.cache
+
+from googleads import adwords
+from googleads import cache
+from googleads import common
+from googleads import dfp
+from googleads import oauth2
+import stub_server
+
+
+# The number of untimed iterations run before the timed ones.
+_WARMUP_ITERATIONS = 1
+# The number of timed iterations run by default.
+_DEFAULT_ITERATIONS = 5
+# The number of seconds each OAuth 2.0 token refresh takes at the stub server.
+_TOKEN_LATENCY = 0.05
+# A token expiry in the past, forcing the next header to refresh the token.
+_EXPIRED = datetime.datetime(1980, 1, 1, 12)
+# The columns of the table of results.
+_TABLE_COLUMNS = (('benchmark', '%-20s'), ('size', '%10s'),
+                  ('throughput', '%22s'), ('p50_ms', '%10s'),
+                  ('p90_ms', '%10s'), ('p99_ms', '%10s'),
+                  ('peak_rss_mb', '%12s'))
+
+# A benchmark: its description, the unit of the work it measures, and the
+# sizes it runs at by default and with --quick.
+Benchmark = collections.namedtuple(
+    'Benchmark', ('function', 'description', 'unit', 'sizes', 'quick_sizes'))
+
+
+def _CreateAdWordsClient(server, suds_cache=None):
+  """Creates an AdWordsClient authorized by the stub server."""
+  return adwords.AdWordsClient('developer token', _CreateOAuth2Client(server),
+                               'benchmarks', client_customer_id='123-456-7890',
+                               cache=suds_cache or suds.cache.NoCache())
+
+
+def _CreateDfpClient(server):
+  """Creates a DfpClient authorized by the stub server."""
+  return dfp.DfpClient(_CreateOAuth2Client(server), 'benchmarks', '1234',
+                       cache=suds.cache.NoCache())
+
+
+def _CreateOAuth2Client(server):
+  """Creates a GoogleRefreshTokenClient refreshing from the stub server."""
+  oauth2_client = oauth2.GoogleRefreshTokenClient(
+      'client id', 'client secret', 'refresh token')
+  oauth2_client.oauth2credentials.token_uri = stub_server.GetTokenUrl(
+      server.url)
+  return oauth2_client
+
+
+def _CreateCampaignOperations(size):
+  """Creates the given number of CampaignService ADD operations."""
+  return [{
+      'operator': 'ADD',
+      'operand': {
+          'name': 'Campaign #%d' % index,
+          'status': 'PAUSED',
+          'startDate': '20150101',
+          'budget': {'budgetId': index, 'amount': {'microAmount': 50000000}}
+      }
+  } for index in xrange(size)]
+
+
+def PackMutate(server, size):
+  """Packs mutate operations into suds objects, without sending them."""
+  service = _CreateAdWordsClient(server).GetService(
+      'CampaignService', stub_server.ADWORDS_VERSION, server.url)
+  operations = _CreateCampaignOperations(size)
+  pack_for_suds = common._PackForSuds  # pylint: disable=protected-access
+
+  def Run():
+    pack_for_suds(operations, service.suds_client.factory)
+    return size
+  return Run
+
+
+def Mutate(server, size):
+  """Sends a mutate with the given number of operations and parses its reply."""
+  service = _CreateAdWordsClient(server).GetService(
+      'CampaignService', stub_server.ADWORDS_VERSION, server.url)
+  operations = _CreateCampaignOperations(size)
+
+  def Run():
+    service.mutate(operations)
+    return size
+  return Run
+
+
+def GetPage(server, size):
+  """Parses a get response holding a page of the given number of campaigns."""
+  server.total_campaigns = size
+  service = _CreateAdWordsClient(server).GetService(
+      'CampaignService', stub_server.ADWORDS_VERSION, server.url)
+  selector = {
+      'fields': ['Id', 'Name', 'Status', 'StartDate', 'Amount'],
+      'paging': {'startIndex': 0, 'numberResults': size}
+  }
+
+  def Run():
+    return len(service.get(selector)['entries'])
+  return Run
+
+
+def PqlCsv(server, size):
+  """Pages through a PQL result set of the given number of rows into a CSV."""
+  server.total_pql_rows = size
+  downloader = _CreateDfpClient(server).GetDataDownloader(
+      stub_server.DFP_VERSION, server.url)
+
+  def Run():
+    output = StringIO.StringIO()
+    downloader.DownloadPqlResultToCsv('SELECT Id, Name FROM Line_Item', output)
+    # The header row is not counted.
+    return output.getvalue().count('\n') - 1
+  return Run
+
+
+def ReportDownload(server, size):
+  """Streams an AdWords report of the given number of MiB to a file."""
+  server.report_size = size * 1024 * 1024
+  downloader = _CreateAdWordsClient(server).GetReportDownloader(
+      stub_server.ADWORDS_VERSION, server.url)
+  report = {
+      'reportName': 'Benchmark report',
+      'dateRangeType': 'LAST_7_DAYS',
+      'reportType': 'CAMPAIGN_PERFORMANCE_REPORT',
+      'downloadFormat': 'CSV',
+      'selector': {'fields': ['CampaignName', 'CampaignStatus', 'Impressions',
+                              'Clicks', 'Cost']}
+  }
+
+  def Run():
+    with tempfile.TemporaryFile() as output:
+      downloader.DownloadReport(report, output)
+      return output.tell()
+  return Run
+
+
+def OAuth2Refresh(server, size):
+  """Creates headers from the given number of threads sharing an expired token.
+
+  The number of token requests the stub server received is reported as
+  token_requests, showing how many of the threads refreshed the token.
+  """
+  server.token_latency = _TOKEN_LATENCY
+  oauth2_client = _CreateOAuth2Client(server)
+  credentials = oauth2_client.oauth2credentials
+
+  def Run():
+    credentials.token_expiry = _EXPIRED
+    threads = [threading.Thread(target=oauth2_client.CreateHttpHeader)
+               for _ in xrange(size)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return size
+  return Run
+
+
+def SetHeaders(server, size):
+  """Sets the SOAP and HTTP headers of a service the given number of times."""
+  service = _CreateAdWordsClient(server).GetService(
+      'CampaignService', stub_server.ADWORDS_VERSION, server.url)
+  header_handler = service._header_handler  # pylint: disable=protected-access
+  # Refresh the token once, so only the setting of headers is measured.
+  header_handler.SetHeaders(service.suds_client)
+
+  def Run():
+    for _ in xrange(size):
+      header_handler.SetHeaders(service.suds_client)
+    return size
+  return Run
+
+
+def _TimeGetService(server, suds_cache):
+  """Times the creation of a CampaignService by a new client, in seconds."""
+  client = _CreateAdWordsClient(server, suds_cache)
+  start_time = time.time()
+  client.GetService('CampaignService', stub_server.ADWORDS_VERSION, server.url)
+  return time.time() - start_time
+
+
+def _CreateGetServiceBenchmark(backend):
+  """Creates a benchmark of GetService using a suds cache backend.
+
+  Each service is created by a new client sharing the cache, as services are by
+  the processes or tasks of an application. The latency of the first, cold
+  GetService is reported as cold_ms, and the timed iterations are warm.
+
+  Args:
+    backend: A string identifying the backend: none, memory, sqlite, mmap or
+        snapshot, a SchemaSnapshot kept in an MmapCache.
+
+  Returns:
+    A function setting up the benchmark.
+  """
+  def GetService(server, size):
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, True)
+    path = os.path.join(directory, 'suds.cache')
+    if backend == 'none':
+      suds_cache = suds.cache.NoCache()
+    elif backend == 'memory':
+      suds_cache = cache.MemoryCache()
+    elif backend == 'sqlite':
+      suds_cache = cache.SqliteCache(os.path.join(directory, 'suds.db'))
+    else:
+      # The mmap file is written ahead of time from a warmed cache, so its cold
+      # GetService includes opening the file.
+      warm_cache = (cache.MemoryCache() if backend == 'mmap'
+                    else cache.SchemaSnapshot())
+      _TimeGetService(server, warm_cache)
+      cache.MmapCache.Write(path, warm_cache.Items())
+    start_time = time.time()
+    if backend == 'mmap':
+      suds_cache = cache.MmapCache(path)
+    elif backend == 'snapshot':
+      suds_cache = cache.SchemaSnapshot(cache.MmapCache(path))
+    cold_seconds = time.time() - start_time + _TimeGetService(server,
+                                                              suds_cache)
+
+    def Run():
+      for _ in xrange(size):
+        _TimeGetService(server, suds_cache)
+      return size
+    Run.extra = {'cold_ms': cold_seconds * 1000}
+    return Run
+  GetService.__doc__ = ('Creates services with the %s suds cache backend.' %
+                        backend)
+  return GetService
+
+
+# The benchmarks, by name.
+_BENCHMARKS = collections.OrderedDict((
+    ('pack_mutate', Benchmark(PackMutate, 'Pack mutate operations', 'ops',
+                              (1000, 10000, 50000), (100, 1000))),
+    ('mutate', Benchmark(Mutate, 'Mutate round trip', 'ops',
+                         (1000, 10000, 50000), (100, 1000))),
+    ('get', Benchmark(GetPage, 'Parse a get page', 'entries',
+                      (1000, 10000, 50000), (100, 1000))),
+    ('pql_csv', Benchmark(PqlCsv, 'PQL paging to CSV', 'rows',
+                          (5000, 50000), (1000,))),
+    ('report_download', Benchmark(ReportDownload, 'Report download (MiB)',
+                                  'bytes', (16, 128), (4,))),
+    ('oauth2_refresh', Benchmark(OAuth2Refresh, 'OAuth 2.0 refresh threads',
+                                 'headers', (1, 8, 32), (1, 8))),
+    ('set_headers', Benchmark(SetHeaders, 'Set service headers', 'calls',
+                              (1000, 10000), (1000,))),
+) + tuple(
+    ('get_service_%s' % backend,
+     Benchmark(_CreateGetServiceBenchmark(backend),
+               'GetService, %s cache' % backend, 'services', (10, 100), (10,)))
+    for backend in ('none', 'memory', 'sqlite', 'mmap', 'snapshot')))
+
+
+def _GetPeakRssMegabytes():
+  """Retrieves the peak resident set size of this process in MiB."""
+  peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kibibytes, OS X reports bytes.
+  return peak_rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def _GetPercentile(sorted_values, percentile):
+  """Retrieves a nearest-rank percentile of a sorted list of values."""
+  index = max(0, int(round(percentile / 100.0 * len(sorted_values))) - 1)
+  return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def RunBenchmark(name, size, iterations=_DEFAULT_ITERATIONS):
+  """Runs a benchmark in this process.
+
+  Args:
+    name: A string identifying the benchmark.
+    size: An int identifying the size to run the benchmark at.
+    [optional]
+    iterations: The number of timed iterations.
+
+  Returns:
+    A dictionary containing the results of the benchmark.
+  """
+  benchmark = _BENCHMARKS[name]
+  with stub_server.StubServer() as server:
+    run = benchmark.function(server, size)
+    for _ in xrange(_WARMUP_ITERATIONS):
+      run()
+    token_requests = server.requests.get(stub_server.TOKEN_PATH, 0)
+    latencies = []
+    work = 0
+    for _ in xrange(iterations):
+      start_time = time.time()
+      work += run()
+      latencies.append(time.time() - start_time)
+    token_requests = (
+        server.requests.get(stub_server.TOKEN_PATH, 0) - token_requests)
+
+  latencies.sort()
+  result = collections.OrderedDict((
+      ('benchmark', name),
+      ('size', size),
+      ('iterations', iterations),
+      ('unit', benchmark.unit),
+      ('throughput', work / sum(latencies) if sum(latencies) else 0.0),
+      ('p50_ms', _GetPercentile(latencies, 50) * 1000),
+      ('p90_ms', _GetPercentile(latencies, 90) * 1000),
+      ('p99_ms', _GetPercentile(latencies, 99) * 1000),
+      ('peak_rss_mb', _GetPeakRssMegabytes()),
+  ))
+  if name == 'oauth2_refresh':
+    result['token_requests'] = token_requests
+  result.update(sorted(getattr(run, 'extra', {}).iteritems()))
+  return result
+
+
+def _RunBenchmarkInSubprocess(name, size, iterations):
+  """Runs a benchmark in a new process, isolating its peak RSS."""
+  output = subprocess.check_output([
+      sys.executable, os.path.abspath(__file__), '--run-one',
+      '%s:%d' % (name, size), '--iterations', str(iterations)])
+  return json.loads(output.strip().splitlines()[-1],
+                    object_pairs_hook=collections.OrderedDict)
+
+
+def _FormatResult(result):
+  """Formats a result as a row of the table of results."""
+  values = dict(result)
+  values['throughput'] = '%.1f %s/s' % (result['throughput'], result['unit'])
+  for key in ('p50_ms', 'p90_ms', 'p99_ms', 'peak_rss_mb'):
+    values[key] = '%.1f' % result[key]
+  row = ' '.join(column_format % values[column]
+                 for column, column_format in _TABLE_COLUMNS)
+  if 'token_requests' in result:
+    row += '  (%d token requests)' % result['token_requests']
+  if 'cold_ms' in result:
+    row += '  (cold %.1f ms)' % result['cold_ms']
+  return row
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--benchmarks', default=','.join(_BENCHMARKS),
+                      help='Comma-separated benchmarks to run, among: %s.' %
+                      ', '.join(_BENCHMARKS))
+  parser.add_argument('--sizes', help='Comma-separated sizes to run every '
+                      'benchmark at, instead of their default sizes.')
+  parser.add_argument('--quick', action='store_true',
+                      help='Run every benchmark at small sizes only.')
+  parser.add_argument('--iterations', type=int, default=_DEFAULT_ITERATIONS,
+                      help='The number of timed iterations of each run.')
+  parser.add_argument('--in-process', action='store_true',
+                      help='Run the benchmarks in this process; the peak RSS '
+                      'reported is then that of every run so far.')
+  parser.add_argument('--json', action='store_true',
+                      help='Print each result as a line of JSON.')
+  parser.add_argument('--run-one', help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run_one:
+    name, size = args.run_one.split(':')
+    print json.dumps(RunBenchmark(name, int(size), args.iterations))
+    return
+
+  names = [benchmark_name.strip()
+           for benchmark_name in args.benchmarks.split(',')]
+  for name in names:
+    if name not in _BENCHMARKS:
+      parser.error('Unknown benchmark: %s' % name)
+
+  if not args.json:
+    print ' '.join(column_format % column
+                   for column, column_format in _TABLE_COLUMNS)
+  for name in names:
+    benchmark = _BENCHMARKS[name]
+    if args.sizes:
+      sizes = [int(run_size) for run_size in args.sizes.split(',')]
+    else:
+      sizes = benchmark.quick_sizes if args.quick else benchmark.sizes
+    for size in sizes:
+      if args.in_process:
+        result = RunBenchmark(name, size, args.iterations)
+      else:
+        result = _RunBenchmarkInSubprocess(name, size, args.iterations)
+      print json.dumps(result) if args.json else _FormatResult(result)
+      sys.stdout.flush()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,595 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local HTTP server standing in for the AdWords and DFP APIs in benchmarks.
+
+The server serves canned WSDLs for the AdWords CampaignService and the DFP
+PublisherQueryLanguageService, a canned AdWords report definition schema, SOAP
+responses, AdWords report downloads and OAuth 2.0 token refreshes. The size of
+the responses is set through the server's attributes, so the library's own
+processing dominates the time measured.
+"""
+
+import BaseHTTPServer
+import json
+import re
+import SocketServer
+import threading
+import time
+
+# The AdWords version served.
+ADWORDS_VERSION = 'v201502'
+# The DFP version served.
+DFP_VERSION = 'v201505'
+
+_ADWORDS_NAMESPACE = ('https://adwords.google.com/api/adwords/cm/%s' %
+                      ADWORDS_VERSION)
+_DFP_NAMESPACE = 'https://www.google.com/apis/ads/publisher/%s' % DFP_VERSION
+
+# The paths of the served WSDLs and schemas, without their query strings.
+_CAMPAIGN_SERVICE_PATH = '/api/adwords/cm/%s/CampaignService' % ADWORDS_VERSION
+_PQL_SERVICE_PATH = ('/apis/ads/publisher/%s/PublisherQueryLanguageService' %
+                     DFP_VERSION)
+_REPORT_DOWNLOAD_PATH = '/api/adwords/reportdownload/%s' % ADWORDS_VERSION
+_REPORT_SCHEMA_PATH = _REPORT_DOWNLOAD_PATH + '/reportDefinition.xsd'
+TOKEN_PATH = '/o/oauth2/token'
+
+_CAMPAIGN_SERVICE_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions targetNamespace="%(namespace)s"
+    xmlns:tns="%(namespace)s"
+    xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:wsdlsoap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <wsdl:types>
+    <schema elementFormDefault="qualified" targetNamespace="%(namespace)s"
+        xmlns="http://www.w3.org/2001/XMLSchema">
+      <complexType name="SoapHeader">
+        <sequence>
+          <element name="clientCustomerId" type="xsd:string" minOccurs="0"/>
+          <element name="developerToken" type="xsd:string" minOccurs="0"/>
+          <element name="userAgent" type="xsd:string" minOccurs="0"/>
+          <element name="validateOnly" type="xsd:boolean" minOccurs="0"/>
+          <element name="partialFailure" type="xsd:boolean" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Money">
+        <sequence>
+          <element name="microAmount" type="xsd:long" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Budget">
+        <sequence>
+          <element name="budgetId" type="xsd:long" minOccurs="0"/>
+          <element name="amount" type="tns:Money" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Campaign">
+        <sequence>
+          <element name="id" type="xsd:long" minOccurs="0"/>
+          <element name="name" type="xsd:string" minOccurs="0"/>
+          <element name="status" type="xsd:string" minOccurs="0"/>
+          <element name="startDate" type="xsd:string" minOccurs="0"/>
+          <element name="budget" type="tns:Budget" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="CampaignOperation">
+        <sequence>
+          <element name="operator" type="xsd:string" minOccurs="0"/>
+          <element name="operand" type="tns:Campaign" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Paging">
+        <sequence>
+          <element name="startIndex" type="xsd:int" minOccurs="0"/>
+          <element name="numberResults" type="xsd:int" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Selector">
+        <sequence>
+          <element name="fields" type="xsd:string" minOccurs="0"
+              maxOccurs="unbounded"/>
+          <element name="paging" type="tns:Paging" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="CampaignPage">
+        <sequence>
+          <element name="totalNumEntries" type="xsd:int" minOccurs="0"/>
+          <element name="entries" type="tns:Campaign" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </sequence>
+      </complexType>
+      <complexType name="CampaignReturnValue">
+        <sequence>
+          <element name="value" type="tns:Campaign" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </sequence>
+      </complexType>
+      <element name="get">
+        <complexType>
+          <sequence>
+            <element name="serviceSelector" type="tns:Selector"
+                minOccurs="0"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="getResponse">
+        <complexType>
+          <sequence>
+            <element name="rval" type="tns:CampaignPage" minOccurs="0"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="mutate">
+        <complexType>
+          <sequence>
+            <element name="operations" type="tns:CampaignOperation"
+                minOccurs="0" maxOccurs="unbounded"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="mutateResponse">
+        <complexType>
+          <sequence>
+            <element name="rval" type="tns:CampaignReturnValue"
+                minOccurs="0"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="RequestHeader" type="tns:SoapHeader"/>
+    </schema>
+  </wsdl:types>
+  <wsdl:message name="RequestHeader">
+    <wsdl:part element="tns:RequestHeader" name="RequestHeader"/>
+  </wsdl:message>
+  <wsdl:message name="getRequest">
+    <wsdl:part element="tns:get" name="parameters"/>
+  </wsdl:message>
+  <wsdl:message name="getResponse">
+    <wsdl:part element="tns:getResponse" name="parameters"/>
+  </wsdl:message>
+  <wsdl:message name="mutateRequest">
+    <wsdl:part element="tns:mutate" name="parameters"/>
+  </wsdl:message>
+  <wsdl:message name="mutateResponse">
+    <wsdl:part element="tns:mutateResponse" name="parameters"/>
+  </wsdl:message>
+  <wsdl:portType name="CampaignServiceInterface">
+    <wsdl:operation name="get">
+      <wsdl:input message="tns:getRequest" name="getRequest"/>
+      <wsdl:output message="tns:getResponse" name="getResponse"/>
+    </wsdl:operation>
+    <wsdl:operation name="mutate">
+      <wsdl:input message="tns:mutateRequest" name="mutateRequest"/>
+      <wsdl:output message="tns:mutateResponse" name="mutateResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="CampaignServiceSoapBinding"
+      type="tns:CampaignServiceInterface">
+    <wsdlsoap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="get">
+      <wsdlsoap:operation soapAction=""/>
+      <wsdl:input name="getRequest">
+        <wsdlsoap:header message="tns:RequestHeader" part="RequestHeader"
+            use="literal"/>
+        <wsdlsoap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output name="getResponse">
+        <wsdlsoap:body use="literal"/>
+      </wsdl:output>
+    </wsdl:operation>
+    <wsdl:operation name="mutate">
+      <wsdlsoap:operation soapAction=""/>
+      <wsdl:input name="mutateRequest">
+        <wsdlsoap:header message="tns:RequestHeader" part="RequestHeader"
+            use="literal"/>
+        <wsdlsoap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output name="mutateResponse">
+        <wsdlsoap:body use="literal"/>
+      </wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="CampaignService">
+    <wsdl:port binding="tns:CampaignServiceSoapBinding"
+        name="CampaignServiceInterfacePort">
+      <wsdlsoap:address location="%(url)s%(path)s"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+_PQL_SERVICE_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions targetNamespace="%(namespace)s"
+    xmlns:tns="%(namespace)s"
+    xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:wsdlsoap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <wsdl:types>
+    <schema elementFormDefault="qualified" targetNamespace="%(namespace)s"
+        xmlns="http://www.w3.org/2001/XMLSchema">
+      <complexType name="SoapRequestHeader">
+        <sequence>
+          <element name="networkCode" type="xsd:string" minOccurs="0"/>
+          <element name="applicationName" type="xsd:string" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType abstract="true" name="Value">
+        <sequence/>
+      </complexType>
+      <complexType name="TextValue">
+        <complexContent>
+          <extension base="tns:Value">
+            <sequence>
+              <element name="value" type="xsd:string" minOccurs="0"/>
+            </sequence>
+          </extension>
+        </complexContent>
+      </complexType>
+      <complexType name="NumberValue">
+        <complexContent>
+          <extension base="tns:Value">
+            <sequence>
+              <element name="value" type="xsd:string" minOccurs="0"/>
+            </sequence>
+          </extension>
+        </complexContent>
+      </complexType>
+      <complexType name="String_ValueMapEntry">
+        <sequence>
+          <element name="key" type="xsd:string" minOccurs="0"/>
+          <element name="value" type="tns:Value" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Statement">
+        <sequence>
+          <element name="query" type="xsd:string" minOccurs="0"/>
+          <element name="values" type="tns:String_ValueMapEntry"
+              minOccurs="0" maxOccurs="unbounded"/>
+        </sequence>
+      </complexType>
+      <complexType name="ColumnType">
+        <sequence>
+          <element name="labelName" type="xsd:string" minOccurs="0"/>
+        </sequence>
+      </complexType>
+      <complexType name="Row">
+        <sequence>
+          <element name="values" type="tns:Value" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </sequence>
+      </complexType>
+      <complexType name="ResultSet">
+        <sequence>
+          <element name="columnTypes" type="tns:ColumnType" minOccurs="0"
+              maxOccurs="unbounded"/>
+          <element name="rows" type="tns:Row" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </sequence>
+      </complexType>
+      <element name="select">
+        <complexType>
+          <sequence>
+            <element name="selectStatement" type="tns:Statement"
+                minOccurs="0"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="selectResponse">
+        <complexType>
+          <sequence>
+            <element name="rval" type="tns:ResultSet" minOccurs="0"/>
+          </sequence>
+        </complexType>
+      </element>
+      <element name="RequestHeader" type="tns:SoapRequestHeader"/>
+    </schema>
+  </wsdl:types>
+  <wsdl:message name="RequestHeader">
+    <wsdl:part element="tns:RequestHeader" name="RequestHeader"/>
+  </wsdl:message>
+  <wsdl:message name="selectRequest">
+    <wsdl:part element="tns:select" name="parameters"/>
+  </wsdl:message>
+  <wsdl:message name="selectResponse">
+    <wsdl:part element="tns:selectResponse" name="parameters"/>
+  </wsdl:message>
+  <wsdl:portType name="PublisherQueryLanguageServiceInterface">
+    <wsdl:operation name="select">
+      <wsdl:input message="tns:selectRequest" name="selectRequest"/>
+      <wsdl:output message="tns:selectResponse" name="selectResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="PublisherQueryLanguageServiceSoapBinding"
+      type="tns:PublisherQueryLanguageServiceInterface">
+    <wsdlsoap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="select">
+      <wsdlsoap:operation soapAction=""/>
+      <wsdl:input name="selectRequest">
+        <wsdlsoap:header message="tns:RequestHeader" part="RequestHeader"
+            use="literal"/>
+        <wsdlsoap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output name="selectResponse">
+        <wsdlsoap:body use="literal"/>
+      </wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="PublisherQueryLanguageService">
+    <wsdl:port binding="tns:PublisherQueryLanguageServiceSoapBinding"
+        name="PublisherQueryLanguageServiceInterfacePort">
+      <wsdlsoap:address location="%(url)s%(path)s"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+_REPORT_DEFINITION_SCHEMA = """<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema elementFormDefault="qualified" targetNamespace="%(namespace)s"
+    xmlns:tns="%(namespace)s" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <xsd:complexType name="Selector">
+    <xsd:sequence>
+      <xsd:element name="fields" type="xsd:string" minOccurs="0"
+          maxOccurs="unbounded"/>
+    </xsd:sequence>
+  </xsd:complexType>
+  <xsd:complexType name="ReportDefinition">
+    <xsd:sequence>
+      <xsd:element name="selector" type="tns:Selector"/>
+      <xsd:element name="reportName" type="xsd:string"/>
+      <xsd:element name="reportType" type="xsd:string"/>
+      <xsd:element name="dateRangeType" type="xsd:string"/>
+      <xsd:element name="downloadFormat" type="xsd:string"/>
+    </xsd:sequence>
+  </xsd:complexType>
+  <xsd:element name="reportDefinition" type="tns:ReportDefinition"/>
+</xsd:schema>
+"""
+
+_SOAP_ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?>'
+                  '<soap:Envelope '
+                  'xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+                  'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+                  '<soap:Body>%s</soap:Body></soap:Envelope>')
+
+_CAMPAIGN = ('<entries><id>%(id)d</id><name>Campaign #%(id)d</name>'
+             '<status>ENABLED</status><startDate>20150101</startDate>'
+             '<budget><budgetId>%(id)d</budgetId><amount><microAmount>'
+             '50000000</microAmount></amount></budget></entries>')
+
+# The size of the chunks in which reports are written.
+_REPORT_CHUNK_SIZE = 64 * 1024
+
+
+class StubServer(object):
+  """Serves canned API responses from a thread of the current process.
+
+  Attributes:
+    url: The base URL of the server, to use as the server of API clients.
+    total_campaigns: The number of campaigns CampaignService.get pages through.
+    total_pql_rows: The number of rows a PQL select pages through.
+    report_size: The size in bytes of downloaded reports.
+    token_latency: The number of seconds a token refresh takes.
+    requests: A dictionary mapping each path to the number of requests for it.
+  """
+
+  def __init__(self, total_campaigns=500, total_pql_rows=5000,
+               report_size=16 * 1024 * 1024, token_latency=0.0):
+    """Initializes a StubServer listening on a free local port.
+
+    Args:
+      [optional]
+      total_campaigns: The number of campaigns CampaignService.get pages
+          through.
+      total_pql_rows: The number of rows a PQL select pages through.
+      report_size: The size in bytes of downloaded reports.
+      token_latency: The number of seconds a token refresh takes.
+    """
+    self.total_campaigns = total_campaigns
+    self.total_pql_rows = total_pql_rows
+    self.report_size = report_size
+    self.token_latency = token_latency
+    self.requests = {}
+    self._lock = threading.Lock()
+    self._server = _ThreadedHTTPServer(('127.0.0.1', 0), _StubHandler)
+    self._server.stub = self
+    self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+    self._thread = None
+
+  def Start(self):
+    """Starts serving requests from a daemon thread."""
+    self._thread = threading.Thread(target=self._server.serve_forever)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def Stop(self):
+    """Stops serving requests."""
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self):
+    self.Start()
+    return self
+
+  def __exit__(self, *args):
+    self.Stop()
+
+  def CountRequest(self, path):
+    """Counts a request for a path."""
+    with self._lock:
+      self.requests[path] = self.requests.get(path, 0) + 1
+
+  def GetDocument(self, path):
+    """Retrieves a canned WSDL or schema.
+
+    Args:
+      path: A string containing the path of the document.
+
+    Returns:
+      A string containing the document, or None if there is none at the path.
+    """
+    if path == _CAMPAIGN_SERVICE_PATH:
+      return _CAMPAIGN_SERVICE_WSDL % {
+          'namespace': _ADWORDS_NAMESPACE, 'url': self.url, 'path': path}
+    elif path == _PQL_SERVICE_PATH:
+      return _PQL_SERVICE_WSDL % {
+          'namespace': _DFP_NAMESPACE, 'url': self.url, 'path': path}
+    elif path == _REPORT_SCHEMA_PATH:
+      return _REPORT_DEFINITION_SCHEMA % {'namespace': _ADWORDS_NAMESPACE}
+    return None
+
+  def GetCampaignServiceResponse(self, request):
+    """Creates the response to a CampaignService request.
+
+    A get returns the page of campaigns its paging selects, and a mutate
+    returns one campaign for each of its operations.
+
+    Args:
+      request: A string containing the SOAP request.
+
+    Returns:
+      A string containing the SOAP response.
+    """
+    if re.search(r'<(\w+:)?mutate[ >]', request):
+      count = len(re.findall(r'<(?:\w+:)?operations[ >]', request))
+      entries = ''.join(_CAMPAIGN % {'id': index} for index in xrange(count))
+      body = ('<mutateResponse xmlns="%s"><rval>%s</rval></mutateResponse>' %
+              (_ADWORDS_NAMESPACE, entries.replace('entries>', 'value>')))
+    else:
+      start_index = _GetIntElement(request, 'startIndex', 0)
+      number_results = _GetIntElement(request, 'numberResults',
+                                      self.total_campaigns)
+      end_index = min(start_index + number_results, self.total_campaigns)
+      entries = ''.join(_CAMPAIGN % {'id': index}
+                        for index in xrange(start_index, end_index))
+      body = ('<getResponse xmlns="%s"><rval><totalNumEntries>%d'
+              '</totalNumEntries>%s</rval></getResponse>' %
+              (_ADWORDS_NAMESPACE, self.total_campaigns, entries))
+    return _SOAP_ENVELOPE % body
+
+  def GetPqlResponse(self, request):
+    """Creates the response to a PQL select, honoring its limit and offset.
+
+    Args:
+      request: A string containing the SOAP request.
+
+    Returns:
+      A string containing the SOAP response.
+    """
+    match = re.search(r'LIMIT (\d+) OFFSET (\d+)', request)
+    limit, offset = (int(match.group(1)), int(match.group(2))) if match else (
+        self.total_pql_rows, 0)
+    rows = ''.join(
+        '<rows><values xsi:type="NumberValue"><value>%d</value></values>'
+        '<values xsi:type="TextValue"><value>Line item "%d"</value></values>'
+        '</rows>' % (index, index)
+        for index in xrange(offset, min(offset + limit, self.total_pql_rows)))
+    body = ('<selectResponse xmlns="%s"><rval><columnTypes><labelName>id'
+            '</labelName></columnTypes><columnTypes><labelName>name'
+            '</labelName></columnTypes>%s</rval></selectResponse>' %
+            (_DFP_NAMESPACE, rows))
+    return _SOAP_ENVELOPE % body
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+  """An HTTP server handling each request in its own thread."""
+
+  daemon_threads = True
+  # Concurrent clients, such as threads refreshing a token, must not overflow
+  # the listen backlog.
+  request_queue_size = 128
+
+
+class _StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles the requests of a StubServer."""
+
+  protocol_version = 'HTTP/1.0'
+
+  def log_message(self, *args):
+    pass
+
+  def _Respond(self, body, content_type='text/xml; charset=utf-8'):
+    self.send_response(200)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    path = self.path.split('?')[0]
+    self.server.stub.CountRequest(path)
+    document = self.server.stub.GetDocument(path)
+    if document is None:
+      self.send_error(404)
+    else:
+      self._Respond(document)
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    stub = self.server.stub
+    stub.CountRequest(self.path)
+    request = self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+
+    if self.path == _CAMPAIGN_SERVICE_PATH:
+      self._Respond(stub.GetCampaignServiceResponse(request))
+    elif self.path == _PQL_SERVICE_PATH:
+      self._Respond(stub.GetPqlResponse(request))
+    elif self.path == TOKEN_PATH:
+      time.sleep(stub.token_latency)
+      self._Respond(json.dumps({'access_token': 'token',
+                                'token_type': 'Bearer', 'expires_in': 3600}),
+                    'application/json')
+    elif self.path == _REPORT_DOWNLOAD_PATH:
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/csv')
+      self.send_header('Content-Length', str(stub.report_size))
+      self.end_headers()
+      row = 'Campaign #1,ENABLED,12345,678,0.05\n'
+      chunk = row * (_REPORT_CHUNK_SIZE // len(row))
+      remaining = stub.report_size
+      while remaining > 0:
+        self.wfile.write(chunk[:remaining])
+        remaining -= len(chunk)
+    else:
+      self.send_error(404)
+
+
+def GetTokenUrl(url):
+  """Creates the URL of a StubServer's OAuth 2.0 token endpoint.
+
+  Args:
+    url: The base URL of the StubServer.
+
+  Returns:
+    A string containing the URL.
+  """
+  return url + TOKEN_PATH
+
+
+def _GetIntElement(document, name, default):
+  """Reads the integer value of the first element of a name in an XML string.
+
+  Args:
+    document: A string containing an XML document.
+    name: The local name of the element.
+    default: The value returned if there is no such element.
+
+  Returns:
+    The integer value of the element, or default.
+  """
+  match = re.search(r'<(?:\w+:)?%s>(\d+)<' % name, document)
+  return int(match.group(1)) if match else default
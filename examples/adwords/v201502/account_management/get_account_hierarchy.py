@@ -34,57 +34,30 @@ __author__ = ('api.kwinter@gmail.com (Kevin Winter)'
 from googleads import adwords
 
 
-def DisplayAccountTree(account, accounts, links, depth=0):
+def DisplayAccountTree(account_graph, customer_id, depth=0):
   """Displays an account tree.
 
   Args:
-    account: dict The account to display.
-    accounts: dict Map from customerId to account.
-    links: dict Map from customerId to child links.
+    account_graph: AccountGraph The graph of the accounts.
+    customer_id: long The customer ID of the account to display.
     depth: int Depth of the current account in the tree.
   """
   prefix = '-' * depth * 2
-  print '%s%s, %s' % (prefix, account['customerId'], account['name'])
-  if account['customerId'] in links:
-    for child_link in links[account['customerId']]:
-      child_account = accounts[child_link['clientCustomerId']]
-      DisplayAccountTree(child_account, accounts, links, depth + 1)
+  print '%s%s, %s' % (prefix, customer_id, account_graph.GetName(customer_id))
+  for child_id in account_graph.GetChildren(customer_id):
+    DisplayAccountTree(account_graph, child_id, depth + 1)
 
 
 def main(client):
-  # Initialize appropriate service.
-  managed_customer_service = client.GetService(
-      'ManagedCustomerService', version='v201502')
-
-  # Construct selector to get all accounts.
-  selector = {
-      'fields': ['CustomerId', 'Name']
-  }
   # Get serviced account graph.
-  graph = managed_customer_service.get(selector)
-  if 'entries' in graph and graph['entries']:
-    # Create map from customerId to parent and child links.
-    child_links = {}
-    parent_links = {}
-    if 'links' in graph:
-      for link in graph['links']:
-        if link['managerCustomerId'] not in child_links:
-          child_links[link['managerCustomerId']] = []
-        child_links[link['managerCustomerId']].append(link)
-        if link['clientCustomerId'] not in parent_links:
-          parent_links[link['clientCustomerId']] = []
-        parent_links[link['clientCustomerId']].append(link)
-    # Create map from customerID to account and find root account.
-    accounts = {}
-    root_account = None
-    for account in graph['entries']:
-      accounts[account['customerId']] = account
-      if account['customerId'] not in parent_links:
-        root_account = account
-    # Display account tree.
-    if root_account:
+  account_graph = adwords.AccountGraph.Load(client, version='v201502')
+  if len(account_graph):
+    # Display account trees, starting from the accounts without managers.
+    roots = account_graph.GetRoots()
+    if roots:
       print 'CustomerId, Name'
-      DisplayAccountTree(root_account, accounts, child_links, 0)
+      for root_id in roots:
+        DisplayAccountTree(account_graph, root_id, 0)
     else:
       print 'Unable to determine a root account'
   else:
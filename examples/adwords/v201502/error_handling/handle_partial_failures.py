@@ -29,8 +29,6 @@ Tags: AdGroupCriterionService.mutate
 __author__ = ('api.kwinter@gmail.com (Kevin Winter)'
               'Joseph DiLallo')
 
-import re
-
 from googleads import adwords
 
 
@@ -93,10 +91,11 @@ def main(client, ad_group_id):
             'operator': 'ADD',
             'operand': keyword
         })
-  result = ad_group_criterion_service.mutate(operations)
+  result = ad_group_criterion_service.MutateBatched(operations)
 
   # Display results.
-  for criterion in result['value']:
+  for index in result.GetSucceededIndices():
+    criterion = result.value[index]
     if criterion['AdGroupCriterion.Type'] == 'BiddableAdGroupCriterion':
       print ('Added keyword ad group criterion with ad group id \'%s\', '
              'criterion id \'%s\', text \'%s\', and match type \'%s\' was '
@@ -105,16 +104,16 @@ def main(client, ad_group_id):
                 criterion['criterion']['text'],
                 criterion['criterion']['matchType']))
 
-  for error in result['partialFailureErrors']:
-    index = re.findall(r'operations\[(.*)\]\.', error['fieldPath'])
-    if index:
+  for index in result.GetFailedIndices():
+    for error in result.GetErrors(index):
       print ('Keyword ad group criterion with ad group id \'%s\' and text '
              '\'%s\' triggered a failure for the following reason: \'%s\'.'
-             % (keywords[int(index[0])]['adGroupId'],
-                keywords[int(index[0])]['criterion']['text'],
+             % (keywords[index]['adGroupId'],
+                keywords[index]['criterion']['text'],
                 error['errorString']))
-    else:
-      print 'The following failure has occurred: \'%s\'.' % error['errorString']
+
+  for error in result.GetUnindexedErrors():
+    print 'The following failure has occurred: \'%s\'.' % error['errorString']
 
 
 if __name__ == '__main__':
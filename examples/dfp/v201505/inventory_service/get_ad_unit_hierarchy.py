@@ -34,49 +34,32 @@ from googleads import dfp
 
 
 def main(client):
-  # Initialize appropriate service.
-  inventory_service = client.GetService('InventoryService', version='v201505')
-  statement = dfp.FilterStatement()
-
-  all_ad_units = []
-  # Get ad units by statement.
-  while True:
-    response = inventory_service.getAdUnitsByStatement(
-        statement.ToStatement())
-    if 'results' in response:
-      all_ad_units.extend(response['results'])
-      statement.offset += dfp.SUGGESTED_PAGE_LIMIT
-    else:
-      break
-
-  # Find the root ad unit. root_ad_unit can also be set to child unit to only
-  # build and display a portion of the tree.
-  query = 'WHERE parentId IS NULL'
-  root_statement = dfp.FilterStatement(query)
-  response = inventory_service.getAdUnitsByStatement(
-      root_statement.ToStatement())
-  root_ad_unit = response['results']
-
-  if root_ad_unit:
-    BuildAndDisplayAdUnitTree(root_ad_unit, all_ad_units)
+  # Build the ad unit tree with parallel paged requests.
+  ad_unit_tree = dfp.AdUnitTree.Load(client, version='v201505')
+
+  # Display the tree under each root ad unit. A single ad unit ID can also be
+  # given to DisplayAdUnitTree to only display a portion of the tree.
+  root_ad_unit_ids = ad_unit_tree.GetRootIds()
+  if root_ad_unit_ids:
+    for root_ad_unit_id in root_ad_unit_ids:
+      DisplayAdUnitTree(root_ad_unit_id, ad_unit_tree)
   else:
     print 'Could not build tree. No root ad unit found.'
 
 
-def DisplayAdUnitTree(root_ad_unit, ad_unit_tree, depth=0):
+def DisplayAdUnitTree(root_ad_unit_id, ad_unit_tree, depth=0):
   """Helper for displaying ad unit tree.
 
   Args:
-    root_ad_unit: dict the root ad unit.
-    ad_unit_tree: dict the tree of ad units.
+    root_ad_unit_id: str the ID of the root ad unit.
+    ad_unit_tree: AdUnitTree the tree of ad units.
     [optional]
     depth: int the depth the tree has reached.
   """
-  print '%s%s (%s)' % (GenerateTab(depth), root_ad_unit['name'],
-                       root_ad_unit['id'])
-  if root_ad_unit['id'] in ad_unit_tree:
-    for child in ad_unit_tree[root_ad_unit['id']]:
-      DisplayAdUnitTree(child, ad_unit_tree, depth+1)
+  print '%s%s (%s)' % (GenerateTab(depth),
+                       ad_unit_tree.GetName(root_ad_unit_id), root_ad_unit_id)
+  for child_id in ad_unit_tree.GetChildIds(root_ad_unit_id):
+    DisplayAdUnitTree(child_id, ad_unit_tree, depth+1)
 
 
 def GenerateTab(depth):
@@ -95,23 +78,6 @@ def GenerateTab(depth):
   tab_list.append('+--')
   return ''.join(tab_list)
 
-
-def BuildAndDisplayAdUnitTree(root_ad_unit, all_ad_units):
-  """Create an ad unit tree and display it.
-
-  Args:
-    root_ad_unit: dict the root ad unit to build the tree under.
-    all_ad_units: list the list of all ad units to build the tree with.
-  """
-  tree = {}
-  for ad_unit in all_ad_units:
-    if 'parentId' in ad_unit:
-      if ad_unit['parentId'] not in tree:
-        tree[ad_unit['parentId']] = []
-      tree[ad_unit['parentId']].append(ad_unit)
-
-  DisplayAdUnitTree(root_ad_unit, tree)
-
 if __name__ == '__main__':
   # Initialize client object.
   dfp_client = dfp.DfpClient.LoadFromStorage()
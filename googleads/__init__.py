@@ -14,6 +14,13 @@
 
 """A client library for Google's SOAP Ads APIs."""
 
+import os
+
 from adwords import AdWordsClient
 from dfa import DfaClient
 from dfp import DfpClient
+
+# The profiling module starts profiling the process as it is imported, so it is
+# only imported when the process is to be profiled.
+if os.environ.get('GOOGLEADS_PROFILE'):
+  from googleads import profiling  # pylint: disable=g-import-not-at-top
@@ -16,16 +16,26 @@
 
 __author__ = 'Joseph DiLallo'
 
+import array
+import collections
+import copy
+import datetime
 import io
+import itertools
+import json
+import logging
 import os
+import Queue
+import re
 import sys
+import tempfile
+import threading
+import time
 import urllib
 import urllib2
 from xml.etree import ElementTree
 
-import suds.client
-import suds.mx.literal
-import suds.xsd.doctor
+import suds
 
 import googleads.common
 import googleads.errors
@@ -123,6 +133,87 @@ _SERVICE_MAP = {
 
 # The endpoint used by default when making AdWords API requests.
 _DEFAULT_ENDPOINT = 'https://adwords.google.com'
+# The number of operations sent in each request by MutateBatched.
+_MUTATE_BATCH_SIZE = 5000
+# The maximum number of requests MutateBatched has outstanding at once.
+_MUTATE_BATCH_MAX_PARALLEL = 4
+# The number of times a request rejected with a RateExceededError is retried.
+_RATE_EXCEEDED_MAX_RETRIES = 5
+# The number of seconds to wait before retrying a request rejected with a
+# RateExceededError which does not say how long to wait.
+_RATE_EXCEEDED_DEFAULT_DELAY = 30
+# The number of seconds to wait before the first resubmission of operations
+# which failed with retryable errors.
+_MUTATE_RETRY_INITIAL_DELAY = 5
+# The ApiError types which indicate an operation may succeed if resubmitted.
+# DatabaseErrors are only retryable if caused by a concurrent modification.
+_RETRYABLE_ERROR_TYPES = ('InternalApiError', 'RateExceededError')
+# The number of seconds after which a MutationBuffer is flushed.
+_MUTATION_BUFFER_MAX_AGE = 60
+# The number of seconds by which change checks overlap, allowing for clock skew.
+_CHANGE_CHECK_OVERLAP = 60
+# The format of the date times accepted by CustomerSyncService selectors.
+_CUSTOMER_SYNC_DATE_TIME_FORMAT = '%Y%m%d %H%M%S UTC'
+# The number of entities requested in each page of a get call.
+_GET_PAGE_SIZE = 500
+# The maximum number of IDs listed in each predicate of a get call.
+_GET_MAX_PREDICATE_VALUES = 500
+# The number of days of change history CustomerSyncService keeps. Accounts last
+# synchronized longer ago than this are synchronized in full.
+_CUSTOMER_SYNC_MAX_DAYS = 89
+# The maximum number of accounts AccountSyncEngine synchronizes at once.
+_ACCOUNT_SYNC_MAX_PARALLEL = 4
+# The services used to retrieve each type of entity an AccountSyncEngine stores.
+_ACCOUNT_SYNC_SERVICES = {
+    'Campaign': 'CampaignService',
+    'AdGroup': 'AdGroupService',
+    'AdGroupCriterion': 'AdGroupCriterionService',
+    'AdGroupAd': 'AdGroupAdService',
+}
+# The fields retrieved by default for each type of entity an AccountSyncEngine
+# stores.
+_ACCOUNT_SYNC_FIELDS = {
+    'Campaign': ['Id', 'Name', 'Status', 'ServingStatus', 'StartDate',
+                 'EndDate', 'AdvertisingChannelType'],
+    'AdGroup': ['Id', 'CampaignId', 'Name', 'Status'],
+    'AdGroupCriterion': ['Id', 'AdGroupId', 'CriteriaType', 'Status',
+                         'KeywordText', 'KeywordMatchType'],
+    'AdGroupAd': ['Id', 'AdGroupId', 'Status'],
+}
+# The number of seconds a cached AccountGraph is used for before it is rebuilt.
+_ACCOUNT_GRAPH_TTL = 3600
+# The fields of the location criteria put into a LocationIndex.
+_LOCATION_FIELDS = ['Id', 'LocationName', 'CanonicalName', 'DisplayType',
+                    'ParentLocations', 'Reach']
+# The maximum number of operations submitted in a single MutateJobService job.
+_MUTATE_JOB_MAX_OPERATIONS = 10000
+# The maximum number of MutateJobService jobs which are left pending at once.
+_MUTATE_JOB_MAX_PENDING_JOBS = 10
+# The number of seconds to wait before the first status check of pending jobs.
+_MUTATE_JOB_POLL_INITIAL_INTERVAL = 5
+# The maximum number of seconds to wait between status checks of pending jobs.
+_MUTATE_JOB_POLL_MAX_INTERVAL = 60
+# The factor by which the wait between status checks grows after each check.
+_MUTATE_JOB_POLL_BACKOFF_FACTOR = 2
+# Matches the operation index at the start of an ApiError's field path.
+_OPERATION_INDEX_PATTERN = re.compile(r'^operations\[(\d+)\]')
+# The report date range types which only cover days before today.
+_PAST_DATE_RANGE_TYPES = ('YESTERDAY', 'LAST_7_DAYS', 'LAST_WEEK',
+                          'LAST_BUSINESS_WEEK', 'LAST_MONTH', 'LAST_14_DAYS',
+                          'LAST_30_DAYS', 'LAST_WEEK_SUN_SAT')
+# Matches the DURING clause of an AWQL query, capturing either the end of a
+# custom date range or a date range type.
+_AWQL_DURING_PATTERN = re.compile(
+    r'\bDURING\s+(?:\d{8}\s*,\s*(\d{8})|(\w+))', re.IGNORECASE)
+# Matches quoted string literals in an AWQL query.
+_AWQL_STRING_LITERAL_PATTERN = re.compile(
+    r'''('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")''')
+# Matches a run of whitespace.
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+# Maps the server and version of each report definition schema loaded to the
+# schema, shared by every ReportDownloader serializing report definitions.
+_report_definition_schemas = {}
+_report_definition_schemas_lock = threading.Lock()
 
 
 class AdWordsClient(object):
@@ -166,6 +257,9 @@ class AdWordsClient(object):
     Args:
       [optional]
       path: The path string to the file containing cached AdWords data.
+          Defaults to the GOOGLEADS_CONFIG environment variable, which may
+          hold a JSON document or a path, and otherwise to googleads.yaml in
+          your home directory.
 
     Returns:
       An AdWordsClient initialized with the values cached in the file.
@@ -175,9 +269,6 @@ class AdWordsClient(object):
       information necessary to instantiate a client object - either a
       required key was missing or an OAuth 2.0 key was missing.
     """
-    if path is None:
-      path = os.path.join(os.path.expanduser('~'), 'googleads.yaml')
-
     return cls(**googleads.common.LoadFromStorage(
         path, cls._YAML_KEY, cls._REQUIRED_INIT_VALUES,
         cls._OPTIONAL_INIT_VALUES))
@@ -211,7 +302,8 @@ class AdWordsClient(object):
           this header.
       https_proxy: A string identifying the proxy that all HTTPS requests
           should be routed through.
-      cache: A subclass of suds.cache.Cache; defaults to None.
+      cache: A subclass of suds.cache.Cache, such as one of googleads.cache;
+          defaults to None.
     """
     self.developer_token = developer_token
     self.oauth2_client = oauth2_client
@@ -223,7 +315,7 @@ class AdWordsClient(object):
     self.cache = cache
 
   def GetService(self, service_name, version=sorted(_SERVICE_MAP.keys())[-1],
-                 server=_DEFAULT_ENDPOINT):
+                 server=_DEFAULT_ENDPOINT, entity_cache=None):
     """Creates a service client for the given service.
 
     Args:
@@ -234,6 +326,8 @@ class AdWordsClient(object):
           defaults to what is currently the latest version. This will be updated
           in future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the AdWords API.
+      entity_cache: A googleads.common.EntityCache used to serve repeated get
+          and get*ByStatement calls without contacting the API.
 
     Returns:
       A suds.client.ServiceSelector which has the headers and proxy configured
@@ -242,6 +336,10 @@ class AdWordsClient(object):
     Raises:
       A GoogleAdsValueError if the service or version provided do not exist.
     """
+    # suds.client, which takes longer to import than the rest of the library,
+    # is imported once the first service is created.
+    import suds.client  # pylint: disable=g-import-not-at-top
+
     if server[-1] == '/': server = server[:-1]
     try:
       proxy_option = None
@@ -253,7 +351,8 @@ class AdWordsClient(object):
       client = suds.client.Client(
           self._SOAP_SERVICE_FORMAT %
           (server, _SERVICE_MAP[version][service_name], version, service_name),
-          proxy=proxy_option, cache=self.cache, timeout=3600)
+          proxy=proxy_option, cache=self.cache,
+          cachingpolicy=getattr(self.cache, 'caching_policy', 0), timeout=3600)
     except KeyError:
       if version in _SERVICE_MAP:
         raise googleads.errors.GoogleAdsValueError(
@@ -265,15 +364,15 @@ class AdWordsClient(object):
             'Unrecognized version of the AdWords API. Version given: %s '
             'Supported versions: %s' % (version, _SERVICE_MAP.keys()))
 
-    return googleads.common.SudsServiceProxy(
-        client, _AdWordsHeaderHandler(self, version))
+    return _AdWordsServiceProxy(client, _AdWordsHeaderHandler(self, version),
+                                entity_cache, version)
 
   def GetReportDownloader(self, version=sorted(_SERVICE_MAP.keys())[-1],
-                          server=_DEFAULT_ENDPOINT):
+                          server=_DEFAULT_ENDPOINT, report_cache=None):
     """Creates a downloader for AdWords reports.
 
     This is a convenience method. It is functionally identical to calling
-    ReportDownloader(adwords_client, version, server)
+    ReportDownloader(adwords_client, version, server, report_cache)
 
     Args:
       [optional]
@@ -281,11 +380,13 @@ class AdWordsClient(object):
           defaults to what is currently the latest version. This will be updated
           in future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the AdWords API.
+      report_cache: A googleads.common.ReportCache used to serve repeated
+          report downloads without contacting the API.
 
     Returns:
       A ReportDownloader tied to this AdWordsClient, ready to download reports.
     """
-    return ReportDownloader(self, version, server)
+    return ReportDownloader(self, version, server, report_cache)
 
   def SetClientCustomerId(self, client_customer_id):
     """Change the client customer id used by the AdWordsClient instance.
@@ -295,6 +396,29 @@ class AdWordsClient(object):
     """
     self.client_customer_id = client_customer_id
 
+  def Profile(self, output=sys.stderr, memory=True):
+    """Profiles the calls made within a with statement.
+
+    This is a convenience method. It is functionally identical to calling
+    googleads.profiling.ProfileSession(output, memory). Calls made by every
+    client in this process while the with statement runs are profiled, and
+    aggregated per service method.
+
+    Args:
+      [optional]
+      output: A file-like object the report of where the time and memory of the
+          calls went is written to when the with statement exits, or None to not
+          write it.
+      memory: A boolean indicating whether to record allocation snapshots. This
+          requires the tracemalloc module.
+
+    Returns:
+      A context manager yielding the googleads.profiling.SessionProfiler
+      profiling the calls.
+    """
+    import googleads.profiling  # pylint: disable=g-import-not-at-top
+    return googleads.profiling.ProfileSession(output, memory)
+
 
 class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
   """Handler which generates the headers for AdWords requests."""
@@ -334,6 +458,11 @@ class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
         soapheaders=header,
         headers=self._adwords_client.oauth2_client.CreateHttpHeader())
 
+  def GetTraceAttributes(self):
+    """Describes the account requests are made for, in tracing spans."""
+    return {'googleads.customer_id': self._adwords_client.client_customer_id,
+            'googleads.version': self._version}
+
   def GetReportDownloadHeaders(self, skip_report_header=None,
                                skip_column_header=None,
                                skip_report_summary=None):
@@ -373,6 +502,110 @@ class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
 
     return headers
 
+  def ForClient(self, client):
+    """Creates a header handler setting the headers of a copy of the client."""
+    return _AdWordsHeaderHandler(client, self._version)
+
+
+class _AdWordsServiceProxy(googleads.common.SudsServiceProxy):
+  """A service proxy with conveniences for AdWords services."""
+
+  def MutateBatched(self, operations, batch_size=_MUTATE_BATCH_SIZE,
+                    max_parallel=_MUTATE_BATCH_MAX_PARALLEL, max_retries=0):
+    """Calls mutate with a list of operations split over several requests.
+
+    The operations are sent in batches of at most batch_size operations, with up
+    to max_parallel requests outstanding at once. A request rejected with a
+    RateExceededError is retried after the delay the error asks for. If partial
+    failure is enabled on the client, the errors returned for each batch are
+    combined with indices referring to the original list of operations, and
+    operations which failed with retryable errors can be resubmitted.
+
+    Args:
+      operations: An iterable of operations for this service's mutate method.
+      [optional]
+      batch_size: The maximum number of operations sent in each request.
+      max_parallel: The maximum number of requests outstanding at once.
+      max_retries: The number of times operations which failed with retryable
+          errors are resubmitted. The wait before each resubmission doubles,
+          starting from _MUTATE_RETRY_INITIAL_DELAY seconds.
+
+    Returns:
+      A MutateResult whose value and errors refer to the positions of the
+      operations in the given iterable. Resubmitted operations have the value
+      and errors of their last attempt.
+
+    Raises:
+      GoogleAdsValueError: If batch_size or max_parallel is not positive.
+      WebFault: If any request fails. Batches which were not yet sent are
+          skipped.
+    """
+    if batch_size < 1 or max_parallel < 1:
+      raise googleads.errors.GoogleAdsValueError(
+          'The batch size and the number of parallel requests must be '
+          'positive.')
+
+    operations = list(operations)
+    result = self._MutateBatches(operations, batch_size, max_parallel)
+    delay = _MUTATE_RETRY_INITIAL_DELAY
+
+    for _ in range(max_retries):
+      indices = result.GetRetryableIndices()
+      if not indices:
+        break
+      logging.info('Resubmitting %d operations in %d seconds.', len(indices),
+                   delay)
+      googleads.common.RecordRetry(self.mutate.service_name, 'mutate',
+                                   'PartialFailure')
+      time.sleep(delay)
+      result._ReplaceResults(indices, self._MutateBatches(
+          [operations[index] for index in indices], batch_size, max_parallel))
+      delay *= 2
+
+    return result
+
+  def _MutateBatches(self, operations, batch_size, max_parallel):
+    """Calls mutate with a list of operations split over several requests.
+
+    Args:
+      operations: A list of operations for this service's mutate method.
+      batch_size: The maximum number of operations sent in each request.
+      max_parallel: The maximum number of requests outstanding at once.
+
+    Returns:
+      A MutateResult whose value and errors refer to the positions of the
+      operations in the given list.
+    """
+    batches = [(offset, operations[offset:offset + batch_size])
+               for offset in range(0, len(operations), batch_size)]
+    # Each request is made with a proxy taken from this queue so that no suds
+    # client is used by two threads at once.
+    proxies = Queue.Queue()
+    proxies.put(self)
+    for _ in range(min(max_parallel, len(batches)) - 1):
+      proxies.put(self.Clone())
+
+    def MutateBatch(batch):
+      proxy = proxies.get()
+      try:
+        return _CallWithRateLimitRetries(proxy.mutate, batch[1])
+      finally:
+        proxies.put(proxy)
+
+    responses = googleads.common.ParallelMap(MutateBatch, batches,
+                                             max_parallel)
+
+    result = MutateResult()
+    for (offset, batch), response in zip(batches, responses):
+      value = list(_GetField(response, 'value') or []) if response else []
+      # Keep later batches aligned with their operations when a response
+      # omits values, such as for validate only requests.
+      value.extend([None] * (len(batch) - len(value)))
+      result._AddValue(value)
+      if response:
+        result._AddErrors(_GetField(response, 'partialFailureErrors'), offset)
+    return result
+
 
 class ReportDownloader(object):
   """A utility that can be used to download reports from AdWords."""
@@ -390,7 +623,7 @@ class ReportDownloader(object):
   _REPORT_DEFINITION_NAME = 'reportDefinition'
 
   def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
-               server=_DEFAULT_ENDPOINT):
+               server=_DEFAULT_ENDPOINT, report_cache=None):
     """Initializes a ReportDownloader.
 
     Args:
@@ -401,30 +634,59 @@ class ReportDownloader(object):
           defaults to what is currently the latest version. This will be updated
           in future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the AdWords API.
+      report_cache: A googleads.common.ReportCache. If provided, downloaded
+          reports are stored in it, keyed by the client customer ID and the
+          normalized report definition or AWQL query, and repeated downloads of
+          the same report are served from it without contacting the API.
     """
     if server[-1] == '/': server = server[:-1]
     self._adwords_client = adwords_client
+    self._report_cache = report_cache
+    self._version = version
     self._namespace = self._NAMESPACE_FORMAT % version
     self._end_point = self._END_POINT_FORMAT % (server, version)
     self._header_handler = _AdWordsHeaderHandler(adwords_client, version)
 
-    proxy_option = None
+    self._server = server
+    self._proxy_option = None
     if self._adwords_client.https_proxy:
-      proxy_option = {'https': self._adwords_client.https_proxy}
+      self._proxy_option = {'https': self._adwords_client.https_proxy}
     # Create an Opener to handle requests when downloading reports.
       self.url_opener = urllib2.build_opener(
           urllib2.ProxyHandler({'https': self._adwords_client.https_proxy}))
     else:
       self.url_opener = urllib2.build_opener()
+    # The report definition schema and marshaller are loaded once the first
+    # report definition is serialized, as AWQL downloads do not need them.
+    self._report_definition_type = None
+    self._marshaller = None
+
+  def _LoadReportDefinitionSchema(self):
+    """Loads the schema and marshaller used to serialize report definitions.
 
-    schema_url = self._SCHEMA_FORMAT % (server, version)
-    schema = suds.client.Client(
-        schema_url,
-        doctor=suds.xsd.doctor.ImportDoctor(suds.xsd.doctor.Import(
-            self._namespace, schema_url)),
-        proxy=proxy_option, cache=self._adwords_client.cache).wsdl.schema
+    The schema is downloaded and parsed once per process for each server and
+    version, and shared by every ReportDownloader for them.
+    """
+    import suds.client  # pylint: disable=g-import-not-at-top
+    import suds.mx.literal  # pylint: disable=g-import-not-at-top
+    import suds.xsd.doctor  # pylint: disable=g-import-not-at-top
+
+    key = (self._server, self._version)
+    with _report_definition_schemas_lock:
+      schema = _report_definition_schemas.get(key)
+      if schema is None:
+        schema_url = self._SCHEMA_FORMAT % key
+        schema = suds.client.Client(
+            schema_url,
+            doctor=suds.xsd.doctor.ImportDoctor(suds.xsd.doctor.Import(
+                self._namespace, schema_url)),
+            proxy=self._proxy_option, cache=self._adwords_client.cache,
+            cachingpolicy=getattr(self._adwords_client.cache, 'caching_policy',
+                                  0)).wsdl.schema
+        _report_definition_schemas[key] = schema
     self._report_definition_type = schema.elements[
         (self._REPORT_DEFINITION_NAME, self._namespace)]
+    # Marshallers keep state while processing, so each downloader has its own.
     self._marshaller = suds.mx.literal.Literal(schema)
 
   def _DownloadReportCheckFormat(self, file_format, output):
@@ -470,7 +732,8 @@ class ReportDownloader(object):
     self._DownloadReportCheckFormat(report_definition['downloadFormat'], output)
     self._DownloadReport(self._SerializeReportDefinition(report_definition),
                          output, skip_report_header, skip_column_header,
-                         skip_report_summary)
+                         skip_report_summary,
+                         _ReportDefinitionIncludesToday(report_definition))
 
   def DownloadReportAsStream(self, report_definition, skip_report_header=None,
                              skip_column_header=None, skip_report_summary=None):
@@ -506,7 +769,8 @@ class ReportDownloader(object):
     """
     return self._DownloadReportAsStream(
         self._SerializeReportDefinition(report_definition), skip_report_header,
-        skip_column_header, skip_report_summary)
+        skip_column_header, skip_report_summary,
+        _ReportDefinitionIncludesToday(report_definition))
 
   def DownloadReportAsStreamWithAwql(self, query, file_format,
                                      skip_report_header=None,
@@ -544,9 +808,10 @@ class ReportDownloader(object):
       AdWordsReportError: if the request fails for any other reason; e.g. a
           network error.
     """
-    return self._DownloadReportAsStream(self._SerializeAwql(query, file_format),
-                                        skip_report_header, skip_column_header,
-                                        skip_report_summary)
+    return self._DownloadReportAsStream(
+        self._SerializeAwql(query, file_format), skip_report_header,
+        skip_column_header, skip_report_summary, _AwqlIncludesToday(query),
+        self._SerializeAwql(_NormalizeAwql(query), file_format))
 
   def DownloadReportAsString(self, report_definition,
                              skip_report_header=None, skip_column_header=None,
@@ -585,7 +850,8 @@ class ReportDownloader(object):
     try:
       response = self._DownloadReportAsStream(
           self._SerializeReportDefinition(report_definition),
-          skip_report_header, skip_column_header, skip_report_summary)
+          skip_report_header, skip_column_header, skip_report_summary,
+          _ReportDefinitionIncludesToday(report_definition))
       return response.read().decode('utf-8')
     finally:
       if response:
@@ -675,10 +941,13 @@ class ReportDownloader(object):
     self._DownloadReportCheckFormat(file_format, output)
     self._DownloadReport(self._SerializeAwql(query, file_format), output,
                          skip_report_header, skip_column_header,
-                         skip_report_summary)
+                         skip_report_summary, _AwqlIncludesToday(query),
+                         self._SerializeAwql(_NormalizeAwql(query),
+                                             file_format))
 
   def _DownloadReport(self, post_body, output, skip_report_header,
-                      skip_column_header, skip_report_summary):
+                      skip_column_header, skip_report_summary,
+                      includes_today=True, cache_key_body=None):
     """Downloads an AdWords report, writing the contents to the given file.
 
     Args:
@@ -695,6 +964,12 @@ class ReportDownloader(object):
       skip_report_summary: A boolean indicating whether to include a summary row
           containing the report totals. If false or not specified, report output
           will include the summary row.
+      [optional]
+      includes_today: A boolean indicating whether the report's date range
+          includes today, which shortens how long the report is cached for.
+      cache_key_body: A string identifying the report in the report cache in
+          place of the POST request's body, such as one holding a normalized
+          AWQL query.
 
     Raises:
       AdWordsReportBadRequestError: if the report download fails due to
@@ -708,7 +983,8 @@ class ReportDownloader(object):
     try:
       response = self._DownloadReportAsStream(post_body, skip_report_header,
                                               skip_column_header,
-                                              skip_report_summary)
+                                              skip_report_summary,
+                                              includes_today, cache_key_body)
       output.write(response.read().decode() if sys.version_info[0] == 3
                    and (getattr(output, 'mode', 'w') == 'w'
                         and type(output) is not io.BytesIO)
@@ -718,9 +994,13 @@ class ReportDownloader(object):
         response.close()
 
   def _DownloadReportAsStream(self, post_body, skip_report_header,
-                              skip_column_header, skip_report_summary):
+                              skip_column_header, skip_report_summary,
+                              includes_today=True, cache_key_body=None):
     """Downloads an AdWords report, returning a stream.
 
+    If this downloader has a report cache, the report is served from it when
+    possible, and otherwise stored in it once downloaded.
+
     Args:
       post_body: The contents of the POST request's body as a URL encoded
           string.
@@ -733,6 +1013,12 @@ class ReportDownloader(object):
       skip_report_summary: A boolean indicating whether to include a summary row
           containing the report totals. If false or not specified, report output
           will include the summary row.
+      [optional]
+      includes_today: A boolean indicating whether the report's date range
+          includes today, which shortens how long the report is cached for.
+      cache_key_body: A string identifying the report in the report cache in
+          place of the POST request's body, such as one holding a normalized
+          AWQL query.
 
     Returns:
       A stream to be used in retrieving the report contents.
@@ -745,17 +1031,44 @@ class ReportDownloader(object):
       AdWordsReportError: if the request fails for any other reason; e.g. a
           network error.
     """
-    if sys.version_info[0] == 3:
-      post_body = bytes(post_body, 'utf8')
-    request = urllib2.Request(
-        self._end_point, post_body,
-        self._header_handler.GetReportDownloadHeaders(skip_report_header,
-                                                      skip_column_header,
-                                                      skip_report_summary))
-    try:
-      return self.url_opener.open(request)
-    except urllib2.HTTPError, e:
-      raise self._ExtractError(e)
+    with googleads.common.MeasureCall(
+        'ReportDownloader', 'DownloadReport',
+        {'googleads.customer_id': self._adwords_client.client_customer_id,
+         'googleads.version': self._version}) as call:
+      if self._report_cache:
+        cache_key = self._report_cache.MakeKey(
+            self._end_point, self._adwords_client.client_customer_id,
+            cache_key_body or post_body, skip_report_header,
+            skip_column_header, skip_report_summary)
+        cached_report = self._report_cache.Get(cache_key)
+        if cached_report:
+          call.cached = True
+          return cached_report
+
+      if sys.version_info[0] == 3:
+        post_body = bytes(post_body, 'utf8')
+      call.request_bytes = len(post_body)
+      request = urllib2.Request(
+          self._end_point, post_body,
+          self._header_handler.GetReportDownloadHeaders(skip_report_header,
+                                                        skip_column_header,
+                                                        skip_report_summary))
+      try:
+        with call.Phase('network'):
+          response = self.url_opener.open(request)
+      except urllib2.HTTPError, e:
+        raise self._ExtractError(e)
+      if hasattr(response, 'info'):
+        content_length = response.info().getheader('Content-Length')
+        if content_length:
+          call.response_bytes = int(content_length)
+
+      if self._report_cache:
+        try:
+          return self._report_cache.Set(cache_key, response, includes_today)
+        finally:
+          response.close()
+      return response
 
   def _SerializeAwql(self, query, file_format):
     """Serializes an AWQL query and file format for transport.
@@ -783,6 +1096,9 @@ class ReportDownloader(object):
       the format needed for an AdWords report request as a string. This is
       intended to be a POST body.
     """
+    import suds.mx  # pylint: disable=g-import-not-at-top
+    if self._marshaller is None:
+      self._LoadReportDefinitionSchema()
     content = suds.mx.Content(
         tag=self._REPORT_DEFINITION_NAME, value=report_definition,
         name=self._REPORT_DEFINITION_NAME, type=self._report_definition_type)
@@ -814,3 +1130,1423 @@ class ReportDownloader(object):
         pass
     return googleads.errors.AdWordsReportError(
         error.code, error, content)
+
+
+class MutateResult(object):
+  """The result of mutating a list of operations, indexed by operation.
+
+  The operations may have been sent over several requests or jobs; the value
+  and errors are combined so that they refer to the positions of operations in
+  the original list. Errors are indexed by operation as they are added, so
+  looking up the errors of an operation, or which operations failed, does not
+  require parsing field paths again.
+
+  Attributes:
+    value: A list with an entry for each operation, in the order the operations
+        were given. Each entry is the value returned for that operation, or None
+        if the operation failed.
+    errors: A list of the ApiErrors returned for the operations. Their field
+        paths have been rewritten to refer to the original operation indices.
+    failed_jobs: A dictionary mapping the ID of each MutateJobService job which
+        failed outright to a tuple of (first operation index, end operation
+        index, failure reason).
+  """
+
+  def __init__(self):
+    """Initializes an empty MutateResult."""
+    self.value = []
+    self.errors = []
+    self.failed_jobs = {}
+    self._errors_by_index = {}
+    self._unindexed_errors = []
+    self._failed_indices = set()
+
+  def GetErrors(self, index):
+    """Retrieves the errors returned for an operation.
+
+    Args:
+      index: The index of the operation in the original list of operations.
+
+    Returns:
+      A list of the ApiErrors returned for the operation, which is empty if the
+      operation did not cause any errors.
+    """
+    return self._errors_by_index.get(index, [])
+
+  def GetUnindexedErrors(self):
+    """Retrieves the errors whose field paths do not refer to an operation.
+
+    Returns:
+      A list of the ApiErrors which do not belong to any single operation, in
+      the order they were returned.
+    """
+    return list(self._unindexed_errors)
+
+  def GetFailedIndices(self):
+    """Retrieves the indices of the operations which failed.
+
+    An operation failed if it caused an error, was returned as a PlaceHolder or
+    was part of a job which failed outright.
+
+    Returns:
+      A sorted list of operation indices.
+    """
+    return sorted(self._failed_indices)
+
+  def GetSucceededIndices(self):
+    """Retrieves the indices of the operations which succeeded.
+
+    Returns:
+      A sorted list of operation indices.
+    """
+    return [index for index in xrange(len(self.value))
+            if index not in self._failed_indices]
+
+  def GetRetryableIndices(self):
+    """Retrieves the indices of failed operations which may succeed if retried.
+
+    An operation is retryable if all of its errors are transient, such as an
+    exceeded rate or a concurrent modification. Operations of jobs which failed
+    outright are not considered retryable.
+
+    Returns:
+      A sorted list of operation indices.
+    """
+    return [index for index in sorted(self._errors_by_index)
+            if all(_IsRetryableError(error)
+                   for error in self._errors_by_index[index])]
+
+  def _AddValue(self, value):
+    """Appends the values returned for a batch of operations.
+
+    Args:
+      value: A list of values, one for each operation in the batch. Failed
+          operations may be represented by None or by a PlaceHolder.
+    """
+    for item in value or []:
+      if item is not None and _IsPlaceHolder(item):
+        self._failed_indices.add(len(self.value))
+        item = None
+      self.value.append(item)
+
+  def _AddErrors(self, errors, offset):
+    """Adds the errors returned for a batch of operations.
+
+    Args:
+      errors: A list of ApiErrors whose field paths refer to the indices of
+          operations within the batch.
+      offset: The index of the batch's first operation in the original list.
+    """
+    for error in errors or []:
+      field_path = getattr(error, 'fieldPath', None) or ''
+      match = _OPERATION_INDEX_PATTERN.match(field_path)
+      if match:
+        self._IndexError(error, int(match.group(1)) + offset)
+      else:
+        self._unindexed_errors.append(error)
+      self.errors.append(error)
+
+  def _AddFailedJob(self, job_id, offset, size, failure_reason):
+    """Appends the operations of a job which failed outright.
+
+    Args:
+      job_id: The ID of the MutateJobService job.
+      offset: The index of the job's first operation in the original list.
+      size: The number of operations in the job.
+      failure_reason: The reason the job failed.
+    """
+    self.value.extend([None] * size)
+    self.failed_jobs[job_id] = (offset, offset + size, failure_reason)
+    self._failed_indices.update(xrange(offset, offset + size))
+
+  def _ReplaceResults(self, indices, result):
+    """Replaces the results of operations with those of resubmitting them.
+
+    Args:
+      indices: A list of the indices of the resubmitted operations.
+      result: The MutateResult of the resubmitted operations, in the order of
+          indices.
+    """
+    replaced_errors = set()
+    for index in indices:
+      replaced_errors.update(
+          id(error) for error in self._errors_by_index.pop(index, []))
+      self._failed_indices.discard(index)
+    self.errors = [error for error in self.errors
+                   if id(error) not in replaced_errors]
+
+    for retry_index, index in enumerate(indices):
+      self.value[index] = result.value[retry_index]
+      if retry_index in result._failed_indices:
+        self._failed_indices.add(index)
+      for error in result.GetErrors(retry_index):
+        self._IndexError(error, index)
+        self.errors.append(error)
+    for error in result.GetUnindexedErrors():
+      self._unindexed_errors.append(error)
+      self.errors.append(error)
+
+  def _IndexError(self, error, index):
+    """Records an error as belonging to an operation.
+
+    Args:
+      error: An ApiError whose field path starts with an operation index.
+      index: The index of the operation in the original list. The error's field
+          path is rewritten to refer to it.
+    """
+    match = _OPERATION_INDEX_PATTERN.match(error.fieldPath)
+    error.fieldPath = 'operations[%d]%s' % (index,
+                                            error.fieldPath[match.end():])
+    self._errors_by_index.setdefault(index, []).append(error)
+    self._failed_indices.add(index)
+
+
+class BulkMutateRunner(object):
+  """Runs any number of operations as asynchronous MutateJobService jobs.
+
+  Operations are split into jobs of at most max_operations_per_job operations
+  each and submitted as they are read, with no more than max_pending_jobs jobs
+  outstanding at once. Every outstanding job is checked with a single get
+  request, with the wait between checks growing from
+  _MUTATE_JOB_POLL_INITIAL_INTERVAL up to _MUTATE_JOB_POLL_MAX_INTERVAL seconds
+  while no job finishes. The results and errors of every job are mapped back to
+  the positions of the operations in the original stream.
+  """
+
+  def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
+               server=_DEFAULT_ENDPOINT,
+               max_operations_per_job=_MUTATE_JOB_MAX_OPERATIONS,
+               max_pending_jobs=_MUTATE_JOB_MAX_PENDING_JOBS):
+    """Initializes a BulkMutateRunner.
+
+    Args:
+      adwords_client: The AdWordsClient used to submit the jobs. The jobs are
+          run for its client customer ID.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      max_operations_per_job: The maximum number of operations in each job.
+      max_pending_jobs: The maximum number of jobs left pending at once.
+    """
+    self._mutate_job_service = adwords_client.GetService(
+        'MutateJobService', version, server)
+    self._max_operations_per_job = max_operations_per_job
+    self._max_pending_jobs = max_pending_jobs
+
+  def Run(self, operations, ordered=False):
+    """Runs operations as MutateJobService jobs and waits for them to finish.
+
+    Args:
+      operations: An iterable of operations. It is consumed lazily, so it may be
+          a generator producing more operations than fit in memory at once.
+      [optional]
+      ordered: A boolean indicating whether the operations must be applied in
+          order. If true, each job lists the previous job as a prerequisite, so
+          it is not processed until the previous job has completed.
+
+    Returns:
+      A MutateResult whose value and errors refer to the positions of the
+      operations in the given iterable.
+    """
+    operations = iter(operations)
+    # Maps the ID of each pending job to the index of its first operation and
+    # its number of operations.
+    pending_jobs = {}
+    # Maps the index of the first operation of each finished job to the job's
+    # ID, its number of operations, its SimpleMutateResult if it completed and
+    # its failure reason if it failed.
+    finished_jobs = {}
+    offset = 0
+    previous_job_id = None
+    exhausted = False
+    interval = _MUTATE_JOB_POLL_INITIAL_INTERVAL
+
+    while not exhausted or pending_jobs:
+      if not exhausted and len(pending_jobs) < self._max_pending_jobs:
+        batch = list(itertools.islice(operations,
+                                      self._max_operations_per_job))
+        if batch:
+          policy = {'prerequisiteJobIds':
+                    [previous_job_id] if ordered and previous_job_id else []}
+          job_id = self._mutate_job_service.mutate(batch, policy)['id']
+          logging.debug('Submitted job %s with %d operations', job_id,
+                        len(batch))
+          pending_jobs[job_id] = (offset, len(batch))
+          previous_job_id = job_id
+          offset += len(batch)
+          interval = _MUTATE_JOB_POLL_INITIAL_INTERVAL
+        else:
+          exhausted = True
+        continue
+
+      time.sleep(interval)
+      if self._CheckJobs(pending_jobs, finished_jobs):
+        interval = _MUTATE_JOB_POLL_INITIAL_INTERVAL
+      else:
+        interval = min(interval * _MUTATE_JOB_POLL_BACKOFF_FACTOR,
+                       _MUTATE_JOB_POLL_MAX_INTERVAL)
+
+    result = MutateResult()
+    for job_offset in sorted(finished_jobs):
+      job_id, size, job_result, failure_reason = finished_jobs[job_offset]
+      if job_result is None:
+        result._AddFailedJob(job_id, job_offset, size, failure_reason)
+      else:
+        value = list(_GetField(job_result, 'results') or [])
+        # Keep later jobs aligned with their operations when a job returns
+        # fewer results than it had operations.
+        value.extend([None] * (size - len(value)))
+        result._AddValue(value)
+        result._AddErrors(_GetField(job_result, 'errors'), job_offset)
+    return result
+
+  def _CheckJobs(self, pending_jobs, finished_jobs):
+    """Checks pending jobs, collecting the results of the finished ones.
+
+    Args:
+      pending_jobs: A dictionary mapping the ID of each pending job to the index
+          of its first operation and its number of operations. Finished jobs are
+          removed from it.
+      finished_jobs: A dictionary to which finished jobs are added, mapping the
+          index of their first operation to their ID, number of operations,
+          SimpleMutateResult if they completed and failure reason if they
+          failed.
+
+    Returns:
+      A boolean indicating whether any of the pending jobs has finished.
+    """
+    jobs = self._mutate_job_service.get(
+        {'xsi_type': 'BulkMutateJobSelector', 'jobIds': list(pending_jobs)})
+    any_finished = False
+
+    for job in jobs or []:
+      job_id = job['id']
+      status = job['status']
+      if job_id not in pending_jobs or status not in ('COMPLETED', 'FAILED'):
+        continue
+      logging.debug('Job %s finished with status: %s', job_id, status)
+      job_offset, size = pending_jobs.pop(job_id)
+      any_finished = True
+      if status == 'COMPLETED':
+        job_result = self._mutate_job_service.getResult(
+            {'xsi_type': 'BulkMutateJobSelector', 'jobIds': [job_id]})
+        finished_jobs[job_offset] = (
+            job_id, size, job_result['SimpleMutateResult'], None)
+      else:
+        finished_jobs[job_offset] = (
+            job_id, size, None, _GetField(job, 'failureReason'))
+
+    return any_finished
+
+
+class MutationBuffer(object):
+  """Buffers operations for AdWords services, coalescing those of each entity.
+
+  Operations are buffered per service and keyed by the entity their operand
+  identifies, using its campaign, ad group and entity or criterion ID. Further
+  operations for a buffered entity are coalesced with its pending operation:
+
+    * A SET following an ADD or SET is merged into it field by field, with the
+      later operation's values taking precedence.
+    * A REMOVE following an ADD cancels both operations.
+    * A REMOVE following a SET replaces it.
+
+  Any other sequence, such as an ADD following a REMOVE, flushes the service's
+  pending operations first so that they are applied in order. Operations whose
+  operand is not a dictionary or does not identify an entity are never
+  coalesced.
+
+  The buffer is flushed through MutateBatched once it holds max_operations
+  operations, or when an operation is added max_age seconds or more after the
+  oldest pending operation. Call Flush to send the remaining operations.
+
+  Operations stay pending until they are sent successfully, so after an error
+  is raised by Add or Flush, calling Flush sends them again. The results of
+  flushes made while adding operations are given to the callback or, without
+  one, returned by the next call to Flush.
+  """
+
+  def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
+               server=_DEFAULT_ENDPOINT, max_operations=_MUTATE_BATCH_SIZE,
+               max_age=_MUTATION_BUFFER_MAX_AGE, callback=None,
+               batch_size=_MUTATE_BATCH_SIZE,
+               max_parallel=_MUTATE_BATCH_MAX_PARALLEL):
+    """Initializes a MutationBuffer.
+
+    Args:
+      adwords_client: The AdWordsClient used to create the services the
+          operations are sent to.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      max_operations: The number of pending operations which causes a flush.
+      max_age: The age in seconds of the oldest pending operation which causes
+          a flush.
+      callback: A callable taking a service name, the list of operations sent
+          to it and their MutateResult, which is called as each service's
+          operations are sent.
+      batch_size: The maximum number of operations sent in each request.
+      max_parallel: The maximum number of requests outstanding at once.
+    """
+    self._adwords_client = adwords_client
+    self._version = version
+    self._server = server
+    self._max_operations = max_operations
+    self._max_age = max_age
+    self._callback = callback
+    self._batch_size = batch_size
+    self._max_parallel = max_parallel
+    self._services = {}
+    # Maps each service name to an OrderedDict of its pending operations, keyed
+    # by the entity they apply to.
+    self._pending = {}
+    self._pending_count = 0
+    self._oldest_time = None
+    # The results of flushes made while adding operations, if there is no
+    # callback, which are yet to be returned by Flush.
+    self._unreturned_results = []
+
+  def Add(self, service_name, operation):
+    """Adds an operation to the buffer, possibly flushing it.
+
+    Args:
+      service_name: A string identifying the AdWords service, such as
+          'AdGroupCriterionService'.
+      operation: An operation for the service's mutate method.
+
+    Raises:
+      WebFault: If flushing the buffer fails. The operation is buffered unless
+          the failure was in sending the operations it follows.
+    """
+    pending = self._pending.setdefault(service_name,
+                                       collections.OrderedDict())
+    key = _GetEntityKey(_GetField(operation, 'operand'))
+
+    if key is None:
+      key = object()
+    elif key in pending:
+      coalesced, coalesced_operation = _CoalesceOperations(pending[key],
+                                                           operation)
+      if coalesced:
+        if coalesced_operation is None:
+          del pending[key]
+          self._pending_count -= 1
+          if not self._pending_count:
+            self._oldest_time = None
+        else:
+          pending[key] = coalesced_operation
+        self._FlushIfDue()
+        return
+      self._FlushService(service_name)
+      pending = self._pending.setdefault(service_name,
+                                         collections.OrderedDict())
+
+    pending[key] = operation
+    self._pending_count += 1
+    if self._oldest_time is None:
+      self._oldest_time = time.time()
+    self._FlushIfDue()
+
+  def Flush(self):
+    """Sends all pending operations.
+
+    Returns:
+      A list of (service name, operations, MutateResult) tuples, one for each
+      time a service's pending operations were sent, in the order they were
+      sent. Without a callback, this includes the flushes made while adding
+      operations since the last call to Flush.
+
+    Raises:
+      WebFault: If sending a service's operations fails. The operations which
+          were not sent remain pending, and the results of those which were are
+          returned by the next call to Flush.
+    """
+    results, self._unreturned_results = self._unreturned_results, []
+    try:
+      for service_name in list(self._pending):
+        self._FlushService(service_name, results)
+    except Exception:
+      self._unreturned_results = results + self._unreturned_results
+      raise
+    return results
+
+  def _FlushIfDue(self):
+    """Flushes the buffer if it is full or its oldest operation is too old."""
+    if (self._pending_count >= self._max_operations or
+        (self._oldest_time is not None and
+         time.time() - self._oldest_time >= self._max_age)):
+      for service_name in list(self._pending):
+        self._FlushService(service_name)
+
+  def _FlushService(self, service_name, results=None):
+    """Sends the pending operations of a service.
+
+    The operations are only removed from the buffer once they were sent.
+
+    Args:
+      service_name: A string identifying the AdWords service.
+      [optional]
+      results: A list the (service name, operations, MutateResult) tuple of the
+          sent operations is appended to. By default, the tuple is kept for the
+          next call to Flush unless there is a callback.
+    """
+    pending = self._pending.get(service_name)
+    if not pending:
+      self._pending.pop(service_name, None)
+      return
+    operations = list(pending.values())
+
+    if service_name not in self._services:
+      self._services[service_name] = self._adwords_client.GetService(
+          service_name, self._version, self._server)
+    logging.debug('Sending %d operations to %s.', len(operations),
+                  service_name)
+    result = self._services[service_name].MutateBatched(
+        operations, self._batch_size, self._max_parallel)
+
+    del self._pending[service_name]
+    self._pending_count -= len(operations)
+    if not self._pending_count:
+      self._oldest_time = None
+    if results is None and not self._callback:
+      results = self._unreturned_results
+    if results is not None:
+      results.append((service_name, operations, result))
+    if self._callback:
+      self._callback(service_name, operations, result)
+
+
+class CustomerSyncInvalidator(object):
+  """Invalidates cached get responses using CustomerSyncService change history.
+
+  Each call to Check asks CustomerSyncService which entities of the given
+  campaigns changed since the previous check, and invalidates the cached
+  responses of the services those entities belong to. The first check covers
+  changes since the invalidator was created, so it should be created before
+  responses are cached.
+  """
+
+  def __init__(self, adwords_client, entity_cache, campaign_ids,
+               version=sorted(_SERVICE_MAP.keys())[-1],
+               server=_DEFAULT_ENDPOINT):
+    """Initializes a CustomerSyncInvalidator.
+
+    Args:
+      adwords_client: The AdWordsClient used to request the change history.
+      entity_cache: The googleads.common.EntityCache to invalidate.
+      campaign_ids: A list of the IDs of the campaigns whose changes are
+          checked.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+    """
+    self._customer_sync_service = adwords_client.GetService(
+        'CustomerSyncService', version, server)
+    self._entity_cache = entity_cache
+    self._campaign_ids = list(campaign_ids)
+    self._last_check_time = datetime.datetime.utcnow()
+
+  def Check(self):
+    """Invalidates the cached responses of services whose entities changed.
+
+    Returns:
+      A set of the names of the invalidated services.
+    """
+    check_time = datetime.datetime.utcnow()
+    since = self._last_check_time - datetime.timedelta(
+        seconds=_CHANGE_CHECK_OVERLAP)
+    change_data = self._customer_sync_service.get({
+        'dateTimeRange': {
+            'min': since.strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT),
+            'max': check_time.strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT)
+        },
+        'campaignIds': self._campaign_ids
+    })
+    self._last_check_time = check_time
+
+    changed_services = _GetChangedServices(change_data)
+    for service_name in changed_services:
+      self._entity_cache.Invalidate(service_name)
+    return changed_services
+
+
+def _GetChangedServices(change_data):
+  """Determines which services' entities changed from CustomerSync change data.
+
+  Args:
+    change_data: The CustomerChangeData returned by CustomerSyncService.
+
+  Returns:
+    A set of the names of the services whose entities changed.
+  """
+  changed_services = set()
+  for campaign in _GetField(change_data, 'changedCampaigns') or []:
+    if _GetField(campaign, 'campaignChangeStatus') != 'FIELDS_UNCHANGED':
+      changed_services.add('CampaignService')
+    if (_GetField(campaign, 'addedCampaignCriteria') or
+        _GetField(campaign, 'removedCampaignCriteria')):
+      changed_services.add('CampaignCriterionService')
+    for ad_group in _GetField(campaign, 'changedAdGroups') or []:
+      if _GetField(ad_group, 'adGroupChangeStatus') != 'FIELDS_UNCHANGED':
+        changed_services.add('AdGroupService')
+      if _GetField(ad_group, 'changedAds'):
+        changed_services.add('AdGroupAdService')
+      if (_GetField(ad_group, 'changedCriteria') or
+          _GetField(ad_group, 'removedCriteria')):
+        changed_services.add('AdGroupCriterionService')
+  return changed_services
+
+
+class AccountSyncEngine(object):
+  """Keeps a local replica of the campaigns, ad groups, criteria and ads of
+  accounts up to date.
+
+  The first synchronization of an account retrieves all of its entities. Later
+  synchronizations ask CustomerSyncService which entities changed since the
+  account's checkpoint and retrieve only those, using get calls filtered by
+  batches of IDs. Campaigns created since the checkpoint are retrieved in full
+  along with their ad groups, criteria and ads. An account whose checkpoint is
+  older than the change history kept by CustomerSyncService is synchronized in
+  full again.
+
+  Entities are stored in a googleads.store.EntityStore under the client
+  customer ID, with the types Campaign, AdGroup, AdGroupCriterion and
+  AdGroupAd. Criteria and ads are stored under IDs of the form
+  'adGroupId:id', with their ad group as parent; ad groups have their campaign
+  as parent.
+  """
+
+  def __init__(self, adwords_client, entity_store,
+               version=sorted(_SERVICE_MAP.keys())[-1],
+               server=_DEFAULT_ENDPOINT, fields=None,
+               max_parallel=_ACCOUNT_SYNC_MAX_PARALLEL):
+    """Initializes an AccountSyncEngine.
+
+    Args:
+      adwords_client: The AdWordsClient whose credentials are used. It is
+          copied for each account, so its client customer ID is not changed.
+      entity_store: The googleads.store.EntityStore the entities are stored in.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      fields: A dictionary mapping entity types to the lists of fields to
+          retrieve for them, overriding _ACCOUNT_SYNC_FIELDS. The fields must
+          include those identifying the entity and its parent.
+      max_parallel: The maximum number of accounts SyncAll synchronizes at once.
+    """
+    self._adwords_client = adwords_client
+    self._entity_store = entity_store
+    self._version = version
+    self._server = server
+    self._fields = dict(_ACCOUNT_SYNC_FIELDS)
+    self._fields.update(fields or {})
+    self._max_parallel = max_parallel
+    # Sessions not currently in use, each with its own copy of the client and
+    # its own services so that several accounts can be synchronized at once.
+    self._sessions = Queue.Queue()
+
+  def Sync(self, client_customer_id):
+    """Brings the stored entities of an account up to date.
+
+    Args:
+      client_customer_id: A string identifying the account.
+
+    Returns:
+      A dictionary with the keys 'full' (whether the account was synchronized
+      in full), 'updated' (the number of entities stored) and 'removed' (the
+      number of entities removed).
+    """
+    try:
+      session = self._sessions.get_nowait()
+    except Queue.Empty:
+      session = _AccountSyncSession(copy.copy(self._adwords_client),
+                                    self._version, self._server, self._fields)
+    try:
+      return session.Sync(client_customer_id, self._entity_store)
+    finally:
+      self._sessions.put(session)
+
+  def SyncAll(self, client_customer_ids):
+    """Brings the stored entities of several accounts up to date.
+
+    Args:
+      client_customer_ids: An iterable of strings identifying the accounts.
+
+    Returns:
+      A list of the results of Sync, in the order of the accounts.
+    """
+    return googleads.common.ParallelMap(self.Sync, client_customer_ids,
+                                        self._max_parallel)
+
+
+class _AccountSyncSession(object):
+  """Synchronizes accounts, one at a time, for an AccountSyncEngine."""
+
+  def __init__(self, adwords_client, version, server, fields):
+    """Initializes an _AccountSyncSession.
+
+    Args:
+      adwords_client: An AdWordsClient used only by this session.
+      version: A string identifying the AdWords version to connect to.
+      server: A string identifying the webserver hosting the AdWords API.
+      fields: A dictionary mapping entity types to the fields to retrieve.
+    """
+    self._adwords_client = adwords_client
+    self._version = version
+    self._server = server
+    self._fields = fields
+    self._services = {}
+
+  def _GetService(self, service_name):
+    """Retrieves one of this session's services, creating it if necessary."""
+    if service_name not in self._services:
+      self._services[service_name] = self._adwords_client.GetService(
+          service_name, self._version, self._server)
+    return self._services[service_name]
+
+  def Sync(self, client_customer_id, entity_store):
+    """Brings the stored entities of an account up to date.
+
+    Args:
+      client_customer_id: A string identifying the account.
+      entity_store: The googleads.store.EntityStore the entities are stored in.
+
+    Returns:
+      A dictionary as returned by AccountSyncEngine.Sync.
+    """
+    self._adwords_client.SetClientCustomerId(client_customer_id)
+    sync_time = datetime.datetime.utcnow()
+    checkpoint = entity_store.GetCheckpoint(client_customer_id)
+    since = None
+    if checkpoint:
+      since = datetime.datetime.strptime(
+          checkpoint, _CUSTOMER_SYNC_DATE_TIME_FORMAT) - datetime.timedelta(
+              seconds=_CHANGE_CHECK_OVERLAP)
+      if sync_time - since > datetime.timedelta(days=_CUSTOMER_SYNC_MAX_DAYS):
+        since = None
+
+    entities = []
+    removed = []
+    if since is None:
+      for entity_type in _ACCOUNT_SYNC_SERVICES:
+        entities.extend(self._GetEntities(entity_type, []))
+    else:
+      campaign_ids = set(str(_GetField(campaign, 'id')) for campaign in
+                         self._GetEntries('Campaign', [], ['Id']))
+      known_campaign_ids = entity_store.GetIds(client_customer_id, 'Campaign')
+      new_campaign_ids = sorted(campaign_ids - known_campaign_ids)
+      for entity_type in _ACCOUNT_SYNC_SERVICES:
+        field = 'Id' if entity_type == 'Campaign' else 'CampaignId'
+        for ids in _Chunks(new_campaign_ids, _GET_MAX_PREDICATE_VALUES):
+          entities.extend(self._GetEntities(
+              entity_type, [{'field': field, 'operator': 'IN', 'values': ids}]))
+
+      changed_campaign_ids = sorted(campaign_ids & known_campaign_ids)
+      if changed_campaign_ids:
+        change_data = self._GetService('CustomerSyncService').get({
+            'dateTimeRange': {
+                'min': since.strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT),
+                'max': sync_time.strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT)
+            },
+            'campaignIds': changed_campaign_ids
+        })
+        self._GetChangedEntities(change_data, entities, removed)
+
+    entity_store.Update(
+        client_customer_id, entities, removed,
+        sync_time.strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT), since is None)
+    logging.debug('Synchronized account %s: %d entities updated, %d removed.',
+                  client_customer_id, len(entities), len(removed))
+    return {'full': since is None, 'updated': len(entities),
+            'removed': len(removed)}
+
+  def _GetChangedEntities(self, change_data, entities, removed):
+    """Retrieves the entities CustomerSyncService reports as changed.
+
+    Args:
+      change_data: The CustomerChangeData returned by CustomerSyncService.
+      entities: A list to which the changed entities are appended, as tuples
+          suitable for EntityStore.Update.
+      removed: A list to which the removed entities are appended, as tuples
+          suitable for EntityStore.Update.
+    """
+    campaign_ids = []
+    ad_group_ids = []
+    # Map the IDs of ad groups to the IDs of their changed criteria and ads.
+    criterion_ids = {}
+    ad_ids = {}
+
+    for campaign in _GetField(change_data, 'changedCampaigns') or []:
+      if _GetField(campaign, 'campaignChangeStatus') != 'FIELDS_UNCHANGED':
+        campaign_ids.append(_GetField(campaign, 'campaignId'))
+      for ad_group in _GetField(campaign, 'changedAdGroups') or []:
+        ad_group_id = _GetField(ad_group, 'adGroupId')
+        if _GetField(ad_group, 'adGroupChangeStatus') != 'FIELDS_UNCHANGED':
+          ad_group_ids.append(ad_group_id)
+        if _GetField(ad_group, 'changedCriteria'):
+          criterion_ids[ad_group_id] = _GetField(ad_group, 'changedCriteria')
+        if _GetField(ad_group, 'changedAds'):
+          ad_ids[ad_group_id] = _GetField(ad_group, 'changedAds')
+        for criterion_id in _GetField(ad_group, 'removedCriteria') or []:
+          removed.append(('AdGroupCriterion',
+                          '%s:%s' % (ad_group_id, criterion_id)))
+
+    for entity_type, ids in (('Campaign', campaign_ids),
+                             ('AdGroup', ad_group_ids)):
+      for chunk in _Chunks(ids, _GET_MAX_PREDICATE_VALUES):
+        entities.extend(self._GetEntities(
+            entity_type, [{'field': 'Id', 'operator': 'IN', 'values': chunk}]))
+
+    for entity_type, child_ids in (('AdGroupCriterion', criterion_ids),
+                                   ('AdGroupAd', ad_ids)):
+      wanted = set('%s:%s' % (ad_group_id, child_id)
+                   for ad_group_id in child_ids
+                   for child_id in child_ids[ad_group_id])
+      # A get filtered by ad group and child IDs may also return other children
+      # of those ad groups which share an ID, so only the wanted ones are kept.
+      for chunk in _Chunks(sorted(child_ids), _GET_MAX_PREDICATE_VALUES):
+        ids = sorted(set(child_id for ad_group_id in chunk
+                         for child_id in child_ids[ad_group_id]))
+        for id_chunk in _Chunks(ids, _GET_MAX_PREDICATE_VALUES):
+          entities.extend(
+              entity for entity in self._GetEntities(entity_type, [
+                  {'field': 'AdGroupId', 'operator': 'IN', 'values': chunk},
+                  {'field': 'Id', 'operator': 'IN', 'values': id_chunk}])
+              if entity[1] in wanted)
+
+  def _GetEntities(self, entity_type, predicates):
+    """Retrieves entities of a type as tuples suitable for EntityStore.Update.
+
+    Args:
+      entity_type: A string identifying the type of the entities.
+      predicates: A list of predicates filtering the entities.
+
+    Returns:
+      A generator of (entity type, entity ID, parent ID, entity) tuples.
+    """
+    for entry in self._GetEntries(entity_type, predicates,
+                                  self._fields[entity_type]):
+      entity_id, parent_id = _GetSyncEntityIds(entity_type, entry)
+      yield entity_type, entity_id, parent_id, entry
+
+  def _GetEntries(self, entity_type, predicates, fields):
+    """Retrieves all entities of a type matching predicates, page by page.
+
+    Args:
+      entity_type: A string identifying the type of the entities.
+      predicates: A list of predicates filtering the entities.
+      fields: A list of the fields to retrieve.
+
+    Returns:
+      A generator of the entities.
+    """
+    service = self._GetService(_ACCOUNT_SYNC_SERVICES[entity_type])
+    selector = {'fields': fields, 'predicates': predicates,
+                'paging': {'startIndex': 0, 'numberResults': _GET_PAGE_SIZE}}
+    while True:
+      page = service.get(selector)
+      entries = _GetField(page, 'entries') or []
+      for entry in entries:
+        yield entry
+      selector['paging']['startIndex'] += _GET_PAGE_SIZE
+      if (not entries or
+          selector['paging']['startIndex'] >= _GetField(page,
+                                                        'totalNumEntries')):
+        break
+
+
+class AccountGraph(object):
+  """A compact, read-only graph of the accounts managed by an MCC.
+
+  Accounts are numbered in the order they were returned. The managers and
+  clients of each account are stored as slices of flat arrays of account
+  numbers, indexed by offset arrays, so looking up an account's parents or
+  children takes constant time regardless of the size of the graph, and the
+  whole graph of a large MCC fits in a few megabytes. Traversals are iterative
+  and visit each account once, so they are safe on graphs in which accounts
+  have several managers.
+  """
+
+  def __init__(self, accounts, links):
+    """Initializes an AccountGraph.
+
+    Args:
+      accounts: A list of (customer ID, name, can manage clients) tuples.
+      links: A list of (manager customer ID, client customer ID) tuples. Links
+          to accounts which are not listed are ignored.
+    """
+    # Customer IDs may not fit in a C long, so they are kept as Python longs.
+    self._customer_ids = [long(account[0]) for account in accounts]
+    self._names = [account[1] for account in accounts]
+    self._can_manage_clients = array.array(
+        'b', [bool(account[2]) for account in accounts])
+    self._indices = dict((customer_id, index) for index, customer_id
+                         in enumerate(self._customer_ids))
+
+    index_links = [(self._indices[long(manager_id)],
+                    self._indices[long(client_id)])
+                   for manager_id, client_id in links
+                   if long(manager_id) in self._indices and
+                   long(client_id) in self._indices]
+    self._child_offsets, self._children = self._BuildAdjacency(index_links)
+    self._parent_offsets, self._parents = self._BuildAdjacency(
+        [(client, manager) for manager, client in index_links])
+
+  def _BuildAdjacency(self, index_links):
+    """Builds the compressed adjacency arrays of a set of links.
+
+    Args:
+      index_links: A list of (source index, target index) tuples.
+
+    Returns:
+      A tuple of the offsets array, in which the targets of the account with
+      index i are at positions offsets[i] to offsets[i + 1] of the targets
+      array, and the targets array.
+    """
+    offsets = array.array('l', [0] * (len(self._customer_ids) + 1))
+    for source, _ in index_links:
+      offsets[source + 1] += 1
+    for index in xrange(len(self._customer_ids)):
+      offsets[index + 1] += offsets[index]
+
+    targets = array.array('l', [0] * len(index_links))
+    positions = array.array('l', offsets)
+    for source, target in index_links:
+      targets[positions[source]] = target
+      positions[source] += 1
+    return offsets, targets
+
+  @classmethod
+  def Load(cls, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
+           server=_DEFAULT_ENDPOINT, cache_path=None, ttl=_ACCOUNT_GRAPH_TTL):
+    """Creates an AccountGraph of the accounts managed by a client's account.
+
+    Args:
+      adwords_client: The AdWordsClient whose client customer ID identifies the
+          MCC.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      cache_path: A string identifying a file in which the graph is cached. If
+          it was written less than ttl seconds ago, the graph is read from it
+          rather than retrieved; otherwise the retrieved graph is written to it.
+      ttl: The number of seconds a cached graph is used for.
+
+    Returns:
+      An AccountGraph.
+    """
+    if cache_path:
+      try:
+        if time.time() - os.path.getmtime(cache_path) < ttl:
+          return cls.LoadFromFile(cache_path)
+      except (IOError, OSError, ValueError):
+        pass
+
+    managed_customer_service = adwords_client.GetService(
+        'ManagedCustomerService', version, server)
+    selector = {'fields': ['CustomerId', 'Name', 'CanManageClients'],
+                'paging': {'startIndex': 0, 'numberResults': _GET_PAGE_SIZE}}
+    accounts = []
+    links = []
+    while True:
+      page = managed_customer_service.get(selector)
+      entries = _GetField(page, 'entries') or []
+      accounts.extend((_GetField(entry, 'customerId'),
+                       _GetField(entry, 'name'),
+                       _GetField(entry, 'canManageClients'))
+                      for entry in entries)
+      links.extend((_GetField(link, 'managerCustomerId'),
+                    _GetField(link, 'clientCustomerId'))
+                   for link in _GetField(page, 'links') or [])
+      selector['paging']['startIndex'] += _GET_PAGE_SIZE
+      if (not entries or
+          selector['paging']['startIndex'] >= _GetField(page,
+                                                        'totalNumEntries')):
+        break
+
+    account_graph = cls(accounts, links)
+    if cache_path:
+      account_graph.Save(cache_path)
+    return account_graph
+
+  @classmethod
+  def LoadFromFile(cls, path):
+    """Reads an AccountGraph written by Save.
+
+    Args:
+      path: A string identifying the file.
+
+    Returns:
+      An AccountGraph.
+    """
+    with open(path, 'rb') as handle:
+      data = json.load(handle)
+    return cls(data['accounts'], data['links'])
+
+  def Save(self, path):
+    """Writes the graph to a file, replacing it atomically.
+
+    Args:
+      path: A string identifying the file.
+    """
+    links = [(self._customer_ids[index], self._customer_ids[child])
+             for index in xrange(len(self._customer_ids))
+             for child in self._children[self._child_offsets[index]:
+                                         self._child_offsets[index + 1]]]
+    data = {'accounts': zip(self._customer_ids, self._names,
+                            self._can_manage_clients),
+            'links': links}
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=os.path.dirname(os.path.abspath(path)),
+        delete=False) as handle:
+      json.dump(data, handle)
+    try:
+      os.rename(handle.name, path)
+    except OSError:
+      # Windows does not allow renaming onto an existing file.
+      os.remove(path)
+      os.rename(handle.name, path)
+
+  def __len__(self):
+    return len(self._customer_ids)
+
+  def __contains__(self, customer_id):
+    return long(customer_id) in self._indices
+
+  def _GetIndex(self, customer_id):
+    """Retrieves the index of an account.
+
+    Raises:
+      KeyError: If the account is not in the graph.
+    """
+    return self._indices[long(customer_id)]
+
+  def GetName(self, customer_id):
+    """Retrieves the name of an account."""
+    return self._names[self._GetIndex(customer_id)]
+
+  def CanManageClients(self, customer_id):
+    """Determines whether an account is a manager account."""
+    return bool(self._can_manage_clients[self._GetIndex(customer_id)])
+
+  def GetParents(self, customer_id):
+    """Retrieves the customer IDs of the managers of an account."""
+    index = self._GetIndex(customer_id)
+    return [self._customer_ids[parent] for parent in
+            self._parents[self._parent_offsets[index]:
+                          self._parent_offsets[index + 1]]]
+
+  def GetChildren(self, customer_id):
+    """Retrieves the customer IDs of the clients of an account."""
+    index = self._GetIndex(customer_id)
+    return [self._customer_ids[child] for child in
+            self._children[self._child_offsets[index]:
+                           self._child_offsets[index + 1]]]
+
+  def GetRoots(self):
+    """Retrieves the customer IDs of the accounts which have no managers."""
+    return [self._customer_ids[index]
+            for index in xrange(len(self._customer_ids))
+            if self._parent_offsets[index] == self._parent_offsets[index + 1]]
+
+  def GetDescendants(self, customer_id):
+    """Retrieves the customer IDs of all accounts managed by an account.
+
+    Args:
+      customer_id: The customer ID of the account.
+
+    Returns:
+      A list of the customer IDs of the account's clients, their clients and so
+      on, in breadth first order. Each account is listed once, and the account
+      itself is not listed.
+    """
+    start = self._GetIndex(customer_id)
+    visited = set([start])
+    queue = collections.deque([start])
+    descendants = []
+    while queue:
+      index = queue.popleft()
+      for child in self._children[self._child_offsets[index]:
+                                  self._child_offsets[index + 1]]:
+        if child not in visited:
+          visited.add(child)
+          descendants.append(self._customer_ids[child])
+          queue.append(child)
+    return descendants
+
+  def GetLeafCustomerIds(self, customer_id=None):
+    """Retrieves the customer IDs of client accounts which are not managers.
+
+    These are the accounts for which campaign data can be retrieved, so they
+    are the units of work of jobs fanned out across an MCC.
+
+    Args:
+      [optional]
+      customer_id: The customer ID of the account whose descendants are
+          searched. Defaults to searching the whole graph.
+
+    Returns:
+      A list of customer IDs.
+    """
+    if customer_id is None:
+      candidates = self._customer_ids
+    else:
+      candidates = self.GetDescendants(customer_id)
+    return [candidate for candidate in candidates
+            if not self._can_manage_clients[self._indices[candidate]]]
+
+
+def LookupLocations(adwords_client, location_names,
+                    version=sorted(_SERVICE_MAP.keys())[-1],
+                    server=_DEFAULT_ENDPOINT, locale='en', location_index=None):
+  """Looks up locations by name with the LocationCriterionService.
+
+  The names are looked up in batches rather than one call each, and the
+  locations found are returned as an index which can be saved and searched
+  offline. Their parent locations are indexed too, without a reach.
+
+  Args:
+    adwords_client: The AdWordsClient to look the locations up with.
+    location_names: A list of strings containing the names of the locations.
+    [optional]
+    version: A string identifying the AdWords version to connect to. This
+        defaults to what is currently the latest version. This will be updated
+        in future releases to point to what is then the latest version.
+    server: A string identifying the webserver hosting the AdWords API.
+    locale: A string identifying the locale of the names.
+    location_index: A googleads.locations.LocationIndex to add the locations to.
+
+  Returns:
+    A googleads.locations.LocationIndex.
+  """
+  # The location index is only imported by the applications which use it.
+  import googleads.locations  # pylint: disable=g-import-not-at-top
+
+  location_criterion_service = adwords_client.GetService(
+      'LocationCriterionService', version, server)
+  parents = {}
+  locations = []
+  for names in _Chunks(sorted(set(location_names)), _GET_MAX_PREDICATE_VALUES):
+    selector = {'fields': _LOCATION_FIELDS,
+                'predicates': [
+                    {'field': 'LocationName', 'operator': 'IN',
+                     'values': names},
+                    {'field': 'Locale', 'operator': 'EQUALS',
+                     'values': [locale]}]}
+    for criterion in _CallWithRateLimitRetries(
+        location_criterion_service.get, selector) or []:
+      location = _GetField(criterion, 'location')
+      # Parent locations are listed from the nearest to the farthest.
+      chain = [location] + list(_GetField(location, 'parentLocations') or [])
+      for index, chain_location in enumerate(chain):
+        location_tuple = (
+            _GetField(chain_location, 'id'),
+            _GetField(chain_location, 'locationName'),
+            _GetField(criterion, 'canonicalName') if index == 0 else None,
+            _GetField(chain[index + 1], 'id') if index + 1 < len(chain)
+            else None,
+            _GetField(chain_location, 'displayType'),
+            _GetField(criterion, 'reach') if index == 0 else None)
+        if index == 0:
+          locations.append(location_tuple)
+        elif location_index is None or location_tuple[0] not in location_index:
+          parents[location_tuple[0]] = location_tuple
+
+  # The locations found replace parents retrieved without a reach.
+  locations = parents.values() + locations
+  if location_index is None:
+    return googleads.locations.LocationIndex(
+        dict((location[0], location) for location in locations).values())
+  return location_index.Update(locations)
+
+
+def _GetSyncEntityIds(entity_type, entity):
+  """Determines the IDs under which an AccountSyncEngine stores an entity.
+
+  Args:
+    entity_type: A string identifying the type of the entity.
+    entity: The entity, as a dictionary or suds object.
+
+  Returns:
+    A tuple of the entity's ID and its parent's ID, which is None for campaigns.
+  """
+  if entity_type == 'Campaign':
+    return str(_GetField(entity, 'id')), None
+  elif entity_type == 'AdGroup':
+    return str(_GetField(entity, 'id')), str(_GetField(entity, 'campaignId'))
+  child = _GetField(entity, 'criterion' if entity_type == 'AdGroupCriterion'
+                    else 'ad')
+  ad_group_id = str(_GetField(entity, 'adGroupId'))
+  return '%s:%s' % (ad_group_id, _GetField(child, 'id')), ad_group_id
+
+
+def _Chunks(items, size):
+  """Splits a list into consecutive chunks.
+
+  Args:
+    items: A list.
+    size: The maximum number of items in each chunk.
+
+  Returns:
+    A list of lists.
+  """
+  return [items[offset:offset + size]
+          for offset in range(0, len(items), size)]
+
+
+def _GetEntityKey(operand):
+  """Identifies the entity an operand applies to.
+
+  Args:
+    operand: The operand of an operation.
+
+  Returns:
+    A tuple of the operand's campaign ID, ad group ID and entity ID, or None if
+    the operand is not a dictionary or has no entity ID. The entity ID is the
+    operand's id, or that of its criterion or ad.
+  """
+  if not isinstance(operand, dict):
+    return None
+  entity_id = operand.get('id')
+  for field in ('criterion', 'ad'):
+    if entity_id is None and isinstance(operand.get(field), dict):
+      entity_id = operand[field].get('id')
+  if entity_id is None:
+    return None
+  return (operand.get('campaignId'), operand.get('adGroupId'), entity_id)
+
+
+def _CoalesceOperations(pending_operation, operation):
+  """Coalesces an operation with the pending operation for the same entity.
+
+  Args:
+    pending_operation: The buffered operation.
+    operation: The operation which follows it.
+
+  Returns:
+    A tuple of a boolean indicating whether the operations could be coalesced
+    and the operation replacing both of them, which is None if they cancel each
+    other out.
+  """
+  pending_operator = pending_operation['operator']
+  operator = operation['operator']
+
+  if operator == 'SET' and pending_operator in ('ADD', 'SET'):
+    coalesced_operation = dict(pending_operation)
+    coalesced_operation['operand'] = _MergeOperands(
+        pending_operation['operand'], operation['operand'])
+    return True, coalesced_operation
+  elif operator == 'REMOVE' and pending_operator == 'ADD':
+    return True, None
+  elif operator == 'REMOVE' and pending_operator == 'SET':
+    return True, operation
+  return False, None
+
+
+def _MergeOperands(operand, update):
+  """Merges the fields of one operand into another.
+
+  Args:
+    operand: A dictionary.
+    update: A dictionary whose fields take precedence over those of operand.
+        Nested dictionaries are merged recursively.
+
+  Returns:
+    A new dictionary containing the merged fields.
+  """
+  merged = dict(operand)
+  for key, value in update.iteritems():
+    if isinstance(value, dict) and isinstance(merged.get(key), dict):
+      merged[key] = _MergeOperands(merged[key], value)
+    else:
+      merged[key] = value
+  return merged
+
+
+def _CallWithRateLimitRetries(method, *args):
+  """Calls a service method, retrying while it is rejected for exceeding a rate.
+
+  Args:
+    method: The service method to call.
+    *args: The arguments to call the method with.
+
+  Returns:
+    The response of the method.
+
+  Raises:
+    WebFault: If the request fails for any other reason, or still exceeds a
+        rate after _RATE_EXCEEDED_MAX_RETRIES retries.
+  """
+  for attempt in itertools.count():
+    try:
+      return method(*args)
+    except suds.WebFault, e:
+      delay = _GetRateExceededDelay(e)
+      if delay is None or attempt >= _RATE_EXCEEDED_MAX_RETRIES:
+        raise
+      logging.info('Rate exceeded, retrying in %d seconds.', delay)
+      googleads.common.RecordRetry(getattr(method, 'service_name', None),
+                                   getattr(method, 'method_name', None),
+                                   'RateExceededError')
+      time.sleep(delay)
+
+
+def _GetRateExceededDelay(web_fault):
+  """Determines how long to wait before retrying a rate limited request.
+
+  Args:
+    web_fault: The suds.WebFault raised by the request.
+
+  Returns:
+    The number of seconds to wait, or None if the fault was not caused by a
+    RateExceededError.
+  """
+  for error in googleads.common.GetFaultErrors(web_fault):
+    if _GetErrorType(error) == 'RateExceededError':
+      return (_GetField(error, 'retryAfterSeconds') or
+              _RATE_EXCEEDED_DEFAULT_DELAY)
+  return None
+
+
+def _IsRetryableError(error):
+  """Determines whether an ApiError is transient.
+
+  Args:
+    error: An ApiError, as a dictionary or suds object.
+
+  Returns:
+    True if the operation which caused the error may succeed if resubmitted.
+  """
+  error_type = _GetErrorType(error)
+  if error_type == 'DatabaseError':
+    return _GetField(error, 'reason') == 'CONCURRENT_MODIFICATION'
+  return error_type in _RETRYABLE_ERROR_TYPES
+
+
+def _GetErrorType(error):
+  """Retrieves the type name of an ApiError, such as RateExceededError.
+
+  Args:
+    error: An ApiError, as a dictionary or suds object.
+
+  Returns:
+    A string naming the type of the error.
+  """
+  return (_GetField(error, 'ApiError.Type') or _GetField(error, 'xsi_type') or
+          error.__class__.__name__)
+
+
+def _GetField(obj, name):
+  """Retrieves a field of a dictionary or suds object.
+
+  Args:
+    obj: A dictionary or suds object.
+    name: The name of the field to retrieve.
+
+  Returns:
+    The value of the field, or None if it is not set.
+  """
+  try:
+    return obj[name] if name in obj else None
+  except TypeError:
+    return getattr(obj, name, None)
+
+
+def _IsPlaceHolder(value):
+  """Determines whether a returned value marks a failed operation.
+
+  Args:
+    value: A value returned for an operation, as a dictionary or suds object.
+
+  Returns:
+    True if the value is a PlaceHolder rather than a result.
+  """
+  if value.__class__.__name__ == 'PlaceHolder':
+    return True
+  try:
+    return 'PlaceHolder' in value
+  except TypeError:
+    return False
+
+
+def _NormalizeAwql(query):
+  """Collapses the whitespace in an AWQL query outside of string literals.
+
+  Args:
+    query: A string containing an AWQL query.
+
+  Returns:
+    The query with each run of whitespace outside of string literals replaced by
+    a single space, and leading and trailing whitespace removed.
+  """
+  parts = _AWQL_STRING_LITERAL_PATTERN.split(query)
+  # Splitting on a capturing pattern puts the literals at the odd indices.
+  for index in range(0, len(parts), 2):
+    parts[index] = _WHITESPACE_PATTERN.sub(' ', parts[index])
+  return ''.join(parts).strip()
+
+
+def _AwqlIncludesToday(query):
+  """Determines whether the date range of an AWQL query may include today.
+
+  Args:
+    query: A string containing an AWQL query.
+
+  Returns:
+    False if the query's DURING clause only covers days before yesterday, or a
+    past date range type. True otherwise, including for queries without a
+    DURING clause, which cover all time.
+  """
+  match = _AWQL_DURING_PATTERN.search(query)
+  if not match:
+    return True
+  end_date, date_range_type = match.groups()
+  if end_date:
+    return _DateIsRecent(end_date)
+  return date_range_type.upper() not in _PAST_DATE_RANGE_TYPES
+
+
+def _ReportDefinitionIncludesToday(report_definition):
+  """Determines whether the date range of a report definition may include today.
+
+  Args:
+    report_definition: A dictionary or instance of the ReportDefinition class
+        generated from the schema.
+
+  Returns:
+    False if the report definition's date range only covers days before
+    yesterday, or is a past date range type. True otherwise.
+  """
+  try:
+    date_range_type = report_definition['dateRangeType']
+    if date_range_type == 'CUSTOM_DATE':
+      return _DateIsRecent(report_definition['selector']['dateRange']['max'])
+    return date_range_type not in _PAST_DATE_RANGE_TYPES
+  except (KeyError, TypeError, AttributeError):
+    return True
+
+
+def _DateIsRecent(date_string):
+  """Determines whether a date is yesterday or later.
+
+  Yesterday is included because an account's time zone may lag behind the local
+  time zone.
+
+  Args:
+    date_string: A string containing a date in the format YYYYMMDD.
+
+  Returns:
+    True if the date is yesterday or later, or can not be parsed.
+  """
+  yesterday = datetime.date.today() - datetime.timedelta(days=1)
+  return str(date_string) >= yesterday.strftime('%Y%m%d')
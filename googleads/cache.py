@@ -0,0 +1,433 @@
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Caches for the WSDLs and schemas suds downloads when creating services.
+
+Any of these can be given as the cache of an AdWordsClient, DfpClient or
+DfaClient. Like suds' own file caches, they store XML documents as text and
+other objects pickled, so the objects suds gets from them are never shared
+between clients. A SchemaSnapshot goes further, keeping the models suds
+resolves from the WSDLs rather than the documents.
+"""
+
+import collections
+import cPickle
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+
+import suds
+import suds.cache
+import suds.sax.document
+import suds.sax.element
+import suds.sax.parser
+
+import googleads.errors
+
+# The magic bytes identifying an MmapCache file.
+_MMAP_CACHE_MAGIC = 'GASC0001'
+# The size of an MmapCache file's index, following its magic bytes.
+_MMAP_CACHE_HEADER = struct.Struct('<Q')
+# The prefixes identifying how a cached value is encoded.
+_DOCUMENT_PREFIX = 'X'
+_PICKLE_PREFIX = 'P'
+# The suffix of the IDs suds gives the resolved WSDL models it caches.
+_DEFINITIONS_ID_SUFFIX = '-wsdl'
+# Matches the object IDs in the descriptions of schema objects, which differ
+# between resolutions of the same schema.
+_SCHEMA_OBJECT_ID_PATTERN = re.compile(r':0x[0-9a-f]+')
+
+
+class MemoryCache(suds.cache.Cache):
+  """A bounded in-memory cache, evicting the least recently used entries."""
+
+  def __init__(self, max_entries=256, max_size=64 * 1024 * 1024):
+    """Initializes a MemoryCache.
+
+    Args:
+      [optional]
+      max_entries: The number of entries the cache holds at most.
+      max_size: The total size in bytes of the entries the cache holds at most.
+    """
+    self.max_entries = max_entries
+    self.max_size = max_size
+    self._entries = collections.OrderedDict()
+    self._size = 0
+    self._lock = threading.Lock()
+
+  def get(self, id):  # pylint: disable=redefined-builtin
+    with self._lock:
+      value = self._entries.pop(id, None)
+      if value is None:
+        return None
+      self._entries[id] = value
+    return _DecodeValue(value)
+
+  def put(self, id, object):  # pylint: disable=redefined-builtin
+    value = _EncodeValue(object)
+    if value is None or len(value) > self.max_size:
+      return object
+    with self._lock:
+      self._Remove(id)
+      self._entries[id] = value
+      self._size += len(value)
+      while len(self._entries) > self.max_entries or self._size > self.max_size:
+        self._Remove(next(iter(self._entries)))
+    return object
+
+  def purge(self, id):  # pylint: disable=redefined-builtin
+    with self._lock:
+      self._Remove(id)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._size = 0
+
+  def Items(self):
+    """Retrieves the entries of the cache, such as for MmapCache.Write.
+
+    Returns:
+      A list of tuples of the ID and object of each entry.
+    """
+    with self._lock:
+      entries = self._entries.items()
+    return [(id, _DecodeValue(value)) for id, value in entries]
+
+  def _Remove(self, id):  # pylint: disable=redefined-builtin
+    value = self._entries.pop(id, None)
+    if value is not None:
+      self._size -= len(value)
+
+
+class MmapCache(suds.cache.Cache):
+  """A read-only cache of documents in a memory-mapped file.
+
+  The file is written once, such as by a deployment step warming a MemoryCache,
+  and every process opening it shares its pages. Entries put in the cache are
+  ignored, so services missing from the file are downloaded every time.
+  """
+
+  def __init__(self, path):
+    """Opens an MmapCache file.
+
+    Args:
+      path: A string identifying a file written by MmapCache.Write.
+
+    Raises:
+      GoogleAdsValueError: If the file is not an MmapCache file.
+    """
+    self.path = path
+    with open(path, 'rb') as handle:
+      self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    magic_size = len(_MMAP_CACHE_MAGIC)
+    if self._mmap[:magic_size] != _MMAP_CACHE_MAGIC:
+      self._mmap.close()
+      raise googleads.errors.GoogleAdsValueError(
+          '%s is not a suds cache file.' % path)
+    index_size, = _MMAP_CACHE_HEADER.unpack_from(self._mmap, magic_size)
+    index_start = magic_size + _MMAP_CACHE_HEADER.size
+    self._data_start = index_start + index_size
+    self._index = json.loads(self._mmap[index_start:self._data_start])
+
+  @classmethod
+  def Write(cls, path, entries):
+    """Writes a cache file, replacing it atomically.
+
+    Args:
+      path: A string identifying the file.
+      entries: A list of tuples of the ID and object of each entry, such as
+          returned by MemoryCache.Items or SqliteCache.Items.
+    """
+    index = {}
+    values = []
+    offset = 0
+    for id, obj in entries:  # pylint: disable=redefined-builtin
+      value = _EncodeValue(obj)
+      if value is not None:
+        index[id] = (offset, len(value))
+        values.append(value)
+        offset += len(value)
+    encoded_index = json.dumps(index)
+
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=os.path.dirname(os.path.abspath(path)),
+        delete=False) as handle:
+      handle.write(_MMAP_CACHE_MAGIC)
+      handle.write(_MMAP_CACHE_HEADER.pack(len(encoded_index)))
+      handle.write(encoded_index)
+      for value in values:
+        handle.write(value)
+    try:
+      os.rename(handle.name, path)
+    except OSError:
+      # Windows does not allow renaming onto an existing file.
+      os.remove(path)
+      os.rename(handle.name, path)
+
+  def Close(self):
+    """Unmaps the file."""
+    self._mmap.close()
+
+  def Items(self):
+    """Retrieves the entries of the cache, such as to write a new file from.
+
+    Returns:
+      A list of tuples of the ID and object of each entry.
+    """
+    return [(str(id), self.get(id)) for id in self._index]
+
+  def __len__(self):
+    return len(self._index)
+
+  def get(self, id):  # pylint: disable=redefined-builtin
+    location = self._index.get(id)
+    if location is None:
+      return None
+    start = self._data_start + location[0]
+    return _DecodeValue(self._mmap[start:start + location[1]])
+
+  def put(self, id, object):  # pylint: disable=redefined-builtin
+    return object
+
+  def purge(self, id):  # pylint: disable=redefined-builtin
+    pass
+
+  def clear(self):
+    pass
+
+
+class SqliteCache(suds.cache.Cache):
+  """A cache in an SQLite database, whose entries expire after a time to live.
+
+  The database can be shared by the processes of a host.
+  """
+
+  def __init__(self, path, ttl=24 * 60 * 60):
+    """Initializes a SqliteCache.
+
+    Args:
+      path: A string identifying the database file, which is created if it
+          does not exist.
+      [optional]
+      ttl: The number of seconds entries are served for.
+    """
+    self.ttl = ttl
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._lock = threading.Lock()
+    with self._lock, self._connection:
+      self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS suds_cache (id TEXT PRIMARY KEY, '
+          'value BLOB NOT NULL, expiry REAL NOT NULL)')
+
+  def get(self, id):  # pylint: disable=redefined-builtin
+    with self._lock:
+      row = self._connection.execute(
+          'SELECT value FROM suds_cache WHERE id = ? AND expiry > ?',
+          (id, time.time())).fetchone()
+    return _DecodeValue(str(row[0])) if row else None
+
+  def put(self, id, object):  # pylint: disable=redefined-builtin
+    value = _EncodeValue(object)
+    if value is not None:
+      with self._lock, self._connection:
+        self._connection.execute(
+            'INSERT OR REPLACE INTO suds_cache VALUES (?, ?, ?)',
+            (id, buffer(value), time.time() + self.ttl))
+    return object
+
+  def purge(self, id):  # pylint: disable=redefined-builtin
+    with self._lock, self._connection:
+      self._connection.execute('DELETE FROM suds_cache WHERE id = ?', (id,))
+
+  def clear(self):
+    with self._lock, self._connection:
+      self._connection.execute('DELETE FROM suds_cache')
+
+  def Items(self):
+    """Retrieves the unexpired entries, such as for MmapCache.Write.
+
+    Returns:
+      A list of tuples of the ID and object of each entry.
+    """
+    with self._lock:
+      rows = self._connection.execute(
+          'SELECT id, value FROM suds_cache WHERE expiry > ?',
+          (time.time(),)).fetchall()
+    return [(str(id), _DecodeValue(str(value))) for id, value in rows]
+
+  def Close(self):
+    """Closes the database."""
+    with self._lock:
+      self._connection.close()
+
+
+class SchemaSnapshot(suds.cache.Cache):
+  """Snapshots of the models suds resolves from WSDLs and their schemas.
+
+  Given a SchemaSnapshot as its cache, a client has suds keep the model it
+  resolves for a service - its types, elements and method signatures - and
+  load it in place of downloading, parsing and resolving the WSDL and the
+  schemas it imports again. Snapshots are kept in another cache, so those of an
+  application's services can be taken ahead of time and shared by its
+  processes through an MmapCache file:
+
+    snapshot = SchemaSnapshot()
+    adwords_client.cache = snapshot
+    adwords_client.GetService('CampaignService')
+    MmapCache.Write(path, snapshot.Items())
+
+    adwords_client.cache = SchemaSnapshot(MmapCache(path))
+
+  Snapshots taken with another version of suds are ignored.
+  """
+
+  # The suds caching policy under which suds caches resolved models rather than
+  # XML documents. Clients pass it to suds along with their cache.
+  caching_policy = 1
+
+  def __init__(self, cache=None):
+    """Initializes a SchemaSnapshot.
+
+    Args:
+      [optional]
+      cache: The suds.cache.Cache the snapshots are kept in. Defaults to a new
+          MemoryCache.
+    """
+    self.cache = MemoryCache() if cache is None else cache
+
+  def get(self, id):  # pylint: disable=redefined-builtin
+    entry = self.cache.get(id)
+    if not entry or entry.get('suds_version') != suds.__version__:
+      return None
+    return entry['definitions']
+
+  def put(self, id, object):  # pylint: disable=redefined-builtin
+    if id.endswith(_DEFINITIONS_ID_SUFFIX):
+      self.cache.put(id, {
+          'suds_version': suds.__version__,
+          'fingerprint': GetSchemaFingerprint(object),
+          'definitions': object
+      })
+    return object
+
+  def purge(self, id):  # pylint: disable=redefined-builtin
+    self.cache.purge(id)
+
+  def clear(self):
+    self.cache.clear()
+
+  def Items(self):
+    """Retrieves the snapshots, such as for MmapCache.Write.
+
+    Returns:
+      A list of tuples of the ID and object of each entry of the cache the
+      snapshots are kept in.
+    """
+    return self.cache.Items()
+
+  def Verify(self, url, **kwargs):
+    """Checks the snapshot of a WSDL matches the model freshly resolved from it.
+
+    Args:
+      url: A string identifying the WSDL or schema, as given to suds.
+      [optional]
+      **kwargs: Options of the suds client resolving the model afresh, such as
+          the doctor or proxy the snapshot was taken with.
+
+    Raises:
+      GoogleAdsValueError: If there is no snapshot of the WSDL, or it does not
+          match the model resolved from the WSDL.
+    """
+    # suds.client is imported once a snapshot is verified, as by the clients.
+    import suds.client  # pylint: disable=g-import-not-at-top
+
+    # suds identifies a WSDL's model by the hash of its URL.
+    entry = self.cache.get('%s%s' % (abs(hash(url)), _DEFINITIONS_ID_SUFFIX))
+    if not entry or entry.get('suds_version') != suds.__version__:
+      raise googleads.errors.GoogleAdsValueError(
+          'There is no snapshot of %s.' % url)
+    kwargs['cache'] = suds.cache.NoCache()
+    fingerprint = GetSchemaFingerprint(suds.client.Client(url, **kwargs).wsdl)
+    if (entry['fingerprint'] != fingerprint or
+        GetSchemaFingerprint(entry['definitions']) != fingerprint):
+      raise googleads.errors.GoogleAdsValueError(
+          'The snapshot of %s does not match its WSDL.' % url)
+
+
+def GetSchemaFingerprint(definitions):
+  """Creates a fingerprint of the model suds resolved from a WSDL.
+
+  Args:
+    definitions: The suds.wsdl.Definitions of the WSDL.
+
+  Returns:
+    A string holding a hash of the types, elements and method signatures of
+    the model.
+  """
+  fingerprint = hashlib.sha1()
+  schema = definitions.schema
+  for schema_objects in (schema.types, schema.elements):
+    for key in sorted(schema_objects):
+      fingerprint.update(repr(key))
+      fingerprint.update(_SCHEMA_OBJECT_ID_PATTERN.sub(
+          '', unicode(schema_objects[key])).encode('utf-8'))
+  for service in definitions.services:
+    for port in service.ports:
+      for name, method in sorted(port.methods.iteritems()):
+        fingerprint.update(repr((
+            service.name, port.name, name,
+            [(parameter[0], parameter[1].resolve().qname)
+             for parameter in method.binding.input.param_defs(method)],
+            [(parameter[0], parameter[1].resolve().qname)
+             for parameter in method.binding.output.param_defs(method)])))
+  return fingerprint.hexdigest()
+
+
+def _EncodeValue(obj):
+  """Encodes an object put in a cache.
+
+  Args:
+    obj: A suds XML document or element, or any picklable object.
+
+  Returns:
+    A string holding the encoded object, or None if it cannot be encoded.
+  """
+  if isinstance(obj, (suds.sax.document.Document, suds.sax.element.Element)):
+    return _DOCUMENT_PREFIX + unicode(obj).encode('utf-8')
+  try:
+    return _PICKLE_PREFIX + cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+  except (cPickle.PicklingError, TypeError):
+    return None
+
+
+def _DecodeValue(value):
+  """Decodes an object encoded by _EncodeValue.
+
+  Args:
+    value: A string holding the encoded object.
+
+  Returns:
+    The object, as a new copy.
+  """
+  if value[0] == _DOCUMENT_PREFIX:
+    return suds.sax.parser.Parser().parse(string=value[1:])
+  return cPickle.loads(value[1:])
@@ -16,14 +16,20 @@
 
 __author__ = 'Joseph DiLallo'
 
+import collections
+import contextlib
+import copy
+import hashlib
+import json
 import os
+import random
 import sys
+import tempfile
+import threading
+import time
 import warnings
 
-import httplib2
-import socks
 import suds
-import yaml
 
 import googleads.errors
 import googleads.oauth2
@@ -41,6 +47,33 @@ _OAUTH_2_AUTH_KEYS = ('client_id', 'client_secret', 'refresh_token')
 # instance.
 _PROXY_KEYS = ('host', 'port')
 
+# The client attributes which may be set per lease of a ClientPool.
+_LEASE_HEADER_ATTRIBUTES = ('client_customer_id', 'validate_only',
+                            'partial_failure', 'network_code')
+
+# The configuration file read when no path is given to LoadFromStorage.
+_DEFAULT_CONFIG_PATH = os.path.join('~', 'googleads.yaml')
+# The environment variable holding a JSON configuration document, or the path
+# of a configuration file, read instead of the default configuration file.
+_CONFIG_ENVIRONMENT_VARIABLE = 'GOOGLEADS_CONFIG'
+
+# The CallHooks notified of every call, replaced rather than modified so that it
+# can be read without locking.
+_call_hooks = []
+_call_hooks_lock = threading.Lock()
+# The SpanExporters given every finished span, replaced rather than modified so
+# that it can be read without locking.
+_span_exporters = []
+# Holds the span each thread is currently in.
+_trace_context = threading.local()
+# Maps the path of each configuration file read to its modification time and
+# size and its parsed contents, as of the latest read.
+_config_cache = {}
+# Maps the class and settings of each OAuth 2.0 client created from a
+# configuration to the client, shared by every client loaded with them.
+_oauth2_clients = {}
+_config_cache_lock = threading.Lock()
+
 
 def GenerateLibSig(short_name):
   """Generates a library signature suitable for a user agent field.
@@ -61,8 +94,15 @@ def LoadFromStorage(path, product_yaml_key, required_client_values,
   the keys used to create OAuth 2.0 credentials. It may also optionally provide
   proxy_info in order to configure a proxy.
 
+  Files are parsed once for as long as they are not modified, and clients
+  loaded with the same OAuth 2.0 credentials and proxy share one
+  GoogleOAuth2Client. Files whose name ends with .json are parsed as JSON.
+
   Args:
-    path: A path string to the yaml document whose keys should be used.
+    path: A path string to the yaml document whose keys should be used. If this
+      is None, the GOOGLEADS_CONFIG environment variable is read instead, and
+      may hold a JSON document or a path; if it is not set, googleads.yaml in
+      the home directory is read. A given path is always read as a file.
     product_yaml_key: The key to read in the yaml as a string.
     required_client_values: A tuple of strings representing values which must
       be in the yaml file for a supported API. If one of these keys is not in
@@ -80,16 +120,35 @@ def LoadFromStorage(path, product_yaml_key, required_client_values,
     information necessary to instantiate a client object - either a
     required_client_values key was missing or an OAuth 2.0 key was missing.
   """
-  if not os.path.isabs(path):
-    path = os.path.expanduser(path)
-  try:
-    with open(path, 'r') as handle:
-      data = yaml.safe_load(handle.read())
-      product_data = data.get(product_yaml_key) or {}
-      proxy_data = data.get(_PROXY_YAML_KEY) or {}
-  except IOError:
+  data = None
+  if path is None:
+    path = os.environ.get(_CONFIG_ENVIRONMENT_VARIABLE) or _DEFAULT_CONFIG_PATH
+    # Only the environment variable may hold the document itself; a path
+    # given by the caller is always read as a file.
+    if path.lstrip()[:1] in ('{', '['):
+      try:
+        data = json.loads(path)
+      except ValueError, e:
+        raise googleads.errors.GoogleAdsValueError(
+            'The %s environment variable does not hold a valid JSON document: '
+            '%s' % (_CONFIG_ENVIRONMENT_VARIABLE, e))
+      path = _CONFIG_ENVIRONMENT_VARIABLE
+  if data is None:
+    if not os.path.isabs(path):
+      path = os.path.expanduser(path)
+    try:
+      data = _ReadConfig(path)
+    except IOError:
+      raise googleads.errors.GoogleAdsValueError(
+          'Given yaml file, %s, could not be opened.' % path)
+    except ValueError, e:
+      raise googleads.errors.GoogleAdsValueError(
+          'Given JSON file, %s, could not be parsed: %s' % (path, e))
+  if not isinstance(data, dict):
     raise googleads.errors.GoogleAdsValueError(
-        'Given yaml file, %s, could not be opened.' % path)
+        'The configuration in %s is not a mapping of keys to values.' % path)
+  product_data = data.get(product_yaml_key) or {}
+  proxy_data = data.get(_PROXY_YAML_KEY) or {}
 
   original_keys = list(product_data.keys())
   original_proxy_keys = list(proxy_data.keys())
@@ -105,6 +164,11 @@ def LoadFromStorage(path, product_yaml_key, required_client_values,
         % (path, required_client_values, original_keys))
 
   try:
+    if proxy_data:
+      # httplib2 and socks are only needed for proxies, so they are not
+      # imported with the library.
+      import httplib2  # pylint: disable=g-import-not-at-top
+      import socks  # pylint: disable=g-import-not-at-top
     proxy_info = (httplib2.ProxyInfo(socks.PROXY_TYPE_HTTP, proxy_data['host'],
                                      proxy_data['port'])
                   if proxy_data else None)
@@ -122,11 +186,10 @@ def LoadFromStorage(path, product_yaml_key, required_client_values,
       'disable_ssl_certificate_validation', True)
 
   try:
-    client_kwargs['oauth2_client'] = (
-        googleads.oauth2.GoogleRefreshTokenClient(
-            product_data['client_id'], product_data['client_secret'],
-            product_data['refresh_token'], proxy_info,
-            disable_ssl_certificate_validation, ca_certs))
+    client_kwargs['oauth2_client'] = _GetSharedOAuth2Client(
+        product_data['client_id'], product_data['client_secret'],
+        product_data['refresh_token'], proxy_info,
+        disable_ssl_certificate_validation, ca_certs)
     for auth_key in _OAUTH_2_AUTH_KEYS:
       del product_data[auth_key]
   except KeyError:
@@ -148,6 +211,92 @@ def LoadFromStorage(path, product_yaml_key, required_client_values,
   return client_kwargs
 
 
+def ClearConfigCache():
+  """Forgets the parsed configuration files and the shared OAuth 2.0 clients.
+
+  Clients loaded afterwards re-read their configuration file and create new
+  OAuth 2.0 clients.
+  """
+  with _config_cache_lock:
+    _config_cache.clear()
+    _oauth2_clients.clear()
+
+
+def _ReadConfig(path):
+  """Reads a configuration file, parsing it only if it changed since last read.
+
+  YAML files are parsed with the C-accelerated loader when PyYAML was built
+  with it.
+
+  Args:
+    path: A string containing the absolute path of the file.
+
+  Returns:
+    A dictionary of the contents of the file, which the caller may modify.
+
+  Raises:
+    IOError: If the file could not be read.
+    ValueError: If a JSON file could not be parsed.
+  """
+  try:
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+  except OSError:
+    version = None
+
+  data = None
+  with _config_cache_lock:
+    cached = _config_cache.get(path)
+  if version is not None and cached and cached[0] == version:
+    data = cached[1]
+  if data is None:
+    with open(path, 'r') as handle:
+      contents = handle.read()
+    if path.endswith('.json'):
+      data = json.loads(contents)
+    else:
+      import yaml  # pylint: disable=g-import-not-at-top
+      data = yaml.load(contents, Loader=getattr(yaml, 'CSafeLoader',
+                                                yaml.SafeLoader))
+    data = data or {}
+    if version is not None:
+      # Replacing the entry of the path drops the contents of its older
+      # versions.
+      with _config_cache_lock:
+        _config_cache[path] = (version, data)
+  return copy.deepcopy(data)
+
+
+def _GetSharedOAuth2Client(client_id, client_secret, refresh_token, proxy_info,
+                           disable_ssl_certificate_validation, ca_certs):
+  """Retrieves the GoogleRefreshTokenClient shared by clients with a config.
+
+  Args:
+    client_id: A string containing the client ID.
+    client_secret: A string containing the client secret.
+    refresh_token: A string containing the refresh token.
+    proxy_info: A ProxyInfo instance identifying the proxy used for all
+        requests, or None.
+    disable_ssl_certificate_validation: A boolean indicating whether ssl
+        certificate validation should be disabled while using a proxy.
+    ca_certs: A string identifying the path to a file containing root CA
+        certificates, or None.
+
+  Returns:
+    The GoogleRefreshTokenClient, created if no client shares it yet.
+  """
+  oauth2_class = googleads.oauth2.GoogleRefreshTokenClient
+  key = (oauth2_class, client_id, client_secret, refresh_token,
+         (proxy_info.proxy_host, proxy_info.proxy_port) if proxy_info else None,
+         disable_ssl_certificate_validation, ca_certs)
+  with _config_cache_lock:
+    if key not in _oauth2_clients:
+      _oauth2_clients[key] = oauth2_class(
+          client_id, client_secret, refresh_token, proxy_info,
+          disable_ssl_certificate_validation, ca_certs)
+    return _oauth2_clients[key]
+
+
 def _PackForSuds(obj, factory):
   """Packs SOAP input into the format we want for suds.
 
@@ -242,6 +391,59 @@ def _IsSudsIterable(obj):
   return (obj and not isinstance(obj, basestring) and hasattr(obj, '__iter__'))
 
 
+def ParallelMap(function, items, max_parallel):
+  """Applies a function to each of a list of items using a pool of threads.
+
+  Args:
+    function: A callable taking a single item.
+    items: An iterable of items.
+    max_parallel: The maximum number of threads calling function at once.
+
+  Returns:
+    A list of the values returned by function, in the order of the items.
+
+  Raises:
+    The first exception raised by function. Items which have not been started
+    when it is raised are skipped, and it is only re-raised once every thread
+    has stopped.
+  """
+  items = list(items)
+  if max_parallel <= 1 or len(items) <= 1:
+    return [function(item) for item in items]
+
+  # Spans started by function belong to the caller's trace.
+  function = BindCurrentSpan(function)
+  results = [None] * len(items)
+  errors = []
+  next_index = [0]
+  lock = threading.Lock()
+
+  def Worker():
+    while True:
+      with lock:
+        if errors or next_index[0] >= len(items):
+          return
+        index = next_index[0]
+        next_index[0] += 1
+      try:
+        results[index] = function(items[index])
+      except Exception, e:  # pylint: disable=broad-except
+        with lock:
+          errors.append(e)
+
+  threads = [threading.Thread(target=Worker)
+             for _ in range(min(max_parallel, len(items)))]
+  for thread in threads:
+    thread.daemon = True
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  if errors:
+    raise errors[0]
+  return results
+
+
 class SudsServiceProxy(object):
   """Wraps a suds service object, allowing custom logic to be injected.
 
@@ -250,13 +452,18 @@ class SudsServiceProxy(object):
   transforming SOAP call input parameters, allowing dictionary syntax to be used
   with all SOAP complex types.
 
+  If an EntityCache is given, the responses of get and get*ByStatement calls
+  are served from it while they are fresh, and any other call, which may change
+  the service's entities, invalidates the service's cached responses.
+
   Attributes:
     suds_client: The suds.client.Client this service belongs to. If you are
         familiar with suds and want to use autogenerated classes, you can access
         the client and its factory,
   """
 
-  def __init__(self, suds_client, header_handler):
+  def __init__(self, suds_client, header_handler, entity_cache=None,
+               version=None):
     """Initializes a suds service proxy.
 
     Args:
@@ -265,9 +472,15 @@ class SudsServiceProxy(object):
           object.
       header_handler: A HeaderHandler responsible for setting the SOAP and HTTP
           headers on the service client.
+      [optional]
+      entity_cache: An EntityCache used to serve repeated get calls.
+      version: A string identifying the API version of the service, recorded in
+          the spans of its calls.
     """
     self.suds_client = suds_client
     self._header_handler = header_handler
+    self._entity_cache = entity_cache
+    self._version = version
     self._method_proxies = {}
 
   def __getattr__(self, attr):
@@ -288,15 +501,111 @@ class SudsServiceProxy(object):
       A callable that can be used to make the desired SOAP request.
     """
     soap_service_method = getattr(self.suds_client.service, method_name)
+    service_name = self.suds_client.wsdl.services[0].name
+
+    cacheable = self._entity_cache is not None and (
+        method_name == 'get' or (method_name.startswith('get') and
+                                 method_name.endswith('ByStatement')))
+    invalidates = self._entity_cache is not None and not cacheable
 
     def MakeSoapRequest(*args):
       """Perform a SOAP call."""
-      self._header_handler.SetHeaders(self.suds_client)
-      return soap_service_method(*[_PackForSuds(arg, self.suds_client.factory)
-                                   for arg in args])
+      attributes = self._GetSpanAttributes(args) if _span_exporters else None
+      with MeasureCall(service_name, method_name, attributes) as call:
+        with call.Phase('headers'):
+          self._header_handler.SetHeaders(self.suds_client)
+        if cacheable:
+          # The SOAP headers identify the account the request is made for.
+          cache_key = repr(_NormalizeForCacheKey(
+              (self.suds_client.options.soapheaders, method_name, args)))
+          response = self._entity_cache.Get(service_name, cache_key)
+          if response is not None:
+            call.cached = True
+            return response
 
+        with call.Phase('pack'):
+          packed_args = [_PackForSuds(arg, self.suds_client.factory)
+                         for arg in args]
+        metrics_plugin = (self._GetMetricsPlugin()
+                          if _call_hooks or _span_exporters else None)
+        if metrics_plugin:
+          metrics_plugin.Start(call)
+        try:
+          response = soap_service_method(*packed_args)
+        finally:
+          if metrics_plugin:
+            metrics_plugin.call = None
+            if metrics_plugin.received_time is not None:
+              call.phases['parse'] = (time.time() -
+                                      metrics_plugin.received_time)
+          # Calls which fail may still have changed entities on the server.
+          if invalidates:
+            self._entity_cache.Invalidate(service_name)
+        if cacheable:
+          self._entity_cache.Set(service_name, cache_key, response)
+        return response
+
+    # These identify the call when it is retried.
+    MakeSoapRequest.service_name = service_name
+    MakeSoapRequest.method_name = method_name
     return MakeSoapRequest
 
+  def _GetSpanAttributes(self, args):
+    """Describes a call for its span.
+
+    Args:
+      args: The arguments of the call.
+
+    Returns:
+      A dictionary of span attributes.
+    """
+    attributes = dict(self._header_handler.GetTraceAttributes())
+    if self._version:
+      attributes['googleads.version'] = self._version
+    if args and isinstance(args[0], (list, tuple)):
+      attributes['googleads.operation_count'] = len(args[0])
+    return attributes
+
+  def _GetMetricsPlugin(self):
+    """Retrieves the suds plugin measuring this service's calls, adding it to
+    the client's options if it is missing.
+
+    Returns:
+      A googleads.metrics.MetricsPlugin.
+    """
+    # The plugin, and suds.plugin, are imported once calls are measured.
+    import googleads.metrics  # pylint: disable=g-import-not-at-top
+
+    plugins = self.suds_client.options.plugins
+    for plugin in plugins:
+      if isinstance(plugin, googleads.metrics.MetricsPlugin):
+        return plugin
+    plugin = googleads.metrics.MetricsPlugin()
+    self.suds_client.set_options(plugins=list(plugins) + [plugin])
+    return plugin
+
+  def Clone(self, suds_client=None, header_handler=None):
+    """Creates a proxy wrapping an independent copy of this service's client.
+
+    Suds clients are not thread safe, so each thread making requests to a
+    service needs its own client. The copy shares the parsed WSDL of the
+    original, so cloning is much cheaper than creating a new client.
+
+    Args:
+      [optional]
+      suds_client: A clone of this service's suds client to wrap instead of a
+          new one.
+      header_handler: A HeaderHandler to use instead of this service's.
+
+    Returns:
+      A new service proxy of the same type, using the same entity cache and, by
+      default, the same header handler.
+    """
+    if suds_client is None:
+      suds_client = self.suds_client.clone()
+    return self.__class__(suds_client, header_handler or self._header_handler,
+                          self._entity_cache, self._version)
+
 
 class HeaderHandler(object):
   """A generic header handler interface that must be subclassed by each API."""
@@ -304,3 +613,921 @@ class HeaderHandler(object):
   def SetHeaders(self, client):
     """Sets the SOAP and HTTP headers on the given suds client."""
     raise NotImplementedError('You must subclass HeaderHandler.')
+
+  def GetTraceAttributes(self):
+    """Describes the account requests are made for, in tracing spans.
+
+    Returns:
+      A dictionary of span attributes.
+    """
+    return {}
+
+  def ForClient(self, client):
+    """Creates a header handler setting the headers of another client.
+
+    Args:
+      client: A copy of the client this handler sets the headers of, such as
+          the client of a ClientLease.
+
+    Returns:
+      A HeaderHandler of the same type, reading the header values from client.
+    """
+    raise NotImplementedError('You must subclass HeaderHandler.')
+
+
+class ClientPool(object):
+  """Keeps warm service clients to hand out to short-lived tasks.
+
+  Creating a service parses its WSDL, which takes far longer than most of the
+  requests made by a web handler or task. A pool creates each service once per
+  set of credentials, version and service, and gives each lease its own clone
+  of the warm suds client, returning it to the pool when the lease is released.
+
+  Each lease has its own copy of the client, so header values such as the
+  client customer ID can be set for a lease without affecting other leases,
+  both in the services it leases and in those its copy creates directly.
+  Clients are pooled by their attributes, including their OAuth 2.0 client, so
+  requests should reuse OAuth 2.0 clients, as LoadFromStorage does, for their
+  clients to share services.
+  """
+
+  def __init__(self, max_idle_clients=8):
+    """Initializes a ClientPool.
+
+    Args:
+      [optional]
+      max_idle_clients: The number of idle suds clients kept for each service.
+          Clients returned to the pool beyond this number are discarded.
+    """
+    self._max_idle_clients = max_idle_clients
+    self._lock = threading.Lock()
+    # Maps the key of each service to the service proxy created for it, and to
+    # the list of idle clones of its suds client.
+    self._services = {}
+    self._idle_clients = collections.defaultdict(list)
+    self._stats = collections.Counter()
+    self._active_leases = 0
+    self._peak_active_leases = 0
+
+  def Lease(self, client, **header_values):
+    """Leases services for a client, with the given header values.
+
+    Args:
+      client: The AdWordsClient, DfpClient or DfaClient whose services are
+          leased.
+      **header_values: The values of the client's client_customer_id,
+          validate_only, partial_failure or network_code attributes to use for
+          this lease.
+
+    Returns:
+      A ClientLease, which can be used in a with statement to release it.
+
+    Raises:
+      GoogleAdsValueError: If a header value is not one of the client's lease
+          header attributes.
+    """
+    for name in header_values:
+      if name not in _LEASE_HEADER_ATTRIBUTES or not hasattr(client, name):
+        raise googleads.errors.GoogleAdsValueError(
+            'Header value %s cannot be set for a lease of a %s. Supported '
+            'values: %s' % (name, client.__class__.__name__, [
+                attribute for attribute in _LEASE_HEADER_ATTRIBUTES
+                if hasattr(client, attribute)]))
+
+    lease_client = copy.copy(client)
+    for name, value in header_values.iteritems():
+      setattr(lease_client, name, value)
+    # DfpClients and DfaClients hold a header handler bound to themselves, which
+    # the copy replaces with one bound to the copy, for the services and
+    # utilities it creates directly.
+    header_handler = getattr(client, '_header_handler', None)
+    if header_handler is not None:
+      # pylint: disable=protected-access
+      lease_client._header_handler = header_handler.ForClient(lease_client)
+    with self._lock:
+      self._stats['leases'] += 1
+      self._active_leases += 1
+      self._peak_active_leases = max(self._peak_active_leases,
+                                     self._active_leases)
+    return ClientLease(self, client, lease_client)
+
+  def GetStats(self):
+    """Reports the utilization of the pool.
+
+    Returns:
+      A dictionary containing the number of leases made (leases), currently
+      active (active_leases) and active at once at most (peak_active_leases),
+      the number of services created (services_created) and pooled
+      (services), the number of suds clients cloned for leases
+      (clients_cloned) and reused from the pool (clients_reused), and the
+      number of idle clients held (idle_clients).
+    """
+    with self._lock:
+      return {
+          'leases': self._stats['leases'],
+          'active_leases': self._active_leases,
+          'peak_active_leases': self._peak_active_leases,
+          'services_created': self._stats['services_created'],
+          'services': len(self._services),
+          'clients_cloned': self._stats['clients_cloned'],
+          'clients_reused': self._stats['clients_reused'],
+          'idle_clients': sum(len(clients)
+                              for clients in self._idle_clients.itervalues())
+      }
+
+  def Clear(self):
+    """Discards the pooled services and idle clients."""
+    with self._lock:
+      self._services.clear()
+      self._idle_clients.clear()
+
+  def _Acquire(self, client, lease_client, service_name, args, kwargs):
+    """Creates a service proxy for a lease from a pooled suds client.
+
+    Args:
+      client: The client the lease was made for.
+      lease_client: The lease's copy of the client.
+      service_name: A string identifying the service.
+      args: A tuple of the other positional arguments of the client's
+          GetService method.
+      kwargs: A dictionary of the other keyword arguments of the client's
+          GetService method.
+
+    Returns:
+      A tuple of the key of the service and the service proxy.
+    """
+    key = (_GetClientPoolKey(client), service_name, args,
+           tuple(sorted(kwargs.iteritems())))
+    with self._lock:
+      service = self._services.get(key)
+      idle_clients = self._idle_clients[key]
+      suds_client = idle_clients.pop() if idle_clients else None
+
+    if service is None:
+      # Creating a service is slow, so it is done without holding the lock. A
+      # service created concurrently for the same key is discarded.
+      created_service = client.GetService(service_name, *args, **kwargs)
+      with self._lock:
+        self._stats['services_created'] += 1
+        service = self._services.setdefault(key, created_service)
+
+    if suds_client is None:
+      suds_client = service.suds_client.clone()
+      with self._lock:
+        self._stats['clients_cloned'] += 1
+    else:
+      with self._lock:
+        self._stats['clients_reused'] += 1
+    header_handler = service._header_handler  # pylint: disable=protected-access
+    return key, service.Clone(suds_client,
+                              header_handler.ForClient(lease_client))
+
+  def _Return(self, key, service):
+    """Returns the suds client of a leased service to the pool."""
+    with self._lock:
+      idle_clients = self._idle_clients[key]
+      if key in self._services and len(idle_clients) < self._max_idle_clients:
+        idle_clients.append(service.suds_client)
+
+  def _EndLease(self):
+    with self._lock:
+      self._active_leases -= 1
+
+
+class ClientLease(object):
+  """Services leased from a ClientPool for a single task.
+
+  A lease is not thread safe; each thread should hold its own lease.
+
+  Attributes:
+    client: The lease's copy of the client, holding its header values.
+  """
+
+  def __init__(self, pool, client, lease_client):
+    """Initializes a ClientLease.
+
+    Args:
+      pool: The ClientPool the lease was made from.
+      client: The client the lease was made for.
+      lease_client: The lease's copy of the client.
+    """
+    self.client = lease_client
+    self._pool = pool
+    self._pooled_client = client
+    self._services = {}
+    self._released = False
+
+  def GetService(self, service_name, *args, **kwargs):
+    """Retrieves a service for this lease.
+
+    Args:
+      service_name: A string identifying the service.
+      *args: The other positional arguments of the client's GetService method,
+          such as the version.
+      **kwargs: The other keyword arguments of the client's GetService method.
+
+    Returns:
+      A service proxy of the same type the client's GetService method returns,
+      whose headers are set from this lease's client.
+
+    Raises:
+      GoogleAdsValueError: If the lease was released.
+    """
+    if self._released:
+      raise googleads.errors.GoogleAdsValueError(
+          'This lease has been released.')
+    service_key = (service_name, args, tuple(sorted(kwargs.iteritems())))
+    if service_key not in self._services:
+      acquire = self._pool._Acquire  # pylint: disable=protected-access
+      self._services[service_key] = acquire(
+          self._pooled_client, self.client, service_name, args, kwargs)
+    return self._services[service_key][1]
+
+  def Release(self):
+    """Returns the lease's services to the pool. Releasing twice is a no-op."""
+    if self._released:
+      return
+    self._released = True
+    for key, service in self._services.itervalues():
+      self._pool._Return(key, service)  # pylint: disable=protected-access
+    self._services.clear()
+    self._pool._EndLease()  # pylint: disable=protected-access
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.Release()
+
+
+def _GetClientPoolKey(client):
+  """Identifies the credentials and settings of a client in a ClientPool.
+
+  Args:
+    client: An AdWordsClient, DfpClient or DfaClient.
+
+  Returns:
+    A tuple of the client's class and its public attributes, other than those
+    set per lease.
+  """
+  return (client.__class__, tuple(sorted(
+      (name, value) for name, value in vars(client).iteritems()
+      if not name.startswith('_') and name not in _LEASE_HEADER_ATTRIBUTES)))
+
+
+class CallHook(object):
+  """Receives the measurements of the calls made by the library.
+
+  Hooks are registered with AddCallHook and notified of every SOAP call made by
+  a service proxy and every report download, from the thread making it. A
+  subclass only needs to override the methods it is interested in, and should
+  return quickly since it delays the call.
+  """
+
+  def BeforeCall(self, call):
+    """Called before a call is made.
+
+    Args:
+      call: The CallMetrics of the call, which are filled in as it progresses.
+    """
+
+  def AfterCall(self, call):
+    """Called once a call has completed or failed.
+
+    Args:
+      call: The CallMetrics of the call.
+    """
+
+  def OnRetry(self, service_name, method_name, reason):
+    """Called when a failed call is about to be retried.
+
+    Args:
+      service_name: A string identifying the service called.
+      method_name: A string identifying the method called.
+      reason: A string identifying the reason for the retry, such as the type of
+          the error which caused it.
+    """
+
+
+class CallMetrics(object):
+  """The measurements of a single call.
+
+  Attributes:
+    service_name: A string identifying the service called, such as
+        CampaignService or ReportDownloader.
+    method_name: A string identifying the method called.
+    start_time: The time at which the call started, in seconds since the epoch.
+    duration: The number of seconds the call took, once it has completed.
+    phases: A dictionary mapping the phases of the call, such as headers, pack,
+        serialize, network and parse, to the number of seconds spent in them.
+    request_bytes: The size of the request, or None if it is not known.
+    response_bytes: The size of the response, or None if it is not known.
+    fault_type: A string identifying the type of the error the call failed
+        with, or None if it succeeded.
+    cached: A boolean indicating whether the response came from a cache.
+  """
+
+  def __init__(self, service_name, method_name):
+    """Initializes a CallMetrics.
+
+    Args:
+      service_name: A string identifying the service called.
+      method_name: A string identifying the method called.
+    """
+    self.service_name = service_name
+    self.method_name = method_name
+    self.start_time = time.time()
+    self.duration = None
+    self.phases = {}
+    self.request_bytes = None
+    self.response_bytes = None
+    self.fault_type = None
+    self.cached = False
+
+  @contextlib.contextmanager
+  def Phase(self, name):
+    """Measures the time spent in a phase of the call.
+
+    Args:
+      name: A string identifying the phase.
+
+    Yields:
+      Nothing; the time spent in the body of the with statement is added to the
+      phase.
+    """
+    start_time = time.time()
+    try:
+      yield
+    finally:
+      self.phases[name] = self.phases.get(name, 0) + time.time() - start_time
+
+
+def AddCallHook(call_hook):
+  """Registers a CallHook to be notified of every call.
+
+  Args:
+    call_hook: The CallHook.
+  """
+  global _call_hooks
+  with _call_hooks_lock:
+    _call_hooks = _call_hooks + [call_hook]
+
+
+def RemoveCallHook(call_hook):
+  """Unregisters a CallHook registered with AddCallHook.
+
+  Args:
+    call_hook: The CallHook.
+  """
+  global _call_hooks
+  with _call_hooks_lock:
+    _call_hooks = [hook for hook in _call_hooks if hook is not call_hook]
+
+
+@contextlib.contextmanager
+def MeasureCall(service_name, method_name, attributes=None):
+  """Measures a call, notifying the registered CallHooks and tracing it.
+
+  Args:
+    service_name: A string identifying the service called.
+    method_name: A string identifying the method called.
+    [optional]
+    attributes: A dictionary of attributes describing the call, added to its
+        span.
+
+  Yields:
+    The CallMetrics of the call, to be filled in by the body of the with
+    statement. Its duration and fault type are set when the body completes.
+  """
+  call_hooks = _call_hooks
+  call = CallMetrics(service_name, method_name)
+  span_attributes = {'googleads.service': service_name,
+                     'googleads.method': method_name}
+  span_attributes.update(attributes or {})
+  with StartSpan('%s.%s' % (service_name, method_name),
+                 span_attributes) as span:
+    for call_hook in call_hooks:
+      call_hook.BeforeCall(call)
+    try:
+      yield call
+    except Exception, e:
+      call.fault_type = _GetFaultType(e)
+      raise
+    finally:
+      call.duration = time.time() - call.start_time
+      for call_hook in call_hooks:
+        call_hook.AfterCall(call)
+      if call.request_bytes is not None:
+        span.SetAttribute('googleads.request_bytes', call.request_bytes)
+      if call.response_bytes is not None:
+        span.SetAttribute('googleads.response_bytes', call.response_bytes)
+      if call.cached:
+        span.SetAttribute('googleads.cached', True)
+
+
+def RecordRetry(service_name, method_name, reason):
+  """Notifies the registered CallHooks that a call is about to be retried.
+
+  Args:
+    service_name: A string identifying the service called.
+    method_name: A string identifying the method called.
+    reason: A string identifying the reason for the retry.
+  """
+  for call_hook in _call_hooks:
+    call_hook.OnRetry(service_name, method_name, reason)
+
+
+class Span(object):
+  """An operation in a trace, in the style of an OpenTelemetry span.
+
+  Attributes:
+    name: A string identifying the operation, such as CampaignService.get.
+    trace_id: A string of 32 hexadecimal digits identifying the trace.
+    span_id: A string of 16 hexadecimal digits identifying the span.
+    parent_span_id: The span_id of the span this span is in, or None.
+    start_time: The time at which the operation started, in seconds since the
+        epoch.
+    end_time: The time at which the operation ended, or None while it runs.
+    attributes: A dictionary describing the operation.
+    status: 'OK', or 'ERROR' if the operation raised an exception.
+    status_message: A string identifying the type of the error the operation
+        failed with, or None.
+  """
+
+  def __init__(self, name, parent=None, attributes=None):
+    """Initializes a Span.
+
+    Args:
+      name: A string identifying the operation.
+      [optional]
+      parent: The Span this span is in, or None to start a new trace.
+      attributes: A dictionary describing the operation.
+    """
+    self.name = name
+    self.trace_id = (parent.trace_id if parent
+                     else '%032x' % random.getrandbits(128))
+    self.span_id = '%016x' % random.getrandbits(64)
+    self.parent_span_id = parent.span_id if parent else None
+    self.start_time = time.time()
+    self.end_time = None
+    self.attributes = dict(attributes or {})
+    self.status = 'OK'
+    self.status_message = None
+
+  def SetAttribute(self, key, value):
+    """Adds an attribute to the span, replacing any of the same key."""
+    self.attributes[key] = value
+
+
+class _NoOpSpan(object):
+  """Stands in for a Span when no SpanExporter is registered."""
+
+  def SetAttribute(self, key, value):
+    pass
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+class SpanExporter(object):
+  """A generic span exporter interface that must be subclassed.
+
+  Exporters are registered with AddSpanExporter, and can forward spans to a
+  tracing system such as OpenTelemetry.
+  """
+
+  def Export(self, span):
+    """Called with each span when it ends, from the thread which ran it."""
+    raise NotImplementedError('You must subclass SpanExporter.')
+
+
+class InMemorySpanExporter(SpanExporter):
+  """A SpanExporter keeping the finished spans in a list, for tests."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._spans = []
+
+  def Export(self, span):
+    with self._lock:
+      self._spans.append(span)
+
+  def GetFinishedSpans(self):
+    """Retrieves the spans exported so far, in the order they ended."""
+    with self._lock:
+      return list(self._spans)
+
+  def Clear(self):
+    """Discards the spans exported so far."""
+    with self._lock:
+      del self._spans[:]
+
+
+def AddSpanExporter(span_exporter):
+  """Registers a SpanExporter, enabling tracing.
+
+  Args:
+    span_exporter: The SpanExporter.
+  """
+  global _span_exporters
+  with _call_hooks_lock:
+    _span_exporters = _span_exporters + [span_exporter]
+
+
+def RemoveSpanExporter(span_exporter):
+  """Unregisters a SpanExporter registered with AddSpanExporter.
+
+  Args:
+    span_exporter: The SpanExporter.
+  """
+  global _span_exporters
+  with _call_hooks_lock:
+    _span_exporters = [exporter for exporter in _span_exporters
+                       if exporter is not span_exporter]
+
+
+def GetCurrentSpan():
+  """Retrieves the span the current thread is in, or None."""
+  return getattr(_trace_context, 'span', None)
+
+
+@contextlib.contextmanager
+def StartSpan(name, attributes=None):
+  """Runs the body of a with statement in a new span.
+
+  The span is a child of the current thread's span, and becomes the current
+  span until the body completes. Nothing is recorded unless a SpanExporter is
+  registered.
+
+  Args:
+    name: A string identifying the operation.
+    [optional]
+    attributes: A dictionary describing the operation.
+
+  Yields:
+    The Span, to which more attributes can be added.
+  """
+  span_exporters = _span_exporters
+  if not span_exporters:
+    yield _NO_OP_SPAN
+    return
+
+  parent = GetCurrentSpan()
+  span = Span(name, parent, attributes)
+  _trace_context.span = span
+  try:
+    yield span
+  except Exception, e:
+    span.status = 'ERROR'
+    span.status_message = _GetFaultType(e)
+    raise
+  finally:
+    _trace_context.span = parent
+    span.end_time = time.time()
+    for span_exporter in span_exporters:
+      span_exporter.Export(span)
+
+
+def BindCurrentSpan(function):
+  """Binds a function to the current span, for calling from other threads.
+
+  Args:
+    function: A callable.
+
+  Returns:
+    A callable which calls function in the span that was current when it was
+    bound, so that spans started by function belong to the same trace.
+  """
+  span = GetCurrentSpan()
+
+  def CallInSpan(*args, **kwargs):
+    previous_span = GetCurrentSpan()
+    _trace_context.span = span
+    try:
+      return function(*args, **kwargs)
+    finally:
+      _trace_context.span = previous_span
+
+  return CallInSpan
+
+
+def GetFaultErrors(web_fault):
+  """Retrieves the ApiErrors of an ApiException raised as a suds.WebFault.
+
+  Args:
+    web_fault: The suds.WebFault raised by a request.
+
+  Returns:
+    A list of ApiErrors, which is empty if the fault was not an ApiException.
+  """
+  detail = getattr(web_fault.fault, 'detail', None)
+  api_exception = getattr(detail, 'ApiExceptionFault', None)
+  errors = getattr(api_exception, 'errors', None) or []
+  return errors if isinstance(errors, list) else [errors]
+
+
+def _GetFaultType(error):
+  """Identifies the type of the error a call failed with.
+
+  Args:
+    error: The exception raised by the call.
+
+  Returns:
+    The type of the first ApiError of an ApiException raised as a suds.WebFault,
+    and otherwise the name of the exception's class.
+  """
+  if isinstance(error, suds.WebFault):
+    errors = GetFaultErrors(error)
+    if errors:
+      return getattr(errors[0], 'ApiError.Type', None) or (
+          errors[0].__class__.__name__)
+  return error.__class__.__name__
+
+
+class ReportCache(object):
+  """A size bounded, on-disk cache of downloaded report contents.
+
+  Entries are stored as individual files in a directory, so a cache directory
+  can be shared by several processes. Each entry expires after a time to live,
+  which is shorter for reports whose date range includes today because their
+  contents are still changing. Once the cache grows beyond its maximum size, the
+  least recently used entries are removed.
+
+  Attributes:
+    directory: A string identifying the directory the cache is stored in.
+    max_size: The maximum total size of the cache in bytes.
+    ttl: The number of seconds a report is cached for.
+    today_ttl: The number of seconds a report whose date range includes today is
+        cached for. If this is not positive, such reports are not cached.
+  """
+
+  # The suffix of the files which contain cache entries.
+  _ENTRY_SUFFIX = '.report'
+  # The number of bytes copied into the cache at a time.
+  _CHUNK_SIZE = 16 * 1024
+
+  def __init__(self, directory, max_size=1024 * 1024 * 1024, ttl=24 * 60 * 60,
+               today_ttl=15 * 60):
+    """Initializes a ReportCache.
+
+    Args:
+      directory: A string identifying the directory to store the cache in. It is
+          created if it does not exist.
+      [optional]
+      max_size: The maximum total size of the cache in bytes.
+      ttl: The number of seconds a report is cached for.
+      today_ttl: The number of seconds a report whose date range includes today
+          is cached for.
+    """
+    self.directory = os.path.expanduser(directory)
+    self.max_size = max_size
+    self.ttl = ttl
+    self.today_ttl = today_ttl
+    if not os.path.isdir(self.directory):
+      os.makedirs(self.directory)
+
+  @staticmethod
+  def MakeKey(*parts):
+    """Creates a cache key identifying a report.
+
+    Args:
+      *parts: The values which together identify the report, for example the
+          endpoint, customer ID and report definition. Dictionaries, lists and
+          suds objects are normalized so that equal values give equal keys
+          regardless of their ordering or type.
+
+    Returns:
+      A string which can be used as a key for this cache.
+    """
+    return hashlib.sha1(repr(_NormalizeForCacheKey(parts))).hexdigest()
+
+  def Get(self, key):
+    """Retrieves a report from the cache.
+
+    Args:
+      key: A string created by MakeKey identifying the report.
+
+    Returns:
+      A file-like object, open for reading, containing the cached report or None
+      if the report is not cached or has expired. The caller must close it.
+    """
+    path = self._GetPath(key)
+    try:
+      handle = open(path, 'rb')
+    except IOError:
+      return None
+
+    try:
+      expiration = float(handle.readline())
+    except ValueError:
+      expiration = 0
+    if expiration <= time.time():
+      handle.close()
+      self._Remove(path)
+      return None
+
+    # Touching the entry marks it as recently used.
+    try:
+      os.utime(path, None)
+    except OSError:
+      pass
+    return handle
+
+  def Set(self, key, contents, includes_today=False):
+    """Stores a report in the cache.
+
+    Args:
+      key: A string created by MakeKey identifying the report.
+      contents: The report, either as a string or as a file-like object which
+          will be read until exhausted.
+      [optional]
+      includes_today: A boolean indicating whether the report's date range
+          includes today, in which case it is cached for today_ttl seconds.
+
+    Returns:
+      A file-like object, open for reading, containing the stored report. The
+      caller must close it.
+    """
+    ttl = self.today_ttl if includes_today else self.ttl
+    handle = tempfile.NamedTemporaryFile(dir=self.directory, delete=False)
+    try:
+      handle.write('%f\n' % (time.time() + max(ttl, 0)))
+      if hasattr(contents, 'read'):
+        while True:
+          chunk = contents.read(self._CHUNK_SIZE)
+          if not chunk: break
+          handle.write(chunk)
+      else:
+        handle.write(contents)
+    finally:
+      handle.close()
+
+    # Entries which expire immediately are still handed back to the caller,
+    # but under a name which is never looked up.
+    path = self._GetPath(key) if ttl > 0 else handle.name
+    try:
+      os.rename(handle.name, path)
+    except OSError:
+      # Windows does not allow renaming onto an existing file.
+      self._Remove(path)
+      os.rename(handle.name, path)
+
+    stored = open(path, 'rb')
+    stored.readline()
+    if ttl <= 0:
+      self._Remove(path)
+    self._Evict()
+    return stored
+
+  def Clear(self):
+    """Removes every report from the cache."""
+    for name in os.listdir(self.directory):
+      self._Remove(os.path.join(self.directory, name))
+
+  def _GetPath(self, key):
+    """Returns the path of the file storing the entry with the given key."""
+    return os.path.join(self.directory, key + self._ENTRY_SUFFIX)
+
+  def _Evict(self):
+    """Removes the least recently used entries until the cache fits."""
+    entries = []
+    total_size = 0
+    for name in os.listdir(self.directory):
+      if not name.endswith(self._ENTRY_SUFFIX): continue
+      path = os.path.join(self.directory, name)
+      try:
+        stat = os.stat(path)
+      except OSError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+      total_size += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+      if total_size <= self.max_size: break
+      self._Remove(path)
+      total_size -= size
+
+  def _Remove(self, path):
+    """Removes a file, ignoring errors if it was already removed."""
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+
+class EntityCache(object):
+  """An in-memory, thread safe cache of the responses of service get calls.
+
+  Responses are grouped by the name of the service which returned them, so that
+  all of a service's responses can be invalidated once its entities are known to
+  have changed. Each response expires after the time to live of its service, and
+  the least recently used responses are removed once the cache holds
+  max_entries responses.
+
+  Each caller is given its own copy of a cached response, so a response may be
+  modified, such as to mutate the entities it holds, without changing what
+  later callers are given.
+  """
+
+  def __init__(self, ttl=3600, service_ttls=None, max_entries=10000):
+    """Initializes an EntityCache.
+
+    Args:
+      [optional]
+      ttl: The number of seconds a response is cached for.
+      service_ttls: A dictionary mapping service names to the number of seconds
+          their responses are cached for, overriding ttl.
+      max_entries: The maximum number of responses cached.
+    """
+    self.ttl = ttl
+    self.service_ttls = service_ttls or {}
+    self.max_entries = max_entries
+    # Maps each cache key to a tuple of the service name, expiry time and
+    # response, from the least to the most recently used.
+    self._entries = collections.OrderedDict()
+    self._keys_by_service = {}
+    self._lock = threading.Lock()
+
+  def Get(self, service_name, key):
+    """Retrieves a cached response.
+
+    Args:
+      service_name: A string identifying the service the response belongs to.
+      key: A string identifying the request.
+
+    Returns:
+      A copy of the cached response, or None if there is no fresh response for
+      the key.
+    """
+    with self._lock:
+      entry = self._entries.pop(key, None)
+      if entry is None:
+        return None
+      if entry[1] <= time.time():
+        self._keys_by_service[service_name].discard(key)
+        return None
+      self._entries[key] = entry
+    return copy.deepcopy(entry[2])
+
+  def Set(self, service_name, key, response):
+    """Caches a response.
+
+    Args:
+      service_name: A string identifying the service the response belongs to.
+      key: A string identifying the request.
+      response: The response to cache. None is never cached. A copy is cached,
+          so the caller may go on to modify the response.
+    """
+    ttl = self.service_ttls.get(service_name, self.ttl)
+    if response is None or ttl <= 0:
+      return
+    response = copy.deepcopy(response)
+    with self._lock:
+      self._entries.pop(key, None)
+      self._entries[key] = (service_name, time.time() + ttl, response)
+      self._keys_by_service.setdefault(service_name, set()).add(key)
+      while len(self._entries) > self.max_entries:
+        evicted_key, (evicted_service_name, _, _) = self._entries.popitem(
+            last=False)
+        self._keys_by_service[evicted_service_name].discard(evicted_key)
+
+  def Invalidate(self, service_name):
+    """Removes all cached responses of a service.
+
+    Args:
+      service_name: A string identifying the service.
+    """
+    with self._lock:
+      for key in self._keys_by_service.pop(service_name, ()):
+        self._entries.pop(key, None)
+
+  def Clear(self):
+    """Removes all cached responses."""
+    with self._lock:
+      self._entries.clear()
+      self._keys_by_service.clear()
+
+
+def _NormalizeForCacheKey(obj):
+  """Converts a value into a canonical form suitable for building cache keys.
+
+  Args:
+    obj: The value to normalize. This may be a dictionary, list, tuple, suds
+        object or scalar, arbitrarily nested.
+
+  Returns:
+    A structure of tuples and strings which compares equal for equal inputs.
+  """
+  if isinstance(obj, dict):
+    return tuple(sorted((str(key), _NormalizeForCacheKey(value))
+                        for key, value in obj.iteritems()))
+  elif isinstance(obj, (list, tuple)):
+    return tuple(_NormalizeForCacheKey(item) for item in obj)
+  elif hasattr(obj, '__keylist__'):
+    return tuple(sorted((str(key), _NormalizeForCacheKey(value))
+                        for key, value in obj if value is not None))
+  elif isinstance(obj, unicode):
+    return obj.encode('utf-8')
+  else:
+    return str(obj)
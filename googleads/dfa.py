@@ -16,12 +16,7 @@
 
 __author__ = 'Joseph DiLallo'
 
-import os
-
-import suds.client
-import suds.sax.element
-import suds.transport
-import suds.wsse
+import sys
 
 import googleads.common
 import googleads.errors
@@ -69,6 +64,9 @@ class DfaClient(object):
     Args:
       [optional]
       path: The path string to the file containing cached DFA data.
+          Defaults to the GOOGLEADS_CONFIG environment variable, which may
+          hold a JSON document or a path, and otherwise to googleads.yaml in
+          your home directory.
 
     Returns:
       A DfaClient initialized with the values cached in the file.
@@ -78,9 +76,6 @@ class DfaClient(object):
       information necessary to instantiate a client object - either a
       required key was missing or an OAuth 2.0 key was missing.
     """
-    if path is None:
-      path = os.path.join(os.path.expanduser('~'), 'googleads.yaml')
-
     return cls(**googleads.common.LoadFromStorage(
         path, cls._YAML_KEY, cls._REQUIRED_INIT_VALUES,
         cls._OPTIONAL_INIT_VALUES))
@@ -102,7 +97,8 @@ class DfaClient(object):
       [optional]
       https_proxy: A string identifying the proxy that all HTTPS requests
           should be routed through.
-      cache: A subclass of suds.cache.Cache; defaults to None.
+      cache: A subclass of suds.cache.Cache, such as one of googleads.cache;
+          defaults to None.
     """
     self.username = username
     self.oauth2_client = oauth2_client
@@ -131,6 +127,9 @@ class DfaClient(object):
     Raises:
       A GoogleAdsValueError if the service or version provided do not exist.
     """
+    import suds.client  # pylint: disable=g-import-not-at-top
+    import suds.transport  # pylint: disable=g-import-not-at-top
+
     server = server[:-1] if server[-1] == '/' else server
     try:
       proxy_option = None
@@ -141,7 +140,8 @@ class DfaClient(object):
 
       client = suds.client.Client(
           self._SOAP_SERVICE_FORMAT % (server, version, service_name),
-          proxy=proxy_option, cache=self.cache, timeout=3600)
+          proxy=proxy_option, cache=self.cache,
+          cachingpolicy=getattr(self.cache, 'caching_policy', 0), timeout=3600)
     except suds.transport.TransportError:
       if version in self._SERVICE_MAP:
         if service_name in self._SERVICE_MAP[version]:
@@ -156,7 +156,31 @@ class DfaClient(object):
             'Unrecognized version of the DFA API. Version given: %s Supported '
             'versions: %s' % (version, self._SERVICE_MAP.keys()))
 
-    return googleads.common.SudsServiceProxy(client, self._header_handler)
+    return googleads.common.SudsServiceProxy(client, self._header_handler,
+                                             version=version)
+
+  def Profile(self, output=sys.stderr, memory=True):
+    """Profiles the calls made within a with statement.
+
+    This is a convenience method. It is functionally identical to calling
+    googleads.profiling.ProfileSession(output, memory). Calls made by every
+    client in this process while the with statement runs are profiled, and
+    aggregated per service method.
+
+    Args:
+      [optional]
+      output: A file-like object the report of where the time and memory of the
+          calls went is written to when the with statement exits, or None to not
+          write it.
+      memory: A boolean indicating whether to record allocation snapshots. This
+          requires the tracemalloc module.
+
+    Returns:
+      A context manager yielding the googleads.profiling.SessionProfiler
+      profiling the calls.
+    """
+    import googleads.profiling  # pylint: disable=g-import-not-at-top
+    return googleads.profiling.ProfileSession(output, memory)
 
 
 class _DfaHeaderHandler(googleads.common.HeaderHandler):
@@ -177,6 +201,9 @@ class _DfaHeaderHandler(googleads.common.HeaderHandler):
 
   def SetHeaders(self, suds_client):
     """Sets the SOAP and HTTP headers on the given suds client."""
+    import suds.sax.element  # pylint: disable=g-import-not-at-top
+    import suds.wsse  # pylint: disable=g-import-not-at-top
+
     wsse_header = suds.wsse.Security()
     wsse_header.tokens.append(
         suds.wsse.UsernameToken(self._dfa_client.username))
@@ -188,3 +215,7 @@ class _DfaHeaderHandler(googleads.common.HeaderHandler):
     suds_client.set_options(
         wsse=wsse_header, soapheaders=request_header,
         headers=self._dfa_client.oauth2_client.CreateHttpHeader())
+
+  def ForClient(self, client):
+    """Creates a header handler setting the headers of a copy of the client."""
+    return _DfaHeaderHandler(client)
@@ -16,16 +16,25 @@
 
 __author__ = 'Joseph DiLallo'
 
+import array
+import codecs
+import collections
 import csv
 import datetime
+import heapq
+import json
 import logging
+import mmap
 import os
+import Queue
+import re
+import struct
+import sys
+import tempfile
+import threading
 import time
 import urllib2
-
-import pytz
-import suds.client
-import suds.transport
+import zlib
 
 import googleads.common
 import googleads.errors
@@ -38,6 +47,71 @@ DEFAULT_ENDPOINT = 'https://ads.google.com'
 SUGGESTED_PAGE_LIMIT = 500
 # The chunk size used for report downloads.
 _CHUNK_SIZE = 16 * 1024
+# The delimiters used by the report export formats that can be parsed into rows.
+_REPORT_ROW_DELIMITERS = {'CSV_DUMP': ',', 'CSV_EXCEL': ',', 'TSV': '\t',
+                          'TSV_EXCEL': '\t'}
+# The prefix of the report column headers which contain metrics.
+_REPORT_METRIC_PREFIX = 'Column.'
+# The pattern of date values in reports.
+_REPORT_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+# The report date range types which only cover days before today.
+_PAST_DATE_RANGE_TYPES = ('YESTERDAY', 'LAST_WEEK', 'LAST_MONTH',
+                          'LAST_3_MONTHS')
+# The magic number at the start of gzip compressed data.
+_GZIP_MAGIC_NUMBER = '\x1f\x8b'
+# The number of seconds to wait before the second status check of a report job.
+_REPORT_POLL_INITIAL_INTERVAL = 1
+# The maximum number of seconds to wait between status checks of a report job.
+_REPORT_POLL_MAX_INTERVAL = 30
+# The factor by which the wait between status checks grows after each check.
+_REPORT_POLL_BACKOFF_FACTOR = 2
+# The number of seconds by which change checks overlap, allowing for clock skew.
+_CHANGE_CHECK_OVERLAP = 60
+# The services whose entities have a lastModifiedDateTime, mapped to the method
+# returning their entities by statement.
+_LAST_MODIFIED_SERVICE_METHODS = {
+    'CreativeService': 'getCreativesByStatement',
+    'InventoryService': 'getAdUnitsByStatement',
+    'LineItemService': 'getLineItemsByStatement',
+    'OrderService': 'getOrdersByStatement',
+}
+# The entity types DfpIncrementalSync can store, in the order they are
+# synchronized, mapped to the service and method returning them by statement and
+# the field holding the ID of their parent.
+_INCREMENTAL_SYNC_TYPES = collections.OrderedDict([
+    ('Order', ('OrderService', 'getOrdersByStatement', None)),
+    ('LineItem', ('LineItemService', 'getLineItemsByStatement', 'orderId')),
+    ('Creative', ('CreativeService', 'getCreativesByStatement', None)),
+    ('AdUnit', ('InventoryService', 'getAdUnitsByStatement', 'parentId')),
+    ('CustomTargetingKey', ('CustomTargetingService',
+                            'getCustomTargetingKeysByStatement', None)),
+    ('CustomTargetingValue', ('CustomTargetingService',
+                              'getCustomTargetingValuesByStatement',
+                              'customTargetingKeyId')),
+])
+# The entity types which have no lastModifiedDateTime, so DfpIncrementalSync
+# retrieves all of them on every synchronization.
+_FULL_REFRESH_TYPES = ('CustomTargetingKey', 'CustomTargetingValue')
+# The maximum number of custom targeting key IDs listed in each statement for
+# their values.
+_MAX_STATEMENT_IDS = 500
+# The maximum number of pages of a statement's results requested at once.
+_MAX_PARALLEL_PAGES = 4
+# The format in which DfpIncrementalSync stores its watermarks, in UTC.
+_WATERMARK_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# The PQL query retrieving the locations put into a LocationIndex.
+_GEO_TARGET_QUERY = ('SELECT Id, Name, CanonicalParentId, Type FROM Geo_Target '
+                     'WHERE Targetable = true')
+# The magic number at the start of CustomTargetingIndex files.
+_CUSTOM_TARGETING_INDEX_MAGIC = 'GACTI001'
+# The header of CustomTargetingIndex files: the number of values and the sizes
+# of the JSON encoded keys and of the value names.
+_CUSTOM_TARGETING_INDEX_HEADER = struct.Struct('<QQQ')
+# A custom targeting value in a CustomTargetingIndex file: its key ID, its ID
+# and the offset and size of its name.
+_CUSTOM_TARGETING_VALUE_RECORD = struct.Struct('<qqQI')
+# A reference from the list of values sorted by ID to a value record.
+_CUSTOM_TARGETING_ID_RECORD = struct.Struct('<I')
 # A giant dictionary of DFP versions and the services they support.
 _SERVICE_MAP = {
     'v201403':
@@ -191,6 +265,9 @@ class DfpClient(object):
     Args:
       [optional]
       path: str The path to the file containing cached DFP data.
+          Defaults to the GOOGLEADS_CONFIG environment variable, which may
+          hold a JSON document or a path, and otherwise to googleads.yaml in
+          your home directory.
 
     Returns:
       A DfpClient initialized with the values cached in the file.
@@ -200,9 +277,6 @@ class DfpClient(object):
       information necessary to instantiate a client object - either a
       required key was missing or an OAuth 2.0 key was missing.
     """
-    if path is None:
-      path = os.path.join(os.path.expanduser('~'), 'googleads.yaml')
-
     return cls(**googleads.common.LoadFromStorage(
         path, cls._YAML_KEY, cls._REQUIRED_INIT_VALUES,
         cls._OPTIONAL_INIT_VALUES))
@@ -225,7 +299,8 @@ class DfpClient(object):
           calls require this header to be set.
       https_proxy: A string identifying the proxy that all HTTPS requests
           should be routed through.
-      cache: A subclass of suds.cache.Cache; defaults to None.
+      cache: A subclass of suds.cache.Cache, such as one of googleads.cache;
+          defaults to None.
     """
     if application_name is DEFAULT_APPLICATION_NAME:
       raise googleads.errors.GoogleAdsValueError(
@@ -240,7 +315,7 @@ class DfpClient(object):
     self._header_handler = _DfpHeaderHandler(self)
 
   def GetService(self, service_name, version=sorted(_SERVICE_MAP.keys())[-1],
-                 server=DEFAULT_ENDPOINT):
+                 server=DEFAULT_ENDPOINT, entity_cache=None):
     """Creates a service client for the given service.
 
     Args:
@@ -251,6 +326,8 @@ class DfpClient(object):
           to what is currently the latest version. This will be updated in
           future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the DFP API.
+      entity_cache: A googleads.common.EntityCache used to serve repeated get
+          and get*ByStatement calls without contacting the API.
 
     Returns:
       A suds.client.ServiceSelector which has the headers and proxy configured
@@ -259,6 +336,11 @@ class DfpClient(object):
     Raises:
       A GoogleAdsValueError if the service or version provided do not exist.
     """
+    # suds.client is imported with the first service rather than the library,
+    # since importing it takes longer than the rest of the library.
+    import suds.client  # pylint: disable=g-import-not-at-top
+    import suds.transport  # pylint: disable=g-import-not-at-top
+
     server = server[:-1] if server[-1] == '/' else server
     try:
       proxy_option = None
@@ -269,7 +351,8 @@ class DfpClient(object):
 
       client = suds.client.Client(
           self._SOAP_SERVICE_FORMAT % (server, version, service_name),
-          proxy=proxy_option, cache=self.cache, timeout=3600)
+          proxy=proxy_option, cache=self.cache,
+          cachingpolicy=getattr(self.cache, 'caching_policy', 0), timeout=3600)
     except suds.transport.TransportError:
       if version in _SERVICE_MAP:
         if service_name in _SERVICE_MAP[version]:
@@ -284,14 +367,15 @@ class DfpClient(object):
             'Unrecognized version of the DFP API. Version given: %s Supported '
             'versions: %s' % (version, _SERVICE_MAP.keys()))
 
-    return googleads.common.SudsServiceProxy(client, self._header_handler)
+    return googleads.common.SudsServiceProxy(client, self._header_handler,
+                                             entity_cache, version)
 
   def GetDataDownloader(self, version=sorted(_SERVICE_MAP.keys())[-1],
-                        server=DEFAULT_ENDPOINT):
+                        server=DEFAULT_ENDPOINT, report_cache=None):
     """Creates a downloader for DFP reports and PQL result sets.
 
     This is a convenience method. It is functionally identical to calling
-    DataDownloader(dfp_client, version, server)
+    DataDownloader(dfp_client, version, server, report_cache)
 
     Args:
       [optional]
@@ -299,11 +383,36 @@ class DfpClient(object):
           to what is currently the latest version. This will be updated in
           future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the DFP API.
+      report_cache: A googleads.common.ReportCache used to serve repeated
+          report jobs and downloads without contacting the API.
 
     Returns:
       A DataDownloader tied to this DfpClient, ready to download reports.
     """
-    return DataDownloader(self, version, server)
+    return DataDownloader(self, version, server, report_cache)
+
+  def Profile(self, output=sys.stderr, memory=True):
+    """Profiles the calls made within a with statement.
+
+    This is a convenience method. It is functionally identical to calling
+    googleads.profiling.ProfileSession(output, memory). Calls made by every
+    client in this process while the with statement runs are profiled, and
+    aggregated per service method.
+
+    Args:
+      [optional]
+      output: A file-like object the report of where the time and memory of the
+          calls went is written to when the with statement exits, or None to not
+          write it.
+      memory: A boolean indicating whether to record allocation snapshots. This
+          requires the tracemalloc module.
+
+    Returns:
+      A context manager yielding the googleads.profiling.SessionProfiler
+      profiling the calls.
+    """
+    import googleads.profiling  # pylint: disable=g-import-not-at-top
+    return googleads.profiling.ProfileSession(output, memory)
 
 
 class _DfpHeaderHandler(googleads.common.HeaderHandler):
@@ -335,6 +444,14 @@ class _DfpHeaderHandler(googleads.common.HeaderHandler):
         soapheaders=header,
         headers=self._dfp_client.oauth2_client.CreateHttpHeader())
 
+  def GetTraceAttributes(self):
+    """Describes the network requests are made for, in tracing spans."""
+    return {'googleads.network_code': self._dfp_client.network_code}
+
+  def ForClient(self, client):
+    """Creates a header handler setting the headers of a copy of the client."""
+    return _DfpHeaderHandler(client)
+
 
 class FilterStatement(object):
   """A statement object for PQL and get*ByStatement queries.
@@ -358,11 +475,895 @@ class FilterStatement(object):
             'values': self.values}
 
 
+class LastModifiedInvalidator(object):
+  """Invalidates cached get responses of entities modified since the last check.
+
+  Each call to Check asks every watched service whether any of its entities has
+  a lastModifiedDateTime after the previous check, and invalidates the cached
+  responses of the services which have such entities. The first check covers
+  changes since the invalidator was created, so it should be created before
+  responses are cached. Services whose entities have no lastModifiedDateTime,
+  such as CustomTargetingService, are refreshed by their cache time to live.
+  """
+
+  def __init__(self, dfp_client, entity_cache, service_methods=None,
+               version=sorted(_SERVICE_MAP.keys())[-1],
+               server=DEFAULT_ENDPOINT):
+    """Initializes a LastModifiedInvalidator.
+
+    Args:
+      dfp_client: The DfpClient used to check for modified entities.
+      entity_cache: The googleads.common.EntityCache to invalidate.
+      [optional]
+      service_methods: A dictionary mapping the names of the services to watch
+          to the names of their get*ByStatement methods. Defaults to
+          _LAST_MODIFIED_SERVICE_METHODS.
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+    """
+    self._dfp_client = dfp_client
+    self._entity_cache = entity_cache
+    self._service_methods = dict(service_methods or
+                                 _LAST_MODIFIED_SERVICE_METHODS)
+    self._version = version
+    self._server = server
+    self._services = {}
+    self._last_check_time = datetime.datetime.utcnow()
+
+  def Check(self):
+    """Invalidates the cached responses of services whose entities changed.
+
+    Returns:
+      A set of the names of the invalidated services.
+    """
+    check_time = datetime.datetime.utcnow()
+    since = self._last_check_time - datetime.timedelta(
+        seconds=_CHANGE_CHECK_OVERLAP)
+    statement = FilterStatement(
+        'WHERE lastModifiedDateTime > :since',
+        [{'key': 'since',
+          'value': {'xsi_type': 'DateTimeValue',
+                    'value': _ToDfpDateTime(since)}}], 1)
+
+    changed_services = set()
+    for service_name, method_name in self._service_methods.iteritems():
+      if service_name not in self._services:
+        # This service is not given the entity cache, so that its checks are
+        # never served from it.
+        self._services[service_name] = self._dfp_client.GetService(
+            service_name, self._version, self._server)
+      page = getattr(self._services[service_name], method_name)(
+          statement.ToStatement())
+      if 'results' in page and page['results']:
+        changed_services.add(service_name)
+        self._entity_cache.Invalidate(service_name)
+
+    self._last_check_time = check_time
+    return changed_services
+
+
+class DfpIncrementalSync(object):
+  """Keeps a local replica of a network's entities up to date.
+
+  For each entity type, a watermark records the latest lastModifiedDateTime
+  seen. Each synchronization retrieves only the entities modified after the
+  watermark, less an overlap window which allows for clock skew and for changes
+  committed while the previous synchronization was running. The first
+  synchronization of a type retrieves all of its entities. Custom targeting keys
+  and values have no lastModifiedDateTime, so they are retrieved in full every
+  time, and stored values replace those stored before.
+
+  Entities are stored in a googleads.store.EntityStore under the network code,
+  with the entity type names used as keys of _INCREMENTAL_SYNC_TYPES. Line items
+  have their order as parent, ad units their parent ad unit and custom targeting
+  values their key. The pages of each statement after the first are requested
+  concurrently.
+  """
+
+  def __init__(self, dfp_client, entity_store, entity_types=None,
+               version=sorted(_SERVICE_MAP.keys())[-1],
+               server=DEFAULT_ENDPOINT, overlap=_CHANGE_CHECK_OVERLAP,
+               max_parallel=_MAX_PARALLEL_PAGES):
+    """Initializes a DfpIncrementalSync.
+
+    Args:
+      dfp_client: The DfpClient used to retrieve the entities of its network.
+      entity_store: The googleads.store.EntityStore the entities are stored in.
+      [optional]
+      entity_types: An iterable of the entity types to synchronize. Defaults to
+          all the types in _INCREMENTAL_SYNC_TYPES. Synchronizing custom
+          targeting values also synchronizes their keys.
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      overlap: The number of seconds before each watermark from which modified
+          entities are retrieved again.
+      max_parallel: The maximum number of pages requested at once.
+
+    Raises:
+      GoogleAdsValueError: If an entity type is not supported.
+    """
+    entity_types = set(entity_types or _INCREMENTAL_SYNC_TYPES)
+    unsupported_types = entity_types - set(_INCREMENTAL_SYNC_TYPES)
+    if unsupported_types:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unsupported entity types: %s. Supported types: %s'
+          % (sorted(unsupported_types), _INCREMENTAL_SYNC_TYPES.keys()))
+    if 'CustomTargetingValue' in entity_types:
+      entity_types.add('CustomTargetingKey')
+
+    self._dfp_client = dfp_client
+    self._entity_store = entity_store
+    self._entity_types = [entity_type for entity_type in _INCREMENTAL_SYNC_TYPES
+                          if entity_type in entity_types]
+    self._version = version
+    self._server = server
+    self._overlap = datetime.timedelta(seconds=overlap)
+    self._max_parallel = max_parallel
+    self._services = {}
+
+  def Sync(self):
+    """Brings the stored entities of the client's network up to date.
+
+    Each entity type is stored in its own transaction, along with its new
+    watermark, so an interrupted synchronization keeps the types it completed.
+
+    Returns:
+      A dictionary mapping each synchronized entity type to the number of
+      entities stored.
+    """
+    network_code = str(self._dfp_client.network_code)
+    checkpoint = self._entity_store.GetCheckpoint(network_code)
+    watermarks = json.loads(checkpoint) if checkpoint else {}
+    counts = {}
+
+    for entity_type in self._entity_types:
+      service_name, method_name, parent_field = _INCREMENTAL_SYNC_TYPES[
+          entity_type]
+      watermark = watermarks.get(entity_type)
+      full = watermark is None or entity_type in _FULL_REFRESH_TYPES
+
+      if entity_type == 'CustomTargetingValue':
+        key_ids = sorted(long(key_id) for key_id in self._entity_store.GetIds(
+            network_code, 'CustomTargetingKey'))
+        entities = []
+        for offset in range(0, len(key_ids), _MAX_STATEMENT_IDS):
+          entities.extend(self._GetAll(
+              service_name, method_name,
+              'WHERE customTargetingKeyId IN (%s) ORDER BY id' % ', '.join(
+                  str(key_id) for key_id in
+                  key_ids[offset:offset + _MAX_STATEMENT_IDS])))
+      elif full:
+        entities = self._GetAll(service_name, method_name, 'ORDER BY id')
+      else:
+        since = datetime.datetime.strptime(
+            watermark, _WATERMARK_FORMAT) - self._overlap
+        entities = self._GetAll(
+            service_name, method_name,
+            'WHERE lastModifiedDateTime > :since ORDER BY id',
+            [{'key': 'since',
+              'value': {'xsi_type': 'DateTimeValue',
+                        'value': _ToDfpDateTime(since)}}])
+
+      if entity_type not in _FULL_REFRESH_TYPES:
+        for entity in entities:
+          if 'lastModifiedDateTime' in entity:
+            modified = _FromDfpDateTime(
+                entity['lastModifiedDateTime']).strftime(_WATERMARK_FORMAT)
+            if watermark is None or modified > watermark:
+              watermark = modified
+        if watermark is not None:
+          watermarks[entity_type] = watermark
+
+      self._entity_store.Update(
+          network_code,
+          [(entity_type, entity['id'],
+            entity[parent_field] if parent_field and parent_field in entity
+            else None, entity) for entity in entities],
+          checkpoint=json.dumps(watermarks, sort_keys=True),
+          replace_types=[entity_type] if full else [])
+      logging.debug('Synchronized %d %s entities of network %s.',
+                    len(entities), entity_type, network_code)
+      counts[entity_type] = len(entities)
+
+    return counts
+
+  def _GetAll(self, service_name, method_name, query, values=None):
+    """Retrieves all entities matching a statement from one of the services.
+
+    Args:
+      service_name: A string identifying the service.
+      method_name: A string identifying the service's get*ByStatement method.
+      query: A string containing the statement's query, without a limit or
+          offset.
+      [optional]
+      values: A list of the statement's bind values.
+
+    Returns:
+      A list of the entities, in the order of the query.
+    """
+    if service_name not in self._services:
+      self._services[service_name] = self._dfp_client.GetService(
+          service_name, self._version, self._server)
+    return _GetAllByStatement(self._services[service_name], method_name, query,
+                              values, self._max_parallel)
+
+
+class AdUnitTree(object):
+  """A compact, read-only index of a network's ad unit hierarchy.
+
+  Ad units are numbered, and each one's parent number, interned name and status
+  are kept in flat arrays. The ad units are also laid out in depth first order,
+  so the subtree of any ad unit is a contiguous slice of that order: listing a
+  subtree takes time proportional to its size, and checking whether one ad unit
+  is under another takes constant time.
+
+  A tree can be saved to disk along with a watermark, the latest
+  lastModifiedDateTime of its ad units, and refreshed later by retrieving only
+  the ad units modified since.
+  """
+
+  def __init__(self, ad_units, watermark=None):
+    """Initializes an AdUnitTree.
+
+    Args:
+      ad_units: A list of (ID, parent ID, name, status) tuples. The parent ID is
+          None for the root ad unit; ad units whose parent is not listed are
+          treated as roots.
+      [optional]
+      watermark: A string containing the latest lastModifiedDateTime of the ad
+          units, in UTC and _WATERMARK_FORMAT.
+    """
+    self.watermark = watermark
+    self._ids = [str(ad_unit[0]) for ad_unit in ad_units]
+    self._indices = dict((ad_unit_id, index)
+                         for index, ad_unit_id in enumerate(self._ids))
+    self._parent_ids = [None if ad_unit[1] is None else str(ad_unit[1])
+                        for ad_unit in ad_units]
+    self._parents = array.array(
+        'l', [self._indices.get(parent_id, -1)
+              for parent_id in self._parent_ids])
+    self._names = [intern(ad_unit[2].encode('utf-8')
+                          if isinstance(ad_unit[2], unicode) else ad_unit[2])
+                   for ad_unit in ad_units]
+    self._statuses = [intern(str(ad_unit[3])) for ad_unit in ad_units]
+
+    count = len(self._ids)
+    self._child_offsets = array.array('l', [0] * (count + 1))
+    for parent in self._parents:
+      if parent >= 0:
+        self._child_offsets[parent + 1] += 1
+    for index in xrange(count):
+      self._child_offsets[index + 1] += self._child_offsets[index]
+    self._children = array.array('l', [0] * self._child_offsets[count])
+    positions = array.array('l', self._child_offsets)
+    for index, parent in enumerate(self._parents):
+      if parent >= 0:
+        self._children[positions[parent]] = index
+        positions[parent] += 1
+
+    # Lay out the ad units in depth first order, recording where each one's
+    # subtree starts and ends in it.
+    self._order = array.array('l')
+    self._starts = array.array('l', [0] * count)
+    self._ends = array.array('l', [0] * count)
+    for root in (index for index in xrange(count) if self._parents[index] < 0):
+      stack = [(root, False)]
+      while stack:
+        index, finished = stack.pop()
+        if finished:
+          self._ends[index] = len(self._order)
+          continue
+        self._starts[index] = len(self._order)
+        self._order.append(index)
+        stack.append((index, True))
+        stack.extend((child, False) for child in reversed(
+            self._children[self._child_offsets[index]:
+                           self._child_offsets[index + 1]]))
+
+  @classmethod
+  def Load(cls, dfp_client, version=sorted(_SERVICE_MAP.keys())[-1],
+           server=DEFAULT_ENDPOINT, cache_path=None,
+           max_parallel=_MAX_PARALLEL_PAGES):
+    """Creates an AdUnitTree of a client's network.
+
+    Args:
+      dfp_client: The DfpClient whose network's ad units are retrieved.
+      [optional]
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      cache_path: A string identifying a file in which the tree is cached. If it
+          exists, the tree is read from it and refreshed; the resulting tree is
+          written back to it.
+      max_parallel: The maximum number of pages requested at once.
+
+    Returns:
+      An AdUnitTree.
+    """
+    ad_unit_tree = None
+    if cache_path and os.path.exists(cache_path):
+      try:
+        ad_unit_tree = cls.LoadFromFile(cache_path)
+      except (IOError, ValueError, KeyError):
+        logging.warning('Ignoring unreadable ad unit tree cache %s.',
+                        cache_path)
+
+    if ad_unit_tree is None:
+      ad_unit_tree = cls([])
+    ad_unit_tree = ad_unit_tree.Refresh(dfp_client, version, server,
+                                        max_parallel)
+    if cache_path:
+      ad_unit_tree.Save(cache_path)
+    return ad_unit_tree
+
+  @classmethod
+  def LoadFromFile(cls, path):
+    """Reads an AdUnitTree written by Save.
+
+    Args:
+      path: A string identifying the file.
+
+    Returns:
+      An AdUnitTree.
+    """
+    with open(path, 'rb') as handle:
+      data = json.load(handle)
+    return cls(data['ad_units'], data['watermark'])
+
+  def Save(self, path):
+    """Writes the tree to a file, replacing it atomically.
+
+    Args:
+      path: A string identifying the file.
+    """
+    data = {'ad_units': zip(self._ids, self._parent_ids, self._names,
+                            self._statuses),
+            'watermark': self.watermark}
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=os.path.dirname(os.path.abspath(path)),
+        delete=False) as handle:
+      json.dump(data, handle)
+    try:
+      os.rename(handle.name, path)
+    except OSError:
+      # Windows does not allow renaming onto an existing file.
+      os.remove(path)
+      os.rename(handle.name, path)
+
+  def Refresh(self, dfp_client, version=sorted(_SERVICE_MAP.keys())[-1],
+              server=DEFAULT_ENDPOINT, max_parallel=_MAX_PARALLEL_PAGES):
+    """Creates an up to date copy of the tree.
+
+    If the tree has a watermark, only the ad units modified after it, less an
+    overlap window allowing for clock skew, are retrieved. Otherwise all ad
+    units are retrieved.
+
+    Args:
+      dfp_client: The DfpClient whose network's ad units are retrieved.
+      [optional]
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      max_parallel: The maximum number of pages requested at once.
+
+    Returns:
+      A new AdUnitTree, or this tree if no ad unit was modified.
+    """
+    inventory_service = dfp_client.GetService('InventoryService', version,
+                                              server)
+    if self.watermark:
+      since = datetime.datetime.strptime(
+          self.watermark, _WATERMARK_FORMAT) - datetime.timedelta(
+              seconds=_CHANGE_CHECK_OVERLAP)
+      ad_units = _GetAllByStatement(
+          inventory_service, 'getAdUnitsByStatement',
+          'WHERE lastModifiedDateTime > :since ORDER BY id',
+          [{'key': 'since',
+            'value': {'xsi_type': 'DateTimeValue',
+                      'value': _ToDfpDateTime(since)}}], max_parallel)
+    else:
+      ad_units = _GetAllByStatement(inventory_service, 'getAdUnitsByStatement',
+                                    'ORDER BY id', None, max_parallel)
+    if not ad_units:
+      return self
+
+    watermark = self.watermark
+    merged = collections.OrderedDict(
+        (ad_unit[0], ad_unit) for ad_unit in zip(
+            self._ids, self._parent_ids, self._names, self._statuses))
+    for ad_unit in ad_units:
+      ad_unit_id = str(ad_unit['id'])
+      merged[ad_unit_id] = (
+          ad_unit_id, ad_unit['parentId'] if 'parentId' in ad_unit else None,
+          ad_unit['name'], ad_unit['status'] if 'status' in ad_unit else None)
+      if 'lastModifiedDateTime' in ad_unit:
+        modified = _FromDfpDateTime(ad_unit['lastModifiedDateTime']).strftime(
+            _WATERMARK_FORMAT)
+        if watermark is None or modified > watermark:
+          watermark = modified
+    logging.debug('Refreshed %d ad units.', len(ad_units))
+    return AdUnitTree(merged.values(), watermark)
+
+  def __len__(self):
+    return len(self._ids)
+
+  def __contains__(self, ad_unit_id):
+    return str(ad_unit_id) in self._indices
+
+  def _GetIndex(self, ad_unit_id):
+    """Retrieves the number of an ad unit.
+
+    Raises:
+      KeyError: If the ad unit is not in the tree.
+    """
+    return self._indices[str(ad_unit_id)]
+
+  def GetName(self, ad_unit_id):
+    """Retrieves the name of an ad unit."""
+    return self._names[self._GetIndex(ad_unit_id)]
+
+  def GetStatus(self, ad_unit_id):
+    """Retrieves the status of an ad unit, such as ACTIVE or ARCHIVED."""
+    return self._statuses[self._GetIndex(ad_unit_id)]
+
+  def GetParentId(self, ad_unit_id):
+    """Retrieves the ID of an ad unit's parent, or None for the root.
+
+    Ad units whose parent is not in the tree keep their parent's ID.
+    """
+    return self._parent_ids[self._GetIndex(ad_unit_id)]
+
+  def GetChildIds(self, ad_unit_id):
+    """Retrieves the IDs of an ad unit's children."""
+    index = self._GetIndex(ad_unit_id)
+    return [self._ids[child] for child in
+            self._children[self._child_offsets[index]:
+                           self._child_offsets[index + 1]]]
+
+  def GetRootIds(self):
+    """Retrieves the IDs of the ad units which have no parent in the tree."""
+    return [self._ids[index] for index in xrange(len(self._ids))
+            if self._parents[index] < 0]
+
+  def GetSubtreeIds(self, ad_unit_id):
+    """Retrieves the IDs of an ad unit and all ad units under it.
+
+    Args:
+      ad_unit_id: The ID of the ad unit.
+
+    Returns:
+      A list of ad unit IDs in depth first order, starting with the ad unit.
+    """
+    index = self._GetIndex(ad_unit_id)
+    return [self._ids[descendant] for descendant in
+            self._order[self._starts[index]:self._ends[index]]]
+
+  def IsUnder(self, ad_unit_id, ancestor_id):
+    """Determines whether an ad unit is in the subtree of another.
+
+    Args:
+      ad_unit_id: The ID of the ad unit.
+      ancestor_id: The ID of the potential ancestor.
+
+    Returns:
+      True if the ad unit is the ancestor or one of its descendants.
+    """
+    index = self._GetIndex(ad_unit_id)
+    ancestor = self._GetIndex(ancestor_id)
+    return (self._starts[ancestor] <= self._starts[index] <
+            self._ends[ancestor])
+
+  def GetPath(self, ad_unit_id):
+    """Retrieves the names of the ad units from a root down to an ad unit.
+
+    Args:
+      ad_unit_id: The ID of the ad unit.
+
+    Returns:
+      A list of names, starting with the root's and ending with the ad unit's.
+    """
+    index = self._GetIndex(ad_unit_id)
+    path = []
+    while index >= 0:
+      path.append(self._names[index])
+      index = self._parents[index]
+    path.reverse()
+    return path
+
+  def FindByPath(self, path):
+    """Finds an ad unit by the names of the ad units leading to it.
+
+    Args:
+      path: A list of names, starting with a root's, as returned by GetPath.
+
+    Returns:
+      The ID of the ad unit, or None if no ad unit has the path.
+    """
+    candidates = [index for index in xrange(len(self._ids))
+                  if self._parents[index] < 0]
+    index = None
+    for name in path:
+      index = next((candidate for candidate in candidates
+                    if self._names[candidate] == name), None)
+      if index is None:
+        return None
+      candidates = self._children[self._child_offsets[index]:
+                                  self._child_offsets[index + 1]]
+    return self._ids[index] if index is not None else None
+
+
+class CustomTargetingIndex(object):
+  """A persistent, memory-mapped index of custom targeting keys and values.
+
+  The index file holds the keys as JSON followed by one fixed size record per
+  value, sorted by key ID and name, a list of the records sorted by value ID and
+  the value names. Values are looked up by binary search over the mapped file,
+  so even an index of millions of values is opened instantly and only the pages
+  that are searched are read from disk.
+
+  Custom targeting values have no lastModifiedDateTime, so refreshing the index
+  only retrieves the values created since, which have higher IDs. Renamed and
+  deleted values are only picked up by a full refresh.
+  """
+
+  def __init__(self, path):
+    """Opens a CustomTargetingIndex file.
+
+    Args:
+      path: A string identifying a file written by CustomTargetingIndex.
+
+    Raises:
+      GoogleAdsValueError: If the file is not a custom targeting index.
+    """
+    self.path = path
+    self._Open()
+
+  def _Open(self):
+    """Maps the index file into memory and reads its header and keys."""
+    with open(self.path, 'rb') as handle:
+      self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    magic_size = len(_CUSTOM_TARGETING_INDEX_MAGIC)
+    if self._mmap[:magic_size] != _CUSTOM_TARGETING_INDEX_MAGIC:
+      self._mmap.close()
+      raise googleads.errors.GoogleAdsValueError(
+          '%s is not a custom targeting index.' % self.path)
+    self._count, keys_size, _ = _CUSTOM_TARGETING_INDEX_HEADER.unpack_from(
+        self._mmap, magic_size)
+    keys_start = magic_size + _CUSTOM_TARGETING_INDEX_HEADER.size
+    metadata = json.loads(self._mmap[keys_start:keys_start + keys_size])
+    self._keys = [(long(key_id), name.encode('utf-8'), key_type)
+                  for key_id, name, key_type in metadata['keys']]
+    self._max_value_id = metadata['max_value_id']
+    self._key_ids = dict((name, key_id) for key_id, name, _ in self._keys)
+    self._key_names = dict((key_id, name) for key_id, name, _ in self._keys)
+    self._records_start = keys_start + keys_size
+    self._ids_start = (self._records_start +
+                       self._count * _CUSTOM_TARGETING_VALUE_RECORD.size)
+    self._names_start = (self._ids_start +
+                         self._count * _CUSTOM_TARGETING_ID_RECORD.size)
+
+  @classmethod
+  def Load(cls, dfp_client, path, version=sorted(_SERVICE_MAP.keys())[-1],
+           server=DEFAULT_ENDPOINT, full=False,
+           max_parallel=_MAX_PARALLEL_PAGES):
+    """Opens and updates the custom targeting index of a client's network.
+
+    Args:
+      dfp_client: The DfpClient whose network's custom targeting is indexed.
+      path: A string identifying the index file. It is created if it does not
+          exist.
+      [optional]
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      full: A boolean indicating whether all values are retrieved again rather
+          than only the new ones.
+      max_parallel: The maximum number of pages requested at once.
+
+    Returns:
+      A CustomTargetingIndex.
+    """
+    if not os.path.exists(path):
+      cls._Write(path, [], [], 0)
+    custom_targeting_index = cls(path)
+    custom_targeting_index.Refresh(dfp_client, version, server, full,
+                                   max_parallel)
+    return custom_targeting_index
+
+  @classmethod
+  def _Write(cls, path, keys, values, max_value_id):
+    """Writes an index file, replacing it atomically.
+
+    Args:
+      path: A string identifying the file.
+      keys: A list of (ID, name, type) tuples of the custom targeting keys.
+      values: A list of (key ID, name, ID) tuples of the custom targeting
+          values, sorted by key ID and name.
+      max_value_id: The highest ID of the indexed values.
+    """
+    cls._Replace(cls._WriteTemporary(path, keys, values, max_value_id), path)
+
+  @staticmethod
+  def _WriteTemporary(path, keys, values, max_value_id):
+    """Writes an index file to a temporary file beside the file it replaces.
+
+    Args:
+      path: A string identifying the file which is to be replaced.
+      keys: A list of (ID, name, type) tuples of the custom targeting keys.
+      values: A list of (key ID, name, ID) tuples of the custom targeting
+          values, sorted by key ID and name.
+      max_value_id: The highest ID of the indexed values.
+
+    Returns:
+      A string identifying the temporary file.
+    """
+    metadata = json.dumps({'keys': keys, 'max_value_id': max_value_id})
+    names_size = sum(len(name) for _, name, _ in values)
+    by_id = sorted(xrange(len(values)), key=lambda index: values[index][2])
+
+    handle = tempfile.NamedTemporaryFile(
+        'wb', dir=os.path.dirname(os.path.abspath(path)), delete=False)
+    try:
+      with handle:
+        handle.write(_CUSTOM_TARGETING_INDEX_MAGIC)
+        handle.write(_CUSTOM_TARGETING_INDEX_HEADER.pack(
+            len(values), len(metadata), names_size))
+        handle.write(metadata)
+        offset = 0
+        for key_id, name, value_id in values:
+          handle.write(_CUSTOM_TARGETING_VALUE_RECORD.pack(
+              key_id, value_id, offset, len(name)))
+          offset += len(name)
+        for index in by_id:
+          handle.write(_CUSTOM_TARGETING_ID_RECORD.pack(index))
+        for _, name, _ in values:
+          handle.write(name)
+    except BaseException:
+      os.remove(handle.name)
+      raise
+    return handle.name
+
+  @staticmethod
+  def _Replace(temporary_path, path):
+    """Replaces an index file with a temporary file.
+
+    If the index file cannot be replaced, the temporary file is removed.
+
+    Args:
+      temporary_path: A string identifying the temporary file.
+      path: A string identifying the index file.
+    """
+    try:
+      try:
+        os.rename(temporary_path, path)
+      except OSError:
+        # Windows does not allow renaming onto an existing file.
+        if os.name != 'nt' or not os.path.exists(path):
+          raise
+        os.remove(path)
+        os.rename(temporary_path, path)
+    except BaseException:
+      if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+      raise
+
+  def Refresh(self, dfp_client, version=sorted(_SERVICE_MAP.keys())[-1],
+              server=DEFAULT_ENDPOINT, full=False,
+              max_parallel=_MAX_PARALLEL_PAGES):
+    """Brings the index up to date, rewriting its file if anything changed.
+
+    Args:
+      dfp_client: The DfpClient whose network's custom targeting is indexed.
+      [optional]
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      full: A boolean indicating whether all values are retrieved again rather
+          than only the new ones.
+      max_parallel: The maximum number of pages requested at once.
+
+    Returns:
+      The number of values retrieved.
+    """
+    custom_targeting_service = dfp_client.GetService(
+        'CustomTargetingService', version, server)
+    keys = [(long(key['id']), _EncodeName(key['name']),
+             key['type'] if 'type' in key else None)
+            for key in _GetAllByStatement(
+                custom_targeting_service, 'getCustomTargetingKeysByStatement',
+                'ORDER BY id', None, max_parallel)]
+    max_value_id = 0 if full else self._max_value_id
+
+    # Values can only be requested for listed keys.
+    key_ids = [key_id for key_id, _, _ in keys]
+    new_values = []
+    for offset in range(0, len(key_ids), _MAX_STATEMENT_IDS):
+      new_values.extend(_GetAllByStatement(
+          custom_targeting_service, 'getCustomTargetingValuesByStatement',
+          'WHERE customTargetingKeyId IN (%s) AND id > %d ORDER BY id' % (
+              ', '.join(str(key_id) for key_id in
+                        key_ids[offset:offset + _MAX_STATEMENT_IDS]),
+              max_value_id), None, max_parallel))
+    logging.debug('Retrieved %d custom targeting values.', len(new_values))
+
+    if not new_values and keys == self._keys and not full:
+      return 0
+
+    values = [] if full else [
+        self._GetRecord(index) for index in xrange(self._count)]
+    for value in new_values:
+      value_id = long(value['id'])
+      values.append((long(value['customTargetingKeyId']),
+                     _EncodeName(value['name']), value_id))
+      max_value_id = max(max_value_id, value_id)
+    values.sort()
+
+    temporary_path = self._WriteTemporary(self.path, keys, values,
+                                          max_value_id)
+    # Windows does not allow replacing a file which is mapped into memory. The
+    # file is reopened even if it was not replaced, so that the index remains
+    # usable.
+    self.Close()
+    try:
+      self._Replace(temporary_path, self.path)
+    finally:
+      self._Open()
+    return len(new_values)
+
+  def Close(self):
+    """Unmaps the index file."""
+    self._mmap.close()
+
+  def __len__(self):
+    return self._count
+
+  def _GetRecord(self, index):
+    """Reads a value record.
+
+    Args:
+      index: The position of the record in the (key ID, name) order.
+
+    Returns:
+      A (key ID, name, ID) tuple.
+    """
+    key_id, value_id, offset, size = (
+        _CUSTOM_TARGETING_VALUE_RECORD.unpack_from(
+            self._mmap, self._records_start +
+            index * _CUSTOM_TARGETING_VALUE_RECORD.size))
+    start = self._names_start + offset
+    return key_id, self._mmap[start:start + size], value_id
+
+  def _GetRecordIndexById(self, position):
+    """Reads the position of a value record in the ID order."""
+    return _CUSTOM_TARGETING_ID_RECORD.unpack_from(
+        self._mmap,
+        self._ids_start + position * _CUSTOM_TARGETING_ID_RECORD.size)[0]
+
+  def _FindValue(self, key_id, name, low=0):
+    """Finds the first value record at or after a key ID and name.
+
+    Args:
+      key_id: The ID of the key.
+      name: A string containing the UTF-8 encoded name of the value.
+      [optional]
+      low: The position at which the search starts.
+
+    Returns:
+      The position of the record, or the number of records if there is none.
+    """
+    high = self._count
+    while low < high:
+      middle = (low + high) // 2
+      if self._GetRecord(middle)[:2] < (key_id, name):
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+  def GetKeyId(self, key_name):
+    """Retrieves the ID of a custom targeting key, or None if there is none."""
+    return self._key_ids.get(_EncodeName(key_name))
+
+  def GetKeyName(self, key_id):
+    """Retrieves the name of a custom targeting key, or None if unknown."""
+    return self._key_names.get(long(key_id))
+
+  def GetValueIds(self, key_name, value_names):
+    """Looks up the IDs of many values of a custom targeting key at once.
+
+    Args:
+      key_name: A string containing the name of the key.
+      value_names: A list of strings containing the names of the values.
+
+    Returns:
+      A dictionary mapping each of the value names which was found to the ID of
+      its value.
+    """
+    key_id = self.GetKeyId(key_name)
+    if key_id is None:
+      return {}
+    value_ids = {}
+    # Looking the names up in order lets each search start after the last.
+    position = self._FindValue(key_id, '')
+    for value_name in sorted(value_names, key=_EncodeName):
+      position = self._FindValue(key_id, _EncodeName(value_name), position)
+      if position < self._count:
+        record_key_id, record_name, value_id = self._GetRecord(position)
+        if (record_key_id, record_name) == (key_id, _EncodeName(value_name)):
+          value_ids[value_name] = value_id
+    return value_ids
+
+  def GetValueNames(self, value_ids):
+    """Looks up many custom targeting values by ID at once.
+
+    Args:
+      value_ids: A list of value IDs.
+
+    Returns:
+      A dictionary mapping each of the value IDs which was found to a
+      (key name, value name) tuple.
+    """
+    value_names = {}
+    for value_id in value_ids:
+      low, high = 0, self._count
+      while low < high:
+        middle = (low + high) // 2
+        if self._GetRecord(self._GetRecordIndexById(middle))[2] < long(
+            value_id):
+          low = middle + 1
+        else:
+          high = middle
+      if low < self._count:
+        key_id, name, record_value_id = self._GetRecord(
+            self._GetRecordIndexById(low))
+        if record_value_id == long(value_id):
+          value_names[value_id] = (self._key_names.get(key_id), name)
+    return value_names
+
+  def GetCustomCriteria(self, key_name, value_names, operator='IS'):
+    """Creates line item targeting criteria from key and value names.
+
+    Args:
+      key_name: A string containing the name of the key.
+      value_names: A list of strings containing the names of the values.
+      [optional]
+      operator: A string containing the criteria's operator, IS or IS_NOT.
+
+    Returns:
+      A CustomCriteria dictionary to use in a line item's targeting.
+
+    Raises:
+      GoogleAdsValueError: If the key or any of the values is not indexed.
+    """
+    key_id = self.GetKeyId(key_name)
+    if key_id is None:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unknown custom targeting key %s.' % key_name)
+    value_ids = self.GetValueIds(key_name, value_names)
+    missing = [value_name for value_name in value_names
+               if value_name not in value_ids]
+    if missing:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unknown values of custom targeting key %s: %s.' % (
+              key_name, ', '.join(missing)))
+    return {'xsi_type': 'CustomCriteria', 'keyId': key_id,
+            'valueIds': [value_ids[value_name] for value_name in value_names],
+            'operator': operator}
+
+
 class DataDownloader(object):
   """A utility that can be used to download reports and PQL result sets."""
 
   def __init__(self, dfp_client, version=sorted(_SERVICE_MAP.keys())[-1],
-               server=DEFAULT_ENDPOINT):
+               server=DEFAULT_ENDPOINT, report_cache=None):
     """Initializes a DataDownloader.
 
     Args:
@@ -373,13 +1374,22 @@ class DataDownloader(object):
           to what is currently the latest version. This will be updated in
           future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the DFP API.
+      report_cache: A googleads.common.ReportCache. If provided, the IDs of
+          completed report jobs are stored in it keyed by the network code and
+          normalized report query, as are downloaded report files. Running the
+          same report query again, or downloading the same report again, is then
+          served from the cache without contacting the API.
     """
     if server[-1] == '/': server = server[:-1]
     self._dfp_client = dfp_client
     self._version = version
     self._server = server
+    self._report_cache = report_cache
     self._report_service = None
     self._pql_service = None
+    # The IDs of report jobs known to cover only days before today, whose files
+    # may therefore be cached for longer.
+    self._past_report_job_ids = set()
 
   def _GetReportService(self):
     """Lazily initializes a report service client."""
@@ -408,45 +1418,445 @@ class DataDownloader(object):
     Raises:
       A DfpReportError if the report job fails to complete.
     """
-    service = self._GetReportService()
-    report_job_id = service.runReportJob(report_job)['id']
+    return self.WaitForReports([report_job])[0]
 
-    if self._version > 'v201502':
-      status = service.getReportJobStatus(report_job_id)
-    else:
-      status = service.getReportJob(report_job_id)['reportJobStatus']
+  def WaitForReports(self, report_jobs, callback=None):
+    """Runs several reports, then waits (blocks) for all of them to finish.
+
+    Every report job is started before any of them is polled. All outstanding
+    jobs are then polled from a single loop, each on its own schedule: a job is
+    checked again after _REPORT_POLL_INITIAL_INTERVAL seconds, and the wait
+    grows by _REPORT_POLL_BACKOFF_FACTOR after every check up to
+    _REPORT_POLL_MAX_INTERVAL seconds. Small reports are therefore picked up
+    within seconds while long running ones are not polled needlessly often.
+
+    Args:
+      report_jobs: A list of the report jobs to run. Each may be a dictionary or
+          an instance of the suds-generated ReportJob class.
+      [optional]
+      callback: A function called as callback(report_job_id, status) as soon as
+          each report job finishes, where status is either 'COMPLETED' or
+          'FAILED'.
+
+    Returns:
+      A list of the report jobs' IDs as strings, in the same order as the given
+      report_jobs.
 
-    while status != 'COMPLETED' and status != 'FAILED':
-      logging.debug('Report job status: %s', status)
-      time.sleep(30)
-      if self._version > 'v201502':
-        status = service.getReportJobStatus(report_job_id)
+    Raises:
+      A DfpReportError if any of the report jobs fails to complete. This is only
+      raised once every other report job has finished.
+
+    If this downloader has a report cache, report jobs whose query completed
+    recently are not run again; the ID of the earlier report job is returned
+    instead.
+    """
+    service = self._GetReportService()
+    report_job_ids = []
+    cache_keys = []
+    # A heap of (next check time, wait after that check, index) tuples, one for
+    # each report job which has not finished yet.
+    now = time.time()
+    pending = []
+    cached_indices = []
+    failed_report_job_id = None
+
+    for index, report_job in enumerate(report_jobs):
+      cache_key = self._GetReportJobCacheKey(report_job)
+      cached_report_job_id = self._GetCachedReportJobId(cache_key)
+      cache_keys.append(cache_key)
+      if cached_report_job_id:
+        report_job_ids.append(cached_report_job_id)
+        cached_indices.append(index)
+      else:
+        report_job_ids.append(service.runReportJob(report_job)['id'])
+        heapq.heappush(pending, (now, _REPORT_POLL_INITIAL_INTERVAL, index))
+      if cache_key and not _ReportJobIncludesToday(report_job):
+        self._past_report_job_ids.add(report_job_ids[-1])
+
+    if callback:
+      for index in cached_indices:
+        callback(report_job_ids[index], 'COMPLETED')
+
+    while pending:
+      next_check, interval, index = heapq.heappop(pending)
+      delay = next_check - time.time()
+      if delay > 0:
+        time.sleep(delay)
+
+      report_job_id = report_job_ids[index]
+      with googleads.common.StartSpan(
+          'DataDownloader.PollReportJob',
+          {'googleads.report_job_id': report_job_id,
+           'googleads.version': self._version}) as span:
+        status = self._GetReportJobStatus(report_job_id)
+        span.SetAttribute('googleads.report_job_status', status)
+      if status == 'COMPLETED' or status == 'FAILED':
+        logging.debug('Report job %s finished with status: %s', report_job_id,
+                      status)
+        if status == 'FAILED' and failed_report_job_id is None:
+          failed_report_job_id = report_job_id
+        elif status == 'COMPLETED' and cache_keys[index]:
+          self._report_cache.Set(
+              cache_keys[index], report_job_id,
+              report_job_id not in self._past_report_job_ids).close()
+        if callback:
+          callback(report_job_id, status)
       else:
-        status = service.getReportJob(report_job_id)['reportJobStatus']
+        logging.debug('Report job %s status: %s', report_job_id, status)
+        heapq.heappush(pending, (
+            time.time() + interval,
+            min(interval * _REPORT_POLL_BACKOFF_FACTOR,
+                _REPORT_POLL_MAX_INTERVAL), index))
+
+    if failed_report_job_id is not None:
+      raise googleads.errors.DfpReportError(failed_report_job_id)
+    else:
+      logging.debug('Reports have completed successfully')
+      return report_job_ids
+
+  def _GetReportJobCacheKey(self, report_job):
+    """Creates the report cache key of a report job.
 
-    if status == 'FAILED':
-      raise googleads.errors.DfpReportError(report_job_id)
+    Args:
+      report_job: A report job, as a dictionary or an instance of the
+          suds-generated ReportJob class.
+
+    Returns:
+      The cache key as a string, or None if this downloader has no report cache.
+    """
+    if not self._report_cache:
+      return None
+    return self._report_cache.MakeKey(
+        self._server, self._version, self._dfp_client.network_code,
+        'ReportJob', report_job['reportQuery'])
+
+  def _GetCachedReportJobId(self, cache_key):
+    """Retrieves the ID of a completed report job from the report cache.
+
+    Args:
+      cache_key: The report cache key of the report job, or None.
+
+    Returns:
+      The ID of the report job as a string, or None if it is not cached.
+    """
+    if not cache_key:
+      return None
+    cached_report_job = self._report_cache.Get(cache_key)
+    if not cached_report_job:
+      return None
+    try:
+      return cached_report_job.read() or None
+    finally:
+      cached_report_job.close()
+
+  def _GetReportJobStatus(self, report_job_id):
+    """Retrieves the status of a report job.
+
+    Args:
+      report_job_id: The ID of the report job, as a string.
+
+    Returns:
+      The status of the report job as a string, e.g. 'IN_PROGRESS'.
+    """
+    service = self._GetReportService()
+    if self._version > 'v201502':
+      return service.getReportJobStatus(report_job_id)
     else:
-      logging.debug('Report has completed successfully')
-      return report_job_id
+      return service.getReportJob(report_job_id)['reportJobStatus']
 
-  def DownloadReportToFile(self, report_job_id, export_format, outfile):
+  def DownloadReportToFile(self, report_job_id, export_format, outfile,
+                           num_connections=1, chunk_size=_CHUNK_SIZE):
     """Downloads report data and writes it to a file.
 
     The report job must be completed before calling this function.
 
+    When num_connections is greater than one and the server hosting the report
+    accepts byte range requests, the report is split into that many ranges which
+    are downloaded in parallel, each over its own connection, and written into
+    their place in outfile. If the server does not accept range requests, the
+    report is downloaded as a single stream instead.
+
+    Args:
+      report_job_id: The ID of the report job to wait for, as a string.
+      export_format: The export format for the report file, as a string.
+      outfile: A writeable, file-like object to write to. When downloading over
+          several connections, this must also support seek and truncate, for
+          example a file opened in 'wb' mode.
+      [optional]
+      num_connections: The number of connections to download the report over.
+      chunk_size: The number of bytes to read from a connection at a time.
+
+    Returns:
+      A dictionary describing the download, containing the number of 'bytes'
+      written, the 'seconds' taken, the resulting 'bytes_per_second' and the
+      number of 'connections' used, which is 0 if the report was served from
+      the report cache.
+    """
+    with googleads.common.MeasureCall(
+        'DataDownloader', 'DownloadReportToFile',
+        {'googleads.report_job_id': report_job_id,
+         'googleads.network_code': self._dfp_client.network_code,
+         'googleads.version': self._version}) as call:
+      stats = self._DownloadReportToFile(report_job_id, export_format, outfile,
+                                         num_connections, chunk_size)
+      call.response_bytes = stats['bytes']
+      call.cached = not stats['connections']
+      return stats
+
+  def _DownloadReportToFile(self, report_job_id, export_format, outfile,
+                            num_connections, chunk_size):
+    """Downloads report data and writes it to a file.
+
     Args:
       report_job_id: The ID of the report job to wait for, as a string.
       export_format: The export format for the report file, as a string.
       outfile: A writeable, file-like object to write to.
+      num_connections: The number of connections to download the report over.
+      chunk_size: The number of bytes to read from a connection at a time.
+
+    Returns:
+      A dictionary describing the download, as returned by DownloadReportToFile.
     """
+    start_time = time.time()
+    cache_key = None
+    if self._report_cache:
+      cache_key = self._report_cache.MakeKey(
+          self._server, self._version, self._dfp_client.network_code,
+          'ReportFile', report_job_id, export_format)
+      cached_report = self._report_cache.Get(cache_key)
+      if cached_report:
+        try:
+          size = _CopyFile(cached_report, outfile, chunk_size)
+        finally:
+          cached_report.close()
+        return self._GetReportDownloadStats(report_job_id, start_time, size, 0)
+
     service = self._GetReportService()
     report_url = service.getReportDownloadURL(report_job_id, export_format)
+    # When caching, the report is downloaded to a temporary file first so that
+    # it can be read back into the cache.
+    destination = tempfile.TemporaryFile() if cache_key else outfile
+
+    size = (self._GetRangedDownloadSize(report_url) if num_connections > 1
+            else None)
+    connections = 1
+    if size:
+      try:
+        connections = self._DownloadReportRanges(
+            report_url, destination, size, num_connections, chunk_size)
+      except _RangeNotSatisfiedError:
+        logging.debug('Byte ranges were not honored, downloading report %s as '
+                      'a single stream', report_job_id)
+        destination.seek(0)
+        destination.truncate()
+        size = None
+        connections = 1
+    if size is None:
+      size = self._DownloadReportStream(report_url, destination, chunk_size)
+
+    if cache_key:
+      try:
+        destination.seek(0)
+        cached_report = self._report_cache.Set(
+            cache_key, destination,
+            report_job_id not in self._past_report_job_ids)
+      finally:
+        destination.close()
+      try:
+        _CopyFile(cached_report, outfile, chunk_size)
+      finally:
+        cached_report.close()
+
+    return self._GetReportDownloadStats(report_job_id, start_time, size,
+                                        connections)
+
+  def _GetReportDownloadStats(self, report_job_id, start_time, size,
+                              connections):
+    """Summarizes a report download.
+
+    Args:
+      report_job_id: The ID of the downloaded report job, as a string.
+      start_time: The time at which the download started, in seconds since the
+          epoch.
+      size: The number of bytes downloaded.
+      connections: The number of connections the report was downloaded over, or
+          0 if it was served from the report cache.
+
+    Returns:
+      A dictionary containing the number of 'bytes' written, the 'seconds'
+      taken, the resulting 'bytes_per_second' and the number of 'connections'
+      used.
+    """
+    seconds = time.time() - start_time
+    stats = {'bytes': size, 'seconds': seconds, 'connections': connections,
+             'bytes_per_second': size / seconds if seconds else None}
+    logging.debug('Downloaded report %s: %s', report_job_id, stats)
+    return stats
+
+  def _DownloadReportStream(self, report_url, outfile, chunk_size):
+    """Downloads a report over a single connection.
+
+    Args:
+      report_url: The URL the report can be downloaded from, as a string.
+      outfile: A writeable, file-like object to write to.
+      chunk_size: The number of bytes to read from the connection at a time.
+
+    Returns:
+      The number of bytes written to outfile.
+    """
     response = urllib2.urlopen(report_url)
+    size = 0
     while True:
-      chunk = response.read(_CHUNK_SIZE)
+      chunk = response.read(chunk_size)
       if not chunk: break
       outfile.write(chunk)
+      size += len(chunk)
+    return size
+
+  def _GetRangedDownloadSize(self, report_url):
+    """Determines whether a report can be downloaded in byte ranges.
+
+    Args:
+      report_url: The URL the report can be downloaded from, as a string.
+
+    Returns:
+      The size of the report in bytes if the server accepts byte range requests
+      for it, otherwise None.
+    """
+    request = urllib2.Request(report_url)
+    request.get_method = lambda: 'HEAD'
+    try:
+      response = urllib2.urlopen(request)
+    except urllib2.URLError, e:
+      logging.debug('Could not determine whether byte ranges are accepted: %s',
+                    e)
+      return None
+
+    try:
+      headers = response.info()
+      if headers.getheader('Accept-Ranges', '').lower() != 'bytes':
+        return None
+      try:
+        size = int(headers.getheader('Content-Length'))
+      except (TypeError, ValueError):
+        return None
+      return size if size > 0 else None
+    finally:
+      response.close()
+
+  def _DownloadReportRanges(self, report_url, outfile, size, num_connections,
+                            chunk_size):
+    """Downloads a report in byte ranges over several parallel connections.
+
+    Args:
+      report_url: The URL the report can be downloaded from, as a string.
+      outfile: A writeable, seekable file-like object to write to.
+      size: The size of the report in bytes.
+      num_connections: The maximum number of connections to download over.
+      chunk_size: The number of bytes to read from a connection at a time.
+
+    Returns:
+      The number of connections the report was downloaded over.
+
+    Raises:
+      _RangeNotSatisfiedError: If the server responded to a range request with
+          something other than the requested range.
+    """
+    range_size = max(-(-size // num_connections), chunk_size)
+    ranges = [(start, min(start + range_size, size) - 1)
+              for start in range(0, size, range_size)]
+    # Allocate the whole file up front so every range can be written in place.
+    outfile.truncate(size)
+    lock = threading.Lock()
+    errors = []
+
+    def DownloadRange(first_byte, last_byte):
+      """Downloads the given inclusive byte range into outfile."""
+      try:
+        request = urllib2.Request(
+            report_url, headers={'Range': 'bytes=%d-%d' % (first_byte,
+                                                           last_byte)})
+        response = urllib2.urlopen(request)
+        try:
+          if response.getcode() != 206:
+            raise _RangeNotSatisfiedError(first_byte, last_byte)
+          position = first_byte
+          while position <= last_byte:
+            chunk = response.read(min(chunk_size, last_byte - position + 1))
+            if not chunk:
+              raise _RangeNotSatisfiedError(first_byte, last_byte)
+            with lock:
+              outfile.seek(position)
+              outfile.write(chunk)
+            position += len(chunk)
+        finally:
+          response.close()
+      except Exception, e:  # pylint: disable=broad-except
+        errors.append(e)
+
+    # The ranges' requests belong to the download's trace.
+    download_range = googleads.common.BindCurrentSpan(DownloadRange)
+    threads = [threading.Thread(target=download_range, args=byte_range)
+               for byte_range in ranges]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    if errors:
+      raise errors[0]
+    outfile.seek(size)
+    return len(ranges)
+
+  def IterReportRows(self, report_job_id, export_format):
+    """Streams the rows of a report without writing it to disk.
+
+    The report job must be completed before calling this function. The report
+    is decompressed and parsed as it is downloaded, so only a few rows are held
+    in memory at any time.
+
+    Values are converted according to their column's header. Metric columns,
+    whose headers start with 'Column.' as in CSV_DUMP reports, become ints or
+    floats. Values of the form YYYY-MM-DD become datetime.date objects. All
+    other values, and metrics that are not numbers, are left as strings.
+
+    Args:
+      report_job_id: The ID of the report job to download, as a string.
+      export_format: The export format of the report, as a string. This must be
+          one of CSV_DUMP, CSV_EXCEL, TSV or TSV_EXCEL.
+
+    Yields:
+      A dictionary for each row of the report, mapping column headers to values.
+
+    Raises:
+      A GoogleAdsValueError if the export format can not be parsed into rows.
+    """
+    if export_format not in _REPORT_ROW_DELIMITERS:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unsupported export format for parsing report rows: %s Supported '
+          'formats: %s' % (export_format, sorted(_REPORT_ROW_DELIMITERS)))
+
+    service = self._GetReportService()
+    report_url = service.getReportDownloadURL(report_job_id, export_format)
+    response = urllib2.urlopen(report_url)
+    try:
+      reader = csv.reader(_IterLines(_IterDecompressedChunks(response)),
+                          delimiter=_REPORT_ROW_DELIMITERS[export_format])
+      try:
+        header = reader.next()
+      except StopIteration:
+        return
+      if header and header[0].startswith(codecs.BOM_UTF8):
+        header[0] = header[0][len(codecs.BOM_UTF8):]
+      converters = [_ConvertReportMetric
+                    if column.startswith(_REPORT_METRIC_PREFIX)
+                    else _ConvertReportDimension for column in header]
+
+      for row in reader:
+        yield dict((column, convert(value)) for column, convert, value
+                   in zip(header, converters, row))
+    finally:
+      response.close()
 
   def DownloadPqlResultToList(self, pql_query, values=None):
     """Downloads the results of a PQL query to a list.
@@ -465,6 +1875,39 @@ class DataDownloader(object):
     self._PageThroughPqlSet(pql_query, results.append, values)
     return results
 
+  def DownloadLocationIndex(self):
+    """Downloads the targetable locations of the Geo_Target PQL table.
+
+    The table provides no reach, so the locations' reach is None. Their
+    canonical names are made by joining their names with those of their
+    canonical parents.
+
+    Returns:
+      A googleads.locations.LocationIndex.
+    """
+    # The location index is only imported by the applications which use it.
+    import googleads.locations  # pylint: disable=g-import-not-at-top
+
+    rows = self.DownloadPqlResultToList(_GEO_TARGET_QUERY)[1:]
+    names = dict((row[0], row[1]) for row in rows)
+    parent_ids = dict((row[0], row[2]) for row in rows
+                      if row[2] in names and row[2] != row[0])
+    canonical_names = {}
+
+    def GetCanonicalName(location_id):
+      if location_id not in canonical_names:
+        ancestor_names = []
+        ancestor_id = location_id
+        while ancestor_id is not None and len(ancestor_names) < len(names):
+          ancestor_names.append(names[ancestor_id])
+          ancestor_id = parent_ids.get(ancestor_id)
+        canonical_names[location_id] = ','.join(ancestor_names)
+      return canonical_names[location_id]
+
+    return googleads.locations.LocationIndex(
+        (row[0], row[1], GetCanonicalName(row[0]), parent_ids.get(row[0]),
+         row[3], None) for row in rows)
+
   def DownloadPqlResultToCsv(self, pql_query, file_handle, values=None):
     """Downloads the results of a PQL query to CSV.
 
@@ -578,6 +2021,7 @@ class DataDownloader(object):
                                       int(date_time_value['hour']),
                                       int(date_time_value['minute']),
                                       int(date_time_value['second']))
+    import pytz  # pylint: disable=g-import-not-at-top
     date_time_str = pytz.timezone(
         date_time_value['timeZoneID']).localize(date_time_obj).isoformat()
 
@@ -587,6 +2031,232 @@ class DataDownloader(object):
       return date_time_str
 
 
+def _ToDfpDateTime(date_time):
+  """Converts a UTC datetime into a DFP DateTime.
+
+  Args:
+    date_time: A datetime.datetime in UTC.
+
+  Returns:
+    A dictionary representing the DateTime.
+  """
+  return {'date': {'year': date_time.year, 'month': date_time.month,
+                   'day': date_time.day},
+          'hour': date_time.hour, 'minute': date_time.minute,
+          'second': date_time.second, 'timeZoneID': 'UTC'}
+
+
+def _GetAllByStatement(service, method_name, query, values, max_parallel):
+  """Retrieves all entities matching a statement, page by page.
+
+  The first page reveals the total number of entities, after which the other
+  pages are requested concurrently, each on its own copy of the service.
+
+  Args:
+    service: The service proxy to retrieve the entities with.
+    method_name: A string identifying the service's get*ByStatement method.
+    query: A string containing the statement's query, without a limit or
+        offset.
+    values: A list of the statement's bind values, or None.
+    max_parallel: The maximum number of pages requested at once.
+
+  Returns:
+    A list of the entities, in the order of the query.
+  """
+  page = getattr(service, method_name)(
+      FilterStatement(query, values, SUGGESTED_PAGE_LIMIT).ToStatement())
+  entities = list(page['results']) if 'results' in page else []
+  total = page['totalResultSetSize'] if 'totalResultSetSize' in page else 0
+  offsets = range(SUGGESTED_PAGE_LIMIT, total, SUGGESTED_PAGE_LIMIT)
+
+  # Each page is requested with a service taken from this queue so that no suds
+  # client is used by two threads at once.
+  services = Queue.Queue()
+  services.put(service)
+  for _ in range(min(max_parallel, len(offsets)) - 1):
+    services.put(service.Clone())
+
+  def GetPage(offset):
+    page_service = services.get()
+    try:
+      page = getattr(page_service, method_name)(
+          FilterStatement(query, values, SUGGESTED_PAGE_LIMIT,
+                          offset).ToStatement())
+    finally:
+      services.put(page_service)
+    return list(page['results']) if 'results' in page else []
+
+  for page_entities in googleads.common.ParallelMap(GetPage, offsets,
+                                                    max_parallel):
+    entities.extend(page_entities)
+  return entities
+
+
+def _EncodeName(name):
+  """Encodes a custom targeting name as UTF-8, if it is not already encoded."""
+  return name.encode('utf-8') if isinstance(name, unicode) else name
+
+
+def _FromDfpDateTime(date_time):
+  """Converts a DFP DateTime into a UTC datetime.
+
+  Args:
+    date_time: A DFP DateTime, as a dictionary or suds object.
+
+  Returns:
+    A naive datetime.datetime in UTC.
+  """
+  # pytz is imported on first use, as few applications convert dates.
+  import pytz  # pylint: disable=g-import-not-at-top
+  local_date_time = pytz.timezone(date_time['timeZoneID']).localize(
+      datetime.datetime(int(date_time['date']['year']),
+                        int(date_time['date']['month']),
+                        int(date_time['date']['day']),
+                        int(date_time['hour']), int(date_time['minute']),
+                        int(date_time['second'])))
+  return local_date_time.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def _CopyFile(source, destination, chunk_size):
+  """Copies the contents of one file-like object to another.
+
+  Args:
+    source: A readable file-like object.
+    destination: A writeable file-like object.
+    chunk_size: The number of bytes to copy at a time.
+
+  Returns:
+    The number of bytes copied.
+  """
+  size = 0
+  while True:
+    chunk = source.read(chunk_size)
+    if not chunk: break
+    destination.write(chunk)
+    size += len(chunk)
+  return size
+
+
+def _ReportJobIncludesToday(report_job):
+  """Determines whether the date range of a report job may include today.
+
+  Args:
+    report_job: A report job, as a dictionary or an instance of the
+        suds-generated ReportJob class.
+
+  Returns:
+    False if the report job's date range only covers days before yesterday, or
+    is a past date range type. True otherwise.
+  """
+  try:
+    report_query = report_job['reportQuery']
+    if report_query['dateRangeType'] == 'CUSTOM_DATE':
+      end_date = report_query['endDate']
+      # Yesterday is included because the network's time zone may lag behind
+      # the local time zone.
+      return (datetime.date(int(end_date['year']), int(end_date['month']),
+                            int(end_date['day'])) >=
+              datetime.date.today() - datetime.timedelta(days=1))
+    return report_query['dateRangeType'] not in _PAST_DATE_RANGE_TYPES
+  except (KeyError, TypeError, AttributeError, ValueError):
+    return True
+
+
+def _IterDecompressedChunks(response):
+  """Reads a response, decompressing its contents if they are gzipped.
+
+  Args:
+    response: A file-like object to read from.
+
+  Yields:
+    Chunks of the response's contents as strings, decompressed if necessary.
+  """
+  decompressor = None
+  while True:
+    chunk = response.read(_CHUNK_SIZE)
+    if not chunk: break
+    if decompressor is None:
+      if chunk.startswith(_GZIP_MAGIC_NUMBER):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+      else:
+        decompressor = False
+    if not decompressor:
+      yield chunk
+      continue
+    while chunk:
+      yield decompressor.decompress(chunk)
+      # A gzip file may consist of several members, each of which requires a
+      # decompressor of its own.
+      chunk = decompressor.unused_data
+      if chunk:
+        yield decompressor.flush()
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+  if decompressor:
+    yield decompressor.flush()
+
+
+def _IterLines(chunks):
+  """Splits a sequence of string chunks into lines.
+
+  Args:
+    chunks: An iterable of strings.
+
+  Yields:
+    Each line in the concatenated chunks, including its line ending.
+  """
+  remainder = ''
+  for chunk in chunks:
+    lines = (remainder + chunk).split('\n')
+    remainder = lines.pop()
+    for line in lines:
+      yield line + '\n'
+  if remainder:
+    yield remainder
+
+
+def _ConvertReportMetric(value):
+  """Converts a report metric to a number, if possible.
+
+  Args:
+    value: The metric as a string.
+
+  Returns:
+    The metric as an int or float, or the original string if it is not a
+    number.
+  """
+  try:
+    return float(value) if '.' in value else int(value)
+  except ValueError:
+    return value
+
+
+def _ConvertReportDimension(value):
+  """Converts a report dimension to a date, if it is one.
+
+  Args:
+    value: The dimension as a string.
+
+  Returns:
+    A datetime.date if the dimension is of the form YYYY-MM-DD, otherwise the
+    original string.
+  """
+  match = _REPORT_DATE_PATTERN.match(value)
+  if match:
+    try:
+      return datetime.date(*[int(part) for part in match.groups()])
+    except ValueError:
+      pass
+  return value
+
+
+class _RangeNotSatisfiedError(Exception):
+  """Raised when a byte range request for a report is not honored."""
+
+  def __init__(self, first_byte, last_byte):
+    super(_RangeNotSatisfiedError, self).__init__(
+        'Server did not return bytes %d-%d' % (first_byte, last_byte))
+
+
 def DfpClassType(value):
   """Returns the class type for the Suds object.
 
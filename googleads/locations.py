@@ -0,0 +1,474 @@
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An offline index of geographic locations, searchable by name.
+
+googleads.adwords.LookupLocations and the DownloadLocationIndex method of
+googleads.dfp.DataDownloader create LocationIndexes, which can be saved to a
+file and opened again instantly in other processes.
+"""
+
+import collections
+import difflib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+import unicodedata
+import zlib
+
+import googleads.errors
+
+# The magic number at the start of LocationIndex files.
+_LOCATION_INDEX_MAGIC = 'GALOC001'
+# The header of LocationIndex files: the number of locations, of n-grams and of
+# postings, and the size of the strings.
+_LOCATION_INDEX_HEADER = struct.Struct('<QQQQ')
+# A location in a LocationIndex file: its ID, parent ID and reach, each -1 if
+# there is none, then the offset and size of its normalized name, name,
+# canonical name and type within the strings, with a size of -1 for None.
+_LOCATION_RECORD = struct.Struct('<qqqIiIiIiIi')
+# A location ID in a LocationIndex file and the position of its record.
+_LOCATION_ID_RECORD = struct.Struct('<qI')
+# An n-gram in a LocationIndex file: its hash, and the position and number of
+# its postings, the positions of the first records of the normalized names
+# containing it.
+_LOCATION_NGRAM_RECORD = struct.Struct('<III')
+# A posting in a LocationIndex file.
+_LOCATION_POSTING = struct.Struct('<I')
+# The length of the n-grams used to find candidates for fuzzy lookups.
+_NGRAM_SIZE = 3
+# The number of normalized names sharing the most n-grams with a name which are
+# compared with it in a fuzzy lookup.
+_FUZZY_CANDIDATES = 200
+# A byte which never occurs in UTF-8, so it sorts after any UTF-8 encoded string
+# with the prefix it is appended to.
+_UTF8_MAX = '\xff'
+
+# A location in a LocationIndex. The reach and canonical name may be None when
+# the source of the location does not provide them.
+Location = collections.namedtuple(
+    'Location', ['id', 'name', 'canonical_name', 'parent_id', 'type', 'reach'])
+
+
+class LocationIndex(object):
+  """An offline index of geographic locations, searchable by name.
+
+  The index is a compact binary image, held in memory or mapped from a file.
+  Locations are stored sorted by their normalized names, which are lower case
+  and stripped of accents, so exact and prefix lookups are binary searches. For
+  fuzzy lookups, the names sharing the most n-grams with the name looked up are
+  found through an n-gram index before their similarity is measured.
+
+  Lookups which match several locations return them by decreasing reach, so the
+  most populous of, for example, all the places named Paris comes first. The
+  names of the locations returned are UTF-8 encoded strings.
+  """
+
+  def __init__(self, locations):
+    """Initializes a LocationIndex.
+
+    Args:
+      locations: A list of Locations, or tuples of the same fields.
+    """
+    self._Open(_PackLocationIndex(locations))
+
+  @classmethod
+  def LoadFromFile(cls, path):
+    """Opens a LocationIndex written by Save, mapping it into memory.
+
+    Args:
+      path: A string identifying the file.
+
+    Returns:
+      A LocationIndex.
+
+    Raises:
+      GoogleAdsValueError: If the file is not a location index.
+    """
+    location_index = cls.__new__(cls)
+    with open(path, 'rb') as handle:
+      data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(_LOCATION_INDEX_MAGIC)] != _LOCATION_INDEX_MAGIC:
+      data.close()
+      raise googleads.errors.GoogleAdsValueError(
+          '%s is not a location index.' % path)
+    location_index._Open(data)
+    return location_index
+
+  def _Open(self, data):
+    """Reads the header of an index image.
+
+    Args:
+      data: A string or mmap holding the image.
+    """
+    self._data = data
+    magic_size = len(_LOCATION_INDEX_MAGIC)
+    (self._count, self._ngram_count, postings_count,
+     _) = _LOCATION_INDEX_HEADER.unpack_from(data, magic_size)
+    self._records_start = magic_size + _LOCATION_INDEX_HEADER.size
+    self._ids_start = (self._records_start +
+                       self._count * _LOCATION_RECORD.size)
+    self._ngrams_start = (self._ids_start +
+                          self._count * _LOCATION_ID_RECORD.size)
+    self._postings_start = (self._ngrams_start +
+                            self._ngram_count * _LOCATION_NGRAM_RECORD.size)
+    self._strings_start = (self._postings_start +
+                           postings_count * _LOCATION_POSTING.size)
+
+  def Save(self, path):
+    """Writes the index to a file, replacing it atomically.
+
+    Args:
+      path: A string identifying the file.
+    """
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=os.path.dirname(os.path.abspath(path)),
+        delete=False) as handle:
+      handle.write(self._data[:])
+    try:
+      os.rename(handle.name, path)
+    except OSError:
+      # Windows does not allow renaming onto an existing file.
+      os.remove(path)
+      os.rename(handle.name, path)
+
+  def Close(self):
+    """Unmaps the index file, if the index was loaded from one."""
+    if isinstance(self._data, mmap.mmap):
+      self._data.close()
+
+  def Update(self, locations):
+    """Creates a copy of the index with locations added or replaced.
+
+    Args:
+      locations: A list of Locations, or tuples of the same fields. Locations
+          whose ID is already indexed replace the indexed ones.
+
+    Returns:
+      A new LocationIndex.
+    """
+    updated = dict((location.id, location) for location in
+                   (self._GetLocation(index) for index in xrange(self._count)))
+    updated.update((location[0], location) for location in locations)
+    return LocationIndex(updated.values())
+
+  def __len__(self):
+    return self._count
+
+  def __contains__(self, location_id):
+    return self._FindId(location_id) is not None
+
+  def Get(self, location_id):
+    """Retrieves a location by ID, or None if it is not indexed."""
+    index = self._FindId(location_id)
+    return self._GetLocation(index) if index is not None else None
+
+  def GetAncestors(self, location_id):
+    """Retrieves the indexed ancestors of a location, nearest first."""
+    ancestors = []
+    location = self.Get(location_id)
+    while location is not None and location.parent_id is not None:
+      location = self.Get(location.parent_id)
+      if location is not None:
+        ancestors.append(location)
+    return ancestors
+
+  def _GetRecord(self, index):
+    """Reads the record of the location at a position in name order."""
+    return _LOCATION_RECORD.unpack_from(
+        self._data, self._records_start + index * _LOCATION_RECORD.size)
+
+  def _GetString(self, offset, size):
+    """Reads a string, or None if its size is -1."""
+    if size < 0:
+      return None
+    start = self._strings_start + offset
+    return self._data[start:start + size]
+
+  def _GetKey(self, index):
+    """Reads the normalized name of the location at a position."""
+    return self._GetString(*self._GetRecord(index)[3:5])
+
+  def _GetLocation(self, index):
+    """Reads the location at a position in name order.
+
+    Args:
+      index: The position of the location's record.
+
+    Returns:
+      A Location.
+    """
+    record = self._GetRecord(index)
+    return Location(
+        record[0], self._GetString(record[5], record[6]),
+        self._GetString(record[7], record[8]),
+        record[1] if record[1] >= 0 else None,
+        self._GetString(record[9], record[10]),
+        record[2] if record[2] >= 0 else None)
+
+  def _FindId(self, location_id):
+    """Finds the position of a location's record, or None if it is unknown."""
+    low, high = 0, self._count
+    while low < high:
+      middle = (low + high) // 2
+      record_id, index = _LOCATION_ID_RECORD.unpack_from(
+          self._data, self._ids_start + middle * _LOCATION_ID_RECORD.size)
+      if record_id < location_id:
+        low = middle + 1
+      elif record_id > location_id:
+        high = middle
+      else:
+        return index
+    return None
+
+  def _FindKey(self, key, low=0, after=False):
+    """Finds the first position whose normalized name is not before a key.
+
+    Args:
+      key: A UTF-8 encoded string.
+      [optional]
+      low: The position at which the search starts.
+      after: A boolean indicating whether the position found is the first one
+          whose normalized name is after the key instead.
+
+    Returns:
+      The position, or the number of locations if there is none.
+    """
+    high = self._count
+    while low < high:
+      middle = (low + high) // 2
+      middle_key = self._GetKey(middle)
+      if middle_key < key or (after and middle_key == key):
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+  def _GetRange(self, start, end, location_type, limit=None):
+    """Retrieves the locations at positions in a range, by decreasing reach."""
+    locations = [location for location in
+                 (self._GetLocation(index) for index in xrange(start, end))
+                 if location_type is None or location.type == location_type]
+    locations.sort(key=lambda location: -(location.reach or 0))
+    return locations[:limit] if limit is not None else locations
+
+  def _GetPostings(self, ngram):
+    """Retrieves the postings of an n-gram.
+
+    Args:
+      ngram: A unicode string.
+
+    Returns:
+      A tuple of the positions of the first records of the normalized names
+      which contain the n-gram, or of n-grams with the same hash.
+    """
+    ngram_hash = _HashNgram(ngram)
+    low, high = 0, self._ngram_count
+    while low < high:
+      middle = (low + high) // 2
+      record_hash, start, count = _LOCATION_NGRAM_RECORD.unpack_from(
+          self._data,
+          self._ngrams_start + middle * _LOCATION_NGRAM_RECORD.size)
+      if record_hash < ngram_hash:
+        low = middle + 1
+      elif record_hash > ngram_hash:
+        high = middle
+      else:
+        return struct.unpack_from(
+            '<%dI' % count, self._data,
+            self._postings_start + start * _LOCATION_POSTING.size)
+    return ()
+
+  def Find(self, name, location_type=None):
+    """Finds the locations with a name, ignoring case and accents.
+
+    Args:
+      name: A string containing the name.
+      [optional]
+      location_type: A string containing the type of the locations to return,
+          such as City or Country.
+
+    Returns:
+      A list of Locations, by decreasing reach.
+    """
+    key = _NormalizeLocationName(name).encode('utf-8')
+    start = self._FindKey(key)
+    return self._GetRange(start, self._FindKey(key, start, after=True),
+                          location_type)
+
+  def FindByPrefix(self, prefix, location_type=None, limit=10):
+    """Finds the locations whose names start with a prefix.
+
+    Args:
+      prefix: A string containing the start of the names.
+      [optional]
+      location_type: A string containing the type of the locations to return,
+          such as City or Country.
+      limit: The maximum number of locations returned.
+
+    Returns:
+      A list of Locations, by decreasing reach.
+    """
+    key = _NormalizeLocationName(prefix).encode('utf-8')
+    start = self._FindKey(key)
+    return self._GetRange(start, self._FindKey(key + _UTF8_MAX, start),
+                          location_type, limit)
+
+  def FindFuzzy(self, name, location_type=None, limit=10, cutoff=0.8):
+    """Finds the locations whose names are similar to a name.
+
+    Only the names sharing the most n-grams with the name are compared with
+    it, so names which are similar but share few n-grams may be missed.
+
+    Args:
+      name: A string containing the name, which may be misspelled.
+      [optional]
+      location_type: A string containing the type of the locations to return,
+          such as City or Country.
+      limit: The maximum number of distinct names matched.
+      cutoff: The minimum similarity, between 0 and 1, of the names matched.
+
+    Returns:
+      A list of Locations, the most similar names first and then by decreasing
+      reach.
+    """
+    key = _NormalizeLocationName(name)
+    shared_ngrams = collections.defaultdict(int)
+    for ngram in _GetNgrams(key):
+      for index in self._GetPostings(ngram):
+        shared_ngrams[index] += 1
+    candidates = heapq.nlargest(_FUZZY_CANDIDATES, shared_ngrams,
+                                key=shared_ngrams.__getitem__)
+
+    # This scores the candidates the same way as difflib.get_close_matches.
+    matcher = difflib.SequenceMatcher()
+    matcher.set_seq2(key)
+    matches = []
+    for index in candidates:
+      matcher.set_seq1(self._GetKey(index).decode('utf-8'))
+      if (matcher.real_quick_ratio() >= cutoff and
+          matcher.quick_ratio() >= cutoff and matcher.ratio() >= cutoff):
+        matches.append((matcher.ratio(), matcher.a, index))
+
+    locations = []
+    for _, candidate_key, index in heapq.nlargest(limit, matches):
+      locations.extend(self._GetRange(
+          index, self._FindKey(candidate_key.encode('utf-8'), index,
+                               after=True), location_type))
+    return locations
+
+
+def _PackLocationIndex(locations):
+  """Creates the binary image of a LocationIndex.
+
+  Args:
+    locations: A list of Locations, or tuples of the same fields.
+
+  Returns:
+    A string holding the image.
+  """
+  locations = [(_NormalizeLocationName(location.name).encode('utf-8'),
+                location) for location in
+               (Location(*location) for location in locations)]
+  locations.sort(key=lambda item: (item[0], -(item[1].reach or 0),
+                                    item[1].id))
+
+  # Equal strings, such as the types, are stored once.
+  strings = []
+  string_offsets = {}
+  strings_size = 0
+  records = []
+  postings = collections.defaultdict(list)
+  for index, (key, location) in enumerate(locations):
+    if not index or key != locations[index - 1][0]:
+      for ngram in _GetNgrams(key.decode('utf-8')):
+        postings[_HashNgram(ngram)].append(index)
+    string_fields = []
+    for value in (key, location.name, location.canonical_name, location.type):
+      if value is None:
+        string_fields.extend((0, -1))
+        continue
+      if isinstance(value, unicode):
+        value = value.encode('utf-8')
+      if value not in string_offsets:
+        string_offsets[value] = strings_size
+        strings.append(value)
+        strings_size += len(value)
+      string_fields.extend((string_offsets[value], len(value)))
+    records.append(_LOCATION_RECORD.pack(
+        location.id,
+        location.parent_id if location.parent_id is not None else -1,
+        location.reach if location.reach is not None else -1,
+        *string_fields))
+
+  by_id = sorted((location.id, index)
+                 for index, (_, location) in enumerate(locations))
+  ngrams = []
+  packed_postings = []
+  posting_count = 0
+  for ngram_hash in sorted(postings):
+    ngram_postings = sorted(set(postings[ngram_hash]))
+    ngrams.append(_LOCATION_NGRAM_RECORD.pack(ngram_hash, posting_count,
+                                              len(ngram_postings)))
+    packed_postings.append(struct.pack('<%dI' % len(ngram_postings),
+                                       *ngram_postings))
+    posting_count += len(ngram_postings)
+
+  return ''.join(
+      [_LOCATION_INDEX_MAGIC,
+       _LOCATION_INDEX_HEADER.pack(len(locations), len(ngrams), posting_count,
+                                   strings_size)] +
+      records +
+      [_LOCATION_ID_RECORD.pack(location_id, index)
+       for location_id, index in by_id] +
+      ngrams + packed_postings + strings)
+
+
+def _GetNgrams(key):
+  """Splits a normalized name into the n-grams used for fuzzy lookups.
+
+  Args:
+    key: A unicode string.
+
+  Returns:
+    A set of unicode strings. The name is padded so that even short names have
+    n-grams, and its start weighs more than its end.
+  """
+  padded = u' ' * (_NGRAM_SIZE - 1) + key + u' '
+  return set(padded[index:index + _NGRAM_SIZE]
+             for index in xrange(len(padded) - _NGRAM_SIZE + 1))
+
+
+def _HashNgram(ngram):
+  """Hashes an n-gram for the n-gram index of a LocationIndex file."""
+  return zlib.crc32(ngram.encode('utf-8')) & 0xffffffff
+
+
+def _NormalizeLocationName(name):
+  """Normalizes a location name for comparison.
+
+  Args:
+    name: A unicode or UTF-8 encoded string.
+
+  Returns:
+    A unicode string in lower case, without accents or repeated whitespace.
+  """
+  if not isinstance(name, unicode):
+    name = name.decode('utf-8')
+  name = u''.join(character for character in
+                  unicodedata.normalize('NFKD', name)
+                  if not unicodedata.combining(character))
+  return u' '.join(name.lower().split())
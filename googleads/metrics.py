@@ -0,0 +1,280 @@
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Metrics of the calls made by the library, exported for Prometheus.
+
+Register a HistogramCollector with googleads.common.AddCallHook to collect the
+durations and counts of calls, and serve them with ServePrometheusMetrics.
+"""
+
+import BaseHTTPServer
+import bisect
+import collections
+import threading
+import time
+
+import suds.plugin
+
+import googleads.common
+
+# The upper bounds, in seconds, of the buckets of a HistogramCollector's
+# histograms.
+_HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                      30, 60, 120)
+# The counters of a HistogramCollector, mapped to their Prometheus name, help
+# text and the names of their labels.
+_PROMETHEUS_COUNTERS = collections.OrderedDict([
+    ('calls', ('googleads_calls_total', 'API calls made.',
+               ('service', 'method'))),
+    ('faults', ('googleads_faults_total', 'API calls which failed.',
+                ('service', 'method', 'type'))),
+    ('retries', ('googleads_retries_total', 'API calls which were retried.',
+                 ('service', 'method', 'reason'))),
+    ('cache_hits', ('googleads_cache_hits_total',
+                    'API calls served from a cache.', ('service', 'method'))),
+    ('request_bytes', ('googleads_request_bytes_total',
+                       'Bytes sent in API requests.', ('service', 'method'))),
+    ('response_bytes', ('googleads_response_bytes_total',
+                        'Bytes received in API responses.',
+                        ('service', 'method')))])
+# The name of the Prometheus histogram of call durations.
+_PROMETHEUS_DURATION_METRIC = 'googleads_call_duration_seconds'
+
+
+class HistogramCollector(googleads.common.CallHook):
+  """A CallHook keeping histograms of call durations and counters in memory.
+
+  Durations are kept per service, method and phase, the whole call being the
+  'total' phase. The collected metrics can be exported in the Prometheus text
+  format, either directly or over HTTP with ServePrometheusMetrics.
+  """
+
+  def __init__(self, buckets=_HISTOGRAM_BUCKETS):
+    """Initializes a HistogramCollector.
+
+    Args:
+      [optional]
+      buckets: A list of the upper bounds of the histograms' buckets, in
+          seconds.
+    """
+    self.buckets = tuple(sorted(buckets))
+    self._lock = threading.Lock()
+    # Maps (service name, method name, phase) to a list of the number of
+    # durations in each bucket, the number of larger durations and their sum.
+    self._histograms = {}
+    # Maps (counter name, label values) to the counter's value.
+    self._counters = collections.defaultdict(int)
+
+  def _Observe(self, labels, seconds):
+    """Adds a duration to a histogram. The lock must be held."""
+    histogram = self._histograms.get(labels)
+    if histogram is None:
+      histogram = self._histograms[labels] = [0] * (len(self.buckets) + 2)
+    histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+    histogram[-1] += seconds
+
+  def AfterCall(self, call):
+    labels = (call.service_name, call.method_name)
+    with self._lock:
+      self._Observe(labels + ('total',), call.duration)
+      for phase, seconds in call.phases.iteritems():
+        self._Observe(labels + (phase,), seconds)
+      self._counters[('calls', labels)] += 1
+      if call.fault_type:
+        self._counters[('faults', labels + (call.fault_type,))] += 1
+      if call.cached:
+        self._counters[('cache_hits', labels)] += 1
+      if call.request_bytes:
+        self._counters[('request_bytes', labels)] += call.request_bytes
+      if call.response_bytes:
+        self._counters[('response_bytes', labels)] += call.response_bytes
+
+  def OnRetry(self, service_name, method_name, reason):
+    with self._lock:
+      self._counters[('retries', (service_name, method_name, reason))] += 1
+
+  def GetHistogram(self, service_name, method_name, phase='total'):
+    """Retrieves a histogram of durations.
+
+    Args:
+      service_name: A string identifying the service.
+      method_name: A string identifying the method.
+      [optional]
+      phase: A string identifying the phase.
+
+    Returns:
+      A tuple of a list of the cumulative number of durations up to each bucket
+      bound, the number of durations and their sum, or None if there are none.
+    """
+    with self._lock:
+      histogram = self._histograms.get((service_name, method_name, phase))
+      if histogram is None:
+        return None
+      cumulative = []
+      for count in histogram[:len(self.buckets)]:
+        cumulative.append(count + (cumulative[-1] if cumulative else 0))
+      return cumulative, sum(histogram[:-1]), histogram[-1]
+
+  def GetCounter(self, name, *labels):
+    """Retrieves the value of a counter.
+
+    Args:
+      name: A string identifying the counter, one of calls, faults, retries,
+          cache_hits, request_bytes and response_bytes.
+      *labels: The values of the counter's labels: the service and method names,
+          followed by the fault type for faults and the reason for retries.
+
+    Returns:
+      The value of the counter.
+    """
+    with self._lock:
+      return self._counters.get((name, labels), 0)
+
+  def Reset(self):
+    """Discards all the collected metrics."""
+    with self._lock:
+      self._histograms.clear()
+      self._counters.clear()
+
+  def ToPrometheusText(self):
+    """Exports the collected metrics in the Prometheus text format.
+
+    Returns:
+      A string containing the metrics.
+    """
+    lines = ['# HELP %s Duration of API calls and of their phases.' %
+             _PROMETHEUS_DURATION_METRIC,
+             '# TYPE %s histogram' % _PROMETHEUS_DURATION_METRIC]
+    with self._lock:
+      for labels, histogram in sorted(self._histograms.iteritems()):
+        label_text = _FormatPrometheusLabels(('service', 'method', 'phase'),
+                                             labels)
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), histogram[:-1]):
+          cumulative += count
+          lines.append('%s_bucket{%s,le="%s"} %d' % (
+              _PROMETHEUS_DURATION_METRIC, label_text, bound, cumulative))
+        lines.append('%s_sum{%s} %r' % (_PROMETHEUS_DURATION_METRIC,
+                                        label_text, histogram[-1]))
+        lines.append('%s_count{%s} %d' % (_PROMETHEUS_DURATION_METRIC,
+                                          label_text, cumulative))
+      for name, (metric, help_text, label_names) in (
+          _PROMETHEUS_COUNTERS.iteritems()):
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s counter' % metric)
+        for (counter_name, labels), value in sorted(
+            self._counters.iteritems()):
+          if counter_name == name:
+            lines.append('%s{%s} %d' % (
+                metric, _FormatPrometheusLabels(label_names, labels), value))
+    return '\n'.join(lines) + '\n'
+
+
+def ServePrometheusMetrics(collector, port, host='localhost'):
+  """Serves the metrics of a HistogramCollector over HTTP for Prometheus.
+
+  The metrics are served from a daemon thread at every path of the address.
+
+  Args:
+    collector: The HistogramCollector whose metrics are served.
+    port: The port to listen on, or 0 to pick a free one.
+    [optional]
+    host: A string identifying the interface to listen on.
+
+  Returns:
+    The BaseHTTPServer.HTTPServer serving the metrics. Its server_address holds
+    the port listened on, and calling its shutdown method stops it.
+  """
+
+  class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Responds to every GET request with the collected metrics."""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+      body = collector.ToPrometheusText()
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/plain; version=0.0.4')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  server = BaseHTTPServer.HTTPServer((host, port), MetricsHandler)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server
+
+
+def _FormatPrometheusLabels(names, values):
+  """Formats the labels of a Prometheus sample.
+
+  Args:
+    names: A list of the names of the labels.
+    values: A list of the values of the labels.
+
+  Returns:
+    A string of comma separated name="value" pairs.
+  """
+  return ','.join('%s="%s"' % (name, unicode(value).encode('utf-8').replace(
+      '\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                  for name, value in zip(names, values))
+
+
+class MetricsPlugin(suds.plugin.MessagePlugin):
+  """A suds plugin measuring the serialization, network and parsing phases.
+
+  A googleads.common.SudsServiceProxy adds the plugin to its suds client's
+  options the first time a call is made with CallHooks or SpanExporters
+  registered, and the plugin measures the calls while its call attribute is
+  set.
+  """
+
+  def __init__(self):
+    """Initializes a MetricsPlugin which is not measuring any call."""
+    self.call = None
+    self.received_time = None
+    self._start_time = None
+    self._sending_time = None
+
+  def Start(self, call):
+    """Starts measuring a call, just before suds serializes its request."""
+    self.call = call
+    self.received_time = None
+    self._start_time = time.time()
+    self._sending_time = None
+
+  def sending(self, context):
+    """Records the end of the serialization phase, as the request is sent.
+
+    Args:
+      context: The suds MessageContext holding the request's envelope.
+    """
+    if self.call is not None:
+      self._sending_time = time.time()
+      self.call.phases['serialize'] = self._sending_time - self._start_time
+      self.call.request_bytes = len(context.envelope)
+
+  def received(self, context):
+    """Records the end of the network phase, as the reply is received.
+
+    Args:
+      context: The suds MessageContext holding the reply.
+    """
+    if self.call is not None:
+      self.received_time = time.time()
+      if self._sending_time is not None:
+        self.call.phases['network'] = self.received_time - self._sending_time
+      self.call.response_bytes = len(context.reply)
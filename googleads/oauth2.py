@@ -27,9 +27,8 @@ __author__ = 'Mark Saniscalchi'
 import datetime
 
 
+import googleads.common
 import googleads.errors
-import httplib2
-import oauth2client.client
 
 # The scopes used for authorizing with the APIs supported by this library.
 SCOPES = {'adwords': 'https://www.googleapis.com/auth/adwords',
@@ -120,6 +119,9 @@ class GoogleRefreshTokenClient(GoogleOAuth2Client):
       ca_certs: A string identifying the path to a file containing root CA
           certificates for SSL server certificate validation.
     """
+    # oauth2client and httplib2 are imported when they are first needed, as
+    # they make up much of the time taken to import the library.
+    import oauth2client.client  # pylint: disable=g-import-not-at-top
     self.oauth2credentials = oauth2client.client.OAuth2Credentials(
         None, client_id, client_secret, refresh_token,
         datetime.datetime(1980, 1, 1, 12), self._GOOGLE_OAUTH2_ENDPOINT,
@@ -158,12 +160,15 @@ class GoogleRefreshTokenClient(GoogleOAuth2Client):
     Raises:
       AccessTokenRefreshError: If the refresh fails.
     """
-    self.oauth2credentials.refresh(
-        httplib2.Http(
-            proxy_info=self.proxy_info,
-            ca_certs=self.ca_certs,
-            disable_ssl_certificate_validation=(
-                self.disable_ssl_certificate_validation)))
+    import httplib2  # pylint: disable=g-import-not-at-top
+    with googleads.common.StartSpan('OAuth2.Refresh', {
+        'googleads.oauth2_client': self.__class__.__name__}):
+      self.oauth2credentials.refresh(
+          httplib2.Http(
+              proxy_info=self.proxy_info,
+              ca_certs=self.ca_certs,
+              disable_ssl_certificate_validation=(
+                  self.disable_ssl_certificate_validation)))
 
 
 class GoogleServiceAccountClient(GoogleOAuth2Client):
@@ -211,6 +216,7 @@ class GoogleServiceAccountClient(GoogleOAuth2Client):
       raise googleads.errors.GoogleAdsValueError('The specified key file (%s)'
                                                  ' does not exist.' % key_file)
 
+    import oauth2client.client  # pylint: disable=g-import-not-at-top
     self.oauth2credentials = oauth2client.client.SignedJwtAssertionCredentials(
         client_email, private_key, scope, private_key_password,
         self._USER_AGENT, sub=sub)
@@ -249,9 +255,12 @@ class GoogleServiceAccountClient(GoogleOAuth2Client):
     Raises:
       AccessTokenRefreshError: If the refresh fails.
     """
-    self.oauth2credentials.refresh(
-        httplib2.Http(
-            proxy_info=self.proxy_info,
-            ca_certs=self.ca_certs,
-            disable_ssl_certificate_validation=(
-                self.disable_ssl_certificate_validation)))
+    import httplib2  # pylint: disable=g-import-not-at-top
+    with googleads.common.StartSpan('OAuth2.Refresh', {
+        'googleads.oauth2_client': self.__class__.__name__}):
+      self.oauth2credentials.refresh(
+          httplib2.Http(
+              proxy_info=self.proxy_info,
+              ca_certs=self.ca_certs,
+              disable_ssl_certificate_validation=(
+                  self.disable_ssl_certificate_validation)))
@@ -0,0 +1,306 @@
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Profiling of the CPU time and memory spent in the calls made by the library.
+
+Set the GOOGLEADS_PROFILE environment variable to profile a whole process, or
+use the Profile method of a client to profile a with statement.
+"""
+
+import atexit
+import collections
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import threading
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+import googleads.common
+
+# The categories the time and memory of a SessionProfiler are attributed to.
+_PROFILE_CATEGORIES = ('googleads', 'suds', 'network', 'other')
+# The modules, and the built-in modules, whose functions are attributed to the
+# network by a SessionProfiler.
+_NETWORK_MODULES = frozenset(['httplib', 'socket', 'socks', 'ssl', 'urllib2'])
+_NETWORK_BUILTINS = ('_socket', '_ssl', 'select')
+# The environment variable holding the path a profile of the process is written
+# to when it exits.
+_PROFILE_ENVIRONMENT_VARIABLE = 'GOOGLEADS_PROFILE'
+
+
+class SessionProfiler(googleads.common.CallHook):
+  """Profiles the CPU time and memory spent in the calls made by the library.
+
+  Each call is profiled with cProfile from the thread making it, and the
+  profiles are aggregated per service method. The time spent in each function
+  is attributed to the library itself, suds, the network or other code. When
+  the tracemalloc module is available, the memory allocated during each call is
+  attributed the same way. Calls made while another call is being profiled in
+  the same thread are counted in the outer call.
+  """
+
+  def __init__(self, memory=True):
+    """Initializes a SessionProfiler.
+
+    Args:
+      [optional]
+      memory: A boolean indicating whether to record allocation snapshots. This
+          is ignored if the tracemalloc module is not available.
+    """
+    self.memory = memory and tracemalloc is not None
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    # Maps (service name, method name) to the aggregated measurements.
+    self._stats = {}
+    self._calls = collections.Counter()
+    self._durations = collections.Counter()
+    self._phases = collections.defaultdict(collections.Counter)
+    self._allocations = collections.defaultdict(collections.Counter)
+
+  def BeforeCall(self, call):
+    if getattr(self._local, 'call', None) is not None:
+      return
+    self._local.call = call
+    self._local.snapshot = (tracemalloc.take_snapshot()
+                            if self.memory and tracemalloc.is_tracing()
+                            else None)
+    self._local.profile = cProfile.Profile()
+    self._local.profile.enable()
+
+  def AfterCall(self, call):
+    if getattr(self._local, 'call', None) is not call:
+      return
+    self._local.profile.disable()
+    allocations = collections.Counter()
+    if self._local.snapshot is not None:
+      for statistic in tracemalloc.take_snapshot().compare_to(
+          self._local.snapshot, 'filename'):
+        if statistic.size_diff > 0:
+          allocations[_GetProfileCategory(
+              statistic.traceback[0].filename)] += statistic.size_diff
+    key = (call.service_name, call.method_name)
+
+    with self._lock:
+      if key in self._stats:
+        self._stats[key].add(self._local.profile)
+      else:
+        self._stats[key] = pstats.Stats(self._local.profile)
+      self._calls[key] += 1
+      self._durations[key] += call.duration
+      self._phases[key].update(call.phases)
+      self._allocations[key].update(allocations)
+    self._local.call = None
+    self._local.profile = None
+    self._local.snapshot = None
+
+  def GetStats(self, service_name=None, method_name=None):
+    """Retrieves the aggregated CPU profile of the calls made.
+
+    Args:
+      [optional]
+      service_name: A string identifying the service whose calls to include.
+          Calls to every service are included if this is not given.
+      method_name: A string identifying the method whose calls to include.
+          Calls to every method are included if this is not given.
+
+    Returns:
+      A pstats.Stats, or None if no such call was profiled.
+    """
+    with self._lock:
+      stats = [self._stats[key] for key in sorted(self._stats)
+               if service_name in (None, key[0])
+               and method_name in (None, key[1])]
+      if not stats:
+        return None
+      result = pstats.Stats(_ProfileData(dict(stats[0].stats)))
+      result.add(*stats[1:])
+    return result
+
+  def GetReport(self, limit=10):
+    """Creates a report of where the time and memory of the calls went.
+
+    Service methods are ranked by the total duration of their calls. For each,
+    the CPU time and memory are broken down into the library, suds, the network
+    and other code, followed by the functions taking the most CPU time.
+
+    Args:
+      [optional]
+      limit: The number of functions listed for each service method.
+
+    Returns:
+      A string containing the report.
+    """
+    with self._lock:
+      keys = sorted(self._calls, key=lambda key: (-self._durations[key], key))
+      lines = ['googleads profile: %d calls, %.3fs' % (
+          sum(self._calls.values()), sum(self._durations.values()))]
+      for key in keys:
+        function_stats = self._stats[key].stats
+        times = collections.Counter()
+        for function, (_, _, own_time, _, _) in function_stats.iteritems():
+          times[_GetProfileCategory(function[0], function[2])] += own_time
+        lines.append('')
+        lines.append('%s.%s: %d calls, %.3fs' % (
+            key[0], key[1], self._calls[key], self._durations[key]))
+        lines.append('  cpu: %s' % ', '.join(
+            '%s %.3fs' % (category, times[category])
+            for category in _PROFILE_CATEGORIES))
+        if self._phases[key]:
+          lines.append('  phases: %s' % ', '.join(
+              '%s %.3fs' % (phase, seconds)
+              for phase, seconds in sorted(self._phases[key].iteritems())))
+        if self.memory:
+          lines.append('  allocated: %s' % ', '.join(
+              '%s %.1f KiB' % (category,
+                               self._allocations[key][category] / 1024.0)
+              for category in _PROFILE_CATEGORIES))
+        ranked_functions = sorted(function_stats.iteritems(),
+                                  key=lambda item: -item[1][2])[:limit]
+        for function, (_, call_count, own_time, cumulative_time,
+                       _) in ranked_functions:
+          lines.append('  %9.3fs %9.3fs %8d  %s' % (
+              own_time, cumulative_time, call_count,
+              _FormatProfileFunction(function)))
+    return '\n'.join(lines) + '\n'
+
+  def DumpStats(self, path):
+    """Writes the aggregated CPU profile of every call to a file.
+
+    The file can be read with pstats or tools such as snakeviz.
+
+    Args:
+      path: A string containing the path of the file.
+    """
+    stats = self.GetStats()
+    if stats is not None:
+      stats.dump_stats(path)
+
+
+@contextlib.contextmanager
+def ProfileSession(output=sys.stderr, memory=True):
+  """Profiles the calls made by the library within a with statement.
+
+  Args:
+    [optional]
+    output: A file-like object the report of the SessionProfiler is written to
+        when the with statement exits, or None to not write it.
+    memory: A boolean indicating whether to record allocation snapshots with
+        tracemalloc, when it is available.
+
+  Yields:
+    The SessionProfiler profiling the calls.
+  """
+  profiler = SessionProfiler(memory)
+  started_tracing = profiler.memory and not tracemalloc.is_tracing()
+  if started_tracing:
+    tracemalloc.start()
+  googleads.common.AddCallHook(profiler)
+  try:
+    yield profiler
+  finally:
+    googleads.common.RemoveCallHook(profiler)
+    if started_tracing:
+      tracemalloc.stop()
+    if output is not None:
+      output.write(profiler.GetReport())
+
+
+def _StartProfileFromEnvironment():
+  """Profiles the process if the GOOGLEADS_PROFILE variable is set.
+
+  The variable holds the path of the file the report is written to when the
+  process exits, or - to write it to stderr. The aggregated CPU profile is also
+  written next to the report, with a .pstats extension.
+
+  Returns:
+    The SessionProfiler, or None if the variable is not set.
+  """
+  path = os.environ.get(_PROFILE_ENVIRONMENT_VARIABLE)
+  if not path:
+    return None
+  session = ProfileSession(output=None)
+  profiler = session.__enter__()
+
+  def WriteReport():
+    session.__exit__(None, None, None)
+    if path == '-':
+      sys.stderr.write(profiler.GetReport())
+    else:
+      with open(path, 'w') as handle:
+        handle.write(profiler.GetReport())
+      profiler.DumpStats(path + '.pstats')
+
+  atexit.register(WriteReport)
+  return profiler
+
+
+class _ProfileData(object):
+  """Profile data in the form pstats.Stats loads it from a profiler."""
+
+  def __init__(self, stats):
+    self._data = stats
+
+  def create_stats(self):  # pylint: disable=invalid-name
+    self.stats = self._data
+
+
+def _GetProfileCategory(filename, function_name=''):
+  """Identifies the category a profiled function or allocation belongs to.
+
+  Args:
+    filename: A string containing the file of the function, or ~ for built-in
+        functions.
+    [optional]
+    function_name: A string containing the name of the function.
+
+  Returns:
+    One of _PROFILE_CATEGORIES.
+  """
+  path = filename.replace(os.sep, '/')
+  if filename == '~':
+    return ('network' if any(module in function_name
+                             for module in _NETWORK_BUILTINS) else 'other')
+  elif '/googleads/' in path:
+    return 'googleads'
+  elif '/suds/' in path:
+    return 'suds'
+  elif ('/httplib2/' in path or
+        os.path.splitext(os.path.basename(path))[0] in _NETWORK_MODULES):
+    return 'network'
+  return 'other'
+
+
+def _FormatProfileFunction(function):
+  """Formats a function of a pstats.Stats with a shortened file path.
+
+  Args:
+    function: A tuple of the file, line number and name of the function.
+
+  Returns:
+    A string identifying the function.
+  """
+  filename, line_number, function_name = function
+  if filename == '~':
+    return function_name
+  path = filename.replace(os.sep, '/').split('/')
+  return '%s:%d(%s)' % ('/'.join(path[-2:]), line_number, function_name)
+
+
+_StartProfileFromEnvironment()
@@ -0,0 +1,194 @@
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local SQLite replica of the entities synchronized from the APIs.
+
+googleads.adwords.AccountSyncEngine and googleads.dfp.DfpIncrementalSync keep
+their entities in an EntityStore.
+"""
+
+import json
+import sqlite3
+import threading
+
+
+class EntityStore(object):
+  """A local SQLite replica of the entities of many accounts.
+
+  Each entity is stored as JSON under its account, type and ID, along with the
+  ID of its parent entity so that the children of an entity can be listed. Each
+  account also has a checkpoint recording how far it has been synchronized.
+  All changes to an account are applied in a single transaction. A store may be
+  used by several threads at once.
+  """
+
+  def __init__(self, path):
+    """Initializes an EntityStore, creating its tables if necessary.
+
+    Args:
+      path: A string identifying the SQLite database file, or ':memory:'.
+    """
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._lock = threading.Lock()
+    with self._lock, self._connection:
+      self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS entities (account TEXT, type TEXT, '
+          'id TEXT, parent_id TEXT, data TEXT, '
+          'PRIMARY KEY (account, type, id))')
+      self._connection.execute(
+          'CREATE INDEX IF NOT EXISTS entities_by_parent ON entities '
+          '(account, type, parent_id)')
+      self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS checkpoints (account TEXT PRIMARY KEY, '
+          'checkpoint TEXT)')
+
+  def Get(self, account, entity_type, entity_id):
+    """Retrieves an entity.
+
+    Args:
+      account: A string identifying the account.
+      entity_type: A string identifying the type of the entity.
+      entity_id: The ID of the entity.
+
+    Returns:
+      A dictionary containing the entity's fields, or None if it is not stored.
+    """
+    with self._lock:
+      row = self._connection.execute(
+          'SELECT data FROM entities WHERE account = ? AND type = ? AND id = ?',
+          (str(account), entity_type, str(entity_id))).fetchone()
+    return json.loads(row[0]) if row else None
+
+  def GetAll(self, account, entity_type, parent_id=None):
+    """Retrieves all entities of a type, optionally limited to one parent.
+
+    Args:
+      account: A string identifying the account.
+      entity_type: A string identifying the type of the entities.
+      [optional]
+      parent_id: The ID of the parent whose children are retrieved.
+
+    Returns:
+      A list of dictionaries containing the entities' fields, ordered by ID.
+    """
+    query = 'SELECT data FROM entities WHERE account = ? AND type = ?'
+    args = [str(account), entity_type]
+    if parent_id is not None:
+      query += ' AND parent_id = ?'
+      args.append(str(parent_id))
+    with self._lock:
+      rows = self._connection.execute(query + ' ORDER BY id', args).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+  def GetIds(self, account, entity_type):
+    """Retrieves the IDs of all entities of a type.
+
+    Args:
+      account: A string identifying the account.
+      entity_type: A string identifying the type of the entities.
+
+    Returns:
+      A set of entity ID strings.
+    """
+    with self._lock:
+      rows = self._connection.execute(
+          'SELECT id FROM entities WHERE account = ? AND type = ?',
+          (str(account), entity_type)).fetchall()
+    return set(row[0] for row in rows)
+
+  def GetCheckpoint(self, account):
+    """Retrieves the checkpoint of an account.
+
+    Args:
+      account: A string identifying the account.
+
+    Returns:
+      The checkpoint string, or None if the account has not been synchronized.
+    """
+    with self._lock:
+      row = self._connection.execute(
+          'SELECT checkpoint FROM checkpoints WHERE account = ?',
+          (str(account),)).fetchone()
+    return row[0] if row else None
+
+  def Update(self, account, entities=(), removed=(), checkpoint=None,
+             replace=False, replace_types=()):
+    """Applies changes to an account in a single transaction.
+
+    Args:
+      account: A string identifying the account.
+      [optional]
+      entities: An iterable of (entity type, entity ID, parent ID, entity)
+          tuples to store. The entity may be a dictionary or suds object, and
+          replaces any stored entity with the same type and ID.
+      removed: An iterable of (entity type, entity ID) tuples to remove.
+      checkpoint: A string to store as the account's checkpoint.
+      replace: A boolean indicating whether all the account's stored entities
+          are removed before the given entities are stored.
+      replace_types: An iterable of entity types whose stored entities are
+          removed before the given entities are stored.
+    """
+    account = str(account)
+    rows = [(account, entity_type, str(entity_id),
+             None if parent_id is None else str(parent_id),
+             json.dumps(_ToJsonable(entity), sort_keys=True))
+            for entity_type, entity_id, parent_id, entity in entities]
+
+    with self._lock, self._connection:
+      if replace:
+        self._connection.execute('DELETE FROM entities WHERE account = ?',
+                                 (account,))
+      self._connection.executemany(
+          'DELETE FROM entities WHERE account = ? AND type = ?',
+          [(account, entity_type) for entity_type in replace_types])
+      self._connection.executemany(
+          'INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)', rows)
+      self._connection.executemany(
+          'DELETE FROM entities WHERE account = ? AND type = ? AND id = ?',
+          [(account, entity_type, str(entity_id))
+           for entity_type, entity_id in removed])
+      if checkpoint is not None:
+        self._connection.execute(
+            'INSERT OR REPLACE INTO checkpoints VALUES (?, ?)',
+            (account, checkpoint))
+
+  def Close(self):
+    """Closes the database connection."""
+    with self._lock:
+      self._connection.close()
+
+
+def _ToJsonable(obj):
+  """Converts a value into a form that can be serialized as JSON.
+
+  Args:
+    obj: The value to convert. This may be a dictionary, list, tuple, suds
+        object or scalar, arbitrarily nested.
+
+  Returns:
+    A structure of dictionaries, lists and scalars. Fields of suds objects which
+    are not set are omitted, and values of other types are converted to strings.
+  """
+  if isinstance(obj, dict):
+    return dict((str(key), _ToJsonable(value))
+                for key, value in obj.iteritems())
+  elif isinstance(obj, (list, tuple)):
+    return [_ToJsonable(item) for item in obj]
+  elif hasattr(obj, '__keylist__'):
+    return dict((str(key), _ToJsonable(value)) for key, value in obj
+                if value is not None)
+  elif obj is None or isinstance(obj, (bool, int, long, float, basestring)):
+    return obj
+  else:
+    return str(obj)
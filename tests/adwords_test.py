@@ -19,7 +19,11 @@
 
 __author__ = 'Joseph DiLallo'
 
+import copy
+import datetime
 import io
+import os
+import shutil
 import sys
 import tempfile
 import unittest
@@ -27,10 +31,13 @@ import urllib
 import urllib2
 
 import mock
+import suds
 
 import googleads.adwords
 import googleads.common
 import googleads.errors
+import googleads.locations
+import googleads.store
 
 PYTHON2 = sys.version_info[0] == 2
 URL_REQUEST_PATH = ('urllib2' if PYTHON2 else 'urllib.request')
@@ -182,7 +189,7 @@ class AdWordsClientTest(unittest.TestCase):
       mock_client.assert_called_once_with(
           'https://testing.test.com/api/adwords/%s/%s/%s?wsdl'
           % (namespace, version, service), proxy=https_proxy, cache=self.cache,
-          timeout=3600)
+          cachingpolicy=0, timeout=3600)
       self.assertIsInstance(suds_service, googleads.common.SudsServiceProxy)
 
     # Use the default server and https_proxy.
@@ -193,7 +200,7 @@ class AdWordsClientTest(unittest.TestCase):
       mock_client.assert_called_once_with(
           'https://adwords.google.com/api/adwords/%s/%s/%s?wsdl'
           % (namespace, version, service), proxy=None, cache=self.cache,
-          timeout=3600)
+          cachingpolicy=0, timeout=3600)
       self.assertFalse(mock_client.return_value.set_options.called)
       self.assertIsInstance(suds_service, googleads.common.SudsServiceProxy)
 
@@ -214,7 +221,13 @@ class AdWordsClientTest(unittest.TestCase):
           mock_downloader.return_value,
           self.adwords_client.GetReportDownloader('version', 'server'))
       mock_downloader.assert_called_once_with(
-          self.adwords_client, 'version', 'server')
+          self.adwords_client, 'version', 'server', None)
+
+    report_cache = mock.Mock()
+    with mock.patch('googleads.adwords.ReportDownloader') as mock_downloader:
+      self.adwords_client.GetReportDownloader('version', 'server', report_cache)
+      mock_downloader.assert_called_once_with(
+          self.adwords_client, 'version', 'server', report_cache)
 
   def testSetClientCustomerId(self):
     suds_client = mock.Mock()
@@ -225,6 +238,23 @@ class AdWordsClientTest(unittest.TestCase):
     soap_header = suds_client.factory.create.return_value
     self.assertEqual(ccid, soap_header.clientCustomerId)
 
+  def testHeaderHandlerForClient(self):
+    suds_client = mock.Mock()
+    lease_client = copy.copy(self.adwords_client)
+    lease_client.client_customer_id = 'leased'
+
+    self.header_handler.ForClient(lease_client).SetHeaders(suds_client)
+
+    soap_header = suds_client.factory.create.return_value
+    self.assertEqual('leased', soap_header.clientCustomerId)
+    self.assertNotEqual('leased', self.adwords_client.client_customer_id)
+
+  def testProfile(self):
+    with mock.patch('googleads.profiling.ProfileSession') as mock_session:
+      self.assertEqual(mock_session.return_value,
+                       self.adwords_client.Profile(None, False))
+      mock_session.assert_called_once_with(None, False)
+
 
 class ReportDownloaderTest(unittest.TestCase):
   """Tests for the googleads.adwords.ReportDownloader class."""
@@ -236,18 +266,51 @@ class ReportDownloaderTest(unittest.TestCase):
     self.adwords_client = mock.Mock()
     self.opener = mock.Mock()
     self.adwords_client.https_proxy = 'my.proxy.gov:443'
-    with mock.patch('suds.client.Client'):
-      with mock.patch('suds.xsd.doctor'):
-        with mock.patch('suds.mx.literal.Literal') as mock_literal:
-          with mock.patch(
-              'googleads.adwords._AdWordsHeaderHandler') as mock_handler:
-            with mock.patch(
-                URL_REQUEST_PATH + '.OpenerDirector') as mock_opener:
-              mock_literal.return_value = self.marshaller
-              mock_handler.return_value = self.header_handler
-              mock_opener.return_value = self.opener
-              self.report_downloader = googleads.adwords.ReportDownloader(
-                  self.adwords_client, self.version)
+    # The report definition schema is loaded by the tests serializing report
+    # definitions.
+    patchers = [
+        mock.patch('suds.client.Client'),
+        mock.patch('suds.xsd.doctor'),
+        mock.patch('suds.mx.literal.Literal', return_value=self.marshaller),
+        mock.patch.dict(googleads.adwords._report_definition_schemas,
+                        clear=True)
+    ]
+    self.mock_client, _, self.mock_literal, _ = [
+        patcher.start() for patcher in patchers]
+    for patcher in patchers:
+      self.addCleanup(patcher.stop)
+    with mock.patch(
+        'googleads.adwords._AdWordsHeaderHandler') as mock_handler:
+      with mock.patch(URL_REQUEST_PATH + '.OpenerDirector') as mock_opener:
+        mock_handler.return_value = self.header_handler
+        mock_opener.return_value = self.opener
+        self.report_downloader = googleads.adwords.ReportDownloader(
+            self.adwords_client, self.version)
+
+  def testInit_doesNotLoadSchema(self):
+    self.assertFalse(self.mock_client.called)
+
+  def testSerializeReportDefinition_loadsSchemaOncePerServerAndVersion(self):
+    schema = self.mock_client.return_value.wsdl.schema
+    other_report_downloader = googleads.adwords.ReportDownloader(
+        self.adwords_client, self.version)
+    other_version_report_downloader = googleads.adwords.ReportDownloader(
+        self.adwords_client, 'v201409')
+
+    for report_downloader in (self.report_downloader, other_report_downloader,
+                              other_version_report_downloader):
+      report_downloader._SerializeReportDefinition({'reportName': 'report'})
+      report_downloader._SerializeReportDefinition({'reportName': 'report'})
+
+    self.assertEqual(
+        ['https://adwords.google.com/api/adwords/reportdownload/%s/'
+         'reportDefinition.xsd' % version
+         for version in (self.version, 'v201409')],
+        [args[0] for args, _ in self.mock_client.call_args_list])
+    # Each downloader has its own marshaller.
+    self.assertEqual(3, self.mock_literal.call_count)
+    self.assertIs(schema.elements.__getitem__.return_value,
+                  other_report_downloader._report_definition_type)
 
   def testDownloadReport(self):
     output_file = io.StringIO()
@@ -334,6 +397,70 @@ class ReportDownloaderTest(unittest.TestCase):
     self.header_handler.GetReportDownloadHeaders.assert_called_once_with(
         None, None, None)
 
+  def testDownloadReportAsStringWithAwql_cached(self):
+    report_cache = mock.Mock()
+    report_cache.MakeKey.return_value = 'key'
+    report_cache.Get.side_effect = [None, io.BytesIO('CACHED REPORT')]
+    report_cache.Set.side_effect = lambda key, response, includes_today: (
+        io.BytesIO(response.read()))
+    self.report_downloader._report_cache = report_cache
+    self.adwords_client.client_customer_id = '123-456-7890'
+    self.header_handler.GetReportDownloadHeaders.return_value = {}
+    query = 'SELECT Id   FROM Campaign\n DURING 20150101,20150131'
+    post_body = urllib.urlencode({'__fmt': 'CSV', '__rdquery': query})
+    cache_key_body = urllib.urlencode(
+        {'__fmt': 'CSV',
+         '__rdquery': 'SELECT Id FROM Campaign DURING 20150101,20150131'})
+
+    with mock.patch(URL_REQUEST_PATH + '.Request') as mock_request:
+      self.opener.open.return_value = io.BytesIO('DOWNLOADED REPORT')
+      self.assertEqual(
+          'DOWNLOADED REPORT',
+          self.report_downloader.DownloadReportAsStringWithAwql(query, 'CSV'))
+      self.assertEqual(
+          'CACHED REPORT',
+          self.report_downloader.DownloadReportAsStringWithAwql(query, 'CSV'))
+
+    # The query is sent as given, and only normalized in the cache key.
+    mock_request.assert_called_once_with(
+        'https://adwords.google.com/api/adwords/reportdownload/%s'
+        % self.version, post_body, {})
+    self.assertEqual(1, self.opener.open.call_count)
+    report_cache.MakeKey.assert_called_with(
+        'https://adwords.google.com/api/adwords/reportdownload/%s'
+        % self.version, '123-456-7890', cache_key_body, None, None, None)
+    report_cache.Set.assert_called_once_with('key', mock.ANY, False)
+
+  def testNormalizeAwql(self):
+    self.assertEqual(
+        'SELECT Id FROM Campaign WHERE Name = \'a  \\\' b\' DURING TODAY',
+        googleads.adwords._NormalizeAwql(
+            ' SELECT Id\n  FROM Campaign WHERE Name = \'a  \\\' b\'\t'
+            'DURING TODAY '))
+
+  def testAwqlIncludesToday(self):
+    self.assertTrue(googleads.adwords._AwqlIncludesToday(
+        'SELECT Id FROM Campaign'))
+    self.assertTrue(googleads.adwords._AwqlIncludesToday(
+        'SELECT Id FROM Campaign DURING this_month'))
+    self.assertTrue(googleads.adwords._AwqlIncludesToday(
+        'SELECT Id FROM Campaign DURING 20150101,%s' %
+        datetime.date.today().strftime('%Y%m%d')))
+    self.assertFalse(googleads.adwords._AwqlIncludesToday(
+        'SELECT Id FROM Campaign DURING LAST_7_DAYS'))
+    self.assertFalse(googleads.adwords._AwqlIncludesToday(
+        'SELECT Id FROM Campaign DURING 20150101, 20150131'))
+
+  def testReportDefinitionIncludesToday(self):
+    self.assertTrue(googleads.adwords._ReportDefinitionIncludesToday(
+        {'dateRangeType': 'TODAY'}))
+    self.assertTrue(googleads.adwords._ReportDefinitionIncludesToday({}))
+    self.assertFalse(googleads.adwords._ReportDefinitionIncludesToday(
+        {'dateRangeType': 'LAST_MONTH'}))
+    self.assertFalse(googleads.adwords._ReportDefinitionIncludesToday(
+        {'dateRangeType': 'CUSTOM_DATE',
+         'selector': {'dateRange': {'min': '20150101', 'max': '20150131'}}}))
+
   def testDownloadReportCheckFormat_CSVStringSuccess(self):
     output_file = io.StringIO()
 
@@ -432,6 +559,8 @@ class ReportDownloaderTest(unittest.TestCase):
     self.assertEqual(content, output_file.getvalue())
     self.header_handler.GetReportDownloadHeaders.assert_called_once_with(
         None, None, None)
+    # AWQL downloads do not need the report definition schema.
+    self.assertFalse(self.mock_client.called)
 
   def testDownloadReportWithBytesIO(self):
     output_file = io.BytesIO()
@@ -525,5 +654,753 @@ class ReportDownloaderTest(unittest.TestCase):
     self.assertIsInstance(rval, googleads.errors.AdWordsReportError)
 
 
+def _ApiError(error_type, field_path, reason=None):
+  """Creates an object resembling an ApiError of the given type."""
+  error = type(error_type, (object,), {})()
+  error.fieldPath = field_path
+  error.reason = reason
+  return error
+
+
+class AdWordsServiceProxyTest(unittest.TestCase):
+  """Tests for the googleads.adwords._AdWordsServiceProxy class."""
+
+  def setUp(self):
+    port = mock.Mock()
+    port.methods = ('mutate',)
+    services = mock.Mock()
+    services.name = 'CampaignService'
+    services.ports = [port]
+    self.suds_client = mock.Mock()
+    self.suds_client.wsdl.services = [services]
+    self.suds_client.clone.return_value = self.suds_client
+    self.mutate = self.suds_client.service.mutate
+    self.proxy = googleads.adwords._AdWordsServiceProxy(
+        self.suds_client, mock.Mock())
+
+  def _RateExceededFault(self, retry_after_seconds):
+    fault = mock.Mock()
+    fault.detail.ApiExceptionFault.errors = [
+        {'ApiError.Type': 'RateExceededError',
+         'retryAfterSeconds': retry_after_seconds}]
+    return suds.WebFault(fault, None)
+
+  def testMutateBatched(self):
+    def Mutate(operations):
+      errors = []
+      for i, operation in enumerate(operations):
+        if operation % 4 == 0:
+          error = mock.Mock()
+          error.fieldPath = 'operations[%d].operand' % i
+          errors.append(error)
+      return {'value': [None if operation % 4 == 0 else {'id': operation}
+                        for operation in operations],
+              'partialFailureErrors': errors}
+    self.mutate.side_effect = Mutate
+
+    result = self.proxy.MutateBatched(range(1, 8), batch_size=3,
+                                      max_parallel=2)
+
+    self.assertEqual([{'id': 1}, {'id': 2}, {'id': 3}, None, {'id': 5},
+                      {'id': 6}, {'id': 7}], result.value)
+    self.assertEqual(1, len(result.errors))
+    self.assertEqual([result.errors[0]], result.GetErrors(3))
+    self.assertEqual('operations[3].operand', result.errors[0].fieldPath)
+    self.assertEqual(3, self.mutate.call_count)
+    self.suds_client.clone.assert_called_once_with()
+
+  def testMutateBatched_noValue(self):
+    self.mutate.return_value = None
+
+    result = self.proxy.MutateBatched(range(5), batch_size=2)
+
+    self.assertEqual([None] * 5, result.value)
+    self.assertEqual([], result.errors)
+
+  def testMutateBatched_rateExceeded(self):
+    self.mutate.side_effect = [self._RateExceededFault(7),
+                               {'value': [{'id': 1}]}]
+
+    with mock.patch('time.sleep') as mock_sleep:
+      with mock.patch('googleads.common.RecordRetry') as mock_record_retry:
+        result = self.proxy.MutateBatched([1])
+
+    mock_sleep.assert_called_once_with(7)
+    mock_record_retry.assert_called_once_with('CampaignService', 'mutate',
+                                              'RateExceededError')
+    self.assertEqual([{'id': 1}], result.value)
+
+  def testMutateBatched_otherFault(self):
+    fault = mock.Mock()
+    fault.detail.ApiExceptionFault.errors = [
+        {'ApiError.Type': 'RequiredError'}]
+    self.mutate.side_effect = suds.WebFault(fault, None)
+
+    with mock.patch('time.sleep') as mock_sleep:
+      self.assertRaises(suds.WebFault, self.proxy.MutateBatched, [1])
+    self.assertFalse(mock_sleep.called)
+
+  def testMutateBatched_retries(self):
+    responses = {
+        (1, 2, 3): {'value': [{'id': 1}, None, None],
+                    'partialFailureErrors': [
+                        _ApiError('RateExceededError', 'operations[1].operand'),
+                        _ApiError('RequiredError', 'operations[2].operand')]},
+        (2,): {'value': [None],
+               'partialFailureErrors': [
+                   _ApiError('DatabaseError', 'operations[0].operand',
+                             'CONCURRENT_MODIFICATION')]},
+    }
+    self.mutate.side_effect = [responses[(1, 2, 3)], responses[(2,)],
+                               {'value': [{'id': 2}]}]
+
+    with mock.patch('time.sleep') as mock_sleep:
+      result = self.proxy.MutateBatched([1, 2, 3], max_retries=3)
+
+    self.assertEqual([mock.call([1, 2, 3]), mock.call([2]), mock.call([2])],
+                     self.mutate.call_args_list)
+    self.assertEqual([mock.call(5), mock.call(10)], mock_sleep.call_args_list)
+    self.assertEqual([{'id': 1}, {'id': 2}, None], result.value)
+    self.assertEqual([0, 1], result.GetSucceededIndices())
+    self.assertEqual([2], result.GetFailedIndices())
+    self.assertEqual([], result.GetRetryableIndices())
+    self.assertEqual(1, len(result.errors))
+    self.assertEqual([], result.GetErrors(1))
+
+  def testMutateBatched_badBatchSize(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      self.proxy.MutateBatched, [1], batch_size=0)
+
+
+class MutateResultTest(unittest.TestCase):
+  """Tests for the googleads.adwords.MutateResult class."""
+
+  def testAddValueAndErrors(self):
+    result = googleads.adwords.MutateResult()
+    error = mock.Mock()
+    error.fieldPath = 'operations[1].operand.criterion.text'
+    unindexed_error = mock.Mock()
+    unindexed_error.fieldPath = ''
+
+    result._AddValue([{'id': 1}, {'PlaceHolder': None}, None])
+    result._AddErrors([error, unindexed_error], 10)
+
+    self.assertEqual([{'id': 1}, None, None], result.value)
+    self.assertEqual('operations[11].operand.criterion.text', error.fieldPath)
+    self.assertEqual([error], result.GetErrors(11))
+    self.assertEqual([], result.GetErrors(1))
+    self.assertEqual([error, unindexed_error], result.errors)
+    self.assertEqual([0, 2], result.GetSucceededIndices())
+    self.assertEqual([1, 11], result.GetFailedIndices())
+    self.assertEqual([unindexed_error], result.GetUnindexedErrors())
+
+  def testReplaceResults_unindexedErrors(self):
+    result = googleads.adwords.MutateResult()
+    unindexed_error = _ApiError('InternalApiError', '')
+    result._AddValue([None])
+    result._AddErrors([_ApiError('RateExceededError', 'operations[0]'),
+                       unindexed_error], 0)
+    retry_result = googleads.adwords.MutateResult()
+    retry_unindexed_error = _ApiError('InternalApiError', '')
+    retry_result._AddValue([{'id': 1}])
+    retry_result._AddErrors([retry_unindexed_error], 0)
+
+    result._ReplaceResults([0], retry_result)
+
+    self.assertEqual([unindexed_error, retry_unindexed_error],
+                     result.GetUnindexedErrors())
+    self.assertEqual([unindexed_error, retry_unindexed_error], result.errors)
+    self.assertEqual([0], result.GetSucceededIndices())
+
+  def testFailedJob(self):
+    result = googleads.adwords.MutateResult()
+
+    result._AddValue([{'id': 1}])
+    result._AddFailedJob(7, 1, 2, 'reason')
+
+    self.assertEqual([{'id': 1}, None, None], result.value)
+    self.assertEqual({7: (1, 3, 'reason')}, result.failed_jobs)
+    self.assertEqual([1, 2], result.GetFailedIndices())
+    self.assertEqual([0], result.GetSucceededIndices())
+    self.assertEqual([], result.GetRetryableIndices())
+
+  def testGetRetryableIndices(self):
+    result = googleads.adwords.MutateResult()
+    errors = [_ApiError('InternalApiError', 'operations[0]'),
+              _ApiError('RateExceededError', 'operations[1]'),
+              _ApiError('RequiredError', 'operations[1]'),
+              _ApiError('DatabaseError', 'operations[2]',
+                        'CONCURRENT_MODIFICATION'),
+              _ApiError('DatabaseError', 'operations[3]', 'PERMISSION_DENIED')]
+
+    result._AddValue([None] * 5)
+    result._AddErrors(errors, 0)
+
+    self.assertEqual([0, 2], result.GetRetryableIndices())
+    self.assertEqual([0, 1, 2, 3], result.GetFailedIndices())
+    self.assertEqual([4], result.GetSucceededIndices())
+
+
+class BulkMutateRunnerTest(unittest.TestCase):
+  """Tests for the googleads.adwords.BulkMutateRunner class."""
+
+  def setUp(self):
+    self.adwords_client = mock.Mock()
+    self.mutate_job_service = self.adwords_client.GetService.return_value
+    self.runner = googleads.adwords.BulkMutateRunner(
+        self.adwords_client, CURRENT_VERSION, max_operations_per_job=3,
+        max_pending_jobs=2)
+    self.job_ids = iter(range(1, 100))
+    self.mutate_job_service.mutate.side_effect = (
+        lambda operations, policy: {'id': next(self.job_ids)})
+
+  def _Error(self, field_path):
+    error = mock.Mock()
+    error.fieldPath = field_path
+    return error
+
+  def testRun(self):
+    statuses = {1: ['PROCESSING', 'COMPLETED'], 2: ['COMPLETED'],
+                3: ['PENDING', 'PENDING', 'FAILED']}
+    errors = {1: [self._Error('operations[2].operand')],
+              2: [self._Error('operations[0].operand.text')]}
+
+    def Get(selector):
+      return [{'id': job_id, 'status': statuses[job_id].pop(0)}
+              for job_id in selector['jobIds']]
+
+    def GetResult(selector):
+      job_id = selector['jobIds'][0]
+      results = [{'value': '%d-%d' % (job_id, i)} for i in range(3)]
+      return {'SimpleMutateResult': {'results': results,
+                                     'errors': errors[job_id]}}
+
+    self.mutate_job_service.get.side_effect = Get
+    self.mutate_job_service.getResult.side_effect = GetResult
+
+    with mock.patch('time.sleep') as mock_sleep:
+      result = self.runner.Run(({'operand': i} for i in range(8)),
+                               ordered=True)
+
+    self.adwords_client.GetService.assert_called_once_with(
+        'MutateJobService', CURRENT_VERSION, 'https://adwords.google.com')
+    self.assertEqual(
+        [mock.call([{'operand': 0}, {'operand': 1}, {'operand': 2}],
+                   {'prerequisiteJobIds': []}),
+         mock.call([{'operand': 3}, {'operand': 4}, {'operand': 5}],
+                   {'prerequisiteJobIds': [1]}),
+         mock.call([{'operand': 6}, {'operand': 7}],
+                   {'prerequisiteJobIds': [2]})],
+        self.mutate_job_service.mutate.call_args_list)
+    self.assertEqual(
+        [{'value': '1-0'}, {'value': '1-1'}, {'value': '1-2'},
+         {'value': '2-0'}, {'value': '2-1'}, {'value': '2-2'}, None, None],
+        result.value)
+    self.assertEqual('operations[2].operand', result.GetErrors(2)[0].fieldPath)
+    self.assertEqual('operations[3].operand.text',
+                     result.GetErrors(3)[0].fieldPath)
+    self.assertEqual({3: (6, 8, None)}, result.failed_jobs)
+    # The wait grows while no job finishes and resets once one does.
+    self.assertEqual([mock.call(5), mock.call(5), mock.call(5), mock.call(10)],
+                     mock_sleep.call_args_list)
+
+  def testRun_unordered(self):
+    self.mutate_job_service.get.side_effect = lambda selector: [
+        {'id': job_id, 'status': 'COMPLETED'}
+        for job_id in selector['jobIds']]
+    self.mutate_job_service.getResult.return_value = {
+        'SimpleMutateResult': {'results': [{'value': 'a'}], 'errors': []}}
+
+    with mock.patch('time.sleep'):
+      result = self.runner.Run([{'operand': 0}, {'operand': 1}])
+
+    self.mutate_job_service.mutate.assert_called_once_with(
+        [{'operand': 0}, {'operand': 1}], {'prerequisiteJobIds': []})
+    self.assertEqual([{'value': 'a'}, None], result.value)
+
+  def testRun_shortJobResults(self):
+    self.mutate_job_service.get.side_effect = lambda selector: [
+        {'id': job_id, 'status': 'COMPLETED'}
+        for job_id in selector['jobIds']]
+    job_results = {
+        1: {'results': [{'value': '1-0'}], 'errors': []},
+        2: {'results': [{'value': '2-0'}, {'PlaceHolder': None},
+                        {'value': '2-2'}],
+            'errors': [self._Error('operations[1].operand')]}
+    }
+    self.mutate_job_service.getResult.side_effect = lambda selector: {
+        'SimpleMutateResult': job_results[selector['jobIds'][0]]}
+
+    with mock.patch('time.sleep'):
+      result = self.runner.Run([{'operand': i} for i in range(6)])
+
+    # The first job's missing results are padded, keeping the second job's
+    # results and errors at the indices of its operations.
+    self.assertEqual(
+        [{'value': '1-0'}, None, None, {'value': '2-0'}, None,
+         {'value': '2-2'}], result.value)
+    self.assertEqual('operations[4].operand', result.GetErrors(4)[0].fieldPath)
+    self.assertEqual([4], result.GetFailedIndices())
+
+  def testRun_noOperations(self):
+    result = self.runner.Run([])
+    self.assertEqual([], result.value)
+    self.assertFalse(self.mutate_job_service.mutate.called)
+
+
+class MutationBufferTest(unittest.TestCase):
+  """Tests for the googleads.adwords.MutationBuffer class."""
+
+  def setUp(self):
+    self.adwords_client = mock.Mock()
+    self.service = self.adwords_client.GetService.return_value
+    self.callback = mock.Mock()
+    self.buffer = googleads.adwords.MutationBuffer(
+        self.adwords_client, CURRENT_VERSION, max_operations=5, max_age=60,
+        callback=self.callback, batch_size=100, max_parallel=2)
+
+  def _Operation(self, operator, criterion_id, **fields):
+    operand = {'adGroupId': 1, 'criterion': {'id': criterion_id}}
+    operand.update(fields)
+    return {'operator': operator, 'operand': operand}
+
+  def _SentOperations(self):
+    return [call[0][0] for call in self.service.MutateBatched.call_args_list]
+
+  def testCoalesce(self):
+    with mock.patch('time.time') as mock_time:
+      mock_time.return_value = 100
+      self.buffer.Add('AdGroupCriterionService', self._Operation(
+          'SET', 1, userStatus='PAUSED', biddingStrategyConfiguration={
+              'bids': [{'bid': 1}]}))
+      self.buffer.Add('AdGroupCriterionService', self._Operation(
+          'SET', 1, userStatus='ENABLED'))
+      self.buffer.Add('AdGroupCriterionService', self._Operation('ADD', 2))
+      self.buffer.Add('AdGroupCriterionService', self._Operation('REMOVE', 2))
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 3))
+      self.buffer.Add('AdGroupCriterionService', self._Operation('REMOVE', 3))
+      self.buffer.Add('CampaignService', {'operator': 'ADD',
+                                          'operand': {'name': 'a'}})
+      self.buffer.Add('CampaignService', {'operator': 'ADD',
+                                          'operand': {'name': 'a'}})
+      self.assertFalse(self.service.MutateBatched.called)
+
+      results = self.buffer.Flush()
+
+    criterion_operations = [
+        self._Operation('SET', 1, userStatus='ENABLED',
+                        biddingStrategyConfiguration={'bids': [{'bid': 1}]}),
+        self._Operation('REMOVE', 3)]
+    campaign_operations = [{'operator': 'ADD', 'operand': {'name': 'a'}}] * 2
+    self.assertEqual(sorted([criterion_operations, campaign_operations]),
+                     sorted(self._SentOperations()))
+    self.service.MutateBatched.assert_any_call(criterion_operations, 100, 2)
+    self.assertEqual(['AdGroupCriterionService', 'CampaignService'],
+                     sorted(result[0] for result in results))
+    self.assertEqual(2, self.callback.call_count)
+    self.assertEqual([], self.buffer.Flush())
+
+  def testAddAfterRemove_flushesFirst(self):
+    with mock.patch('time.time', return_value=100):
+      self.buffer.Add('AdGroupCriterionService', self._Operation('REMOVE', 1))
+      self.buffer.Add('AdGroupCriterionService', self._Operation('ADD', 1))
+
+      self.assertEqual([[self._Operation('REMOVE', 1)]],
+                       self._SentOperations())
+      self.buffer.Flush()
+
+    self.assertEqual([[self._Operation('REMOVE', 1)],
+                      [self._Operation('ADD', 1)]], self._SentOperations())
+
+  def testFlushOnSize(self):
+    with mock.patch('time.time', return_value=100):
+      for criterion_id in range(6):
+        self.buffer.Add('AdGroupCriterionService',
+                        self._Operation('SET', criterion_id))
+
+    self.assertEqual([[self._Operation('SET', criterion_id)
+                       for criterion_id in range(5)]], self._SentOperations())
+
+  def testFlushOnAge(self):
+    with mock.patch('time.time') as mock_time:
+      mock_time.return_value = 100
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 1))
+      mock_time.return_value = 159
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 2))
+      self.assertFalse(self.service.MutateBatched.called)
+      mock_time.return_value = 160
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 3))
+
+    self.assertEqual([[self._Operation('SET', 1), self._Operation('SET', 2),
+                       self._Operation('SET', 3)]], self._SentOperations())
+
+  def testFlush_failureKeepsOperations(self):
+    self.service.MutateBatched.side_effect = [
+        suds.WebFault(mock.Mock(), mock.Mock()), 'result']
+    with mock.patch('time.time', return_value=100):
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 1))
+      self.assertRaises(suds.WebFault, self.buffer.Flush)
+      self.assertFalse(self.callback.called)
+      self.buffer.Add('AdGroupCriterionService', self._Operation('SET', 2))
+
+      results = self.buffer.Flush()
+
+    operations = [self._Operation('SET', 1), self._Operation('SET', 2)]
+    self.assertEqual([[self._Operation('SET', 1)], operations],
+                     self._SentOperations())
+    self.assertEqual([('AdGroupCriterionService', operations, 'result')],
+                     results)
+    self.callback.assert_called_once_with('AdGroupCriterionService',
+                                          operations, 'result')
+
+  def testFlush_returnsAutomaticFlushesWithoutCallback(self):
+    self.buffer = googleads.adwords.MutationBuffer(
+        self.adwords_client, CURRENT_VERSION, max_operations=2, max_age=60)
+    self.service.MutateBatched.side_effect = ['first', 'second']
+    with mock.patch('time.time', return_value=100):
+      for criterion_id in range(3):
+        self.buffer.Add('AdGroupCriterionService',
+                        self._Operation('SET', criterion_id))
+
+      results = self.buffer.Flush()
+
+    self.assertEqual([
+        ('AdGroupCriterionService',
+         [self._Operation('SET', 0), self._Operation('SET', 1)], 'first'),
+        ('AdGroupCriterionService', [self._Operation('SET', 2)], 'second')],
+                     results)
+    self.assertEqual([], self.buffer.Flush())
+
+
+class CustomerSyncInvalidatorTest(unittest.TestCase):
+  """Tests for the googleads.adwords.CustomerSyncInvalidator class."""
+
+  def testCheck(self):
+    adwords_client = mock.Mock()
+    customer_sync_service = adwords_client.GetService.return_value
+    entity_cache = mock.Mock()
+    start_time = datetime.datetime(2015, 6, 1, 12)
+    check_time = datetime.datetime(2015, 6, 1, 13)
+    with mock.patch('googleads.adwords.datetime.datetime') as mock_datetime:
+      mock_datetime.utcnow.return_value = start_time
+      invalidator = googleads.adwords.CustomerSyncInvalidator(
+          adwords_client, entity_cache, [1, 2], CURRENT_VERSION)
+      customer_sync_service.get.return_value = {
+          'changedCampaigns': [
+              {'campaignId': 1, 'campaignChangeStatus': 'FIELDS_UNCHANGED',
+               'changedAdGroups': [
+                   {'adGroupId': 3, 'adGroupChangeStatus': 'FIELDS_UNCHANGED',
+                    'changedCriteria': [4]}]},
+              {'campaignId': 2, 'campaignChangeStatus': 'FIELDS_CHANGED',
+               'removedCampaignCriteria': [5]}]}
+      mock_datetime.utcnow.return_value = check_time
+
+      changed_services = invalidator.Check()
+
+    adwords_client.GetService.assert_called_once_with(
+        'CustomerSyncService', CURRENT_VERSION, 'https://adwords.google.com')
+    customer_sync_service.get.assert_called_once_with({
+        'dateTimeRange': {'min': '20150601 115900 UTC',
+                          'max': '20150601 130000 UTC'},
+        'campaignIds': [1, 2]})
+    self.assertEqual(set(['AdGroupCriterionService', 'CampaignService',
+                          'CampaignCriterionService']), changed_services)
+    self.assertEqual(3, entity_cache.Invalidate.call_count)
+    entity_cache.Invalidate.assert_any_call('AdGroupCriterionService')
+
+  def testCheck_noChanges(self):
+    adwords_client = mock.Mock()
+    adwords_client.GetService.return_value.get.return_value = {}
+    entity_cache = mock.Mock()
+    invalidator = googleads.adwords.CustomerSyncInvalidator(
+        adwords_client, entity_cache, [1])
+
+    self.assertEqual(set(), invalidator.Check())
+    self.assertFalse(entity_cache.Invalidate.called)
+
+
+class FakeEntityService(object):
+  """A fake AdWords service whose get calls filter a list of entities."""
+
+  def __init__(self, entities, child_field=None):
+    self.entities = entities
+    self.child_field = child_field
+    self.selectors = []
+
+  def _GetFieldValue(self, entity, field):
+    if field == 'Id' and self.child_field:
+      return entity[self.child_field]['id']
+    return entity[field[0].lower() + field[1:]]
+
+  def get(self, selector):
+    self.selectors.append(copy.deepcopy(selector))
+    entries = [entity for entity in self.entities
+               if all(str(self._GetFieldValue(entity, predicate['field']))
+                      in [str(value) for value in predicate['values']]
+                      for predicate in selector['predicates'])]
+    paging = selector['paging']
+    return {'totalNumEntries': len(entries),
+            'entries': entries[paging['startIndex']:
+                               paging['startIndex'] + paging['numberResults']]}
+
+
+class AccountSyncEngineTest(unittest.TestCase):
+  """Tests for the googleads.adwords.AccountSyncEngine class."""
+
+  def setUp(self):
+    self.services = {
+        'CampaignService': FakeEntityService([
+            {'id': 1, 'campaignId': 1, 'name': 'a'},
+            {'id': 2, 'campaignId': 2, 'name': 'b'}]),
+        'AdGroupService': FakeEntityService([
+            {'id': 10, 'campaignId': 1, 'name': 'c'},
+            {'id': 20, 'campaignId': 2, 'name': 'd'}]),
+        'AdGroupCriterionService': FakeEntityService([
+            {'adGroupId': 10, 'campaignId': 1, 'criterion': {'id': 100}},
+            {'adGroupId': 10, 'campaignId': 1, 'criterion': {'id': 101}},
+            {'adGroupId': 20, 'campaignId': 2, 'criterion': {'id': 100}}],
+                                                     'criterion'),
+        'AdGroupAdService': FakeEntityService([
+            {'adGroupId': 20, 'campaignId': 2, 'ad': {'id': 200},
+             'status': 'ENABLED'}], 'ad'),
+        'CustomerSyncService': mock.Mock(),
+    }
+    self.customer_sync_service = self.services['CustomerSyncService']
+    oauth2_client = mock.Mock()
+    self.adwords_client = googleads.adwords.AdWordsClient(
+        'dev token', oauth2_client, 'user agent', client_customer_id='1')
+    self.entity_store = googleads.store.EntityStore(':memory:')
+    self.addCleanup(self.entity_store.Close)
+    self.engine = googleads.adwords.AccountSyncEngine(
+        self.adwords_client, self.entity_store, CURRENT_VERSION)
+    self.start_time = datetime.datetime(2015, 6, 1, 12)
+
+  def _Sync(self, sync_time, client_customer_id='123'):
+    strptime = datetime.datetime.strptime
+    with mock.patch.object(
+        googleads.adwords.AdWordsClient, 'GetService',
+        side_effect=lambda service_name, version, server:
+        self.services[service_name]):
+      with mock.patch('googleads.adwords.datetime.datetime') as mock_datetime:
+        mock_datetime.utcnow.return_value = sync_time
+        mock_datetime.strptime = strptime
+        with mock.patch('googleads.adwords._GET_PAGE_SIZE', 1):
+          return self.engine.Sync(client_customer_id)
+
+  def testSync_full(self):
+    self.assertEqual({'full': True, 'updated': 8, 'removed': 0},
+                     self._Sync(self.start_time))
+
+    self.assertEqual(set(['10:100', '10:101', '20:100']),
+                     self.entity_store.GetIds('123', 'AdGroupCriterion'))
+    self.assertEqual([{'adGroupId': 20, 'campaignId': 2, 'ad': {'id': 200},
+                       'status': 'ENABLED'}],
+                     self.entity_store.GetAll('123', 'AdGroupAd', 20))
+    self.assertEqual('20150601 120000 UTC',
+                     self.entity_store.GetCheckpoint('123'))
+    self.assertEqual('1', self.adwords_client.client_customer_id)
+    self.assertFalse(self.customer_sync_service.get.called)
+
+  def testSync_incremental(self):
+    self._Sync(self.start_time)
+    self.services['CampaignService'].entities[0]['name'] = 'changed'
+    self.services['CampaignService'].entities.append(
+        {'id': 3, 'campaignId': 3, 'name': 'new'})
+    self.services['AdGroupService'].entities.append(
+        {'id': 30, 'campaignId': 3, 'name': 'new'})
+    self.services['AdGroupAdService'].entities[0]['status'] = 'PAUSED'
+    self.services['AdGroupCriterionService'].entities[1:2] = []
+    self.customer_sync_service.get.return_value = {
+        'changedCampaigns': [
+            {'campaignId': 1, 'campaignChangeStatus': 'FIELDS_CHANGED',
+             'changedAdGroups': [
+                 {'adGroupId': 10, 'adGroupChangeStatus': 'FIELDS_UNCHANGED',
+                  'removedCriteria': [101]}]},
+            {'campaignId': 2, 'campaignChangeStatus': 'FIELDS_UNCHANGED',
+             'changedAdGroups': [
+                 {'adGroupId': 20, 'adGroupChangeStatus': 'FIELDS_UNCHANGED',
+                  'changedAds': [200], 'changedCriteria': [100]}]}]}
+
+    self.assertEqual({'full': False, 'updated': 5, 'removed': 1},
+                     self._Sync(self.start_time + datetime.timedelta(hours=1)))
+
+    self.customer_sync_service.get.assert_called_once_with({
+        'dateTimeRange': {'min': '20150601 115900 UTC',
+                          'max': '20150601 130000 UTC'},
+        'campaignIds': ['1', '2']})
+    self.assertEqual('changed',
+                     self.entity_store.Get('123', 'Campaign', 1)['name'])
+    self.assertEqual('new', self.entity_store.Get('123', 'AdGroup', 30)['name'])
+    self.assertEqual('PAUSED',
+                     self.entity_store.Get('123', 'AdGroupAd',
+                                           '20:200')['status'])
+    self.assertEqual(set(['10:100', '20:100']),
+                     self.entity_store.GetIds('123', 'AdGroupCriterion'))
+    self.assertEqual(
+        [{'field': 'AdGroupId', 'operator': 'IN', 'values': [20]},
+         {'field': 'Id', 'operator': 'IN', 'values': [100]}],
+        self.services['AdGroupCriterionService'].selectors[-1]['predicates'])
+
+  def testSync_expiredCheckpoint(self):
+    self._Sync(self.start_time)
+
+    result = self._Sync(self.start_time + datetime.timedelta(days=100))
+
+    self.assertTrue(result['full'])
+    self.assertFalse(self.customer_sync_service.get.called)
+
+  def testSyncAll(self):
+    with mock.patch.object(self.engine, 'Sync') as mock_sync:
+      mock_sync.side_effect = lambda client_customer_id: client_customer_id
+
+      self.assertEqual(['1', '2', '3'], self.engine.SyncAll(['1', '2', '3']))
+
+
+class AccountGraphTest(unittest.TestCase):
+  """Tests for the googleads.adwords.AccountGraph class."""
+
+  def setUp(self):
+    self.accounts = [(1, 'root', True), (2, 'manager', True),
+                     (3, 'client', False), (4, 'shared client', False),
+                     (5, 'empty manager', True)]
+    # Account 4 has two managers, and 2 and 5 manage each other.
+    self.links = [(1, 2), (1, 4), (2, 3), (2, 4), (2, 5), (5, 2), (1, 99)]
+    self.account_graph = googleads.adwords.AccountGraph(self.accounts,
+                                                        self.links)
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+
+  def testLookups(self):
+    self.assertEqual(5, len(self.account_graph))
+    self.assertIn('3', self.account_graph)
+    self.assertNotIn(99, self.account_graph)
+    self.assertEqual('manager', self.account_graph.GetName(2))
+    self.assertTrue(self.account_graph.CanManageClients(2))
+    self.assertFalse(self.account_graph.CanManageClients(3))
+    self.assertEqual([2, 4], self.account_graph.GetChildren(1))
+    self.assertEqual([1, 2], self.account_graph.GetParents(4))
+    self.assertEqual([], self.account_graph.GetChildren(3))
+    self.assertEqual([1], self.account_graph.GetRoots())
+    self.assertRaises(KeyError, self.account_graph.GetChildren, 99)
+
+  def testGetDescendants(self):
+    self.assertEqual([2, 4, 3, 5], self.account_graph.GetDescendants(1))
+    self.assertEqual([3, 4, 5], self.account_graph.GetDescendants(2))
+    self.assertEqual([2, 3, 4], self.account_graph.GetDescendants(5))
+    self.assertEqual([], self.account_graph.GetDescendants(3))
+
+  def testGetLeafCustomerIds(self):
+    self.assertEqual([3, 4], self.account_graph.GetLeafCustomerIds())
+    self.assertEqual([4, 3], self.account_graph.GetLeafCustomerIds(1))
+    self.assertEqual([], self.account_graph.GetLeafCustomerIds(3))
+
+  def testSaveAndLoadFromFile(self):
+    path = os.path.join(self.directory, 'graph.json')
+    self.account_graph.Save(path)
+    self.account_graph.Save(path)
+
+    account_graph = googleads.adwords.AccountGraph.LoadFromFile(path)
+
+    self.assertEqual(5, len(account_graph))
+    self.assertEqual('shared client', account_graph.GetName(4))
+    self.assertEqual([1, 2], account_graph.GetParents(4))
+    self.assertEqual([2, 4, 3, 5], account_graph.GetDescendants(1))
+
+  def testLoad(self):
+    adwords_client = mock.Mock()
+    service = adwords_client.GetService.return_value
+    pages = [
+        {'totalNumEntries': 3,
+         'entries': [{'customerId': 1, 'name': 'root',
+                      'canManageClients': True},
+                     {'customerId': 2, 'name': 'a', 'canManageClients': False}],
+         'links': [{'managerCustomerId': 1, 'clientCustomerId': 2}]},
+        {'totalNumEntries': 3,
+         'entries': [{'customerId': 3, 'name': 'b',
+                      'canManageClients': False}],
+         'links': [{'managerCustomerId': 1, 'clientCustomerId': 3}]}]
+    start_indices = []
+
+    def Get(selector):
+      start_indices.append(selector['paging']['startIndex'])
+      return pages[len(start_indices) - 1]
+    service.get.side_effect = Get
+    path = os.path.join(self.directory, 'graph.json')
+
+    with mock.patch('googleads.adwords._GET_PAGE_SIZE', 2):
+      account_graph = googleads.adwords.AccountGraph.Load(
+          adwords_client, CURRENT_VERSION, cache_path=path)
+      cached_account_graph = googleads.adwords.AccountGraph.Load(
+          adwords_client, CURRENT_VERSION, cache_path=path)
+
+    adwords_client.GetService.assert_called_once_with(
+        'ManagedCustomerService', CURRENT_VERSION, 'https://adwords.google.com')
+    self.assertEqual([0, 2], start_indices)
+    self.assertEqual([2, 3], account_graph.GetLeafCustomerIds(1))
+    self.assertEqual([2, 3], cached_account_graph.GetChildren(1))
+
+    os.utime(path, (0, 0))
+    start_indices[:] = []
+    googleads.adwords.AccountGraph.Load(adwords_client, CURRENT_VERSION,
+                                        cache_path=path)
+    self.assertEqual(2, adwords_client.GetService.call_count)
+
+
+class LookupLocationsTest(unittest.TestCase):
+  """Tests for the googleads.adwords.LookupLocations function."""
+
+  def setUp(self):
+    france = {'id': 2250, 'locationName': 'France', 'displayType': 'Country'}
+    region = {'id': 9040, 'locationName': 'Ile-de-France',
+              'displayType': 'Region', 'parentLocations': [france]}
+    self.criteria = [
+        {'location': {'id': 1006094, 'locationName': 'Paris',
+                      'displayType': 'City',
+                      'parentLocations': [region, france]},
+         'canonicalName': 'Paris,Ile-de-France,France', 'reach': 9000000,
+         'searchTerm': 'Paris'},
+        {'location': france, 'canonicalName': 'France', 'reach': 60000000,
+         'searchTerm': 'France'}]
+    self.adwords_client = mock.Mock()
+    self.location_criterion_service = (
+        self.adwords_client.GetService.return_value)
+    self.location_criterion_service.get.return_value = self.criteria
+
+  def testLookupLocations(self):
+    with mock.patch('googleads.adwords._GET_MAX_PREDICATE_VALUES', 1):
+      location_index = googleads.adwords.LookupLocations(
+          self.adwords_client, ['Paris', 'France', 'Paris'], 'v201502')
+
+    self.adwords_client.GetService.assert_called_once_with(
+        'LocationCriterionService', 'v201502',
+        googleads.adwords._DEFAULT_ENDPOINT)
+    self.assertEqual(
+        [['France'], ['Paris']],
+        [call[0][0]['predicates'][0]['values'] for call in
+         self.location_criterion_service.get.call_args_list])
+    self.assertEqual(
+        {'field': 'Locale', 'operator': 'EQUALS', 'values': ['en']},
+        self.location_criterion_service.get.call_args[0][0]['predicates'][1])
+    self.assertEqual(3, len(location_index))
+    self.assertEqual(
+        (1006094, 'Paris', 'Paris,Ile-de-France,France', 9040, 'City',
+         9000000),
+        location_index.Get(1006094))
+    self.assertEqual((9040, 'Ile-de-France', None, 2250, 'Region', None),
+                     location_index.Get(9040))
+    self.assertEqual(60000000, location_index.Get(2250).reach)
+
+  def testLookupLocations_update(self):
+    location_index = googleads.locations.LocationIndex(
+        [(9040, 'Ile-de-France', 'Ile-de-France,France', 2250, 'Region',
+          12000000)])
+
+    location_index = googleads.adwords.LookupLocations(
+        self.adwords_client, ['Paris'], location_index=location_index)
+
+    self.assertEqual(3, len(location_index))
+    self.assertEqual(12000000, location_index.Get(9040).reach)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,306 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the cache module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import suds.client
+import suds.sax.parser
+
+import googleads.cache
+import googleads.errors
+
+_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="https://www.google.com/apis/test" name="TestService"
+    targetNamespace="https://www.google.com/apis/test">
+  <types>
+    <xsd:schema targetNamespace="https://www.google.com/apis/test"
+        elementFormDefault="qualified">
+      <xsd:complexType name="Selector">
+        <xsd:sequence>
+          <xsd:element name="%s" type="xsd:string" maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:element name="get">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="selector" type="tns:Selector"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+      <xsd:element name="getResponse">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="rval" type="xsd:string"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+    </xsd:schema>
+  </types>
+  <message name="getRequest">
+    <part name="parameters" element="tns:get"/>
+  </message>
+  <message name="getResponse">
+    <part name="parameters" element="tns:getResponse"/>
+  </message>
+  <portType name="TestServiceInterface">
+    <operation name="get">
+      <input message="tns:getRequest"/>
+      <output message="tns:getResponse"/>
+    </operation>
+  </portType>
+  <binding name="TestServiceSoapBinding" type="tns:TestServiceInterface">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="get">
+      <soap:operation soapAction=""/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+  </binding>
+  <service name="TestService">
+    <port name="TestServiceInterfacePort" binding="tns:TestServiceSoapBinding">
+      <soap:address location="https://www.google.com/apis/test/TestService"/>
+    </port>
+  </service>
+</definitions>
+"""
+_DOCUMENT = ('<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" '
+             'name="CampaignService"><types/></definitions>')
+
+
+def _ParseDocument():
+  return suds.sax.parser.Parser().parse(string=_DOCUMENT)
+
+
+class MemoryCacheTest(unittest.TestCase):
+  """Tests for the googleads.cache.MemoryCache class."""
+
+  def setUp(self):
+    self.cache = googleads.cache.MemoryCache(max_entries=2)
+
+  def testPutAndGet(self):
+    document = _ParseDocument()
+
+    self.assertIs(document, self.cache.put('1-document', document))
+    self.cache.put('2-wsdl', {'key': 'value'})
+
+    cached_document = self.cache.get('1-document')
+    self.assertIsNot(document, cached_document)
+    self.assertEqual(unicode(document), unicode(cached_document))
+    self.assertEqual({'key': 'value'}, self.cache.get('2-wsdl'))
+    self.assertIsNone(self.cache.get('3-document'))
+
+  def testPut_evictsLeastRecentlyUsed(self):
+    self.cache.put('1-wsdl', 1)
+    self.cache.put('2-wsdl', 2)
+    self.cache.get('1-wsdl')
+    self.cache.put('3-wsdl', 3)
+
+    self.assertEqual(1, self.cache.get('1-wsdl'))
+    self.assertIsNone(self.cache.get('2-wsdl'))
+    self.assertEqual(3, self.cache.get('3-wsdl'))
+
+  def testPut_evictsBySize(self):
+    self.cache = googleads.cache.MemoryCache(max_size=100)
+    self.cache.put('1-wsdl', 'a' * 40)
+    self.cache.put('2-wsdl', 'b' * 40)
+    self.cache.put('3-wsdl', 'c' * 40)
+    self.cache.put('4-wsdl', 'd' * 200)
+
+    self.assertIsNone(self.cache.get('1-wsdl'))
+    self.assertEqual('b' * 40, self.cache.get('2-wsdl'))
+    self.assertEqual('c' * 40, self.cache.get('3-wsdl'))
+    self.assertIsNone(self.cache.get('4-wsdl'))
+
+  def testPurgeAndClear(self):
+    self.cache.put('1-wsdl', 1)
+    self.cache.put('2-wsdl', 2)
+
+    self.cache.purge('1-wsdl')
+    self.assertIsNone(self.cache.get('1-wsdl'))
+    self.assertEqual([('2-wsdl', 2)], self.cache.Items())
+
+    self.cache.clear()
+    self.assertEqual([], self.cache.Items())
+
+
+class MmapCacheTest(unittest.TestCase):
+  """Tests for the googleads.cache.MmapCache class."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'suds.cache')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testWriteAndGet(self):
+    source = googleads.cache.MemoryCache()
+    source.put('1-document', _ParseDocument())
+    source.put('2-wsdl', [1, 2])
+    googleads.cache.MmapCache.Write(self.path, source.Items())
+
+    cache = googleads.cache.MmapCache(self.path)
+    self.addCleanup(cache.Close)
+
+    self.assertEqual(2, len(cache))
+    self.assertEqual(unicode(_ParseDocument()),
+                     unicode(cache.get('1-document')))
+    self.assertEqual([1, 2], cache.get('2-wsdl'))
+    self.assertIsNone(cache.get('3-wsdl'))
+
+    # The cache is read-only.
+    cache.put('3-wsdl', 3)
+    cache.purge('2-wsdl')
+    cache.clear()
+    self.assertIsNone(cache.get('3-wsdl'))
+    self.assertEqual([1, 2], cache.get('2-wsdl'))
+
+  def testInit_notCacheFile(self):
+    with open(self.path, 'wb') as handle:
+      handle.write('not a cache file')
+
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.cache.MmapCache, self.path)
+
+
+class SqliteCacheTest(unittest.TestCase):
+  """Tests for the googleads.cache.SqliteCache class."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'suds.db')
+    self.cache = googleads.cache.SqliteCache(self.path, ttl=60)
+
+  def tearDown(self):
+    self.cache.Close()
+    shutil.rmtree(self.directory)
+
+  def testPutAndGet(self):
+    with mock.patch('time.time') as mock_time:
+      mock_time.return_value = 1000
+      self.cache.put('1-document', _ParseDocument())
+      self.cache.put('2-wsdl', {'key': 'value'})
+
+      mock_time.return_value = 1059
+      self.assertEqual(unicode(_ParseDocument()),
+                       unicode(self.cache.get('1-document')))
+      # Another connection to the database sees the entries.
+      other_cache = googleads.cache.SqliteCache(self.path)
+      self.addCleanup(other_cache.Close)
+      self.assertEqual({'key': 'value'}, other_cache.get('2-wsdl'))
+      self.assertEqual(['1-document', '2-wsdl'],
+                       sorted(id for id, _ in self.cache.Items()))
+
+      mock_time.return_value = 1061
+      self.assertIsNone(self.cache.get('1-document'))
+      self.assertEqual([], self.cache.Items())
+
+  def testPurgeAndClear(self):
+    self.cache.put('1-wsdl', 1)
+    self.cache.put('2-wsdl', 2)
+
+    self.cache.purge('1-wsdl')
+    self.assertIsNone(self.cache.get('1-wsdl'))
+    self.assertEqual(2, self.cache.get('2-wsdl'))
+
+    self.cache.clear()
+    self.assertIsNone(self.cache.get('2-wsdl'))
+
+
+class SchemaSnapshotTest(unittest.TestCase):
+  """Tests for the googleads.cache.SchemaSnapshot class."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'TestService.wsdl')
+    self.url = 'file://' + self.path
+    self._WriteWsdl('fields')
+    self.snapshot = googleads.cache.SchemaSnapshot()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def _WriteWsdl(self, field_name):
+    with open(self.path, 'w') as handle:
+      handle.write(_WSDL % field_name)
+
+  def _CreateClient(self, snapshot):
+    return suds.client.Client(self.url, cache=snapshot,
+                              cachingpolicy=snapshot.caching_policy)
+
+  def testPutAndGet(self):
+    self._CreateClient(self.snapshot)
+    self.assertEqual(1, len(self.snapshot.Items()))
+
+    # The model is loaded from the snapshot, without reading the WSDL.
+    os.remove(self.path)
+    client = self._CreateClient(self.snapshot)
+    self.assertEqual(['fields'], client.factory.create('Selector').__keylist__)
+    self.assertIn('get', client.wsdl.services[0].ports[0].methods)
+
+  def testPutAndGet_mmapCache(self):
+    self._CreateClient(self.snapshot)
+    path = os.path.join(self.directory, 'snapshot.cache')
+    googleads.cache.MmapCache.Write(path, self.snapshot.Items())
+    mmap_cache = googleads.cache.MmapCache(path)
+    self.addCleanup(mmap_cache.Close)
+
+    os.remove(self.path)
+    client = self._CreateClient(googleads.cache.SchemaSnapshot(mmap_cache))
+    self.assertEqual(['fields'], client.factory.create('Selector').__keylist__)
+
+  def testGet_otherSudsVersion(self):
+    self._CreateClient(self.snapshot)
+
+    with mock.patch('suds.__version__', '0.1'):
+      self.assertEqual([None], [self.snapshot.get(id)
+                                for id, _ in self.snapshot.Items()])
+
+  def testVerify(self):
+    self._CreateClient(self.snapshot)
+    self.snapshot.Verify(self.url)
+
+    self._WriteWsdl('predicates')
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      self.snapshot.Verify, self.url)
+
+  def testVerify_noSnapshot(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      self.snapshot.Verify, self.url)
+
+  def testGetSchemaFingerprint(self):
+    fingerprint = googleads.cache.GetSchemaFingerprint(
+        suds.client.Client(self.url, cache=None).wsdl)
+
+    self.assertEqual(fingerprint, googleads.cache.GetSchemaFingerprint(
+        suds.client.Client(self.url, cache=None).wsdl))
+    self._WriteWsdl('predicates')
+    self.assertNotEqual(fingerprint, googleads.cache.GetSchemaFingerprint(
+        suds.client.Client(self.url, cache=None).wsdl))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -18,6 +18,11 @@
 
 __author__ = 'Joseph DiLallo'
 
+import json
+import os
+import shutil
+import tempfile
+import time
 import unittest
 import warnings
 
@@ -45,6 +50,7 @@ class CommonTest(unittest.TestCase):
     self.fake_proxy.return_value = mock.Mock()
     self.fake_proxy.return_value.proxy_host = 'ahost'
     self.fake_proxy.return_value.proxy_port = 'aport'
+    self.addCleanup(googleads.common.ClearConfigCache)
 
   def _CreateYamlFile(self, data, insert_oauth2_key=None):
     """Return the filename of a yaml file created for testing."""
@@ -168,6 +174,112 @@ class CommonTest(unittest.TestCase):
                             'needed': 'd', 'keys': 'e',
                             'https_proxy': None}, rval)
 
+  def testLoadFromStorage_cached(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    yaml_fname = os.path.join(directory, 'googleads.yaml')
+    yaml_contents = {'one': {'needed': 'd'}}
+    yaml_contents['one'].update(self._OAUTH_DICT)
+    with open(yaml_fname, 'w') as handle:
+      handle.write(yaml.dump(yaml_contents))
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient') as mock_client:
+      with mock.patch('yaml.load', wraps=yaml.load) as mock_load:
+        first = googleads.common.LoadFromStorage(yaml_fname, 'one', ['needed'],
+                                                 [])
+        second = googleads.common.LoadFromStorage(yaml_fname, 'one',
+                                                  ['needed'], [])
+        mock_client.assert_called_once_with('a', 'b', 'c', None, True, None)
+        self.assertEqual(first, second)
+        self.assertEqual(1, mock_load.call_count)
+
+        yaml_contents['one']['needed'] = 'changed'
+        with open(yaml_fname, 'w') as handle:
+          handle.write(yaml.dump(yaml_contents))
+        os.utime(yaml_fname, (time.time() + 10, time.time() + 10))
+        third = googleads.common.LoadFromStorage(yaml_fname, 'one', ['needed'],
+                                                 [])
+        self.assertEqual(2, mock_load.call_count)
+        self.assertEqual('changed', third['needed'])
+        self.assertIs(first['oauth2_client'], third['oauth2_client'])
+        mock_client.assert_called_once_with('a', 'b', 'c', None, True, None)
+
+        # Only the latest version of the file is kept.
+        self.assertEqual([yaml_fname], googleads.common._config_cache.keys())
+
+        googleads.common.ClearConfigCache()
+        googleads.common.LoadFromStorage(yaml_fname, 'one', ['needed'], [])
+        self.assertEqual(3, mock_load.call_count)
+        self.assertEqual(2, mock_client.call_count)
+
+  def testLoadFromStorage_json(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    json_fname = os.path.join(directory, 'googleads.json')
+    json_contents = {'one': {'needed': 'd'}}
+    json_contents['one'].update(self._OAUTH_DICT)
+    with open(json_fname, 'w') as handle:
+      json.dump(json_contents, handle)
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient') as mock_client:
+      with mock.patch('yaml.load') as mock_load:
+        rval = googleads.common.LoadFromStorage(json_fname, 'one', ['needed'],
+                                                [])
+        self.assertFalse(mock_load.called)
+        mock_client.assert_called_once_with('a', 'b', 'c', None, True, None)
+        self.assertEqual('d', rval['needed'])
+
+  def testLoadFromStorage_environment(self):
+    config = {'one': {'needed': 'd'}}
+    config['one'].update(self._OAUTH_DICT)
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient') as mock_client:
+      with mock.patch.dict(os.environ,
+                           {'GOOGLEADS_CONFIG': json.dumps(config)}):
+        rval = googleads.common.LoadFromStorage(None, 'one', ['needed'], [])
+        mock_client.assert_called_once_with('a', 'b', 'c', None, True, None)
+        self.assertEqual({'oauth2_client': mock_client.return_value,
+                          'needed': 'd', 'https_proxy': None}, rval)
+
+  def testLoadFromStorage_environmentInvalidJson(self):
+    for config in ('{"one": ', '["one"]'):
+      with mock.patch.dict(os.environ, {'GOOGLEADS_CONFIG': config}):
+        self.assertRaises(googleads.errors.GoogleAdsValueError,
+                          googleads.common.LoadFromStorage, None, 'one',
+                          ['needed'], [])
+
+  def testLoadFromStorage_pathIsNotParsedAsJson(self):
+    config = {'one': {'needed': 'd'}}
+    config['one'].update(self._OAUTH_DICT)
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient'):
+      try:
+        googleads.common.LoadFromStorage(json.dumps(config), 'one', ['needed'],
+                                         [])
+        self.fail('GoogleAdsValueError not raised')
+      except googleads.errors.GoogleAdsValueError, e:
+        self.assertIn('could not be opened', str(e))
+        self.assertNotIn('GOOGLEADS_CONFIG', str(e))
+
+  def testLoadFromStorage_pathTakesPrecedenceOverEnvironment(self):
+    yaml_fname = self._CreateYamlFile({'one': {'needed': 'd'}}, 'one')
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient'):
+      with mock.patch('googleads.common.open', self.fake_open, create=True):
+        with mock.patch.dict(os.environ, {'GOOGLEADS_CONFIG': '{"one": '}):
+          rval = googleads.common.LoadFromStorage(yaml_fname, 'one',
+                                                  ['needed'], [])
+          self.assertEqual('d', rval['needed'])
+
+  def testLoadFromStorage_environmentPath(self):
+    yaml_fname = self._CreateYamlFile({'one': {'needed': 'd'}}, 'one')
+
+    with mock.patch('googleads.oauth2.GoogleRefreshTokenClient'):
+      with mock.patch('googleads.common.open', self.fake_open, create=True):
+        with mock.patch.dict(os.environ, {'GOOGLEADS_CONFIG': yaml_fname}):
+          rval = googleads.common.LoadFromStorage(None, 'one', ['needed'], [])
+          self.assertEqual('d', rval['needed'])
+
   def testLoadFromStorage_warningWithUnrecognizedKey(self):
     yaml_fname = self._CreateYamlFile(
         {'kval': {'Im': 'here', 'whats': 'this?'}}, 'kval')
@@ -258,6 +370,17 @@ class CommonTest(unittest.TestCase):
     factory.create.assert_any_call('ns0:EliteCampaign')
     self.assertEqual('Sales', rval.name)
 
+  def testGetFaultErrors(self):
+    fault = mock.Mock()
+    api_error = mock.Mock()
+    fault.detail.ApiExceptionFault.errors = api_error
+    self.assertEqual([api_error], googleads.common.GetFaultErrors(
+        suds.WebFault(fault, None)))
+
+    fault.detail = None
+    self.assertEqual([], googleads.common.GetFaultErrors(
+        suds.WebFault(fault, None)))
+
 
 class SudsServiceProxyTest(unittest.TestCase):
   """Tests for the googleads.common.SudsServiceProxy class."""
@@ -286,6 +409,537 @@ class SudsServiceProxyTest(unittest.TestCase):
     client.service.SoapMethod.assert_called_once_with('modified_test')
     header_handler.SetHeaders.assert_called_once_with(client)
 
+  def testClone(self):
+    header_handler = mock.Mock()
+    client = mock.Mock()
+    suds_service_wrapper = googleads.common.SudsServiceProxy(
+        client, header_handler)
+
+    clone = suds_service_wrapper.Clone()
+
+    self.assertIsInstance(clone, googleads.common.SudsServiceProxy)
+    self.assertEqual(client.clone.return_value, clone.suds_client)
+    self.assertEqual(header_handler, clone._header_handler)
+
+    other_client = mock.Mock()
+    other_header_handler = mock.Mock()
+    clone = suds_service_wrapper.Clone(other_client, other_header_handler)
+
+    self.assertEqual(other_client, clone.suds_client)
+    self.assertEqual(other_header_handler, clone._header_handler)
+
+  def _CreateCachingProxy(self, entity_cache):
+    port = mock.Mock()
+    port.methods = ('get', 'getAdUnitsByStatement', 'mutate')
+    services = mock.Mock()
+    services.ports = [port]
+    services.name = 'InventoryService'
+    client = mock.Mock()
+    client.wsdl.services = [services]
+    client.options.soapheaders = {'networkCode': '1'}
+    client.service.get.return_value = {'entries': [{'name': 'a'}]}
+    client.service.getAdUnitsByStatement.return_value = {
+        'totalResultSetSize': 0}
+    return googleads.common.SudsServiceProxy(client, mock.Mock(), entity_cache)
+
+  def testSudsServiceProxy_entityCache(self):
+    entity_cache = googleads.common.EntityCache()
+    suds_service_wrapper = self._CreateCachingProxy(entity_cache)
+    client = suds_service_wrapper.suds_client
+
+    with mock.patch('googleads.common._PackForSuds', lambda obj, _: obj):
+      first = suds_service_wrapper.get({'fields': ['Id']})
+      second = suds_service_wrapper.get({'fields': ['Id']})
+      suds_service_wrapper.get({'fields': ['Name']})
+      suds_service_wrapper.getAdUnitsByStatement({'query': 'LIMIT 1'})
+      suds_service_wrapper.getAdUnitsByStatement({'query': 'LIMIT 1'})
+      client.options.soapheaders = {'networkCode': '2'}
+      suds_service_wrapper.get({'fields': ['Id']})
+
+    self.assertEqual(first, second)
+    self.assertEqual(3, client.service.get.call_count)
+    self.assertEqual(1, client.service.getAdUnitsByStatement.call_count)
+
+    entity_cache.Invalidate('InventoryService')
+    with mock.patch('googleads.common._PackForSuds', lambda obj, _: obj):
+      suds_service_wrapper.getAdUnitsByStatement({'query': 'LIMIT 1'})
+    self.assertEqual(2, client.service.getAdUnitsByStatement.call_count)
+
+  def testSudsServiceProxy_entityCacheReturnsCopies(self):
+    entity_cache = googleads.common.EntityCache()
+    suds_service_wrapper = self._CreateCachingProxy(entity_cache)
+
+    with mock.patch('googleads.common._PackForSuds', lambda obj, _: obj):
+      first = suds_service_wrapper.get({'fields': ['Id']})
+      first['entries'][0]['name'] = 'b'
+      second = suds_service_wrapper.get({'fields': ['Id']})
+      self.assertEqual({'entries': [{'name': 'a'}]}, second)
+      second['entries'].append({'name': 'c'})
+      third = suds_service_wrapper.get({'fields': ['Id']})
+
+    self.assertEqual({'entries': [{'name': 'a'}]}, third)
+    self.assertEqual(1, suds_service_wrapper.suds_client.service.get.call_count)
+
+  def testSudsServiceProxy_entityCacheInvalidatedByMutate(self):
+    entity_cache = googleads.common.EntityCache()
+    suds_service_wrapper = self._CreateCachingProxy(entity_cache)
+    client = suds_service_wrapper.suds_client
+    client.service.mutate.side_effect = [None, suds.WebFault(mock.Mock(),
+                                                             mock.Mock())]
+
+    with mock.patch('googleads.common._PackForSuds', lambda obj, _: obj):
+      suds_service_wrapper.get({'fields': ['Id']})
+      suds_service_wrapper.mutate([])
+      suds_service_wrapper.get({'fields': ['Id']})
+      self.assertRaises(suds.WebFault, suds_service_wrapper.mutate, [])
+      suds_service_wrapper.get({'fields': ['Id']})
+      suds_service_wrapper.get({'fields': ['Id']})
+
+    self.assertEqual(3, client.service.get.call_count)
+    self.assertEqual(2, client.service.mutate.call_count)
+
+
+class FakeClient(object):
+  """A client with the attributes of a DfpClient, for ClientPool tests."""
+
+  def __init__(self, oauth2_client, network_code):
+    self.oauth2_client = oauth2_client
+    self.application_name = 'application'
+    self.network_code = network_code
+    self._header_handler = mock.Mock()
+    self._services_created = 0
+
+  def GetService(self, service_name, version='v1'):
+    self._services_created += 1
+    suds_client = mock.Mock()
+    suds_client.clone.side_effect = mock.Mock
+    return googleads.common.SudsServiceProxy(suds_client, self._header_handler,
+                                             version=version)
+
+
+class ClientPoolTest(unittest.TestCase):
+  """Tests for the googleads.common.ClientPool class."""
+
+  def setUp(self):
+    self.pool = googleads.common.ClientPool(max_idle_clients=1)
+    self.oauth2_client = mock.Mock()
+    self.client = FakeClient(self.oauth2_client, '1234')
+
+  def testLease(self):
+    with self.pool.Lease(self.client, network_code='5678') as lease:
+      service = lease.GetService('LineItemService', 'v2')
+      self.assertIs(service, lease.GetService('LineItemService', 'v2'))
+      self.assertEqual('5678', lease.client.network_code)
+      self.assertEqual('1234', self.client.network_code)
+      # Both the lease's copy of the client and its services set headers from
+      # the copy.
+      for_client = self.client._header_handler.ForClient
+      self.assertEqual([mock.call(lease.client)] * 2,
+                       for_client.call_args_list)
+      self.assertIs(for_client.return_value, lease.client._header_handler)
+      self.assertIs(for_client.return_value, service._header_handler)
+      self.assertEqual('v2', service._version)
+      self.assertEqual(1, self.pool.GetStats()['active_leases'])
+
+    self.assertEqual({'leases': 1, 'active_leases': 0, 'peak_active_leases': 1,
+                      'services_created': 1, 'services': 1,
+                      'clients_cloned': 1, 'clients_reused': 0,
+                      'idle_clients': 1}, self.pool.GetStats())
+    self.assertRaises(googleads.errors.GoogleAdsValueError, lease.GetService,
+                      'LineItemService', 'v2')
+
+  def testLease_reusesClients(self):
+    with self.pool.Lease(self.client) as lease:
+      suds_client = lease.GetService('LineItemService').suds_client
+    # A new client with the same credentials shares the pooled services.
+    other_client = FakeClient(self.oauth2_client, '1234')
+    with self.pool.Lease(other_client, network_code='5678') as lease:
+      self.assertIs(suds_client,
+                    lease.GetService('LineItemService').suds_client)
+
+    self.assertEqual(1, self.client._services_created)
+    self.assertEqual(0, other_client._services_created)
+    stats = self.pool.GetStats()
+    self.assertEqual(1, stats['clients_cloned'])
+    self.assertEqual(1, stats['clients_reused'])
+
+  def testLease_concurrent(self):
+    first = self.pool.Lease(self.client)
+    second = self.pool.Lease(self.client)
+    first_service = first.GetService('LineItemService')
+    second_service = second.GetService('LineItemService')
+    other_service = second.GetService('LineItemService', 'v2')
+    first.Release()
+    second.Release()
+    first.Release()
+
+    self.assertIsNot(first_service.suds_client, second_service.suds_client)
+    stats = self.pool.GetStats()
+    self.assertEqual(2, stats['peak_active_leases'])
+    self.assertEqual(0, stats['active_leases'])
+    self.assertEqual(2, stats['services'])
+    self.assertEqual(3, stats['clients_cloned'])
+    # Only one idle client is kept per service.
+    self.assertEqual(2, stats['idle_clients'])
+    self.assertEqual('v2', other_service._version)
+
+    self.pool.Clear()
+    self.assertEqual(0, self.pool.GetStats()['services'])
+
+  def testLease_otherCredentials(self):
+    with self.pool.Lease(self.client) as lease:
+      lease.GetService('LineItemService')
+    other_client = FakeClient(mock.Mock(), '1234')
+    with self.pool.Lease(other_client) as lease:
+      lease.GetService('LineItemService')
+
+    self.assertEqual(1, other_client._services_created)
+
+  def testLease_unsupportedHeader(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError, self.pool.Lease,
+                      self.client, client_customer_id='123')
+    self.assertRaises(googleads.errors.GoogleAdsValueError, self.pool.Lease,
+                      self.client, application_name='other')
+    self.assertEqual(0, self.pool.GetStats()['leases'])
+
+
+class EntityCacheTest(unittest.TestCase):
+  """Tests for the googleads.common.EntityCache class."""
+
+  def setUp(self):
+    self.entity_cache = googleads.common.EntityCache(
+        ttl=60, service_ttls={'CustomTargetingService': 10,
+                              'LabelService': 0}, max_entries=3)
+
+  def testGetAndSet(self):
+    with mock.patch('time.time', return_value=100):
+      self.entity_cache.Set('CampaignService', 'a', 'response')
+      self.assertEqual('response', self.entity_cache.Get('CampaignService',
+                                                         'a'))
+    self.assertIsNone(self.entity_cache.Get('CampaignService', 'b'))
+
+  def testTtl(self):
+    with mock.patch('time.time') as mock_time:
+      mock_time.return_value = 100
+      self.entity_cache.Set('CampaignService', 'a', 'campaigns')
+      self.entity_cache.Set('CustomTargetingService', 'b', 'keys')
+      self.entity_cache.Set('LabelService', 'c', 'labels')
+      self.entity_cache.Set('CampaignService', 'd', None)
+      mock_time.return_value = 110
+
+      self.assertEqual('campaigns',
+                       self.entity_cache.Get('CampaignService', 'a'))
+      self.assertIsNone(self.entity_cache.Get('CustomTargetingService', 'b'))
+      self.assertIsNone(self.entity_cache.Get('LabelService', 'c'))
+      self.assertIsNone(self.entity_cache.Get('CampaignService', 'd'))
+      mock_time.return_value = 160
+      self.assertIsNone(self.entity_cache.Get('CampaignService', 'a'))
+
+  def testEviction(self):
+    for key in ('a', 'b', 'c'):
+      self.entity_cache.Set('CampaignService', key, key)
+    self.entity_cache.Get('CampaignService', 'a')
+    self.entity_cache.Set('CampaignService', 'd', 'd')
+
+    self.assertEqual('a', self.entity_cache.Get('CampaignService', 'a'))
+    self.assertIsNone(self.entity_cache.Get('CampaignService', 'b'))
+    self.assertEqual('d', self.entity_cache.Get('CampaignService', 'd'))
+
+  def testInvalidate(self):
+    self.entity_cache.Set('CampaignService', 'a', 'a')
+    self.entity_cache.Set('AdGroupService', 'b', 'b')
+
+    self.entity_cache.Invalidate('CampaignService')
+    self.entity_cache.Invalidate('BudgetService')
+
+    self.assertIsNone(self.entity_cache.Get('CampaignService', 'a'))
+    self.assertEqual('b', self.entity_cache.Get('AdGroupService', 'b'))
+
+    self.entity_cache.Clear()
+    self.assertIsNone(self.entity_cache.Get('AdGroupService', 'b'))
+
+
+class ParallelMapTest(unittest.TestCase):
+  """Tests for the googleads.common.ParallelMap function."""
+
+  def testParallelMap(self):
+    self.assertEqual([x * x for x in range(20)],
+                     googleads.common.ParallelMap(lambda x: x * x, range(20),
+                                                  4))
+
+  def testParallelMap_serial(self):
+    self.assertEqual([2, 4], googleads.common.ParallelMap(lambda x: x * 2,
+                                                          iter([1, 2]), 1))
+
+  def testParallelMap_error(self):
+    def Square(x):
+      if x == 3:
+        raise ValueError(x)
+      return x * x
+
+    self.assertRaises(ValueError, googleads.common.ParallelMap, Square,
+                      range(10), 3)
+
+
+class RecordingCallHook(googleads.common.CallHook):
+  """A CallHook recording the notifications it receives."""
+
+  def __init__(self):
+    self.started = []
+    self.calls = []
+    self.retries = []
+
+  def BeforeCall(self, call):
+    self.started.append(call)
+
+  def AfterCall(self, call):
+    self.calls.append(call)
+
+  def OnRetry(self, service_name, method_name, reason):
+    self.retries.append((service_name, method_name, reason))
+
+
+class CallHookTest(unittest.TestCase):
+  """Tests for the call hooks of the googleads.common module."""
+
+  def setUp(self):
+    self.call_hook = RecordingCallHook()
+    googleads.common.AddCallHook(self.call_hook)
+    self.addCleanup(googleads.common.RemoveCallHook, self.call_hook)
+
+    port = mock.Mock()
+    port.methods = ('get',)
+    services = mock.Mock()
+    services.name = 'CampaignService'
+    services.ports = [port]
+    self.client = mock.Mock()
+    self.client.wsdl.services = [services]
+    self.client.options.plugins = []
+    self.client.set_options.side_effect = (
+        lambda plugins: setattr(self.client.options, 'plugins', plugins))
+    self.proxy = googleads.common.SudsServiceProxy(self.client, mock.Mock())
+
+  def _Get(self, selector):
+    # Plays the part of suds, which notifies the client's plugins.
+    plugin = self.client.options.plugins[0]
+    plugin.sending(mock.Mock(envelope='<request/>'))
+    plugin.received(mock.Mock(reply='<response></response>'))
+    return 'response'
+
+  def testMakeSoapRequest(self):
+    self.client.service.get.side_effect = self._Get
+
+    self.assertEqual('response', self.proxy.get({'fields': ['Id']}))
+    self.assertEqual('response', self.proxy.get({'fields': ['Id']}))
+
+    self.assertEqual(1, len(self.client.options.plugins))
+    self.assertEqual(self.call_hook.started, self.call_hook.calls)
+    call = self.call_hook.calls[0]
+    self.assertEqual(('CampaignService', 'get'),
+                     (call.service_name, call.method_name))
+    self.assertEqual(
+        set(['headers', 'pack', 'serialize', 'network', 'parse']),
+        set(call.phases))
+    self.assertEqual((10, 21), (call.request_bytes, call.response_bytes))
+    self.assertIsNone(call.fault_type)
+    self.assertFalse(call.cached)
+    self.assertTrue(call.duration >= 0)
+
+  def testMakeSoapRequest_fault(self):
+    api_error = type('RateExceededError', (object,), {})()
+    setattr(api_error, 'ApiError.Type', 'RateExceededError')
+    fault = mock.Mock()
+    fault.detail.ApiExceptionFault.errors = [api_error]
+    self.client.service.get.side_effect = suds.WebFault(fault, None)
+
+    self.assertRaises(suds.WebFault, self.proxy.get, {})
+
+    self.assertEqual('RateExceededError', self.call_hook.calls[0].fault_type)
+    self.assertIsNone(self.client.options.plugins[0].call)
+
+  def testMakeSoapRequest_noHooks(self):
+    googleads.common.RemoveCallHook(self.call_hook)
+    self.client.service.get.return_value = 'response'
+
+    self.assertEqual('response', self.proxy.get({}))
+
+    self.assertEqual([], self.client.options.plugins)
+    self.assertEqual([], self.call_hook.calls)
+
+  def testRecordRetry(self):
+    googleads.common.RecordRetry('CampaignService', 'mutate',
+                                 'RateExceededError')
+
+    self.assertEqual([('CampaignService', 'mutate', 'RateExceededError')],
+                     self.call_hook.retries)
+
+
+class TracingTest(unittest.TestCase):
+  """Tests for the tracing functions of the googleads.common module."""
+
+  def setUp(self):
+    self.span_exporter = googleads.common.InMemorySpanExporter()
+    googleads.common.AddSpanExporter(self.span_exporter)
+    self.addCleanup(googleads.common.RemoveSpanExporter, self.span_exporter)
+
+  def testStartSpan(self):
+    with googleads.common.StartSpan('outer', {'a': 1}) as outer:
+      self.assertIs(outer, googleads.common.GetCurrentSpan())
+      with googleads.common.StartSpan('inner') as inner:
+        inner.SetAttribute('b', 2)
+    self.assertIsNone(googleads.common.GetCurrentSpan())
+
+    self.assertEqual([inner, outer], self.span_exporter.GetFinishedSpans())
+    self.assertEqual(outer.trace_id, inner.trace_id)
+    self.assertEqual(outer.span_id, inner.parent_span_id)
+    self.assertIsNone(outer.parent_span_id)
+    self.assertEqual({'a': 1}, outer.attributes)
+    self.assertEqual({'b': 2}, inner.attributes)
+    self.assertTrue(outer.start_time <= inner.start_time <= inner.end_time <=
+                    outer.end_time)
+    self.assertEqual('OK', outer.status)
+
+  def testStartSpan_error(self):
+    def Fail():
+      with googleads.common.StartSpan('failing'):
+        raise ValueError('failed')
+
+    self.assertRaises(ValueError, Fail)
+
+    span = self.span_exporter.GetFinishedSpans()[0]
+    self.assertEqual(('ERROR', 'ValueError'),
+                     (span.status, span.status_message))
+
+  def testStartSpan_noExporter(self):
+    googleads.common.RemoveSpanExporter(self.span_exporter)
+
+    with googleads.common.StartSpan('untraced') as span:
+      span.SetAttribute('a', 1)
+      self.assertIsNone(googleads.common.GetCurrentSpan())
+
+    self.assertEqual([], self.span_exporter.GetFinishedSpans())
+
+  def testParallelMap(self):
+    def Work(item):
+      with googleads.common.StartSpan('work %d' % item):
+        return item
+
+    with googleads.common.StartSpan('parent') as parent:
+      googleads.common.ParallelMap(Work, range(4), 2)
+
+    work_spans = [span for span in self.span_exporter.GetFinishedSpans()
+                  if span is not parent]
+    self.assertEqual(4, len(work_spans))
+    self.assertEqual(set([parent.span_id]),
+                     set(span.parent_span_id for span in work_spans))
+
+  def testSudsServiceProxy(self):
+    port = mock.Mock()
+    port.methods = ('mutate',)
+    services = mock.Mock()
+    services.name = 'CampaignService'
+    services.ports = [port]
+    client = mock.Mock()
+    client.wsdl.services = [services]
+    client.options.plugins = []
+    client.set_options.side_effect = (
+        lambda plugins: setattr(client.options, 'plugins', plugins))
+
+    def Mutate(operations):
+      client.options.plugins[0].sending(mock.Mock(envelope='<mutate/>'))
+      client.options.plugins[0].received(mock.Mock(reply='<rval/>'))
+      return {'value': operations}
+    client.service.mutate.side_effect = Mutate
+    header_handler = mock.Mock()
+    header_handler.GetTraceAttributes.return_value = {
+        'googleads.customer_id': '123-456-7890'}
+    proxy = googleads.common.SudsServiceProxy(client, header_handler,
+                                              version='v201502')
+
+    proxy.mutate([{'operator': 'ADD'}, {'operator': 'SET'}])
+
+    span = self.span_exporter.GetFinishedSpans()[0]
+    self.assertEqual('CampaignService.mutate', span.name)
+    self.assertEqual(
+        {'googleads.service': 'CampaignService',
+         'googleads.method': 'mutate', 'googleads.version': 'v201502',
+         'googleads.customer_id': '123-456-7890',
+         'googleads.operation_count': 2, 'googleads.request_bytes': 9,
+         'googleads.response_bytes': 7}, span.attributes)
+
+
+class ReportCacheTest(unittest.TestCase):
+  """Tests for the googleads.common.ReportCache class."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.report_cache = googleads.common.ReportCache(
+        self.directory, max_size=100, ttl=60, today_ttl=0)
+
+  def testMakeKey(self):
+    key = googleads.common.ReportCache.MakeKey(
+        'server', {'b': [1, 2], 'a': u'\u00e9'})
+    self.assertEqual(key, googleads.common.ReportCache.MakeKey(
+        'server', {'a': u'\u00e9', 'b': (1, 2)}))
+    self.assertNotEqual(key, googleads.common.ReportCache.MakeKey(
+        'server', {'a': u'\u00e9', 'b': [2, 1]}))
+
+  def testSetAndGet(self):
+    self.assertIsNone(self.report_cache.Get('key'))
+    stored = self.report_cache.Set('key', 'report contents')
+    self.assertEqual('report contents', stored.read())
+    stored.close()
+
+    cached = self.report_cache.Get('key')
+    self.assertEqual('report contents', cached.read())
+    cached.close()
+
+  def testSet_fromFile(self):
+    source = tempfile.TemporaryFile()
+    source.write('x' * 50000)
+    source.seek(0)
+    self.report_cache.max_size = 100000
+    self.report_cache.Set('key', source).close()
+
+    cached = self.report_cache.Get('key')
+    self.assertEqual('x' * 50000, cached.read())
+    cached.close()
+
+  def testGet_expired(self):
+    self.report_cache.Set('key', 'report contents').close()
+
+    with mock.patch('time.time', return_value=time.time() + 61):
+      self.assertIsNone(self.report_cache.Get('key'))
+    self.assertEqual([], os.listdir(self.directory))
+
+  def testSet_includesTodayNotCached(self):
+    stored = self.report_cache.Set('key', 'report contents',
+                                   includes_today=True)
+    self.assertEqual('report contents', stored.read())
+    stored.close()
+
+    self.assertIsNone(self.report_cache.Get('key'))
+
+  def testSet_evictsLeastRecentlyUsed(self):
+    self.report_cache.Set('first', 'a' * 30).close()
+    self.report_cache.Set('second', 'b' * 30).close()
+    # Entries are ordered by modification time, which has a coarse resolution
+    # on some file systems.
+    os.utime(os.path.join(self.directory, 'first.report'), (1, 1))
+    os.utime(os.path.join(self.directory, 'second.report'), (2, 2))
+    self.report_cache.Get('first').close()
+    self.report_cache.Set('third', 'c' * 30).close()
+
+    self.assertIsNone(self.report_cache.Get('second'))
+    self.assertIsNotNone(self.report_cache.Get('first'))
+    self.assertIsNotNone(self.report_cache.Get('third'))
+
+  def testClear(self):
+    self.report_cache.Set('key', 'report contents').close()
+    self.report_cache.Clear()
+    self.assertIsNone(self.report_cache.Get('key'))
+
 
 class HeaderHandlerTest(unittest.TestCase):
   """Tests for the googleads.common.HeaderHeader class."""
@@ -18,8 +18,17 @@
 
 __author__ = 'Joseph DiLallo'
 
+import BaseHTTPServer
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
 import StringIO
 import sys
+import tempfile
+import threading
 import unittest
 
 import mock
@@ -28,6 +37,7 @@ import suds.transport
 import googleads.dfp
 import googleads.common
 import googleads.errors
+import googleads.store
 
 
 class BaseValue(object):
@@ -106,6 +116,37 @@ def DecideValue(original_object):
     return BooleanValue(original_object)
 
 
+class RangeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Serves the server's content, honoring byte ranges if it accepts them."""
+
+  def do_HEAD(self):
+    self.send_response(200)
+    if self.server.accept_ranges:
+      self.send_header('Accept-Ranges', 'bytes')
+    self.send_header('Content-Length', str(len(self.server.content)))
+    self.end_headers()
+
+  def do_GET(self):
+    content = self.server.content
+    range_header = self.headers.getheader('Range')
+    self.server.requests.append(range_header)
+    if range_header and self.server.honor_ranges:
+      first_byte, last_byte = [
+          int(b) for b in range_header[len('bytes='):].split('-')]
+      self.send_response(206)
+      self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+          first_byte, last_byte, len(content)))
+      content = content[first_byte:last_byte + 1]
+    else:
+      self.send_response(200)
+    self.send_header('Content-Length', str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def log_message(self, *args):
+    pass
+
+
 class DfpHeaderHandlerTest(unittest.TestCase):
   """Tests for the googleads.dfp._DfpHeaderHandler class."""
 
@@ -184,7 +225,7 @@ class DfpClientTest(unittest.TestCase):
       mock_client.assert_called_once_with(
           'https://testing.test.com/apis/ads/publisher/%s/%s?wsdl'
           % (self.version, service), proxy=https_proxy, cache=self.cache,
-          timeout=3600)
+          cachingpolicy=0, timeout=3600)
       self.assertIsInstance(suds_service, googleads.common.SudsServiceProxy)
 
     # Use the default server and https proxy.
@@ -195,7 +236,7 @@ class DfpClientTest(unittest.TestCase):
       mock_client.assert_called_once_with(
           'https://ads.google.com/apis/ads/publisher/%s/%s?wsdl'
           % (self.version, service), proxy=None, cache=self.cache,
-          timeout=3600)
+          cachingpolicy=0, timeout=3600)
       self.assertFalse(mock_client.return_value.set_options.called)
       self.assertIsInstance(suds_service, googleads.common.SudsServiceProxy)
 
@@ -414,6 +455,28 @@ class DataDownloaderTest(unittest.TestCase):
          'query': ('SELECT Id, Name FROM Line_Item LIMIT 500 OFFSET 0')})
     self.assertEqual([], result_set)
 
+  def testDownloadLocationIndex(self):
+    with mock.patch.object(self.report_downloader,
+                           'DownloadPqlResultToList') as mock_download:
+      mock_download.return_value = [
+          ['id', 'name', 'canonicalparentid', 'type'],
+          [2250, 'France', '-', 'COUNTRY'],
+          [9040, 'Ile-de-France', 2250, 'REGION'],
+          [1006094, 'Paris', 9040, 'CITY'],
+          [1005781, 'Z\xc3\xbcrich', 2756, 'CITY']]
+      location_index = self.report_downloader.DownloadLocationIndex()
+
+    mock_download.assert_called_once_with(googleads.dfp._GEO_TARGET_QUERY)
+    self.assertEqual(4, len(location_index))
+    self.assertEqual(
+        (1006094, 'Paris', 'Paris,Ile-de-France,France', 9040, 'CITY', None),
+        location_index.Get(1006094))
+    self.assertIsNone(location_index.Get(2250).parent_id)
+    self.assertEqual('Z\xc3\xbcrich',
+                     location_index.Get(1005781).canonical_name)
+    self.assertEqual([1005781], [location.id for location in
+                                 location_index.Find('Zurich')])
+
   def testWaitForReport_success(self):
     id_ = '1g684'
     input_ = {'reportQuery': 'something', 'id': id_}
@@ -423,10 +486,32 @@ class DataDownloaderTest(unittest.TestCase):
 
     with mock.patch('time.sleep') as mock_sleep:
       rval = self.report_downloader.WaitForReport(input_)
-      mock_sleep.assert_called_once_with(30)
+      self.assertEqual(1, mock_sleep.call_count)
+      self.assertTrue(mock_sleep.call_args[0][0] <=
+                      googleads.dfp._REPORT_POLL_INITIAL_INTERVAL)
     self.assertEqual(id_, rval)
     self.report_service.getReportJobStatus.assert_any_call(id_)
 
+  def testWaitForReport_traced(self):
+    span_exporter = googleads.common.InMemorySpanExporter()
+    googleads.common.AddSpanExporter(span_exporter)
+    self.addCleanup(googleads.common.RemoveSpanExporter, span_exporter)
+    self.report_service.getReportJobStatus.side_effect = ['IN_PROGRESS',
+                                                          'COMPLETED']
+    self.report_service.runReportJob.return_value = {'id': '1g684'}
+
+    with mock.patch('time.sleep'):
+      self.report_downloader.WaitForReport({'id': '1g684'})
+
+    spans = span_exporter.GetFinishedSpans()
+    self.assertEqual(['DataDownloader.PollReportJob'] * 2,
+                     [span.name for span in spans])
+    self.assertEqual(['IN_PROGRESS', 'COMPLETED'],
+                     [span.attributes['googleads.report_job_status']
+                      for span in spans])
+    self.assertEqual('1g684', spans[0].attributes['googleads.report_job_id'])
+    self.assertEqual(self.version, spans[0].attributes['googleads.version'])
+
   def testWaitForReport_failure(self):
     self.report_service.getReportJobStatus.return_value = 'FAILED'
     self.report_service.runReportJob.return_value = {'id': '782yt97r2'}
@@ -435,6 +520,79 @@ class DataDownloaderTest(unittest.TestCase):
         googleads.errors.DfpReportError,
         self.report_downloader.WaitForReport, {'id': 'obj'})
 
+  def testWaitForReports_success(self):
+    statuses = {'1': ['IN_PROGRESS', 'IN_PROGRESS', 'IN_PROGRESS',
+                      'COMPLETED'],
+                '2': ['COMPLETED'],
+                '3': ['IN_PROGRESS', 'COMPLETED']}
+    self.report_service.runReportJob.side_effect = (
+        lambda report_job: {'id': report_job['id']})
+    self.report_service.getReportJobStatus.side_effect = (
+        lambda report_job_id: statuses[report_job_id].pop(0))
+    callback = mock.Mock()
+    clock = [1000.0]
+
+    def FakeSleep(seconds):
+      clock[0] += seconds
+
+    with mock.patch('time.time', side_effect=lambda: clock[0]):
+      with mock.patch('time.sleep', side_effect=FakeSleep):
+        rval = self.report_downloader.WaitForReports(
+            [{'id': '1'}, {'id': '2'}, {'id': '3'}], callback)
+
+    self.assertEqual(['1', '2', '3'], rval)
+    self.assertEqual([mock.call('2', 'COMPLETED'), mock.call('3', 'COMPLETED'),
+                      mock.call('1', 'COMPLETED')], callback.call_args_list)
+    # Job 1 is checked after waits of 1, 2 and 4 seconds.
+    self.assertEqual(1007.0, clock[0])
+    self.assertEqual(7, self.report_service.getReportJobStatus.call_count)
+
+  def testWaitForReports_backoffIsCapped(self):
+    statuses = ['IN_PROGRESS'] * 10 + ['COMPLETED']
+    self.report_service.runReportJob.return_value = {'id': '1'}
+    self.report_service.getReportJobStatus.side_effect = statuses
+    clock = [0.0]
+    waits = []
+
+    def FakeSleep(seconds):
+      waits.append(seconds)
+      clock[0] += seconds
+
+    with mock.patch('time.time', side_effect=lambda: clock[0]):
+      with mock.patch('time.sleep', side_effect=FakeSleep):
+        self.report_downloader.WaitForReports([{'id': '1'}])
+
+    self.assertEqual([1, 2, 4, 8, 16, 30, 30, 30, 30, 30], waits)
+
+  def testWaitForReports_failure(self):
+    statuses = {'1': ['FAILED'], '2': ['IN_PROGRESS', 'COMPLETED']}
+    self.report_service.runReportJob.side_effect = (
+        lambda report_job: {'id': report_job['id']})
+    self.report_service.getReportJobStatus.side_effect = (
+        lambda report_job_id: statuses[report_job_id].pop(0))
+    callback = mock.Mock()
+
+    with mock.patch('time.sleep'):
+      try:
+        self.report_downloader.WaitForReports([{'id': '1'}, {'id': '2'}],
+                                              callback)
+        self.fail('Expected a DfpReportError.')
+      except googleads.errors.DfpReportError, e:
+        self.assertEqual('1', e.report_job_id)
+
+    self.assertEqual([mock.call('1', 'FAILED'), mock.call('2', 'COMPLETED')],
+                     callback.call_args_list)
+
+  def testWaitForReports_oldVersion(self):
+    self.report_downloader._version = 'v201502'
+    self.report_service.runReportJob.return_value = {'id': '1'}
+    self.report_service.getReportJob.return_value = {
+        'reportJobStatus': 'COMPLETED'}
+
+    self.assertEqual(['1'],
+                     self.report_downloader.WaitForReports([{'id': '1'}]))
+    self.report_service.getReportJob.assert_called_once_with('1')
+
   def testDownloadReportToFile(self):
     report_format = 'csv'
     report_job_id = 't68t3278y429'
@@ -455,6 +613,182 @@ class DataDownloaderTest(unittest.TestCase):
       mock_urlopen.assert_called_once_with(report_download_url)
       self.assertEqual(report_contents, outfile.getvalue())
 
+  def _StartRangeServer(self, content, accept_ranges):
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+    server.content = content
+    server.accept_ranges = accept_ranges
+    server.honor_ranges = accept_ranges
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    self.addCleanup(server.server_close)
+    self.addCleanup(server.shutdown)
+    self.report_service.getReportDownloadURL.return_value = (
+        'http://127.0.0.1:%d/report.csv.gz' % server.server_address[1])
+    return server
+
+  def testDownloadReportToFile_parallelRanges(self):
+    content = ''.join(chr(i % 256) for i in range(100000))
+    server = self._StartRangeServer(content, True)
+
+    with tempfile.TemporaryFile() as outfile:
+      stats = self.report_downloader.DownloadReportToFile(
+          '123', 'CSV_DUMP', outfile, num_connections=4, chunk_size=1000)
+      outfile.seek(0)
+      self.assertEqual(content, outfile.read())
+
+    self.assertEqual(4, stats['connections'])
+    self.assertEqual(len(content), stats['bytes'])
+    self.assertEqual(['bytes=0-24999', 'bytes=25000-49999',
+                      'bytes=50000-74999', 'bytes=75000-99999'],
+                     sorted(server.requests))
+
+  def testDownloadReportToFile_rangesNotAccepted(self):
+    content = 'THIS IS YOUR REPORT!' * 1000
+    server = self._StartRangeServer(content, False)
+
+    with tempfile.TemporaryFile() as outfile:
+      stats = self.report_downloader.DownloadReportToFile(
+          '123', 'CSV_DUMP', outfile, num_connections=4)
+      outfile.seek(0)
+      self.assertEqual(content, outfile.read())
+
+    self.assertEqual(1, stats['connections'])
+    self.assertEqual(len(content), stats['bytes'])
+    self.assertEqual([None], server.requests)
+
+  def testDownloadReportToFile_rangesNotHonored(self):
+    content = 'THIS IS YOUR REPORT!' * 1000
+    server = self._StartRangeServer(content, True)
+    # Advertise range support in HEAD responses but ignore Range headers.
+    server.honor_ranges = False
+
+    with tempfile.TemporaryFile() as outfile:
+      stats = self.report_downloader.DownloadReportToFile(
+          '123', 'CSV_DUMP', outfile, num_connections=2)
+      outfile.seek(0)
+      self.assertEqual(content, outfile.read())
+
+    self.assertEqual(1, stats['connections'])
+
+  def _GzipContents(self, contents):
+    compressed = StringIO.StringIO()
+    gzip_file = gzip.GzipFile(fileobj=compressed, mode='wb')
+    gzip_file.write(contents)
+    gzip_file.close()
+    return compressed.getvalue()
+
+  def testIterReportRows(self):
+    rows = ['Dimension.DATE,Dimension.AD_UNIT_NAME,'
+            'Column.AD_SERVER_IMPRESSIONS,Column.AD_SERVER_CTR']
+    for i in range(5000):
+      rows.append('2015-06-%02d,"Ad unit, number %d",%d,0.%d' % (
+          i % 30 + 1, i, i, i))
+    contents = '\r\n'.join(rows) + '\r\n'
+    self.report_service.getReportDownloadURL.return_value = 'http://report'
+
+    with mock.patch('urllib2.urlopen') as mock_urlopen:
+      mock_urlopen.return_value = StringIO.StringIO(
+          self._GzipContents(contents))
+      result = list(self.report_downloader.IterReportRows('123', 'CSV_DUMP'))
+      mock_urlopen.assert_called_once_with('http://report')
+
+    self.report_service.getReportDownloadURL.assert_called_once_with(
+        '123', 'CSV_DUMP')
+    self.assertEqual(5000, len(result))
+    self.assertEqual({'Dimension.DATE': datetime.date(2015, 6, 18),
+                      'Dimension.AD_UNIT_NAME': 'Ad unit, number 4007',
+                      'Column.AD_SERVER_IMPRESSIONS': 4007,
+                      'Column.AD_SERVER_CTR': 0.4007}, result[4007])
+
+  def testIterReportRows_uncompressedTsv(self):
+    contents = ('Dimension.ORDER_NAME\tColumn.AD_SERVER_CLICKS\n'
+                'An order\t12\n'
+                '2015-13-45\tN/A\n')
+
+    with mock.patch('urllib2.urlopen') as mock_urlopen:
+      mock_urlopen.return_value = StringIO.StringIO(contents)
+      result = list(self.report_downloader.IterReportRows('123', 'TSV'))
+
+    self.assertEqual([{'Dimension.ORDER_NAME': 'An order',
+                       'Column.AD_SERVER_CLICKS': 12},
+                      {'Dimension.ORDER_NAME': '2015-13-45',
+                       'Column.AD_SERVER_CLICKS': 'N/A'}], result)
+
+  def testIterReportRows_multipleGzipMembers(self):
+    contents = (self._GzipContents('Column.A,Column.B\n1,2\n') +
+                self._GzipContents('3,4\n'))
+
+    with mock.patch('urllib2.urlopen') as mock_urlopen:
+      mock_urlopen.return_value = StringIO.StringIO(contents)
+      result = list(self.report_downloader.IterReportRows('123', 'CSV_DUMP'))
+
+    self.assertEqual([{'Column.A': 1, 'Column.B': 2},
+                      {'Column.A': 3, 'Column.B': 4}], result)
+
+  def testIterReportRows_unsupportedFormat(self):
+    self.assertRaises(
+        googleads.errors.GoogleAdsValueError, list,
+        self.report_downloader.IterReportRows('123', 'XML'))
+
+  def testWaitForReports_cached(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.report_downloader._report_cache = googleads.common.ReportCache(
+        directory)
+    report_job = {'reportQuery': {'dimensions': ['DATE'],
+                                  'dateRangeType': 'LAST_WEEK'}}
+    self.report_service.runReportJob.return_value = {'id': '1'}
+    self.report_service.getReportJobStatus.return_value = 'COMPLETED'
+    callback = mock.Mock()
+
+    self.assertEqual(['1'], self.report_downloader.WaitForReports([report_job]))
+    self.assertEqual(
+        ['1'], self.report_downloader.WaitForReports([report_job], callback))
+
+    self.report_service.runReportJob.assert_called_once_with(report_job)
+    self.report_service.getReportJobStatus.assert_called_once_with('1')
+    callback.assert_called_once_with('1', 'COMPLETED')
+
+  def testDownloadReportToFile_cached(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    self.report_downloader._report_cache = googleads.common.ReportCache(
+        directory)
+    self.report_service.getReportDownloadURL.return_value = 'http://report'
+
+    with mock.patch('urllib2.urlopen') as mock_urlopen:
+      mock_urlopen.return_value = StringIO.StringIO('THIS IS YOUR REPORT!')
+      outfile = StringIO.StringIO()
+      stats = self.report_downloader.DownloadReportToFile(
+          '123', 'CSV_DUMP', outfile)
+      self.assertEqual('THIS IS YOUR REPORT!', outfile.getvalue())
+      self.assertEqual(1, stats['connections'])
+
+      outfile = StringIO.StringIO()
+      stats = self.report_downloader.DownloadReportToFile(
+          '123', 'CSV_DUMP', outfile)
+      self.assertEqual('THIS IS YOUR REPORT!', outfile.getvalue())
+      self.assertEqual(0, stats['connections'])
+      self.assertEqual(20, stats['bytes'])
+      mock_urlopen.assert_called_once_with('http://report')
+
+  def testReportJobIncludesToday(self):
+    self.assertTrue(googleads.dfp._ReportJobIncludesToday(
+        {'reportQuery': {'dateRangeType': 'TODAY'}}))
+    self.assertTrue(googleads.dfp._ReportJobIncludesToday({}))
+    self.assertFalse(googleads.dfp._ReportJobIncludesToday(
+        {'reportQuery': {'dateRangeType': 'LAST_MONTH'}}))
+    self.assertFalse(googleads.dfp._ReportJobIncludesToday(
+        {'reportQuery': {'dateRangeType': 'CUSTOM_DATE',
+                         'endDate': {'year': 2015, 'month': 1, 'day': 31}}}))
+    today = datetime.date.today()
+    self.assertTrue(googleads.dfp._ReportJobIncludesToday(
+        {'reportQuery': {'dateRangeType': 'CUSTOM_DATE',
+                         'endDate': {'year': today.year, 'month': today.month,
+                                     'day': today.day}}}))
+
   def testGetReportService(self):
     self.report_downloader._dfp_client = mock.Mock()
     self.report_downloader._report_service = None
@@ -502,5 +836,391 @@ class FilterStatementTest(unittest.TestCase):
                       'values': values})
 
 
+class LastModifiedInvalidatorTest(unittest.TestCase):
+  """Tests for the LastModifiedInvalidator class."""
+
+  def testCheck(self):
+    dfp_client = mock.Mock()
+    services = {'InventoryService': mock.Mock(), 'OrderService': mock.Mock()}
+    dfp_client.GetService.side_effect = (
+        lambda service_name, version, server: services[service_name])
+    services['InventoryService'].getAdUnitsByStatement.return_value = {
+        'totalResultSetSize': 1, 'results': [{'id': 1}]}
+    services['OrderService'].getOrdersByStatement.return_value = {
+        'totalResultSetSize': 0}
+    entity_cache = mock.Mock()
+
+    start_time = datetime.datetime(2015, 6, 1, 12)
+    check_time = datetime.datetime(2015, 6, 1, 13)
+    with mock.patch('googleads.dfp.datetime.datetime') as mock_datetime:
+      mock_datetime.utcnow.return_value = start_time
+      invalidator = googleads.dfp.LastModifiedInvalidator(
+          dfp_client, entity_cache,
+          {'InventoryService': 'getAdUnitsByStatement',
+           'OrderService': 'getOrdersByStatement'}, 'v201505')
+      mock_datetime.utcnow.return_value = check_time
+
+      self.assertEqual(set(['InventoryService']), invalidator.Check())
+      invalidator.Check()
+
+    entity_cache.Invalidate.assert_called_with('InventoryService')
+    self.assertEqual(2, entity_cache.Invalidate.call_count)
+    self.assertEqual(2, dfp_client.GetService.call_count)
+    dfp_client.GetService.assert_any_call(
+        'InventoryService', 'v201505', 'https://ads.google.com')
+    statements = [
+        call[0][0] for call in
+        services['InventoryService'].getAdUnitsByStatement.call_args_list]
+    self.assertEqual('WHERE lastModifiedDateTime > :since LIMIT 1 OFFSET 0',
+                     statements[0]['query'])
+    self.assertEqual(
+        {'date': {'year': 2015, 'month': 6, 'day': 1}, 'hour': 11,
+         'minute': 59, 'second': 0, 'timeZoneID': 'UTC'},
+        statements[0]['values'][0]['value']['value'])
+    self.assertEqual(12, statements[1]['values'][0]['value']['value']['hour'])
+
+
+class FakeStatementService(object):
+  """A fake DFP service which pages through a list of entities."""
+
+  def __init__(self, entities, values=None):
+    self.entities = entities
+    self.values = values or []
+    self.statements = []
+    self.lock = threading.Lock()
+
+  def Clone(self):
+    return self
+
+  def _GetPage(self, entities, statement):
+    with self.lock:
+      self.statements.append(statement)
+    limit, offset = [int(value) for value in
+                     re.search(r'LIMIT (\d+) OFFSET (\d+)$',
+                               statement['query']).groups()]
+    page = {'totalResultSetSize': len(entities), 'startIndex': offset}
+    if entities[offset:offset + limit]:
+      page['results'] = entities[offset:offset + limit]
+    return page
+
+  def GetByStatement(self, statement):
+    return self._GetPage(self.entities, statement)
+
+  def getCustomTargetingValuesByStatement(self, statement):
+    return self._GetPage(self.values, statement)
+
+  getOrdersByStatement = GetByStatement
+  getLineItemsByStatement = GetByStatement
+  getCustomTargetingKeysByStatement = GetByStatement
+  getAdUnitsByStatement = GetByStatement
+
+
+def _DfpDateTime(hour, minute=0, time_zone_id='America/New_York'):
+  return {'date': {'year': 2015, 'month': 6, 'day': 1}, 'hour': hour,
+          'minute': minute, 'second': 0, 'timeZoneID': time_zone_id}
+
+
+class DfpIncrementalSyncTest(unittest.TestCase):
+  """Tests for the DfpIncrementalSync class."""
+
+  def setUp(self):
+    self.dfp_client = mock.Mock()
+    self.dfp_client.network_code = 1234
+    self.services = {
+        'OrderService': FakeStatementService([
+            {'id': 1, 'lastModifiedDateTime': _DfpDateTime(8)},
+            {'id': 2, 'lastModifiedDateTime': _DfpDateTime(9, 30)},
+            {'id': 3, 'lastModifiedDateTime': _DfpDateTime(7)}]),
+        'LineItemService': FakeStatementService([
+            {'id': 10, 'orderId': 1,
+             'lastModifiedDateTime': _DfpDateTime(12, 0, 'UTC')}]),
+        'CustomTargetingService': FakeStatementService([
+            {'id': 100, 'name': 'key'}]),
+    }
+    self.dfp_client.GetService.side_effect = (
+        lambda service_name, version, server: self.services[service_name])
+    self.entity_store = googleads.store.EntityStore(':memory:')
+    self.addCleanup(self.entity_store.Close)
+
+  def _Sync(self, entity_types):
+    sync = googleads.dfp.DfpIncrementalSync(
+        self.dfp_client, self.entity_store, entity_types, 'v201505',
+        max_parallel=2)
+    with mock.patch('googleads.dfp.SUGGESTED_PAGE_LIMIT', 1):
+      return sync.Sync()
+
+  def testSync(self):
+    self.assertEqual({'Order': 3, 'LineItem': 1},
+                     self._Sync(['Order', 'LineItem']))
+
+    self.assertEqual(set(['1', '2', '3']),
+                     self.entity_store.GetIds('1234', 'Order'))
+    self.assertEqual([10], [line_item['id'] for line_item in
+                            self.entity_store.GetAll('1234', 'LineItem', 1)])
+    self.assertEqual({'LineItem': '2015-06-01T12:00:00',
+                      'Order': '2015-06-01T13:30:00'},
+                     json.loads(self.entity_store.GetCheckpoint('1234')))
+    self.assertEqual(
+        ['ORDER BY id LIMIT 1 OFFSET %d' % offset for offset in range(3)],
+        sorted(statement['query'] for statement in
+               self.services['OrderService'].statements))
+
+    self.services['OrderService'].entities = [
+        {'id': 2, 'name': 'changed',
+         'lastModifiedDateTime': _DfpDateTime(10)}]
+    self.services['OrderService'].statements = []
+
+    self.assertEqual({'Order': 1}, self._Sync(['Order']))
+
+    statement = self.services['OrderService'].statements[0]
+    self.assertEqual(
+        'WHERE lastModifiedDateTime > :since ORDER BY id LIMIT 1 OFFSET 0',
+        statement['query'])
+    self.assertEqual(
+        {'date': {'year': 2015, 'month': 6, 'day': 1}, 'hour': 13,
+         'minute': 29, 'second': 0, 'timeZoneID': 'UTC'},
+        statement['values'][0]['value']['value'])
+    self.assertEqual('changed',
+                     self.entity_store.Get('1234', 'Order', 2)['name'])
+    self.assertEqual(set(['1', '2', '3']),
+                     self.entity_store.GetIds('1234', 'Order'))
+    self.assertEqual('2015-06-01T14:00:00', json.loads(
+        self.entity_store.GetCheckpoint('1234'))['Order'])
+
+  def testSync_customTargeting(self):
+    self._Sync(['CustomTargetingValue'])
+    self.services['CustomTargetingService'].entities = [
+        {'id': 101, 'name': 'key'}]
+    self.services['CustomTargetingService'].values = [
+        {'id': 1001, 'customTargetingKeyId': 101, 'name': 'value'}]
+    self.services['CustomTargetingService'].statements = []
+
+    self.assertEqual({'CustomTargetingKey': 1, 'CustomTargetingValue': 1},
+                     self._Sync(['CustomTargetingValue']))
+
+    self.assertEqual(
+        ['ORDER BY id LIMIT 1 OFFSET 0',
+         'WHERE customTargetingKeyId IN (101) ORDER BY id LIMIT 1 OFFSET 0'],
+        [statement['query'] for statement in
+         self.services['CustomTargetingService'].statements])
+    self.assertEqual(set(['101']),
+                     self.entity_store.GetIds('1234', 'CustomTargetingKey'))
+    self.assertEqual(
+        [{'id': 1001, 'customTargetingKeyId': 101, 'name': 'value'}],
+        self.entity_store.GetAll('1234', 'CustomTargetingValue', 101))
+    self.assertEqual({}, json.loads(self.entity_store.GetCheckpoint('1234')))
+
+  def testSync_unsupportedType(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.dfp.DfpIncrementalSync, self.dfp_client,
+                      self.entity_store, ['Proposal'])
+
+
+class AdUnitTreeTest(unittest.TestCase):
+  """Tests for the AdUnitTree class."""
+
+  def setUp(self):
+    self.inventory_service = FakeStatementService([
+        {'id': 1, 'name': 'root', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(8)},
+        {'id': 2, 'parentId': 1, 'name': 'sports', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(9)},
+        {'id': 3, 'parentId': 2, 'name': 'soccer', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(7)},
+        {'id': 4, 'parentId': 1, 'name': 'news', 'status': 'ARCHIVED',
+         'lastModifiedDateTime': _DfpDateTime(7)},
+        {'id': 5, 'parentId': 2, 'name': 'tennis', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(7)}])
+    self.dfp_client = mock.Mock()
+    self.dfp_client.GetService.return_value = self.inventory_service
+    self.tempdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tempdir)
+
+  def _Load(self, cache_path=None):
+    with mock.patch('googleads.dfp.SUGGESTED_PAGE_LIMIT', 2):
+      return googleads.dfp.AdUnitTree.Load(
+          self.dfp_client, 'v201505', cache_path=cache_path, max_parallel=2)
+
+  def testLoad(self):
+    ad_unit_tree = self._Load()
+
+    self.dfp_client.GetService.assert_called_once_with(
+        'InventoryService', 'v201505', googleads.dfp.DEFAULT_ENDPOINT)
+    self.assertEqual(5, len(ad_unit_tree))
+    self.assertIn(3, ad_unit_tree)
+    self.assertNotIn(6, ad_unit_tree)
+    self.assertEqual('2015-06-01T13:00:00', ad_unit_tree.watermark)
+    self.assertEqual(['1'], ad_unit_tree.GetRootIds())
+    self.assertEqual(['2', '4'], ad_unit_tree.GetChildIds(1))
+    self.assertEqual('1', ad_unit_tree.GetParentId(2))
+    self.assertIsNone(ad_unit_tree.GetParentId(1))
+    self.assertEqual('news', ad_unit_tree.GetName(4))
+    self.assertEqual('ARCHIVED', ad_unit_tree.GetStatus(4))
+    self.assertEqual(['1', '2', '3', '5', '4'], ad_unit_tree.GetSubtreeIds(1))
+    self.assertEqual(['2', '3', '5'], ad_unit_tree.GetSubtreeIds(2))
+    self.assertEqual(['root', 'sports', 'tennis'], ad_unit_tree.GetPath(5))
+    self.assertEqual('5', ad_unit_tree.FindByPath(['root', 'sports',
+                                                   'tennis']))
+    self.assertIsNone(ad_unit_tree.FindByPath(['root', 'tennis']))
+    self.assertTrue(ad_unit_tree.IsUnder(3, 1))
+    self.assertTrue(ad_unit_tree.IsUnder(2, 2))
+    self.assertFalse(ad_unit_tree.IsUnder(4, 2))
+    self.assertFalse(ad_unit_tree.IsUnder(1, 3))
+    self.assertRaises(KeyError, ad_unit_tree.GetName, 6)
+
+  def testLoad_cached(self):
+    cache_path = os.path.join(self.tempdir, 'ad_units.json')
+    self._Load(cache_path)
+    self.inventory_service.entities = [
+        {'id': 4, 'parentId': 2, 'name': 'news', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(10)},
+        {'id': 6, 'parentId': 4, 'name': 'local', 'status': 'ACTIVE',
+         'lastModifiedDateTime': _DfpDateTime(10, 30)}]
+    self.inventory_service.statements = []
+
+    ad_unit_tree = self._Load(cache_path)
+
+    statement = self.inventory_service.statements[0]
+    self.assertEqual(
+        'WHERE lastModifiedDateTime > :since ORDER BY id LIMIT 2 OFFSET 0',
+        statement['query'])
+    self.assertEqual(
+        {'date': {'year': 2015, 'month': 6, 'day': 1}, 'hour': 12,
+         'minute': 59, 'second': 0, 'timeZoneID': 'UTC'},
+        statement['values'][0]['value']['value'])
+    self.assertEqual(6, len(ad_unit_tree))
+    self.assertEqual('2015-06-01T14:30:00', ad_unit_tree.watermark)
+    self.assertEqual(['root', 'sports', 'news', 'local'],
+                     ad_unit_tree.GetPath(6))
+    self.assertEqual(['2'], ad_unit_tree.GetChildIds(1))
+    self.assertEqual('ACTIVE', ad_unit_tree.GetStatus(4))
+
+    cached = googleads.dfp.AdUnitTree.LoadFromFile(cache_path)
+    self.assertEqual(ad_unit_tree.GetSubtreeIds(1), cached.GetSubtreeIds(1))
+    self.assertEqual(ad_unit_tree.watermark, cached.watermark)
+
+  def testLoad_orphan(self):
+    ad_unit_tree = googleads.dfp.AdUnitTree([
+        ('1', None, 'root', 'ACTIVE'), ('7', '8', 'orphan', 'ACTIVE')])
+
+    self.assertEqual(['1', '7'], ad_unit_tree.GetRootIds())
+    self.assertEqual('8', ad_unit_tree.GetParentId(7))
+    self.assertEqual(['orphan'], ad_unit_tree.GetPath(7))
+
+
+class CustomTargetingIndexTest(unittest.TestCase):
+  """Tests for the CustomTargetingIndex class."""
+
+  def setUp(self):
+    self.custom_targeting_service = FakeStatementService(
+        [{'id': 1, 'name': 'sport', 'type': 'PREDEFINED'},
+         {'id': 2, 'name': 'city', 'type': 'FREEFORM'}],
+        [{'id': 10, 'customTargetingKeyId': 1, 'name': 'tennis'},
+         {'id': 11, 'customTargetingKeyId': 1, 'name': 'golf'},
+         {'id': 12, 'customTargetingKeyId': 2, 'name': 'paris'},
+         {'id': 13, 'customTargetingKeyId': 1, 'name': u'p\xe9tanque'}])
+    self.dfp_client = mock.Mock()
+    self.dfp_client.GetService.return_value = self.custom_targeting_service
+    self.tempdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tempdir)
+    self.path = os.path.join(self.tempdir, 'custom_targeting.idx')
+
+  def _Load(self, full=False):
+    with mock.patch('googleads.dfp.SUGGESTED_PAGE_LIMIT', 2):
+      custom_targeting_index = googleads.dfp.CustomTargetingIndex.Load(
+          self.dfp_client, self.path, 'v201505', full=full, max_parallel=2)
+    self.addCleanup(custom_targeting_index.Close)
+    return custom_targeting_index
+
+  def testLoad(self):
+    custom_targeting_index = self._Load()
+
+    self.dfp_client.GetService.assert_called_once_with(
+        'CustomTargetingService', 'v201505', googleads.dfp.DEFAULT_ENDPOINT)
+    self.assertEqual(
+        ['ORDER BY id LIMIT 2 OFFSET 0',
+         'WHERE customTargetingKeyId IN (1, 2) AND id > 0 ORDER BY id '
+         'LIMIT 2 OFFSET 0',
+         'WHERE customTargetingKeyId IN (1, 2) AND id > 0 ORDER BY id '
+         'LIMIT 2 OFFSET 2'],
+        [statement['query'] for statement in
+         self.custom_targeting_service.statements])
+    self.assertEqual(4, len(custom_targeting_index))
+    self.assertEqual(2, custom_targeting_index.GetKeyId('city'))
+    self.assertIsNone(custom_targeting_index.GetKeyId('country'))
+    self.assertEqual('sport', custom_targeting_index.GetKeyName(1))
+    self.assertEqual(
+        {'golf': 11, 'tennis': 10, u'p\xe9tanque': 13},
+        custom_targeting_index.GetValueIds(
+            'sport', ['tennis', 'golf', 'paris', u'p\xe9tanque']))
+    self.assertEqual({}, custom_targeting_index.GetValueIds('country', ['fr']))
+    self.assertEqual(
+        {12: ('city', 'paris'), 13: ('sport', 'p\xc3\xa9tanque')},
+        custom_targeting_index.GetValueNames([12, 13, 14]))
+
+  def testLoad_incremental(self):
+    self._Load().Close()
+    self.custom_targeting_service.values = [
+        {'id': 14, 'customTargetingKeyId': 2, 'name': 'berlin'}]
+    self.custom_targeting_service.statements = []
+
+    custom_targeting_index = self._Load()
+
+    self.assertEqual(
+        'WHERE customTargetingKeyId IN (1, 2) AND id > 13 ORDER BY id '
+        'LIMIT 2 OFFSET 0',
+        self.custom_targeting_service.statements[1]['query'])
+    self.assertEqual(5, len(custom_targeting_index))
+    self.assertEqual({'berlin': 14, 'paris': 12},
+                     custom_targeting_index.GetValueIds(
+                         'city', ['paris', 'berlin']))
+
+    custom_targeting_index = self._Load(full=True)
+
+    self.assertEqual(1, len(custom_targeting_index))
+    self.assertEqual({14: ('city', 'berlin')},
+                     custom_targeting_index.GetValueNames([14]))
+
+  def testRefresh_failedWriteKeepsIndex(self):
+    custom_targeting_index = self._Load()
+    self.custom_targeting_service.values = [
+        {'id': 14, 'customTargetingKeyId': 2, 'name': 'berlin'}]
+
+    with mock.patch('googleads.dfp.CustomTargetingIndex._WriteTemporary',
+                    side_effect=IOError):
+      self.assertRaises(IOError, custom_targeting_index.Refresh,
+                        self.dfp_client, 'v201505')
+    with mock.patch('os.rename', side_effect=OSError):
+      self.assertRaises(OSError, custom_targeting_index.Refresh,
+                        self.dfp_client, 'v201505')
+
+    self.assertEqual(4, len(custom_targeting_index))
+    self.assertEqual({12: ('city', 'paris')},
+                     custom_targeting_index.GetValueNames([12, 14]))
+    self.assertEqual(['custom_targeting.idx'], os.listdir(self.tempdir))
+
+  def testGetCustomCriteria(self):
+    custom_targeting_index = self._Load()
+
+    self.assertEqual(
+        {'xsi_type': 'CustomCriteria', 'keyId': 1, 'valueIds': [10, 11],
+         'operator': 'IS_NOT'},
+        custom_targeting_index.GetCustomCriteria('sport', ['tennis', 'golf'],
+                                                 'IS_NOT'))
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      custom_targeting_index.GetCustomCriteria, 'sport',
+                      ['tennis', 'chess'])
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      custom_targeting_index.GetCustomCriteria, 'country',
+                      ['fr'])
+
+  def testInit_notAnIndex(self):
+    with open(self.path, 'wb') as handle:
+      handle.write('not an index')
+
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.dfp.CustomTargetingIndex, self.path)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the locations module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import googleads.errors
+import googleads.locations
+
+
+class LocationIndexTest(unittest.TestCase):
+  """Tests for the googleads.locations.LocationIndex class."""
+
+  def setUp(self):
+    self.location_index = googleads.locations.LocationIndex([
+        (2250, 'France', 'France', None, 'Country', 60000000),
+        (9040, 'Ile-de-France', 'Ile-de-France,France', 2250, 'Region',
+         12000000),
+        (1006094, 'Paris', 'Paris,Ile-de-France,France', 9040, 'City',
+         9000000),
+        (2840, 'United States', 'United States', None, 'Country', 300000000),
+        (1026339, 'Paris', 'Paris,Texas,United States', 2840, 'City', 50000),
+        (1005781, u'Z\xfcrich', u'Z\xfcrich,Switzerland', None, 'City',
+         400000),
+        (1006002, 'Parisot', 'Parisot,France', 2250, 'City', None)])
+
+  def testFind(self):
+    self.assertEqual([1006094, 1026339],
+                     [location.id for location in
+                      self.location_index.Find(' PARIS ')])
+    self.assertEqual([1026339], [location.id for location in
+                                 self.location_index.Find('Paris')
+                                 if location.parent_id == 2840])
+    self.assertEqual([], self.location_index.Find('Paris', 'Country'))
+    self.assertEqual([1005781], [location.id for location in
+                                 self.location_index.Find('zurich')])
+    self.assertEqual('Ile-de-France',
+                     self.location_index.Get(9040).name)
+    self.assertIsNone(self.location_index.Get(1))
+    self.assertIn(2250, self.location_index)
+    self.assertEqual([9040, 2250], [location.id for location in
+                                    self.location_index.GetAncestors(1006094)])
+
+  def testFindByPrefix(self):
+    self.assertEqual([1006094, 1026339, 1006002],
+                     [location.id for location in
+                      self.location_index.FindByPrefix('par')])
+    self.assertEqual([1006094], [location.id for location in
+                                 self.location_index.FindByPrefix('par',
+                                                                  limit=1)])
+    self.assertEqual([], self.location_index.FindByPrefix('x'))
+
+  def testFindFuzzy(self):
+    self.assertEqual([1006094, 1026339],
+                     [location.id for location in
+                      self.location_index.FindFuzzy('Pariss', limit=1)])
+    self.assertEqual([2840], [location.id for location in
+                              self.location_index.FindFuzzy('United Stats')])
+    self.assertEqual([], self.location_index.FindFuzzy('Tokyo'))
+
+  def testSaveAndUpdate(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'locations.idx')
+    self.location_index.Save(path)
+
+    location_index = googleads.locations.LocationIndex.LoadFromFile(path)
+    self.addCleanup(location_index.Close)
+    self.assertEqual(7, len(location_index))
+    self.assertEqual(self.location_index.Get(1005781),
+                     location_index.Get(1005781))
+    self.assertEqual(
+        (1005781, 'Z\xc3\xbcrich', 'Z\xc3\xbcrich,Switzerland', None, 'City',
+         400000), location_index.Get(1005781))
+    self.assertEqual([1006094, 1026339],
+                     [location.id for location in
+                      location_index.FindFuzzy('Pariss', limit=1)])
+
+    location_index = location_index.Update(
+        [(1006002, 'Parisot', 'Parisot,France', 2250, 'City', 700),
+         (2276, 'Germany', 'Germany', None, 'Country', 80000000)])
+    self.assertEqual(8, len(location_index))
+    self.assertEqual(700, location_index.Get(1006002).reach)
+    self.assertEqual([2276], [location.id for location in
+                              location_index.Find('germany')])
+
+  def testLoadFromFile_notAnIndex(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'locations.idx')
+    with open(path, 'wb') as handle:
+      handle.write('not an index')
+
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.locations.LocationIndex.LoadFromFile, path)
+
+  def testFindFuzzy_onlyScoresCandidates(self):
+    location_index = googleads.locations.LocationIndex(
+        [(index, 'Place %d' % index, None, None, 'City', None)
+         for index in range(50)] +
+        [(100, 'Springfield', None, None, 'City', 100)])
+
+    with mock.patch('googleads.locations._FUZZY_CANDIDATES', 2):
+      self.assertEqual([100], [location.id for location in
+                               location_index.FindFuzzy('Springfeld')])
+      self.assertEqual(2, len(location_index.FindFuzzy('Place 1', limit=50,
+                                                       cutoff=0)))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the metrics module."""
+
+import unittest
+import urllib2
+
+import googleads.common
+import googleads.metrics
+
+
+class HistogramCollectorTest(unittest.TestCase):
+  """Tests for the googleads.metrics.HistogramCollector class."""
+
+  def setUp(self):
+    self.collector = googleads.metrics.HistogramCollector(buckets=(0.1, 1))
+    for duration, fault_type in ((0.05, None), (0.5, None),
+                                 (2, 'RateExceededError')):
+      call = googleads.common.CallMetrics('CampaignService', 'get')
+      call.duration = duration
+      call.phases['network'] = duration / 2
+      call.request_bytes = 100
+      call.response_bytes = 1000
+      call.fault_type = fault_type
+      self.collector.AfterCall(call)
+    self.collector.OnRetry('CampaignService', 'get', 'RateExceededError')
+
+  def testAfterCall(self):
+    histogram = self.collector.GetHistogram('CampaignService', 'get')
+    self.assertEqual([1, 2], histogram[0])
+    self.assertEqual(3, histogram[1])
+    self.assertAlmostEqual(2.55, histogram[2])
+    self.assertEqual([1, 3], self.collector.GetHistogram(
+        'CampaignService', 'get', 'network')[0])
+    self.assertIsNone(self.collector.GetHistogram('CampaignService', 'mutate'))
+    self.assertEqual(3, self.collector.GetCounter('calls', 'CampaignService',
+                                                  'get'))
+    self.assertEqual(1, self.collector.GetCounter(
+        'faults', 'CampaignService', 'get', 'RateExceededError'))
+    self.assertEqual(1, self.collector.GetCounter(
+        'retries', 'CampaignService', 'get', 'RateExceededError'))
+    self.assertEqual(3000, self.collector.GetCounter(
+        'response_bytes', 'CampaignService', 'get'))
+    self.assertEqual(0, self.collector.GetCounter(
+        'cache_hits', 'CampaignService', 'get'))
+
+    self.collector.Reset()
+    self.assertIsNone(self.collector.GetHistogram('CampaignService', 'get'))
+
+  def testToPrometheusText(self):
+    text = self.collector.ToPrometheusText()
+    lines = text.splitlines()
+
+    self.assertIn('# TYPE googleads_call_duration_seconds histogram', lines)
+    self.assertIn('googleads_call_duration_seconds_bucket{service='
+                  '"CampaignService",method="get",phase="total",le="0.1"} 1',
+                  lines)
+    self.assertIn('googleads_call_duration_seconds_bucket{service='
+                  '"CampaignService",method="get",phase="total",le="+Inf"} 3',
+                  lines)
+    self.assertIn('googleads_call_duration_seconds_count{service='
+                  '"CampaignService",method="get",phase="total"} 3', lines)
+    self.assertIn('googleads_faults_total{service="CampaignService",'
+                  'method="get",type="RateExceededError"} 1', lines)
+    self.assertIn('googleads_request_bytes_total{service="CampaignService",'
+                  'method="get"} 300', lines)
+    self.assertTrue(text.endswith('\n'))
+
+  def testServePrometheusMetrics(self):
+    server = googleads.metrics.ServePrometheusMetrics(self.collector, 0)
+    self.addCleanup(server.server_close)
+    self.addCleanup(server.shutdown)
+
+    response = urllib2.urlopen('http://localhost:%d/metrics' %
+                               server.server_address[1])
+
+    self.assertEqual(self.collector.ToPrometheusText(), response.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
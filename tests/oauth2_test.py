@@ -25,6 +25,7 @@ import httplib2
 import mock
 import socks
 
+import googleads.common
 import googleads.errors
 import googleads.oauth2
 
@@ -149,6 +150,20 @@ class GoogleRefreshTokenClientTest(unittest.TestCase):
                         self.googleads_client.CreateHttpHeader)
       self.assertFalse(self.mock_oauth2_credentials.apply.called)
 
+  def testRefresh_traced(self):
+    span_exporter = googleads.common.InMemorySpanExporter()
+    googleads.common.AddSpanExporter(span_exporter)
+    self.addCleanup(googleads.common.RemoveSpanExporter, span_exporter)
+
+    with mock.patch('httplib2.Http', self.http):
+      self.googleads_client.Refresh()
+
+    span = span_exporter.GetFinishedSpans()[0]
+    self.assertEqual('OAuth2.Refresh', span.name)
+    self.assertEqual('GoogleRefreshTokenClient',
+                     span.attributes['googleads.oauth2_client'])
+    self.assertEqual('OK', span.status)
+
 
 class GoogleServiceAccountTest(unittest.TestCase):
   """Tests for the googleads.oauth2.GoogleServiceAccountClient class."""
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the profiling module."""
+
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+import googleads.common
+import googleads.profiling
+
+
+class SessionProfilerTest(unittest.TestCase):
+  """Tests for the googleads.profiling.SessionProfiler class."""
+
+  def testProfileSession(self):
+    output = StringIO.StringIO()
+
+    with googleads.profiling.ProfileSession(output, memory=False) as profiler:
+      self.assertIn(profiler, googleads.common._call_hooks)
+      with googleads.common.MeasureCall('CampaignService', 'get') as call:
+        with call.Phase('network'):
+          sorted(range(1000), reverse=True)
+        with googleads.common.MeasureCall('CampaignService', 'mutate'):
+          pass
+
+    self.assertNotIn(profiler, googleads.common._call_hooks)
+    self.assertIsNotNone(profiler.GetStats('CampaignService', 'get'))
+    self.assertIsNotNone(profiler.GetStats())
+    self.assertIsNone(profiler.GetStats('CampaignService', 'mutate'))
+    report = output.getvalue()
+    self.assertEqual(profiler.GetReport(), report)
+    self.assertIn('CampaignService.get: 1 calls', report)
+    self.assertIn('cpu: googleads ', report)
+    self.assertIn('phases: network ', report)
+    self.assertNotIn('allocated:', report)
+    self.assertIn('sorted', report)
+
+  def testProfileSession_memory(self):
+    statistics = [mock.Mock(size_diff=2048, traceback=[
+        mock.Mock(filename='/lib/suds/sax/parser.py')]), mock.Mock(
+            size_diff=-1024, traceback=[mock.Mock(filename='/lib/json.py')])]
+    with mock.patch('googleads.profiling.tracemalloc') as mock_tracemalloc:
+      mock_tracemalloc.is_tracing.return_value = False
+      with googleads.profiling.ProfileSession(None) as profiler:
+        mock_tracemalloc.is_tracing.return_value = True
+        mock_tracemalloc.take_snapshot.return_value.compare_to.return_value = (
+            statistics)
+        with googleads.common.MeasureCall('CampaignService', 'get'):
+          pass
+
+      mock_tracemalloc.start.assert_called_once_with()
+      mock_tracemalloc.stop.assert_called_once_with()
+    self.assertIn('allocated: googleads 0.0 KiB, suds 2.0 KiB, network 0.0 '
+                  'KiB, other 0.0 KiB', profiler.GetReport())
+
+  def testStartProfileFromEnvironment(self):
+    directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'profile.txt')
+
+    with mock.patch.dict(os.environ, {'GOOGLEADS_PROFILE': path}):
+      with mock.patch('atexit.register') as mock_register:
+        profiler = googleads.profiling._StartProfileFromEnvironment()
+    with googleads.common.MeasureCall('ReportDownloader', 'DownloadReport'):
+      pass
+    mock_register.call_args[0][0]()
+
+    self.assertNotIn(profiler, googleads.common._call_hooks)
+    with open(path) as handle:
+      self.assertIn('ReportDownloader.DownloadReport: 1 calls', handle.read())
+    self.assertTrue(os.path.exists(path + '.pstats'))
+
+  def testStartProfileFromEnvironment_unset(self):
+    with mock.patch.dict(os.environ, clear=True):
+      self.assertIsNone(googleads.profiling._StartProfileFromEnvironment())
+
+  def testGetProfileCategory(self):
+    self.assertEqual('googleads', googleads.profiling._GetProfileCategory(
+        '/lib/googleads/common.py'))
+    self.assertEqual('suds', googleads.profiling._GetProfileCategory(
+        '/lib/suds/client.py'))
+    self.assertEqual('network', googleads.profiling._GetProfileCategory(
+        '/usr/lib/python2.7/httplib.py'))
+    self.assertEqual('network', googleads.profiling._GetProfileCategory(
+        '~', "<method 'recv' of '_socket.socket' objects>"))
+    self.assertEqual('other', googleads.profiling._GetProfileCategory(
+        '~', '<sorted>'))
+    self.assertEqual('other', googleads.profiling._GetProfileCategory(
+        '/usr/lib/python2.7/json/decoder.py'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+#
+# Copyright 2026 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the store module."""
+
+import unittest
+
+import suds.sudsobject
+
+import googleads.store
+
+
+class EntityStoreTest(unittest.TestCase):
+  """Tests for the googleads.store.EntityStore class."""
+
+  def setUp(self):
+    self.entity_store = googleads.store.EntityStore(':memory:')
+    self.addCleanup(self.entity_store.Close)
+    self.entity_store.Update('123', [
+        ('Campaign', 1, None, {'id': 1, 'name': u'Campaign \u2603'}),
+        ('AdGroup', 10, 1, suds.sudsobject.Factory.object(
+            'AdGroup', {'id': 10, 'campaignId': 1, 'bids': None})),
+        ('AdGroup', 11, 1, {'id': 11, 'campaignId': 1}),
+        ('AdGroup', 20, 2, {'id': 20, 'campaignId': 2})], checkpoint='a')
+    self.entity_store.Update('456', [('Campaign', 1, None, {'id': 1})])
+
+  def testGet(self):
+    self.assertEqual({'id': 1, 'name': u'Campaign \u2603'},
+                     self.entity_store.Get('123', 'Campaign', 1))
+    self.assertEqual({'id': 10, 'campaignId': 1},
+                     self.entity_store.Get('123', 'AdGroup', '10'))
+    self.assertIsNone(self.entity_store.Get('123', 'Campaign', 2))
+
+  def testGetAll(self):
+    self.assertEqual([10, 11], [ad_group['id'] for ad_group in
+                                self.entity_store.GetAll('123', 'AdGroup', 1)])
+    self.assertEqual(3, len(self.entity_store.GetAll('123', 'AdGroup')))
+    self.assertEqual(set(['1']), self.entity_store.GetIds('456', 'Campaign'))
+
+  def testCheckpoint(self):
+    self.assertEqual('a', self.entity_store.GetCheckpoint('123'))
+    self.assertIsNone(self.entity_store.GetCheckpoint('456'))
+
+  def testUpdate(self):
+    self.entity_store.Update('123', [('AdGroup', 10, 1, {'id': 10})],
+                             [('AdGroup', 11)], 'b')
+
+    self.assertEqual({'id': 10}, self.entity_store.Get('123', 'AdGroup', 10))
+    self.assertIsNone(self.entity_store.Get('123', 'AdGroup', 11))
+    self.assertEqual('b', self.entity_store.GetCheckpoint('123'))
+
+  def testUpdate_replace(self):
+    self.entity_store.Update('123', [('Campaign', 3, None, {'id': 3})],
+                             replace=True)
+
+    self.assertEqual(set(['3']), self.entity_store.GetIds('123', 'Campaign'))
+    self.assertEqual(set(), self.entity_store.GetIds('123', 'AdGroup'))
+    self.assertEqual(set(['1']), self.entity_store.GetIds('456', 'Campaign'))
+
+  def testUpdate_replaceTypes(self):
+    self.entity_store.Update('123', [('AdGroup', 30, 3, {'id': 30})],
+                             replace_types=['AdGroup'])
+
+    self.assertEqual(set(['1']), self.entity_store.GetIds('123', 'Campaign'))
+    self.assertEqual(set(['30']), self.entity_store.GetIds('123', 'AdGroup'))
+
+
+if __name__ == '__main__':
+  unittest.main()